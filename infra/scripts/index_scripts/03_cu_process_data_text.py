@@ -171,8 +171,8 @@ def create_tables():
     cursor.execute('DROP TABLE IF EXISTS processed_data')
     cursor.execute("""CREATE TABLE processed_data (
         ConversationId varchar(255) NOT NULL PRIMARY KEY,
-        EndTime varchar(255),
-        StartTime varchar(255),
+        EndTime datetime2(0),
+        StartTime datetime2(0),
         Content varchar(max),
         summary varchar(3000),
         satisfied varchar(255),
@@ -188,8 +188,13 @@ def create_tables():
         key_phrase varchar(500), 
         sentiment varchar(255),
         topic varchar(255), 
-        StartTime varchar(255)
+        StartTime datetime2(0)
     );""")
+    # Covering indexes for the dashboard's date range filters and aggregates
+    cursor.execute("""CREATE NONCLUSTERED INDEX IX_processed_data_StartTime
+        ON processed_data (StartTime, mined_topic, sentiment, satisfied) INCLUDE (EndTime)""")
+    cursor.execute("""CREATE NONCLUSTERED INDEX IX_processed_data_key_phrases_StartTime
+        ON processed_data_key_phrases (StartTime, topic, sentiment) INCLUDE (key_phrase)""")
     conn.commit()
     print("Database tables created.")
 
@@ -367,7 +372,8 @@ cursor.execute("""CREATE TABLE km_processed_data (
     topic varchar(255)
 );""")
 conn.commit()
-cursor.execute('''select ConversationId, StartTime, EndTime, Content, summary, satisfied, sentiment, 
+cursor.execute('''select ConversationId, CONVERT(varchar(19), StartTime, 120) as StartTime,
+CONVERT(varchar(19), EndTime, 120) as EndTime, Content, summary, satisfied, sentiment,
 key_phrases as keyphrases, complaint, mined_topic as topic from processed_data''')
 rows = cursor.fetchall()
 columns = ["ConversationId", "StartTime", "EndTime", "Content", "summary", "satisfied", "sentiment", 
@@ -395,14 +401,57 @@ print("processed_data_key_phrases table updated.")
 
 # Adjust dates to current date
 today = datetime.today()
-cursor.execute("SELECT MAX(CAST(StartTime AS DATETIME)) FROM [dbo].[processed_data]")
+cursor.execute("SELECT MAX(StartTime) FROM [dbo].[processed_data]")
 max_start_time = cursor.fetchone()[0]
 days_difference = (today - max_start_time).days - 1 if max_start_time else 0
-cursor.execute("UPDATE [dbo].[processed_data] SET StartTime = FORMAT(DATEADD(DAY, ?, StartTime), 'yyyy-MM-dd HH:mm:ss'), EndTime = FORMAT(DATEADD(DAY, ?, EndTime), 'yyyy-MM-dd HH:mm:ss')", (days_difference, days_difference))
+cursor.execute("UPDATE [dbo].[processed_data] SET StartTime = DATEADD(DAY, ?, StartTime), EndTime = DATEADD(DAY, ?, EndTime)", (days_difference, days_difference))
 cursor.execute("UPDATE [dbo].[km_processed_data] SET StartTime = FORMAT(DATEADD(DAY, ?, StartTime), 'yyyy-MM-dd HH:mm:ss'), EndTime = FORMAT(DATEADD(DAY, ?, EndTime), 'yyyy-MM-dd HH:mm:ss')", (days_difference, days_difference))
-cursor.execute("UPDATE [dbo].[processed_data_key_phrases] SET StartTime = FORMAT(DATEADD(DAY, ?, StartTime), 'yyyy-MM-dd HH:mm:ss')", (days_difference,))
+cursor.execute("UPDATE [dbo].[processed_data_key_phrases] SET StartTime = DATEADD(DAY, ?, StartTime)", (days_difference,))
+# Rebuild the daily rollup tables the dashboard reads its KPIs from
+cursor.execute('DROP TABLE IF EXISTS km_call_rollup_daily')
+cursor.execute("""CREATE TABLE km_call_rollup_daily (
+    call_date date,
+    mined_topic varchar(255),
+    sentiment varchar(255),
+    satisfied varchar(255),
+    calls int NOT NULL,
+    handling_minutes bigint,
+    timed_calls int NOT NULL
+);""")
+cursor.execute("CREATE CLUSTERED INDEX IX_km_call_rollup_daily ON km_call_rollup_daily (call_date, mined_topic, sentiment, satisfied)")
+cursor.execute("""INSERT INTO km_call_rollup_daily (call_date, mined_topic, sentiment, satisfied, calls, handling_minutes, timed_calls)
+SELECT CAST(StartTime AS date), mined_topic, sentiment, satisfied, COUNT(*),
+    SUM(CAST(DATEDIFF(MINUTE, StartTime, EndTime) AS bigint)), COUNT(DATEDIFF(MINUTE, StartTime, EndTime))
+FROM processed_data
+GROUP BY CAST(StartTime AS date), mined_topic, sentiment, satisfied""")
+cursor.execute('DROP TABLE IF EXISTS km_key_phrase_rollup_daily')
+cursor.execute("""CREATE TABLE km_key_phrase_rollup_daily (
+    call_date date,
+    topic varchar(255),
+    key_phrase varchar(500),
+    sentiment varchar(255),
+    calls int NOT NULL
+);""")
+cursor.execute("CREATE CLUSTERED INDEX IX_km_key_phrase_rollup_daily ON km_key_phrase_rollup_daily (call_date, topic, sentiment)")
+cursor.execute("""INSERT INTO km_key_phrase_rollup_daily (call_date, topic, key_phrase, sentiment, calls)
+SELECT CAST(StartTime AS date), topic, key_phrase, sentiment, COUNT(*)
+FROM processed_data_key_phrases
+GROUP BY CAST(StartTime AS date), topic, key_phrase, sentiment""")
+# Record the rebase so the API's daily date rebase job skips today
+cursor.execute("""IF OBJECT_ID(N'[dbo].[km_data_watermark]', N'U') IS NULL
+CREATE TABLE [dbo].[km_data_watermark] (
+    id int NOT NULL PRIMARY KEY,
+    rebased_on date NOT NULL,
+    days_shifted int NOT NULL,
+    updated_at datetime2 NOT NULL
+);""")
+cursor.execute("""MERGE [dbo].[km_data_watermark] AS w
+USING (SELECT 1 AS id) AS s ON w.id = s.id
+WHEN MATCHED THEN UPDATE SET rebased_on = ?, days_shifted = ?, updated_at = SYSUTCDATETIME()
+WHEN NOT MATCHED THEN INSERT (id, rebased_on, days_shifted, updated_at) VALUES (1, ?, ?, SYSUTCDATETIME());""",
+               (today.date(), days_difference, today.date(), days_difference))
 conn.commit()
-print("Dates adjusted to current date.")
+print("Dates adjusted to current date and rollup tables rebuilt.")
 
 cursor.close()
 conn.close()
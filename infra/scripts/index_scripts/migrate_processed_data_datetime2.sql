@@ -0,0 +1,76 @@
+-- Migrates an existing Knowledge Mining database to typed StartTime/EndTime columns.
+--
+-- Databases created before this change store StartTime/EndTime as varchar(255), which
+-- forces an implicit conversion per row for every dashboard date filter. This script
+-- converts them to datetime2(0) and adds the covering indexes used by the dashboard.
+-- km_processed_data is left unchanged, since the SQL agent queries it as text.
+--
+-- The script is idempotent and can be re-run. Run it with sqlcmd or the Azure portal
+-- query editor against the solution's SQL database, e.g.:
+--   sqlcmd -S <server>.database.windows.net -d <database> -G -b -i migrate_processed_data_datetime2.sql
+--
+-- The validation and the column changes run in one batch and transaction, and the indexes
+-- are only created on converted columns, so a failed validation changes nothing even when
+-- the client carries on with the next batch.
+
+SET XACT_ABORT ON;
+GO
+
+BEGIN TRANSACTION;
+
+-- Refuse to migrate if any value would not convert; fix or clear those rows first.
+IF EXISTS (
+    SELECT 1 FROM [dbo].[processed_data]
+    WHERE (StartTime IS NOT NULL AND TRY_CONVERT(datetime2(0), StartTime) IS NULL)
+       OR (EndTime IS NOT NULL AND TRY_CONVERT(datetime2(0), EndTime) IS NULL)
+)
+    THROW 50001, 'processed_data contains StartTime/EndTime values that are not valid dates.', 1;
+
+IF EXISTS (
+    SELECT 1 FROM [dbo].[processed_data_key_phrases]
+    WHERE StartTime IS NOT NULL AND TRY_CONVERT(datetime2(0), StartTime) IS NULL
+)
+    THROW 50002, 'processed_data_key_phrases contains StartTime values that are not valid dates.', 1;
+
+IF EXISTS (
+    SELECT 1 FROM sys.columns
+    WHERE object_id = OBJECT_ID(N'[dbo].[processed_data]') AND name = 'StartTime'
+      AND TYPE_NAME(system_type_id) <> 'datetime2'
+)
+BEGIN
+    ALTER TABLE [dbo].[processed_data] ALTER COLUMN StartTime datetime2(0) NULL;
+    ALTER TABLE [dbo].[processed_data] ALTER COLUMN EndTime datetime2(0) NULL;
+END
+
+IF EXISTS (
+    SELECT 1 FROM sys.columns
+    WHERE object_id = OBJECT_ID(N'[dbo].[processed_data_key_phrases]') AND name = 'StartTime'
+      AND TYPE_NAME(system_type_id) <> 'datetime2'
+)
+    ALTER TABLE [dbo].[processed_data_key_phrases] ALTER COLUMN StartTime datetime2(0) NULL;
+
+COMMIT TRANSACTION;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE object_id = OBJECT_ID(N'[dbo].[processed_data]') AND name = 'IX_processed_data_StartTime'
+) AND EXISTS (
+    SELECT 1 FROM sys.columns
+    WHERE object_id = OBJECT_ID(N'[dbo].[processed_data]') AND name = 'StartTime'
+      AND TYPE_NAME(system_type_id) = 'datetime2'
+)
+    CREATE NONCLUSTERED INDEX IX_processed_data_StartTime
+        ON [dbo].[processed_data] (StartTime, mined_topic, sentiment, satisfied) INCLUDE (EndTime);
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE object_id = OBJECT_ID(N'[dbo].[processed_data_key_phrases]') AND name = 'IX_processed_data_key_phrases_StartTime'
+) AND EXISTS (
+    SELECT 1 FROM sys.columns
+    WHERE object_id = OBJECT_ID(N'[dbo].[processed_data_key_phrases]') AND name = 'StartTime'
+      AND TYPE_NAME(system_type_id) = 'datetime2'
+)
+    CREATE NONCLUSTERED INDEX IX_processed_data_key_phrases_StartTime
+        ON [dbo].[processed_data_key_phrases] (StartTime, topic, sentiment) INCLUDE (key_phrase);
+GO
@@ -1,14 +1,50 @@
 import asyncio
+import hashlib
+import json
+import logging
+import time
 from abc import ABC, abstractmethod
 from typing import Optional
 
 from common.config.config import Config
 
+logger = logging.getLogger(__name__)
+
+# Metadata key holding the hash of the definition an agent was created from
+DEFINITION_HASH_KEY = "definition_hash"
+
+_startup_metrics = {}
+
+
+def agent_definition_hash(definition: dict) -> str:
+    """Return a stable hash of an agent definition (model, name, instructions, tools, ...)."""
+    def serialize(value):
+        if hasattr(value, "as_dict"):
+            return value.as_dict()
+        return str(value)
+
+    encoded = json.dumps(definition, sort_keys=True, default=serialize)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def get_agent_startup_metrics() -> dict:
+    """Return per-factory provisioning time and whether an existing agent was reused."""
+    return dict(_startup_metrics)
+
 
 class BaseAgentFactory(ABC):
     """Base factory class for creating and managing agent instances."""
     _lock = asyncio.Lock()
     _agent: Optional[object] = None
+    # Whether this worker created the agent for itself and deletes it on shutdown
+    _owns_agent = True
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Each factory gets its own lock so that factories can provision concurrently
+        cls._lock = asyncio.Lock()
+        cls._agent = None
+        cls._owns_agent = True
 
     @classmethod
     async def get_agent(cls) -> object:
@@ -16,7 +52,12 @@ class BaseAgentFactory(ABC):
         async with cls._lock:
             if cls._agent is None:
                 config = Config()
+                started = time.perf_counter()
                 cls._agent = await cls.create_agent(config)
+                seconds = time.perf_counter() - started
+                _startup_metrics[cls.__name__] = {"seconds": round(seconds, 3), "reused": not cls._owns_agent}
+                logger.info("%s provisioned in %.2fs (%s)", cls.__name__, seconds,
+                            "owned" if cls._owns_agent else "shared")
         return cls._agent
 
     @classmethod
@@ -27,6 +68,69 @@ class BaseAgentFactory(ABC):
                 await cls._delete_agent_instance(cls._agent)
                 cls._agent = None
 
+    @classmethod
+    async def _provision_agent(cls, agents_client, config: Config, **definition):
+        """
+        Find an agent with the same name and definition hash, or create one.
+
+        When agent reuse is enabled, every worker and restart shares one agent per definition: an
+        existing agent created from the same definition is returned, and a new one is created
+        (tagged with the hash) only when none exists. Once it is created, agents of the same name
+        left from older definitions are deleted. Shared agents are kept on shutdown; with reuse
+        disabled, each worker creates its own agent and deletes it on shutdown.
+
+        Args:
+            agents_client: The project's agents client.
+            config: Configuration object; ``agent_reuse_enabled`` selects the behavior.
+            **definition: Keyword arguments for ``create_agent``; ``name`` is required.
+
+        Returns:
+            Agent: The reused or created agent definition.
+        """
+        definition_hash = agent_definition_hash(definition)
+        if not config.agent_reuse_enabled:
+            cls._owns_agent = True
+            return await agents_client.create_agent(**definition, metadata={DEFINITION_HASH_KEY: definition_hash})
+
+        async for agent in agents_client.list_agents(order="asc"):
+            if agent.name == definition["name"] and (agent.metadata or {}).get(DEFINITION_HASH_KEY) == definition_hash:
+                cls._owns_agent = False
+                return agent
+
+        agent = await agents_client.create_agent(**definition, metadata={DEFINITION_HASH_KEY: definition_hash})
+        cls._owns_agent = False
+        return await cls._remove_duplicate_agents(agents_client, agent, definition["name"], definition_hash)
+
+    @classmethod
+    async def _remove_duplicate_agents(cls, agents_client, agent, name, definition_hash):
+        """
+        Delete agents of the same name made redundant by the newly created ``agent``.
+
+        Workers starting at the same time may each have created an agent for the definition;
+        all of them keep the oldest one and delete their own. Agents from older definitions
+        would otherwise pile up with every change of the definition, so they are deleted too.
+        """
+        kept = None
+        redundant = []
+        async for other in agents_client.list_agents(order="asc"):
+            if other.name != name:
+                continue
+            if (other.metadata or {}).get(DEFINITION_HASH_KEY) != definition_hash:
+                redundant.append(other)
+            elif kept is None:
+                kept = other
+        if kept is not None and kept.id != agent.id:
+            redundant.append(agent)
+            agent = kept
+
+        for other in redundant:
+            try:
+                await agents_client.delete_agent(other.id)
+            except Exception as e:
+                # Another worker may have deleted it first
+                logger.warning("Could not delete redundant agent %s: %s", other.id, e)
+        return agent
+
     @classmethod
     @abstractmethod
     async def create_agent(cls, config: Config) -> object:
@@ -0,0 +1,138 @@
+"""
+Warm pool of agent threads for the single-turn SQL, search and chart agents.
+
+Each tool call used to create a thread, run on it and delete it, paying two control-plane
+round trips before and after any model work. The pool keeps pre-created threads ready,
+hands one out per call and recycles it after use: the used thread is deleted and replaced
+by a fresh one in the background, so a run never sees messages from an earlier call and
+thread create/delete latency stays off the request path.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Pool name -> AgentThreadPool, for the /metrics endpoint
+_thread_pools = {}
+
+
+class AgentThreadPool:
+    """
+    Pool of pre-created threads for one agent's project client.
+
+    Args:
+        client: Async ``AIProjectClient`` the agent belongs to.
+        name (str): Pool name reported in the metrics, e.g. 'sql'.
+        size (int): Number of idle threads kept ready. When the pool is empty, threads are
+            created on demand and only recycled back up to this size.
+    """
+
+    def __init__(self, client, name, size=4):
+        self.client = client
+        self.name = name
+        self.size = max(0, size)
+        self._idle = deque()
+        self._pending_creates = 0
+        self._in_use = 0
+        self._background = set()
+        self._closed = False
+        self._hits = 0
+        self._misses = 0
+        self._recycled = 0
+        self._create_errors = 0
+        self._delete_errors = 0
+
+    def start(self):
+        """Fill the pool in the background and register it for metrics."""
+        _thread_pools[self.name] = self
+        self._refill()
+
+    @asynccontextmanager
+    async def thread(self):
+        """
+        Borrow a thread for one run and yield its id.
+
+        The thread is recycled when the block exits, whether or not the run succeeded.
+        """
+        thread_id = await self._acquire()
+        self._in_use += 1
+        try:
+            yield thread_id
+        finally:
+            self._in_use -= 1
+            self._spawn(self._recycle(thread_id))
+
+    async def close(self):
+        """Wait for background work, delete the idle threads and unregister the pool."""
+        self._closed = True
+        if _thread_pools.get(self.name) is self:
+            del _thread_pools[self.name]
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        while self._idle:
+            await self._delete(self._idle.popleft())
+
+    def get_metrics(self):
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "in_use": self._in_use,
+            "pending_creates": self._pending_creates,
+            "hits": self._hits,
+            "misses": self._misses,
+            "recycled": self._recycled,
+            "create_errors": self._create_errors,
+            "delete_errors": self._delete_errors,
+        }
+
+    async def _acquire(self):
+        if self._idle:
+            self._hits += 1
+            return self._idle.popleft()
+        self._misses += 1
+        thread = await self.client.agents.threads.create()
+        return thread.id
+
+    async def _recycle(self, thread_id):
+        await self._delete(thread_id)
+        self._recycled += 1
+        self._refill()
+
+    def _refill(self):
+        while not self._closed and len(self._idle) + self._pending_creates < self.size:
+            self._pending_creates += 1
+            self._spawn(self._create())
+
+    async def _create(self):
+        try:
+            thread = await self.client.agents.threads.create()
+        except Exception as e:
+            self._create_errors += 1
+            logger.warning("Could not pre-create a thread for the %s agent: %s", self.name, e)
+            return
+        finally:
+            self._pending_creates -= 1
+        if self._closed:
+            await self._delete(thread.id)
+        else:
+            self._idle.append(thread.id)
+
+    async def _delete(self, thread_id):
+        try:
+            await self.client.agents.threads.delete(thread_id=thread_id)
+        except Exception as e:
+            self._delete_errors += 1
+            logger.warning("Could not delete thread %s of the %s agent: %s", thread_id, self.name, e)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+
+def get_agent_thread_pool_metrics():
+    """Return the metrics of every open thread pool, keyed by pool name."""
+    return {name: pool.get_metrics() for name, pool in _thread_pools.items()}
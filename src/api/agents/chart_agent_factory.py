@@ -1,7 +1,8 @@
-from azure.ai.projects import AIProjectClient
+from azure.ai.projects.aio import AIProjectClient
 
 from agents.agent_factory_base import BaseAgentFactory
-from helpers.azure_credential_utils import get_azure_credential
+from agents.agent_thread_pool import AgentThreadPool
+from helpers.azure_credential_utils import get_azure_credential_async
 
 
 class ChartAgentFactory(BaseAgentFactory):
@@ -20,7 +21,8 @@ class ChartAgentFactory(BaseAgentFactory):
             config: Configuration object containing AI project and model settings.
 
         Returns:
-            dict: A dictionary containing the created 'agent' and its associated 'client'.
+            dict: A dictionary containing the created 'agent', its associated 'client' and
+            the agent's 'thread_pool'.
         """
         instructions = """You are an assistant that helps generate valid chart data to be shown using chart.js with version 4.4.4 compatible.
         Include chart type and chart options.
@@ -35,7 +37,7 @@ class ChartAgentFactory(BaseAgentFactory):
         Ensure Y-axis labels are fully visible by increasing **ticks.padding**, **ticks.maxWidth**, or enabling word wrapping where necessary.
         Ensure bars and data points are evenly spaced and not squished or cropped at **100%** resolution by maintaining appropriate **barPercentage** and **categoryPercentage** values."""
 
-        credential = get_azure_credential()
+        credential = await get_azure_credential_async()
 
         project_client = AIProjectClient(
             endpoint=config.ai_project_endpoint,
@@ -43,23 +45,35 @@ class ChartAgentFactory(BaseAgentFactory):
             api_version=config.ai_project_api_version,
         )
 
-        agent = project_client.agents.create_agent(
+        agent = await cls._provision_agent(
+            project_client.agents,
+            config,
             model=config.azure_openai_deployment_model,
             name=f"KM-ChartAgent-{config.solution_name}",
             instructions=instructions,
         )
 
+        thread_pool = AgentThreadPool(project_client, name="chart", size=config.agent_thread_pool_size)
+        thread_pool.start()
+
         return {
             "agent": agent,
-            "client": project_client
+            "client": project_client,
+            "thread_pool": thread_pool
         }
 
     @classmethod
     async def _delete_agent_instance(cls, agent_wrapper: dict):
         """
-        Asynchronously deletes the specified chart agent instance from the Azure AI project.
+        Asynchronously deletes the specified chart agent instance from the Azure AI project
+        along with its pooled threads, and closes its project client.
+        The agent itself is only deleted when this worker owns it rather than sharing it.
 
         Args:
-            agent_wrapper (dict): Dictionary containing the 'agent' and 'client' to be removed.
+            agent_wrapper (dict): Dictionary containing the 'agent', 'client' and 'thread_pool' to be removed.
         """
-        agent_wrapper["client"].agents.delete_agent(agent_wrapper["agent"].id)
+        client = agent_wrapper["client"]
+        await agent_wrapper["thread_pool"].close()
+        if cls._owns_agent:
+            await client.agents.delete_agent(agent_wrapper["agent"].id)
+        await client.close()
@@ -1,8 +1,9 @@
 from azure.ai.agents.models import AzureAISearchTool, AzureAISearchQueryType
-from azure.ai.projects import AIProjectClient
+from azure.ai.projects.aio import AIProjectClient
 
 from agents.agent_factory_base import BaseAgentFactory
-from helpers.azure_credential_utils import get_azure_credential
+from agents.agent_thread_pool import AgentThreadPool
+from helpers.azure_credential_utils import get_azure_credential_async
 
 
 class SearchAgentFactory(BaseAgentFactory):
@@ -18,9 +19,10 @@ class SearchAgentFactory(BaseAgentFactory):
             config: Configuration object containing Azure project and search index settings.
 
         Returns:
-            dict: A dictionary containing the created agent and the project client.
+            dict: A dictionary containing the created agent, the project client and the
+            agent's thread pool.
         """
-        credential = get_azure_credential()
+        credential = await get_azure_credential_async()
 
         project_client = AIProjectClient(
             endpoint=config.ai_project_endpoint,
@@ -34,7 +36,7 @@ class SearchAgentFactory(BaseAgentFactory):
             "titleField": "chunk_id",
         }
 
-        project_index = project_client.indexes.create_or_update(
+        project_index = await project_client.indexes.create_or_update(
             name=f"project-index-{config.azure_ai_search_connection_name}-{config.azure_ai_search_index}",
             version="1",
             index={
@@ -54,7 +56,9 @@ class SearchAgentFactory(BaseAgentFactory):
             filter=""
         )
 
-        agent = project_client.agents.create_agent(
+        agent = await cls._provision_agent(
+            project_client.agents,
+            config,
             model=config.azure_openai_deployment_model,
             name=f"KM-ChatWithCallTranscriptsAgent-{config.solution_name}",
             instructions="You are a helpful agent. Use the tools provided and always cite your sources.",
@@ -62,17 +66,28 @@ class SearchAgentFactory(BaseAgentFactory):
             tool_resources=ai_search.resources,
         )
 
+        thread_pool = AgentThreadPool(project_client, name="search", size=config.agent_thread_pool_size)
+        thread_pool.start()
+
         return {
             "agent": agent,
-            "client": project_client
+            "client": project_client,
+            "thread_pool": thread_pool
         }
 
     @classmethod
     async def _delete_agent_instance(cls, agent_wrapper: dict):
         """
-        Asynchronously deletes the specified agent instance from the Azure AI project.
+        Asynchronously deletes the specified agent instance from the Azure AI project
+        along with its pooled threads, and closes its project client.
+        The agent itself is only deleted when this worker owns it rather than sharing it.
 
         Args:
-            agent_wrapper (dict): A dictionary containing the 'agent' and the corresponding 'client'.
+            agent_wrapper (dict): A dictionary containing the 'agent', the corresponding 'client'
+                and its 'thread_pool'.
         """
-        agent_wrapper["client"].agents.delete_agent(agent_wrapper["agent"].id)
+        client = agent_wrapper["client"]
+        await agent_wrapper["thread_pool"].close()
+        if cls._owns_agent:
+            await client.agents.delete_agent(agent_wrapper["agent"].id)
+        await client.close()
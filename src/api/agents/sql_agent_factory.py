@@ -1,7 +1,8 @@
-from azure.ai.projects import AIProjectClient
+from azure.ai.projects.aio import AIProjectClient
 
 from agents.agent_factory_base import BaseAgentFactory
-from helpers.azure_credential_utils import get_azure_credential
+from agents.agent_thread_pool import AgentThreadPool
+from helpers.azure_credential_utils import get_azure_credential_async
 
 
 class SQLAgentFactory(BaseAgentFactory):
@@ -19,7 +20,8 @@ class SQLAgentFactory(BaseAgentFactory):
             config: Configuration object containing AI project and model settings.
 
         Returns:
-            dict: A dictionary containing the created 'agent' and its associated 'client'.
+            dict: A dictionary containing the created 'agent', its associated 'client' and
+            the agent's 'thread_pool'.
         """
         instructions = '''You are an assistant that helps generate valid T-SQL queries.
         Generate a valid T-SQL query for the user's request using these tables:
@@ -32,7 +34,7 @@ class SQLAgentFactory(BaseAgentFactory):
         Ensure all aggregations, filters, grouping logic, and time-based calculations are precise, logically consistent, and reflect the user's intent without ambiguity.
         **Always** return a valid T-SQL query. Only return the SQL query text—no explanations.'''
 
-        credential = get_azure_credential()
+        credential = await get_azure_credential_async()
 
         project_client = AIProjectClient(
             endpoint=config.ai_project_endpoint,
@@ -40,23 +42,35 @@ class SQLAgentFactory(BaseAgentFactory):
             api_version=config.ai_project_api_version,
         )
 
-        agent = project_client.agents.create_agent(
+        agent = await cls._provision_agent(
+            project_client.agents,
+            config,
             model=config.azure_openai_deployment_model,
             name=f"KM-ChatWithSQLDatabaseAgent-{config.solution_name}",
             instructions=instructions,
         )
 
+        thread_pool = AgentThreadPool(project_client, name="sql", size=config.agent_thread_pool_size)
+        thread_pool.start()
+
         return {
             "agent": agent,
-            "client": project_client
+            "client": project_client,
+            "thread_pool": thread_pool
         }
 
     @classmethod
     async def _delete_agent_instance(cls, agent_wrapper: dict):
         """
-        Asynchronously deletes the specified SQL agent instance from the Azure AI project.
+        Asynchronously deletes the specified SQL agent instance from the Azure AI project
+        along with its pooled threads, and closes its project client.
+        The agent itself is only deleted when this worker owns it rather than sharing it.
 
         Args:
-            agent_wrapper (dict): Dictionary containing the 'agent' and 'client' to be removed.
+            agent_wrapper (dict): Dictionary containing the 'agent', 'client' and 'thread_pool' to be removed.
         """
-        agent_wrapper["client"].agents.delete_agent(agent_wrapper["agent"].id)
+        client = agent_wrapper["client"]
+        await agent_wrapper["thread_pool"].close()
+        if cls._owns_agent:
+            await client.agents.delete_agent(agent_wrapper["agent"].id)
+        await client.close()
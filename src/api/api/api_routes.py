@@ -6,13 +6,22 @@ from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse, StreamingResponse
 import requests
 from api.models.input_models import ChartFilters
-from services.chat_service import ChatService
+from agents.agent_factory_base import get_agent_startup_metrics
+from agents.agent_thread_pool import get_agent_thread_pool_metrics
+from services.chat_service import ChatService, negotiate_stream_protocol
 from services.chart_service import ChartService
+from services.chart_cache import get_chart_cache_stats
+from services.sql_query_cache import get_sql_query_cache_stats
+from services.conversation_thread_store import get_conversation_thread_store_metrics
+from services.thread_reaper import get_thread_reaper_metrics
+from common.database.sqldb_service import get_executor_metrics, get_governor_metrics, get_pool_metrics
+from common.database.sql_governor import sql_query_user
 from common.logging.event_utils import track_event_if_configured
 from azure.monitor.opentelemetry import configure_azure_monitor
 from opentelemetry import trace
 from opentelemetry.trace import Status, StatusCode
-from helpers.azure_credential_utils import get_azure_credential
+from helpers.azure_credential_utils import get_azure_credential_async, get_credential_metrics
+from auth.auth_utils import get_authenticated_user_details
 
 router = APIRouter()
 
@@ -113,18 +122,28 @@ async def conversation(request: Request):
         logger.info(f"Received last_rag_response: {last_rag_response}")
 
         query = request_json.get("messages")[-1].get("content")
+        # Attribute SQL generated for this request to the user for the per-user query quota
+        sql_query_user.set(get_authenticated_user_details(request.headers)["user_principal_id"])
         is_chart_query = any(
             term in query.lower()
             for term in ["chart", "graph", "visualize", "plot"]
         )
         chat_service = ChatService(request=request)
         if not is_chart_query:
-            result = await chat_service.stream_chat_request(request_json, conversation_id, query)
+            # Clients opt in to delta streaming with "stream_protocol" in the body or the X-Stream-Protocol header
+            stream_protocol = negotiate_stream_protocol(
+                request_json.get("stream_protocol") or request.headers.get("X-Stream-Protocol")
+            )
+            result = await chat_service.stream_chat_request(request_json, conversation_id, query, stream_protocol)
             track_event_if_configured(
                 "ChatStreamSuccess",
                 {"conversation_id": conversation_id, "query": query}
             )
-            return StreamingResponse(result, media_type="application/json-lines")
+            return StreamingResponse(
+                result,
+                media_type="application/json-lines",
+                headers={"X-Stream-Protocol": stream_protocol},
+            )
         else:
             result = await chat_service.complete_chat_request(query, last_rag_response)
             track_event_if_configured(
@@ -171,6 +190,25 @@ async def get_chart_config():
     return JSONResponse(content={"error": "DISPLAY_CHART_DEFAULT flag not found in environment variables"}, status_code=400)
 
 
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Returns in-process performance counters for this worker.
+    """
+    return JSONResponse(content={
+        "sql_pool": get_pool_metrics(),
+        "sql_executor": get_executor_metrics(),
+        "sql_governor": get_governor_metrics(),
+        "chart_cache": get_chart_cache_stats(),
+        "agent_startup": get_agent_startup_metrics(),
+        "agent_thread_pools": get_agent_thread_pool_metrics(),
+        "sql_query_cache": get_sql_query_cache_stats(),
+        "conversation_threads": get_conversation_thread_store_metrics(),
+        "credentials": get_credential_metrics(),
+        "thread_reaper": get_thread_reaper_metrics(),
+    })
+
+
 @router.post("/fetch-azure-search-content")
 async def fetch_azure_search_content_endpoint(request: Request):
     """
@@ -186,8 +224,8 @@ async def fetch_azure_search_content_endpoint(request: Request):
             return JSONResponse(content={"error": "URL is required"}, status_code=400)
 
         # Get Azure AD token
-        credential = get_azure_credential()
-        token = credential.get_token("https://search.azure.com/.default")
+        credential = await get_azure_credential_async()
+        token = await credential.get_token("https://search.azure.com/.default")
         access_token = token.token
 
         # Define blocking request call
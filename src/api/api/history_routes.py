@@ -1,5 +1,6 @@
 import logging
 import os
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 from auth.auth_utils import get_authenticated_user_details
@@ -11,6 +12,9 @@ from opentelemetry.trace import Status, StatusCode
 
 router = APIRouter()
 
+# Response header carrying the opaque token of the next /list page
+NEXT_TOKEN_HEADER = "X-Next-Token"
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -175,6 +179,15 @@ async def update_message_feedback(request: Request):
         return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
+def with_status_url(job):
+    return {**job, "status_url": f"/history/delete_status/{job['job_id']}"}
+
+
+def deletion_job_response(job):
+    """202 response pointing the client at the status of a background deletion job."""
+    return JSONResponse(content=with_status_url(job), status_code=202)
+
+
 @router.delete("/delete")
 async def delete_conversation(request: Request):
     try:
@@ -194,6 +207,13 @@ async def delete_conversation(request: Request):
 
         # Delete conversation using HistoryService
         deleted = await history_service.delete_conversation(user_id, conversation_id)
+        if isinstance(deleted, dict):
+            track_event_if_configured("ConversationDeletionStarted", {
+                "user_id": user_id,
+                "conversation_id": conversation_id,
+                "job_id": deleted["job_id"]
+            })
+            return deletion_job_response(deleted)
         if deleted:
             track_event_if_configured("ConversationDeleted", {
                 "user_id": user_id,
@@ -225,9 +245,17 @@ async def delete_conversation(request: Request):
 @router.get("/list")
 async def list_conversations(
     request: Request,
-    offset: int = Query(0, alias="offset"),
-    limit: int = Query(25, alias="limit")
+    offset: Optional[int] = Query(None, alias="offset"),
+    limit: int = Query(25, alias="limit"),
+    next_token: Optional[str] = Query(None, alias="next")
 ):
+    """
+    Lists the user's conversations, most recently updated first.
+
+    Pages are chained through the opaque token returned in the X-Next-Token header: pass it back
+    as ``next`` to get the following page. Requests with an explicit ``offset`` and no ``next``
+    keep the original offset/limit paging.
+    """
     try:
         authenticated_user = get_authenticated_user_details(
             request_headers=request.headers)
@@ -236,7 +264,17 @@ async def list_conversations(
         logger.info(f"user_id: {user_id}, offset: {offset}, limit: {limit}")
 
         # Get conversations
-        conversations = await history_service.get_conversations(user_id, offset=offset, limit=limit)
+        headers = {}
+        if offset is not None and next_token is None:
+            conversations = await history_service.get_conversations(user_id, offset=offset, limit=limit)
+        else:
+            try:
+                conversations, next_page = await history_service.get_conversations_page(
+                    user_id, limit, continuation_token=next_token)
+            except ValueError:
+                return JSONResponse(content={"error": "Invalid next token"}, status_code=400)
+            if next_page:
+                headers[NEXT_TOKEN_HEADER] = next_page
 
         if not isinstance(conversations, list):
             track_event_if_configured("ListConversationsNotFound", {
@@ -254,7 +292,7 @@ async def list_conversations(
             "limit": limit,
             "conversation_count": len(conversations)
         })
-        return JSONResponse(content=conversations, status_code=200)
+        return JSONResponse(content=conversations, status_code=200, headers=headers)
 
     except Exception as e:
         logger.exception("Exception in /history/list: %s", str(e))
@@ -359,6 +397,27 @@ async def rename_conversation(request: Request):
         return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
 
 
+@router.get("/delete_status/{job_id}")
+async def get_deletion_status(request: Request, job_id: str):
+    try:
+        authenticated_user = get_authenticated_user_details(
+            request_headers=request.headers)
+        user_id = authenticated_user["user_principal_id"]
+
+        job = await history_service.get_deletion_status(user_id, job_id)
+        if job is None:
+            return JSONResponse(content={"error": f"Deletion job {job_id} not found"}, status_code=404)
+        return JSONResponse(content=job, status_code=200)
+
+    except Exception as e:
+        logger.exception("Exception in /history/delete_status: %s", str(e))
+        span = trace.get_current_span()
+        if span is not None:
+            span.record_exception(e)
+            span.set_status(Status(StatusCode.ERROR, str(e)))
+        return JSONResponse(content={"error": "An internal error has occurred!"}, status_code=500)
+
+
 @router.delete("/delete_all")
 async def delete_all_conversations(request: Request):
     try:
@@ -376,15 +435,26 @@ async def delete_all_conversations(request: Request):
             raise HTTPException(status_code=404,
                                 detail=f"No conversations for {user_id} were found")
 
-        # Delete all conversations
+        # Delete all conversations; very large ones are deleted by background jobs
+        jobs = []
         for conversation in conversations:
-            await history_service.delete_conversation(user_id, conversation["id"])
+            deleted = await history_service.delete_conversation(user_id, conversation["id"])
+            if isinstance(deleted, dict):
+                jobs.append(deleted)
 
         track_event_if_configured("AllConversationsDeleted", {
             "user_id": user_id,
-            "deleted_count": len(conversations)
+            "deleted_count": len(conversations) - len(jobs),
+            "pending_count": len(jobs)
         })
 
+        if jobs:
+            return JSONResponse(
+                content={
+                    "message": f"Deleting {len(jobs)} of the conversations for user {user_id} in the background",
+                    "jobs": [with_status_url(job) for job in jobs]},
+                status_code=202,
+            )
         return JSONResponse(
             content={
                 "message": f"Successfully deleted all conversations for user {user_id}"},
@@ -421,6 +491,13 @@ async def clear_messages(request: Request):
 
         # Delete conversation messages from CosmosDB
         success = await history_service.clear_messages(user_id, conversation_id)
+        if isinstance(success, dict):
+            track_event_if_configured("ClearMessagesStarted", {
+                "user_id": user_id,
+                "conversation_id": conversation_id,
+                "job_id": success["job_id"]
+            })
+            return deletion_job_response(success)
 
         if not success:
             track_event_if_configured("ClearMessagesFailed", {
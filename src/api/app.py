@@ -7,6 +7,7 @@ and cleanup.
 """
 
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -19,7 +20,10 @@ from agents.search_agent_factory import SearchAgentFactory
 from agents.sql_agent_factory import SQLAgentFactory
 from agents.chart_agent_factory import ChartAgentFactory
 from api.api_routes import router as backend_router
-from api.history_routes import router as history_router
+from api.history_routes import router as history_router, history_service
+from common.database.sqldb_service import close_connection_pool
+from helpers.azure_credential_utils import close_azure_credentials
+from services.date_rebase_service import DateRebaseService
 
 load_dotenv()
 
@@ -29,18 +33,34 @@ async def lifespan(fastapi_app: FastAPI):
     """
     Manages the application lifespan events for the FastAPI app.
 
-    On startup, initializes the Azure AI agent using the configuration and attaches it to the app state.
+    On startup, provisions the Azure AI agents concurrently and attaches them to the app state,
+    warms up the shared chat history clients and starts the daily date rebase job.
     On shutdown, deletes the agent instance and performs any necessary cleanup.
     """
-    fastapi_app.state.agent = await ConversationAgentFactory.get_agent()
-    fastapi_app.state.search_agent = await SearchAgentFactory.get_agent()
-    fastapi_app.state.sql_agent = await SQLAgentFactory.get_agent()
-    fastapi_app.state.chart_agent = await ChartAgentFactory.get_agent()
+    (
+        fastapi_app.state.agent,
+        fastapi_app.state.search_agent,
+        fastapi_app.state.sql_agent,
+        fastapi_app.state.chart_agent,
+        _,
+    ) = await asyncio.gather(
+        ConversationAgentFactory.get_agent(),
+        SearchAgentFactory.get_agent(),
+        SQLAgentFactory.get_agent(),
+        ChartAgentFactory.get_agent(),
+        history_service.warm_up(),
+    )
+    fastapi_app.state.date_rebase_service = DateRebaseService()
+    fastapi_app.state.date_rebase_service.start()
     yield
+    await fastapi_app.state.date_rebase_service.stop()
     await ConversationAgentFactory.delete_agent()
     await SearchAgentFactory.delete_agent()
     await SQLAgentFactory.delete_agent()
     await ChartAgentFactory.delete_agent()
+    await close_connection_pool()
+    await history_service.close()
+    await close_azure_credentials()
     fastapi_app.state.sql_agent = None
     fastapi_app.state.search_agent = None
     fastapi_app.state.agent = None
@@ -63,6 +83,7 @@ def build_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Token"],
     )
 
     # Include routers
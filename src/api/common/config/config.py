@@ -18,12 +18,41 @@ class Config:
         self.sqldb_username = os.getenv("SQLDB_USERNAME")
         self.driver = "{ODBC Driver 17 for SQL Server}"
         self.mid_id = os.getenv("SQLDB_USER_MID")
+        self.sqldb_pool_size = int(os.getenv("SQLDB_POOL_SIZE", "10"))
+        self.sqldb_pool_timeout = float(os.getenv("SQLDB_POOL_TIMEOUT", "30"))
+        self.sqldb_pool_recycle_seconds = int(os.getenv("SQLDB_POOL_RECYCLE_SECONDS", "1800"))
+        self.sqldb_pool_health_check_seconds = int(os.getenv("SQLDB_POOL_HEALTH_CHECK_SECONDS", "60"))
+        self.sqldb_max_concurrency = int(os.getenv("SQLDB_MAX_CONCURRENCY", str(self.sqldb_pool_size)))
+        self.sqldb_max_queue_depth = int(os.getenv("SQLDB_MAX_QUEUE_DEPTH", "100"))
+        self.sql_query_max_rows = int(os.getenv("SQL_QUERY_MAX_ROWS", "500"))
+        self.sql_query_max_chars = int(os.getenv("SQL_QUERY_MAX_CHARS", "20000"))
+        self.sql_query_timeout_seconds = int(os.getenv("SQL_QUERY_TIMEOUT_SECONDS", "30"))
+        self.sql_query_max_concurrent_per_user = int(os.getenv("SQL_QUERY_MAX_CONCURRENT_PER_USER", "2"))
+        self.sql_query_check_plan_cost = os.getenv("SQL_QUERY_CHECK_PLAN_COST", "false").strip().lower() == "true"
+        self.sql_query_max_plan_cost = float(os.getenv("SQL_QUERY_MAX_PLAN_COST", "0"))
+
+        # Chart result cache configuration
+        self.chart_cache_ttl_seconds = int(os.getenv("CHART_CACHE_TTL_SECONDS", "300"))
+        self.chart_cache_max_entries = int(os.getenv("CHART_CACHE_MAX_ENTRIES", "256"))
+        self.chart_cache_version_check_seconds = int(os.getenv("CHART_CACHE_VERSION_CHECK_SECONDS", "60"))
+
+        # Generated SQL cache configuration
+        self.sql_query_cache_ttl_seconds = int(os.getenv("SQL_QUERY_CACHE_TTL_SECONDS", "86400"))
+        self.sql_query_cache_max_entries = int(os.getenv("SQL_QUERY_CACHE_MAX_ENTRIES", "256"))
+        self.sql_query_cache_similarity_threshold = float(os.getenv("SQL_QUERY_CACHE_SIMILARITY_THRESHOLD", "0"))
+        self.sql_query_cache_schema_check_seconds = int(os.getenv("SQL_QUERY_CACHE_SCHEMA_CHECK_SECONDS", "300"))
+
+        # Chat streaming configuration
+        self.stream_coalesce_max_bytes = int(os.getenv("STREAM_COALESCE_MAX_BYTES", "256"))
+        self.stream_coalesce_max_latency_ms = int(os.getenv("STREAM_COALESCE_MAX_LATENCY_MS", "50"))
 
         # Azure OpenAI configuration
         self.azure_openai_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
         self.azure_openai_deployment_model = os.getenv("AZURE_OPENAI_DEPLOYMENT_MODEL")
         self.azure_openai_api_version = os.getenv("AZURE_OPENAI_API_VERSION")
         self.azure_openai_resource = os.getenv("AZURE_OPENAI_RESOURCE")
+        self.azure_openai_embedding_model = os.getenv("AZURE_OPENAI_EMBEDDING_MODEL")
+        self.azure_openai_max_connections = int(os.getenv("AZURE_OPENAI_MAX_CONNECTIONS", "100"))
 
         # Azure AI Search configuration
         self.azure_ai_search_endpoint = os.getenv("AZURE_AI_SEARCH_ENDPOINT")
@@ -35,6 +64,23 @@ class Config:
         self.use_ai_project_client = os.getenv("USE_AI_PROJECT_CLIENT", "False").lower() == "true"
         self.ai_project_endpoint = os.getenv("AZURE_AI_AGENT_ENDPOINT")
         self.ai_project_api_version = os.getenv("AZURE_AI_AGENT_API_VERSION", "2025-05-01")
+        self.agent_thread_pool_size = int(os.getenv("AGENT_THREAD_POOL_SIZE", "4"))
+        # Share one agent per definition across workers and restarts instead of creating one per worker
+        self.agent_reuse_enabled = os.getenv("AGENT_REUSE_ENABLED", "true").strip().lower() == "true"
+
+        # Conversation to agent thread store configuration
+        self.conversation_thread_store = os.getenv("CONVERSATION_THREAD_STORE", "memory")
+        self.conversation_thread_store_path = os.getenv("CONVERSATION_THREAD_STORE_PATH")
+        self.conversation_thread_store_url = os.getenv("CONVERSATION_THREAD_STORE_URL")
+        self.conversation_thread_ttl_seconds = int(os.getenv("CONVERSATION_THREAD_TTL_SECONDS", "3600"))
+        self.conversation_thread_max_entries = int(os.getenv("CONVERSATION_THREAD_MAX_ENTRIES", "10000"))
+
+        # Background deletion of agent threads that conversations no longer use
+        self.thread_reaper_queue_path = os.getenv("THREAD_REAPER_QUEUE_PATH")
+        self.thread_reaper_max_concurrency = int(os.getenv("THREAD_REAPER_MAX_CONCURRENCY", "4"))
+        self.thread_reaper_rate_per_second = float(os.getenv("THREAD_REAPER_RATE_PER_SECOND", "10"))
+        self.thread_reaper_max_attempts = int(os.getenv("THREAD_REAPER_MAX_ATTEMPTS", "5"))
+        self.thread_reaper_drain_seconds = float(os.getenv("THREAD_REAPER_DRAIN_SECONDS", "10"))
 
         # Chat history configuration
         self.use_chat_history_enabled = os.getenv("USE_CHAT_HISTORY_ENABLED", "false").strip().lower() == "true"
@@ -42,5 +88,12 @@ class Config:
         self.azure_cosmosdb_account = os.getenv("AZURE_COSMOSDB_ACCOUNT")
         self.azure_cosmosdb_conversations_container = os.getenv("AZURE_COSMOSDB_CONVERSATIONS_CONTAINER")
         self.azure_cosmosdb_enable_feedback = os.getenv("AZURE_COSMOSDB_ENABLE_FEEDBACK", "false").lower() == "true"
+        self.azure_cosmosdb_connection_limit = int(os.getenv("AZURE_COSMOSDB_CONNECTION_LIMIT", "100"))
+        self.azure_cosmosdb_delete_max_concurrency = int(os.getenv("AZURE_COSMOSDB_DELETE_MAX_CONCURRENCY", "10"))
+        self.azure_cosmosdb_delete_background_threshold = int(
+            os.getenv("AZURE_COSMOSDB_DELETE_BACKGROUND_THRESHOLD", "1000"))
+        self.title_generation_max_concurrency = int(os.getenv("TITLE_GENERATION_MAX_CONCURRENCY", "2"))
+        self.title_generation_batch_size = int(os.getenv("TITLE_GENERATION_BATCH_SIZE", "8"))
+        self.title_generation_batch_wait_ms = int(os.getenv("TITLE_GENERATION_BATCH_WAIT_MS", "100"))
 
         self.solution_name = os.getenv("SOLUTION_NAME", "")
@@ -0,0 +1,111 @@
+"""Compiles dashboard ChartFilters into parameterized SQL predicates.
+
+Filter values are bound as parameters instead of being pasted into the statement,
+so every request with the same filter shape sends identical statement text and
+SQL Server can reuse the cached plan. The values are declared once as variables at
+the top of the batch and every chart statement refers to the same variables.
+"""
+
+CHART_DATE_RANGES = {
+    'Last 7 days': "DATEADD(day, -7, GETDATE())",
+    'Last 14 days': "DATEADD(day, -14, GETDATE())",
+    'Last 90 days': "DATEADD(day, -90, GETDATE())",
+    'Year to Date': "DATEADD(year, -1, GETDATE())",
+}
+
+# Filter name -> (dimension, SQL type of the declared variable)
+CHART_FILTER_DIMENSIONS = {
+    'Topic': ('topic', 'varchar(255)'),
+    'Sentiment': ('sentiment', 'varchar(255)'),
+    'Satisfaction': ('satisfied', 'varchar(255)'),
+}
+
+
+def _padded(values):
+    """Pad a value list to the next power of two by repeating its last value.
+
+    IN (...) ignores duplicates, and padding keeps the number of distinct statement
+    texts logarithmic in the number of selected values.
+    """
+    size = 1
+    while size < len(values):
+        size *= 2
+    return values + [values[-1]] * (size - len(values))
+
+
+class CompiledChartFilters:
+    """
+    Parameterized form of a ChartFilters selection.
+
+    Attributes:
+        declarations (str): DECLARE statements binding the filter values, placed at the start of the batch.
+        params (list): Values for the ``?`` placeholders in ``declarations``, in order.
+        has_date_range (bool): Whether ``@cutoff`` is declared, i.e. a date range filter is applied.
+    """
+
+    def __init__(self, declarations, params, dimension_predicates, has_date_range):
+        self.declarations = declarations
+        self.params = params
+        self.has_date_range = has_date_range
+        self._dimension_predicates = dimension_predicates
+
+    def predicates(self, columns):
+        """
+        Return the dimension predicates for a table.
+
+        Args:
+            columns (dict): Maps each dimension ('topic', 'sentiment', 'satisfied') to the table's
+                column name. Dimensions the table does not have are left out of the result.
+        """
+        return [
+            f"{columns[dimension]} {predicate}"
+            for dimension, predicate in self._dimension_predicates
+            if columns.get(dimension)
+        ]
+
+
+def compile_chart_filters(chart_filters):
+    """
+    Compile ChartFilters into a CompiledChartFilters.
+
+    Topic, Sentiment and Satisfaction become ``IN`` predicates over declared variables ('all'
+    sentiments are ignored). The selected date ranges become a single ``@cutoff`` variable holding
+    the latest range start, since several ranges are combined with AND. Unknown filters, unknown
+    date ranges and filters that cannot be read are ignored.
+    """
+    try:
+        selected_filters = chart_filters.model_dump().get('selected_filters') or {}
+    except BaseException:
+        selected_filters = {}
+
+    declarations = []
+    params = []
+    dimension_predicates = []
+    date_cutoffs = []
+    for name, values in selected_filters.items():
+        values = list(dict.fromkeys(values or []))
+        if name == 'DateRange':
+            # In a fixed order, so the statement text does not depend on the selection order
+            date_cutoffs = [cutoff for date_range, cutoff in CHART_DATE_RANGES.items() if date_range in values]
+            continue
+        if name not in CHART_FILTER_DIMENSIONS:
+            continue
+        if name == 'Sentiment':
+            values = [value for value in values if value != 'all']
+        if not values:
+            continue
+
+        dimension, sql_type = CHART_FILTER_DIMENSIONS[name]
+        variables = []
+        for index, value in enumerate(_padded(values)):
+            variable = f"@{dimension}_{index}"
+            declarations.append(f"DECLARE {variable} {sql_type} = ?;")
+            params.append(value)
+            variables.append(variable)
+        dimension_predicates.append((dimension, f"IN ({', '.join(variables)})"))
+
+    if date_cutoffs:
+        cutoff_values = ', '.join(f"({cutoff})" for cutoff in date_cutoffs)
+        declarations.append(f"DECLARE @cutoff datetime2(0) = (SELECT MAX(c) FROM (VALUES {cutoff_values}) v(c));")
+
+    return CompiledChartFilters('\n'.join(declarations), params, dimension_predicates, bool(date_cutoffs))
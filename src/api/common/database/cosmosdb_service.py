@@ -1,9 +1,47 @@
+import asyncio
+import base64
 import uuid
 from datetime import datetime
 
+import aiohttp
+from azure.core import MatchConditions
+from azure.core.pipeline.transport import AioHttpTransport
 from azure.cosmos import exceptions
 from azure.cosmos.aio import CosmosClient
 
+# Cosmos DB accepts at most 100 operations in one transactional batch
+TRANSACTIONAL_BATCH_LIMIT = 100
+
+# Fields returned by conversation listings; the full documents are read through get_conversation
+CONVERSATION_LIST_FIELDS = "c.id, c.title, c.createdAt, c.updatedAt"
+
+
+def encode_continuation_token(token):
+    """Wrap a Cosmos continuation token into an opaque, URL-safe string."""
+    if not token:
+        return None
+    return base64.urlsafe_b64encode(token.encode("utf-8")).decode("ascii")
+
+
+def decode_continuation_token(token):
+    """Unwrap a token made by encode_continuation_token. Raises ValueError for malformed tokens."""
+    if not token:
+        return None
+    try:
+        return base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8")
+    except (UnicodeError, ValueError) as e:
+        raise ValueError("Invalid continuation token") from e
+
+
+def _conversation_list_query(sort_order):
+    sort_order = sort_order.upper()
+    if sort_order not in ("ASC", "DESC"):
+        raise ValueError(f"Invalid sort order: {sort_order}")
+    return (
+        f"SELECT {CONVERSATION_LIST_FIELDS} FROM c where c.userId = @userId and c.type='conversation' "
+        f"order by c.updatedAt {sort_order}"
+    )
+
 
 class CosmosConversationClient:
 
@@ -14,15 +52,28 @@ class CosmosConversationClient:
         database_name: str,
         container_name: str,
         enable_message_feedback: bool = False,
+        connection_limit: int = None,
+        delete_concurrency: int = 10,
     ):
         self.cosmosdb_endpoint = cosmosdb_endpoint
         self.credential = credential
         self.database_name = database_name
         self.container_name = container_name
         self.enable_message_feedback = enable_message_feedback
+        self.delete_concurrency = max(1, delete_concurrency)
+        client_options = {}
+        if connection_limit:
+            # Size the aiohttp connection pool the client keeps open; must be called with a running loop
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=connection_limit),
+                cookie_jar=aiohttp.DummyCookieJar(),
+                auto_decompress=False,
+                trust_env=True,
+            )
+            client_options["transport"] = AioHttpTransport(session=session, session_owner=True)
         try:
             self.cosmosdb_client = CosmosClient(
-                self.cosmosdb_endpoint, credential=credential
+                self.cosmosdb_endpoint, credential=credential, **client_options
             )
         except exceptions.CosmosHttpResponseError as e:
             if e.status_code == 401:
@@ -44,6 +95,9 @@ class CosmosConversationClient:
         except exceptions.CosmosResourceNotFoundError:
             raise ValueError("Invalid CosmosDB container name")
 
+    async def close(self):
+        await self.cosmosdb_client.close()
+
     async def ensure(self):
         if (
             not self.cosmosdb_client
@@ -93,44 +147,141 @@ class CosmosConversationClient:
         else:
             return False
 
+    async def update_conversation_title(self, user_id, conversation_id, title, expected_title):
+        """
+        Set the title of a conversation that still has ``expected_title``.
+
+        The write only succeeds if the document did not change since it was read, so that a
+        rename made in the meantime is never overwritten. Returns False when nothing was updated.
+        """
+        try:
+            conversation = await self.container_client.read_item(
+                item=conversation_id, partition_key=user_id
+            )
+        except exceptions.CosmosResourceNotFoundError:
+            return False
+        if conversation.get("title") != expected_title:
+            return False
+
+        conversation["title"] = title
+        try:
+            return await self.container_client.replace_item(
+                item=conversation_id,
+                body=conversation,
+                etag=conversation.get("_etag"),
+                match_condition=MatchConditions.IfNotModified,
+            )
+        except (exceptions.CosmosAccessConditionFailedError, exceptions.CosmosResourceNotFoundError):
+            return False
+
     async def delete_conversation(self, user_id, conversation_id):
-        conversation = await self.container_client.read_item(
-            item=conversation_id, partition_key=user_id
-        )
-        if conversation:
-            resp = await self.container_client.delete_item(
+        try:
+            return await self.container_client.delete_item(
                 item=conversation_id, partition_key=user_id
             )
-            return resp
-        else:
+        except exceptions.CosmosResourceNotFoundError:
             return True
 
-    async def delete_messages(self, conversation_id, user_id):
-        # get a list of all the messages in the conversation
-        messages = await self.get_messages(user_id, conversation_id)
-        response_list = []
-        if messages:
-            for message in messages:
-                resp = await self.container_client.delete_item(
-                    item=message["id"], partition_key=user_id
-                )
-                response_list.append(resp)
-            return response_list
+    async def delete_messages(self, conversation_id, user_id, message_ids=None, progress=None):
+        """
+        Delete the messages of a conversation.
+
+        Args:
+            conversation_id (str): The conversation whose messages are deleted.
+            user_id (str): The owner of the conversation, which is also the partition key.
+            message_ids (list, optional): The ids to delete, when already fetched with get_message_ids.
+            progress (callable, optional): Called with the number of messages deleted so far.
+
+        Returns:
+            list: The ids of the deleted messages, or None if the conversation has no messages.
+        """
+        if message_ids is None:
+            message_ids = await self.get_message_ids(user_id, conversation_id)
+        if not message_ids:
+            return None
+        await self.delete_items(user_id, message_ids, progress=progress)
+        return message_ids
+
+    async def delete_items(self, user_id, item_ids, progress=None):
+        """
+        Delete items of one user's partition.
+
+        Items are deleted in transactional batches of up to TRANSACTIONAL_BATCH_LIMIT, run
+        ``delete_concurrency`` at a time. A batch fails as a whole if one of its items is
+        already gone, in which case its items are deleted one by one, with the same bounded
+        concurrency, ignoring those that no longer exist.
+        """
+        semaphore = asyncio.Semaphore(self.delete_concurrency)
+        deleted = 0
+
+        async def delete_batch(batch):
+            nonlocal deleted
+            async with semaphore:
+                try:
+                    await self.container_client.execute_item_batch(
+                        batch_operations=[("delete", (item_id,)) for item_id in batch],
+                        partition_key=user_id,
+                    )
+                except exceptions.CosmosBatchOperationError:
+                    await asyncio.gather(*(self._delete_item(user_id, item_id) for item_id in batch))
+            deleted += len(batch)
+            if progress is not None:
+                progress(deleted)
+
+        await asyncio.gather(*(
+            delete_batch(item_ids[start:start + TRANSACTIONAL_BATCH_LIMIT])
+            for start in range(0, len(item_ids), TRANSACTIONAL_BATCH_LIMIT)
+        ))
+        return deleted
+
+    async def _delete_item(self, user_id, item_id):
+        try:
+            await self.container_client.delete_item(item=item_id, partition_key=user_id)
+        except exceptions.CosmosResourceNotFoundError:
+            pass
 
     async def get_conversations(self, user_id, limit, sort_order="DESC", offset=0):
         parameters = [{"name": "@userId", "value": user_id}]
-        query = f"SELECT * FROM c where c.userId = @userId and c.type='conversation' order by c.updatedAt {sort_order}"
+        query = _conversation_list_query(sort_order)
         if limit is not None:
-            query += f" offset {offset} limit {limit}"
+            query += " offset @offset limit @limit"
+            parameters += [{"name": "@offset", "value": int(offset)}, {"name": "@limit", "value": int(limit)}]
 
         conversations = []
         async for item in self.container_client.query_items(
-            query=query, parameters=parameters
+            query=query, parameters=parameters, partition_key=user_id
         ):
             conversations.append(item)
 
         return conversations
 
+    async def get_conversations_page(self, user_id, limit, continuation_token=None, sort_order="DESC"):
+        """
+        Return one page of a user's conversations and the token of the next page.
+
+        Pages resume from a Cosmos continuation token instead of skipping ``offset`` results, so
+        deep pages cost the same as the first one. Cosmos may return fewer than ``limit``
+        conversations on a page that is not the last one.
+
+        Returns:
+            tuple: The conversations on the page, and an opaque token for the next page or None.
+        """
+        parameters = [{"name": "@userId", "value": user_id}]
+        pages = self.container_client.query_items(
+            query=_conversation_list_query(sort_order),
+            parameters=parameters,
+            partition_key=user_id,
+            max_item_count=limit,
+        ).by_page(decode_continuation_token(continuation_token))
+
+        conversations = []
+        async for page in pages:
+            async for item in page:
+                conversations.append(item)
+            break
+
+        return conversations, encode_continuation_token(pages.continuation_token)
+
     async def get_conversation(self, user_id, conversation_id):
         parameters = [
             {"name": "@conversationId", "value": conversation_id},
@@ -200,3 +351,44 @@ class CosmosConversationClient:
             messages.append(item)
 
         return messages
+
+    async def get_message_ids(self, user_id, conversation_id):
+        parameters = [
+            {"name": "@conversationId", "value": conversation_id},
+            {"name": "@userId", "value": user_id},
+        ]
+        query = "SELECT VALUE c.id FROM c WHERE c.conversationId = @conversationId AND c.type='message' AND c.userId = @userId"
+        return [
+            item async for item in self.container_client.query_items(
+                query=query, parameters=parameters, partition_key=user_id
+            )
+        ]
+
+    async def upsert_deletion_job(self, job):
+        return await self.container_client.upsert_item(job)
+
+    async def get_deletion_job(self, user_id, job_id):
+        try:
+            job = await self.container_client.read_item(item=job_id, partition_key=user_id)
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+        return job if job.get("type") == "deletion_job" else None
+
+    async def delete_deletion_jobs(self, user_id, finished_before):
+        """Delete the user's finished deletion jobs last updated before ``finished_before`` (ISO timestamp)."""
+        parameters = [
+            {"name": "@userId", "value": user_id},
+            {"name": "@finishedBefore", "value": finished_before},
+        ]
+        query = (
+            "SELECT VALUE c.id FROM c WHERE c.type='deletion_job' AND c.userId = @userId "
+            "AND c.status != 'running' AND c.updatedAt < @finishedBefore"
+        )
+        job_ids = [
+            item async for item in self.container_client.query_items(
+                query=query, parameters=parameters, partition_key=user_id
+            )
+        ]
+        if job_ids:
+            await self.delete_items(user_id, job_ids)
+        return len(job_ids)
@@ -0,0 +1,279 @@
+"""Connection pooling for the SQL database.
+
+Opening a pyodbc connection against Azure SQL requires an AAD access token and a
+full TDS/TLS handshake, which is more expensive than most dashboard queries. This
+module keeps a bounded set of open connections that are health checked and
+recycled.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection became available within the acquire timeout."""
+
+
+class _PooledConnection:
+    __slots__ = ("connection", "created_at", "last_used_at", "needs_check", "discard_on_release", "discarded")
+
+    def __init__(self, connection):
+        now = time.monotonic()
+        self.connection = connection
+        self.created_at = now
+        self.last_used_at = now
+        self.needs_check = False
+        self.discard_on_release = False
+        self.discarded = False
+
+
+class SqlConnectionPool:
+    """
+    Bounded pool of database connections.
+
+    Args:
+        connect: Coroutine function that opens and returns a new DB-API connection.
+        max_size (int): Maximum number of connections, idle and in use, held by the pool.
+        acquire_timeout (float): Seconds to wait for a free connection before giving up.
+        recycle_seconds (float): Connections older than this are closed instead of reused.
+        health_check_seconds (float): Idle connections older than this are pinged before reuse.
+        run_sync: Optional coroutine function ``run_sync(func, *args)`` used to run the blocking
+            ping, rollback and close calls off the event loop. Called inline when omitted.
+    """
+
+    def __init__(self, connect, max_size=10, acquire_timeout=30.0, recycle_seconds=1800, health_check_seconds=60,
+                 run_sync=None):
+        self._connect = connect
+        self._run_sync = run_sync
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.recycle_seconds = recycle_seconds
+        self.health_check_seconds = health_check_seconds
+        self._idle = deque()
+        self._borrowed = {}
+        self._size = 0
+        self._condition = None
+        self._closed = False
+        self.metrics = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+            "discarded": 0,
+        }
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    def get_metrics(self):
+        """Return a snapshot of the pool counters and current occupancy."""
+        return {
+            **self.metrics,
+            "max_size": self.max_size,
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": self._size - len(self._idle),
+        }
+
+    @asynccontextmanager
+    async def connection(self):
+        """Borrow a connection for the duration of the ``async with`` block."""
+        pooled = await self._acquire()
+        self._borrowed[id(pooled.connection)] = pooled
+        try:
+            yield pooled.connection
+        except BaseException:
+            # The failure may have left the connection unusable; verify it before reuse.
+            pooled.needs_check = True
+            raise
+        finally:
+            if self._borrowed.get(id(pooled.connection)) is pooled:
+                del self._borrowed[id(pooled.connection)]
+            await self._release(pooled)
+
+    def discard(self, connection):
+        """Close a borrowed connection when it is released instead of returning it to the pool."""
+        pooled = self._borrowed.get(id(connection))
+        if pooled is not None:
+            pooled.discard_on_release = True
+
+    async def close(self):
+        """Close all idle connections and stop handing out new ones."""
+        self._closed = True
+        while self._idle:
+            await self._discard(self._idle.popleft())
+
+    def _get_condition(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def _run(self, func, *args):
+        if self._run_sync is None:
+            return func(*args)
+        return await self._run_sync(func, *args)
+
+    async def _acquire(self):
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        condition = self._get_condition()
+        deadline = time.monotonic() + self.acquire_timeout
+        waited = False
+        while True:
+            pooled = None
+            async with condition:
+                while True:
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+
+                    if self._size < self.max_size:
+                        # Reserve the slot before releasing the lock to open the connection.
+                        self._size += 1
+                        break
+
+                    if not waited:
+                        self.metrics["waits"] += 1
+                        waited = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.metrics["wait_timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Timed out after {self.acquire_timeout}s waiting for a database connection")
+                    try:
+                        await asyncio.wait_for(condition.wait(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        pass
+
+            if pooled is None:
+                return await self._open()
+
+            try:
+                usable = await self._is_usable(pooled)
+            except BaseException:
+                # Cancelled or failed mid-check: the connection is already out of the idle list,
+                # so drop it (even if this task is cancelled again) rather than leak its slot.
+                await asyncio.shield(self._discard(pooled))
+                raise
+            if usable:
+                pooled.last_used_at = time.monotonic()
+                self.metrics["checkouts"] += 1
+                return pooled
+
+    async def _open(self):
+        try:
+            connection = await self._connect()
+        except BaseException:
+            condition = self._get_condition()
+            async with condition:
+                self._size -= 1
+                condition.notify()
+            raise
+        self.metrics["created"] += 1
+        self.metrics["checkouts"] += 1
+        return _PooledConnection(connection)
+
+    async def _release(self, pooled):
+        if self._closed or pooled.discard_on_release or self._is_expired(pooled):
+            if not self._closed and not pooled.discard_on_release:
+                self.metrics["recycled"] += 1
+            await self._discard(pooled)
+            return
+
+        try:
+            reset = await self._run(self._reset, pooled.connection)
+        except BaseException:
+            # Cancelled or failed mid-reset: the connection is in an unknown state, so drop it
+            # rather than leak its slot.
+            await asyncio.shield(self._discard(pooled))
+            raise
+        if not reset:
+            self.metrics["health_check_failures"] += 1
+            await self._discard(pooled)
+            return
+
+        condition = self._get_condition()
+        async with condition:
+            pooled.last_used_at = time.monotonic()
+            self._idle.append(pooled)
+            condition.notify()
+
+    def _is_expired(self, pooled):
+        return time.monotonic() - pooled.created_at >= self.recycle_seconds
+
+    async def _is_usable(self, pooled):
+        if self._is_expired(pooled):
+            self.metrics["recycled"] += 1
+            await self._discard(pooled)
+            return False
+
+        idle_for = time.monotonic() - pooled.last_used_at
+        if pooled.needs_check or idle_for >= self.health_check_seconds:
+            if not await self._run(self._ping, pooled.connection):
+                self.metrics["health_check_failures"] += 1
+                await self._discard(pooled)
+                return False
+            pooled.needs_check = False
+        return True
+
+    @staticmethod
+    def _reset(connection):
+        # Roll back anything the borrower left open so no locks outlive the checkout.
+        try:
+            connection.rollback()
+            return True
+        except Exception:
+            logger.warning("Pooled connection failed to reset", exc_info=True)
+            return False
+
+    @staticmethod
+    def _ping(connection):
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            return True
+        except Exception:
+            logger.warning("Pooled connection failed health check", exc_info=True)
+            return False
+        finally:
+            if cursor:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            logger.debug("Error closing pooled connection", exc_info=True)
+
+    async def _discard(self, pooled):
+        if pooled.discarded:
+            return
+        pooled.discarded = True
+        self.metrics["discarded"] += 1
+        try:
+            await self._run(self._close, pooled.connection)
+        finally:
+            # Freed before taking the lock, so that a cancellation while waiting for it cannot lose the slot
+            self._size -= 1
+            condition = self._get_condition()
+            async with condition:
+                condition.notify()
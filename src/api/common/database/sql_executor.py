@@ -0,0 +1,101 @@
+"""Bounded thread pool for blocking database work.
+
+pyodbc calls block the calling thread for the full network round trip. Running them
+on the asyncio event loop stalls every other request served by the same worker, so
+all connect, execute, fetch and close calls are dispatched to this executor instead.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SqlExecutorSaturatedError(Exception):
+    """Raised when the executor already has the maximum number of calls queued."""
+
+
+class SqlExecutor:
+    """
+    Runs blocking callables on a dedicated thread pool with bounded concurrency.
+
+    Args:
+        max_workers (int): Number of threads, i.e. how many SQL calls may run at once.
+        max_queue_depth (int): How many further calls may wait for a free thread. Calls
+            beyond that are rejected with SqlExecutorSaturatedError instead of piling up.
+    """
+
+    def __init__(self, max_workers=10, max_queue_depth=100):
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sqldb")
+        # Only touched from the event loop thread, so no locking is needed.
+        self._pending = 0
+        self.metrics = {
+            "submitted": 0,
+            "rejected": 0,
+            "max_pending": 0,
+        }
+
+    def get_metrics(self):
+        """Return a snapshot of the executor counters."""
+        return {
+            **self.metrics,
+            "max_workers": self.max_workers,
+            "max_queue_depth": self.max_queue_depth,
+            "pending": self._pending,
+            "active": min(self._pending, self.max_workers),
+            "queued": max(self._pending - self.max_workers, 0),
+        }
+
+    async def run(self, func, *args, **kwargs):
+        """Run ``func(*args, **kwargs)`` on the executor and await its result."""
+        if self._pending >= self.max_workers + self.max_queue_depth:
+            self.metrics["rejected"] += 1
+            raise SqlExecutorSaturatedError(
+                f"SQL executor is saturated ({self._pending} calls pending)")
+
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        self._pending += 1
+        self.metrics["submitted"] += 1
+        self.metrics["max_pending"] = max(self.metrics["max_pending"], self._pending)
+        # Count the call as pending until the thread finishes, even if the awaiting
+        # request is cancelled in the meantime.
+        future.add_done_callback(lambda _: self._call_soon(loop, self._on_done))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    async def run_to_completion(self, func, *args, **kwargs):
+        """
+        Like run, but if the awaiting task is cancelled, wait for the thread to finish before
+        the cancellation propagates.
+
+        Use it for calls on a borrowed connection: a cancelled request must not hand the
+        connection back to the pool (which rolls it back or closes it from another thread)
+        while this call is still using it.
+        """
+        work = asyncio.ensure_future(self.run(func, *args, **kwargs))
+        try:
+            return await asyncio.shield(work)
+        except asyncio.CancelledError:
+            while not work.done():
+                try:
+                    await asyncio.wait([work])
+                except asyncio.CancelledError:
+                    # Cancelled again; the thread still has to finish first
+                    continue
+            raise
+
+    def _on_done(self):
+        self._pending -= 1
+
+    @staticmethod
+    def _call_soon(loop, callback):
+        try:
+            loop.call_soon_threadsafe(callback)
+        except RuntimeError:
+            # The loop has already been closed; nothing is waiting on the counter any more.
+            pass
+
+    def shutdown(self, wait=True):
+        """Stop accepting work and release the worker threads."""
+        self._executor.shutdown(wait=wait)
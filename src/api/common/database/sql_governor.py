@@ -0,0 +1,338 @@
+"""Guards for running SQL written by the SQL agent.
+
+Generated SQL is executed verbatim against the shared database, so a single runaway
+query (a cross join, a ``LIKE '%...%'`` over transcripts) can hold locks and CPU for
+every other user. The governor only admits a single read-only SELECT statement, caps
+the number of rows it can return, limits how many queries one user may run at once,
+enforces a statement timeout and cancels the statement on the server when the chat
+request that issued it goes away. The estimated plan cost is logged for every query.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Set by the chat endpoint so that quota checks can attribute queries to the requesting user.
+sql_query_user = ContextVar("sql_query_user", default=None)
+
+# Keywords that make a statement something other than a plain read. INTO covers SELECT ... INTO.
+FORBIDDEN_KEYWORDS = frozenset({
+    'ALTER', 'BACKUP', 'BULK', 'CREATE', 'DBCC', 'DELETE', 'DENY', 'DROP', 'EXEC', 'EXECUTE',
+    'GRANT', 'INSERT', 'INTO', 'KILL', 'MERGE', 'OPENDATASOURCE', 'OPENQUERY', 'OPENROWSET',
+    'RECONFIGURE', 'RESTORE', 'REVOKE', 'SHUTDOWN', 'TRUNCATE', 'UPDATE', 'USE', 'WAITFOR',
+})
+SET_OPERATORS = frozenset({'UNION', 'EXCEPT', 'INTERSECT'})
+
+_WORD = re.compile(r"[A-Za-z_@#][A-Za-z0-9_@#$]*")
+_NUMBER = re.compile(r"\d+(?:\.\d*)?")
+_PLAN_COST = re.compile(r'StatementSubTreeCost="([0-9.Ee+-]+)"')
+
+
+class SqlQueryRejectedError(Exception):
+    """Raised when generated SQL is not a single read-only SELECT or is estimated too expensive."""
+
+
+class SqlQuotaExceededError(Exception):
+    """Raised when a user already has the maximum number of queries running."""
+
+
+class _Token:
+    __slots__ = ("kind", "text", "start", "end", "depth")
+
+    def __init__(self, kind, text, start, end, depth):
+        self.kind = kind
+        self.text = text
+        self.start = start
+        self.end = end
+        self.depth = depth
+
+
+def _tokenize(sql):
+    """
+    Split T-SQL into words, numbers and punctuation with their parenthesis depth.
+
+    Comments, string literals and quoted identifiers are skipped, so keywords inside them
+    are never matched. Word and number tokens are upper-cased.
+    """
+    tokens = []
+    depth = 0
+    i = 0
+    length = len(sql)
+    while i < length:
+        char = sql[i]
+        if char.isspace():
+            i += 1
+        elif sql.startswith('--', i):
+            newline = sql.find('\n', i)
+            i = length if newline == -1 else newline + 1
+        elif sql.startswith('/*', i):
+            # Block comments nest in T-SQL
+            nesting = 0
+            while i < length:
+                if sql.startswith('/*', i):
+                    nesting += 1
+                    i += 2
+                elif sql.startswith('*/', i):
+                    nesting -= 1
+                    i += 2
+                    if nesting == 0:
+                        break
+                else:
+                    i += 1
+            else:
+                raise SqlQueryRejectedError("Unterminated comment")
+        elif char in "'\"[":
+            closing = ']' if char == '[' else char
+            i += 1
+            while True:
+                end = sql.find(closing, i)
+                if end == -1:
+                    raise SqlQueryRejectedError("Unterminated string or identifier")
+                if sql.startswith(closing * 2, end):
+                    i = end + 2
+                    continue
+                i = end + 1
+                break
+            tokens.append(_Token('literal', '', i, i, depth))
+        elif char == '(':
+            tokens.append(_Token('(', char, i, i + 1, depth))
+            depth += 1
+            i += 1
+        elif char == ')':
+            depth -= 1
+            if depth < 0:
+                raise SqlQueryRejectedError("Unbalanced parentheses")
+            tokens.append(_Token(')', char, i, i + 1, depth))
+            i += 1
+        else:
+            for kind, pattern in (('word', _WORD), ('number', _NUMBER)):
+                match = pattern.match(sql, i)
+                if match:
+                    tokens.append(_Token(kind, match.group(0).upper(), i, match.end(), depth))
+                    i = match.end()
+                    break
+            else:
+                tokens.append(_Token(char, char, i, i + 1, depth))
+                i += 1
+    if depth:
+        raise SqlQueryRejectedError("Unbalanced parentheses")
+    return tokens
+
+
+def govern_sql(sql, row_limit=None):
+    """
+    Validate generated SQL and cap the number of rows it returns.
+
+    The statement must be a single SELECT (optionally preceded by CTEs) without any
+    keyword that writes data, changes the schema or reaches outside the database.
+    ``TOP (row_limit)`` is added to the outer SELECT, and an existing larger TOP is lowered.
+    Statements whose outer query combines several SELECTs or pages with OFFSET are left
+    as they are; their output is still bounded when it is fetched.
+
+    Returns:
+        tuple: The SQL to run and whether a row limit was applied.
+
+    Raises:
+        SqlQueryRejectedError: If the statement is not allowed.
+    """
+    tokens = _tokenize(sql)
+    words = [token for token in tokens if token.kind == 'word']
+    if not words:
+        raise SqlQueryRejectedError("Empty statement")
+    if words[0].text not in ('SELECT', 'WITH'):
+        raise SqlQueryRejectedError(f"Only SELECT statements are allowed, got {words[0].text}")
+    forbidden = sorted({token.text for token in words} & FORBIDDEN_KEYWORDS)
+    if forbidden:
+        raise SqlQueryRejectedError(f"Statement contains {', '.join(forbidden)}")
+    first_semicolon = next((index for index, token in enumerate(tokens) if token.kind == ';'), None)
+    if first_semicolon is not None and any(token.kind != ';' for token in tokens[first_semicolon:]):
+        raise SqlQueryRejectedError("Only a single statement is allowed")
+
+    if not row_limit:
+        return sql, False
+    outer = [token for token in words if token.depth == 0]
+    selects = [index for index, token in enumerate(tokens) if token.kind == 'word' and token.depth == 0 and token.text == 'SELECT']
+    if len(selects) != 1 or any(token.text in SET_OPERATORS or token.text == 'OFFSET' for token in outer):
+        return sql, False
+
+    position = selects[0] + 1
+    while position < len(tokens) and tokens[position].text in ('ALL', 'DISTINCT'):
+        position += 1
+    if position < len(tokens) and tokens[position].text == 'TOP':
+        count = tokens[position + 1] if position + 1 < len(tokens) else None
+        if count is not None and count.kind == '(':
+            count = tokens[position + 2] if position + 2 < len(tokens) else None
+        trailing = [token.text for token in tokens[position + 1:position + 5]]
+        if count is None or count.kind != 'number' or 'PERCENT' in trailing or float(count.text) <= row_limit:
+            return sql, False
+        return f"{sql[:count.start]}{row_limit}{sql[count.end:]}", True
+
+    insert_at = tokens[position - 1].end
+    return f"{sql[:insert_at]} TOP ({row_limit}){sql[insert_at:]}", True
+
+
+def _estimate_plan_cost(cursor, sql):
+    """Return the optimizer's estimated subtree cost for the statement, without running it."""
+    cursor.execute("SET SHOWPLAN_XML ON")
+    try:
+        cursor.execute(sql)
+        row = cursor.fetchone()
+        match = _PLAN_COST.search(row[0]) if row and row[0] else None
+        return float(match.group(1)) if match else None
+    finally:
+        cursor.execute("SET SHOWPLAN_XML OFF")
+
+
+class SqlQueryGovernor:
+    """
+    Applies the execution limits for generated SQL.
+
+    Args:
+        run_sync: Coroutine function running a blocking callable off the event loop.
+        timeout_seconds (float): Statement timeout, enforced by the server and, with a short
+            grace period, by the client. 0 disables it.
+        max_concurrent_per_user (int): Queries one user may have running at once. 0 disables the quota.
+        check_plan_cost (bool): Whether to estimate and log the plan cost before running a query.
+            Needs the SHOWPLAN permission; without it the check is skipped. Costs extra round trips
+            per query.
+        max_plan_cost (float): Estimated cost above which queries are rejected. 0 only logs the cost.
+        discard: Optional callable ``discard(conn)`` telling the pool not to reuse a connection.
+            Called when the plan cost check fails, since SHOWPLAN_XML may still be on for its session.
+    """
+
+    # Extra time the client waits for the server-side timeout before cancelling on its own
+    client_grace_seconds = 5
+
+    def __init__(self, run_sync, timeout_seconds=30, max_concurrent_per_user=2,
+                 check_plan_cost=False, max_plan_cost=0, discard=None):
+        self._run_sync = run_sync
+        self._discard = discard
+        self.timeout_seconds = timeout_seconds
+        self.max_concurrent_per_user = max_concurrent_per_user
+        self.check_plan_cost = check_plan_cost
+        self.max_plan_cost = max_plan_cost
+        self._running = {}
+        self.metrics = {
+            "executed": 0,
+            "rejected": 0,
+            "quota_exceeded": 0,
+            "row_limited": 0,
+            "timeouts": 0,
+            "cancelled": 0,
+            "max_plan_cost": 0.0,
+        }
+
+    def get_metrics(self):
+        """Return a snapshot of the governor counters."""
+        return {
+            **self.metrics,
+            "running": sum(self._running.values()),
+            "timeout_seconds": self.timeout_seconds,
+            "max_concurrent_per_user": self.max_concurrent_per_user,
+        }
+
+    def prepare(self, sql, row_limit):
+        """Validate the SQL and apply the row limit; see govern_sql."""
+        try:
+            governed_sql, limited = govern_sql(sql, row_limit)
+        except SqlQueryRejectedError:
+            self.metrics["rejected"] += 1
+            raise
+        if limited:
+            self.metrics["row_limited"] += 1
+        return governed_sql
+
+    @asynccontextmanager
+    async def user_slot(self):
+        """Hold one of the current user's concurrent query slots for the ``async with`` block."""
+        user = sql_query_user.get() or "anonymous"
+        if self.max_concurrent_per_user and self._running.get(user, 0) >= self.max_concurrent_per_user:
+            self.metrics["quota_exceeded"] += 1
+            raise SqlQuotaExceededError(f"User already has {self.max_concurrent_per_user} queries running")
+        self._running[user] = self._running.get(user, 0) + 1
+        try:
+            yield
+        finally:
+            self._running[user] -= 1
+            if not self._running[user]:
+                del self._running[user]
+
+    async def run(self, conn, func, sql, *args):
+        """
+        Run ``func(cursor, sql, *args)`` on a fresh cursor of ``conn`` under the statement timeout.
+
+        If the awaiting request is cancelled or the client-side timeout expires, the statement
+        is cancelled on the server and the call waits for it to stop before returning, so the
+        connection is idle when it goes back to the pool.
+        """
+        cursor = await self._run_sync(self._open_cursor, conn)
+        try:
+            if self.check_plan_cost:
+                await self._check_plan_cost(conn, cursor, sql)
+
+            work = asyncio.ensure_future(self._run_sync(func, cursor, sql, *args))
+            timeout = self.timeout_seconds + self.client_grace_seconds if self.timeout_seconds else None
+            try:
+                result = await asyncio.wait_for(asyncio.shield(work), timeout)
+            except asyncio.TimeoutError:
+                self.metrics["timeouts"] += 1
+                logger.warning("Generated SQL exceeded %ss and was cancelled", self.timeout_seconds)
+                await self._cancel(cursor, work)
+                return None
+            except asyncio.CancelledError:
+                self.metrics["cancelled"] += 1
+                logger.info("Request went away, cancelling its generated SQL")
+                await self._cancel(cursor, work)
+                raise
+            self.metrics["executed"] += 1
+            return result
+        finally:
+            await self._run_sync(cursor.close)
+
+    def _open_cursor(self, conn):
+        # pyodbc applies the connection's query timeout to cursors created while it is set.
+        conn.timeout = int(self.timeout_seconds)
+        try:
+            return conn.cursor()
+        finally:
+            conn.timeout = 0
+
+    async def _check_plan_cost(self, conn, cursor, sql):
+        started = time.monotonic()
+        try:
+            cost = await self._run_sync(_estimate_plan_cost, cursor, sql)
+        except BaseException as e:
+            # The session may be left in SHOWPLAN mode, where statements return plans, not rows
+            if self._discard is not None:
+                self._discard(conn)
+            if not isinstance(e, Exception):
+                raise
+            logger.warning("Could not estimate the plan cost of generated SQL: %s", e)
+            # Only run the query here if SHOWPLAN_XML is known to be off again
+            await self._run_sync(cursor.execute, "SET SHOWPLAN_XML OFF")
+            return
+        logger.info("Generated SQL estimated plan cost %s (estimated in %.0f ms)",
+                    cost, (time.monotonic() - started) * 1000)
+        if cost is None:
+            return
+        self.metrics["max_plan_cost"] = max(self.metrics["max_plan_cost"], cost)
+        if self.max_plan_cost and cost > self.max_plan_cost:
+            self.metrics["rejected"] += 1
+            raise SqlQueryRejectedError(f"Estimated plan cost {cost} exceeds {self.max_plan_cost}")
+
+    @staticmethod
+    async def _cancel(cursor, work):
+        try:
+            # SQLCancel is safe to call while another thread is executing on the cursor.
+            cursor.cancel()
+        except Exception as e:
+            logger.warning("Could not cancel generated SQL: %s", e)
+        try:
+            await asyncio.shield(work)
+        except (Exception, asyncio.CancelledError):
+            pass
@@ -1,16 +1,108 @@
 from datetime import datetime
 import struct
 
-import pandas as pd
 from api.models.input_models import ChartFilters
+from common.database.chart_filters import compile_chart_filters
 from common.config.config import Config
+from common.database.sql_connection_pool import SqlConnectionPool
+from common.database.sql_executor import SqlExecutor
+from common.database.sql_governor import SqlQueryGovernor, SqlQueryRejectedError, SqlQuotaExceededError
 import logging
 from helpers.azure_credential_utils import get_azure_credential_async
+from helpers.row_grouping import group_rows
 import pyodbc
 
+SQL_COPT_SS_ACCESS_TOKEN = 1256
+SQL_TOKEN_SCOPE = "https://database.windows.net/.default"
+
+_connection_pool = None
+_sql_executor = None
+_sql_governor = None
+
+
+def get_sql_executor():
+    """Get the process-wide executor that runs all blocking pyodbc calls."""
+    global _sql_executor
+    if _sql_executor is None:
+        config = Config()
+        _sql_executor = SqlExecutor(
+            max_workers=config.sqldb_max_concurrency,
+            max_queue_depth=config.sqldb_max_queue_depth,
+        )
+    return _sql_executor
+
+
+def get_sql_governor():
+    """Get the process-wide governor applied to agent-generated SQL."""
+    global _sql_governor
+    if _sql_governor is None:
+        config = Config()
+        _sql_governor = SqlQueryGovernor(
+            get_sql_executor().run_to_completion,
+            timeout_seconds=config.sql_query_timeout_seconds,
+            max_concurrent_per_user=config.sql_query_max_concurrent_per_user,
+            check_plan_cost=config.sql_query_check_plan_cost,
+            max_plan_cost=config.sql_query_max_plan_cost,
+            discard=lambda conn: get_connection_pool().discard(conn),
+        )
+    return _sql_governor
+
+
+def get_connection_pool():
+    """Get the process-wide SQL connection pool, creating it on first use."""
+    global _connection_pool
+    if _connection_pool is None:
+        config = Config()
+        _connection_pool = SqlConnectionPool(
+            get_db_connection,
+            max_size=config.sqldb_pool_size,
+            acquire_timeout=config.sqldb_pool_timeout,
+            recycle_seconds=config.sqldb_pool_recycle_seconds,
+            health_check_seconds=config.sqldb_pool_health_check_seconds,
+            run_sync=get_sql_executor().run_to_completion,
+        )
+    return _connection_pool
+
+
+async def close_connection_pool():
+    """Close the SQL connection pool and stop the executor."""
+    global _connection_pool, _sql_executor, _sql_governor
+    if _connection_pool is not None:
+        await _connection_pool.close()
+    if _sql_executor is not None:
+        _sql_executor.shutdown(wait=False)
+    _connection_pool = None
+    _sql_executor = None
+    _sql_governor = None
+
+
+def get_executor_metrics():
+    """Return SQL executor counters, or an empty dict if no SQL work has run yet."""
+    if _sql_executor is None:
+        return {}
+    return _sql_executor.get_metrics()
+
+
+def get_governor_metrics():
+    """Return generated SQL governor counters, or an empty dict if no generated SQL has run yet."""
+    if _sql_governor is None:
+        return {}
+    return _sql_governor.get_metrics()
+
+
+def get_pool_metrics():
+    """Return connection pool counters, or an empty dict if the pool has not been used yet."""
+    if _connection_pool is None:
+        return {}
+    return _connection_pool.get_metrics()
+
 
 async def get_db_connection():
-    """Get a connection to the SQL database"""
+    """Open a new connection to the SQL database.
+
+    Prefer borrowing from get_connection_pool(); this is the factory the pool uses
+    to open new connections.
+    """
     config = Config()
 
     server = config.sqldb_server
@@ -18,22 +110,22 @@ async def get_db_connection():
     username = config.sqldb_username
     password = config.sqldb_database
     driver = config.driver
-    mid_id = config.mid_id
 
     try:
-        credential = await get_azure_credential_async(client_id=mid_id)
-        token = await credential.get_token("https://database.windows.net/.default")
+        # The shared credential caches the token and renews it before it expires
+        credential = await get_azure_credential_async(client_id=config.mid_id)
+        token = await credential.get_token(SQL_TOKEN_SCOPE)
         token_bytes = token.token.encode("utf-16-LE")
         token_struct = struct.pack(
             f"<I{len(token_bytes)}s",
             len(token_bytes),
             token_bytes
         )
-        SQL_COPT_SS_ACCESS_TOKEN = 1256
 
         # Set up the connection
         connection_string = f"DRIVER={driver};SERVER={server};DATABASE={database};"
-        conn = pyodbc.connect(
+        conn = await get_sql_executor().run(
+            pyodbc.connect,
             connection_string, attrs_before={SQL_COPT_SS_ACCESS_TOKEN: token_struct}
         )
 
@@ -41,7 +133,8 @@ async def get_db_connection():
         return conn
     except pyodbc.Error as e:
         logging.error("Failed with Azure Credential: %s", str(e))
-        conn = pyodbc.connect(
+        conn = await get_sql_executor().run(
+            pyodbc.connect,
             f"DRIVER={driver};SERVER={server};DATABASE={database};UID={username};PWD={password}",
             timeout=5)
 
@@ -49,22 +142,86 @@ async def get_db_connection():
         return conn
 
 
+DATE_REBASE_LOCK = "km_date_rebase"
+
+_watermark_table_ready = False
+
+
 async def adjust_processed_data_dates():
     """
     Adjusts the dates in the processed_data, km_processed_data, and processed_data_key_phrases tables
     to align with the current date.
+
+    The rebase runs at most once per day across all workers: the day it last ran is persisted in
+    km_data_watermark and concurrent runs are serialized with an application lock. Returns True if
+    any dates were shifted.
     """
-    conn = await get_db_connection()
+    async with get_connection_pool().connection() as conn:
+        return await get_sql_executor().run_to_completion(_adjust_processed_data_dates, conn)
+
+
+def _ensure_watermark_table(cursor):
+    global _watermark_table_ready
+    if _watermark_table_ready:
+        return
+    cursor.execute(
+        """IF OBJECT_ID(N'[dbo].[km_data_watermark]', N'U') IS NULL
+        CREATE TABLE [dbo].[km_data_watermark] (
+            id int NOT NULL PRIMARY KEY,
+            rebased_on date NOT NULL,
+            days_shifted int NOT NULL,
+            updated_at datetime2 NOT NULL
+        )"""
+    )
+    cursor.commit()
+    _watermark_table_ready = True
+
+
+def _read_rebased_on(cursor):
+    cursor.execute("SELECT rebased_on FROM [dbo].[km_data_watermark] WHERE id = 1")
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _adjust_processed_data_dates(conn):
     cursor = None
     try:
         cursor = conn.cursor()
-        # Adjust the dates to the current date
+        _ensure_watermark_table(cursor)
+
         today = datetime.today()
+        # Cheap read-only check so that every run after the first one of the day is a no-op.
+        if _read_rebased_on(cursor) == today.date():
+            conn.rollback()
+            return False
+
+        # Serialize the rebase across workers; whoever fails to get the lock skips this run.
+        cursor.execute(
+            """SET NOCOUNT ON;
+            DECLARE @result int;
+            EXEC @result = sp_getapplock @Resource = ?, @LockMode = 'Exclusive',
+                @LockOwner = 'Transaction', @LockTimeout = 0;
+            SELECT @result;""",
+            (DATE_REBASE_LOCK,)
+        )
+        if cursor.fetchone()[0] < 0:
+            logging.info("Date rebase already running in another worker, skipping")
+            conn.rollback()
+            return False
+
+        # Re-check under the lock in case another worker finished while we were checking.
+        if _read_rebased_on(cursor) == today.date():
+            conn.rollback()
+            return False
+
+        # The CAST and FORMAT below work whether StartTime/EndTime are datetime2 or, in databases
+        # not yet migrated with migrate_processed_data_datetime2.sql, varchar.
         cursor.execute(
             "SELECT MAX(CAST(StartTime AS DATETIME)) FROM [dbo].[processed_data]"
         )
         max_start_time = (cursor.fetchone())[0]
 
+        days_difference = 0
         if max_start_time:
             days_difference = (today - max_start_time).days - 1
             if days_difference != 0:
@@ -85,19 +242,101 @@ async def adjust_processed_data_dates():
                     "UPDATE [dbo].[processed_data_key_phrases] SET StartTime = FORMAT(DATEADD(DAY, ?, StartTime), "
                     "'yyyy-MM-dd HH:mm:ss')", (days_difference,)
                 )
-                # Commit the changes
-                conn.commit()
+                # Shift the daily rollups built by the ingestion scripts along with the raw rows
+                cursor.execute(
+                    """IF OBJECT_ID(N'[dbo].[km_call_rollup_daily]', N'U') IS NOT NULL
+                        UPDATE [dbo].[km_call_rollup_daily] SET call_date = DATEADD(DAY, ?, call_date);
+                    IF OBJECT_ID(N'[dbo].[km_key_phrase_rollup_daily]', N'U') IS NOT NULL
+                        UPDATE [dbo].[km_key_phrase_rollup_daily] SET call_date = DATEADD(DAY, ?, call_date);""",
+                    (days_difference, days_difference)
+                )
+
+        # Record the watermark in the same transaction as the updates
+        cursor.execute(
+            """MERGE [dbo].[km_data_watermark] AS w
+            USING (SELECT 1 AS id) AS s ON w.id = s.id
+            WHEN MATCHED THEN UPDATE SET rebased_on = ?, days_shifted = ?, updated_at = SYSUTCDATETIME()
+            WHEN NOT MATCHED THEN INSERT (id, rebased_on, days_shifted, updated_at)
+                VALUES (1, ?, ?, SYSUTCDATETIME());""",
+            (today.date(), days_difference, today.date(), days_difference)
+        )
+        conn.commit()
+        return days_difference != 0
+    finally:
+        if cursor:
+            cursor.close()
+
+
+async def fetch_data_version():
+    """
+    Return the time the processed data was last rebased or ingested, taken from km_data_watermark.
+
+    Used to detect data changes made by other workers or by the ingestion scripts. Returns None
+    until the table has been created by the ingestion scripts or the first date rebase.
+    """
+    async with get_connection_pool().connection() as conn:
+        return await get_sql_executor().run_to_completion(_fetch_data_version, conn)
+
+
+def _fetch_data_version(conn):
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        # Read only: the chart cache calls this on every lookup, so the table is never created here
+        cursor.execute(
+            """IF OBJECT_ID(N'[dbo].[km_data_watermark]', N'U') IS NULL
+                SELECT CAST(NULL AS datetime2);
+            ELSE
+                SELECT updated_at FROM [dbo].[km_data_watermark] WHERE id = 1;"""
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        if cursor:
+            cursor.close()
+
+
+# Tables the SQL agent generates queries against; a change to their columns makes cached SQL stale.
+SQL_AGENT_TABLES = ('km_processed_data', 'processed_data_key_phrases')
+
+
+async def fetch_schema_version():
+    """
+    Return a checksum of the column definitions of the tables the SQL agent queries.
+
+    Used to drop generated SQL that was written against an older schema.
+    """
+    async with get_connection_pool().connection() as conn:
+        return await get_sql_executor().run_to_completion(_fetch_schema_version, conn)
+
+
+def _fetch_schema_version(conn):
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        placeholders = ', '.join('?' for _ in SQL_AGENT_TABLES)
+        cursor.execute(
+            f"""SELECT CHECKSUM_AGG(CHECKSUM(TABLE_NAME, COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH, IS_NULLABLE))
+            FROM INFORMATION_SCHEMA.COLUMNS
+            WHERE TABLE_SCHEMA = 'dbo' AND TABLE_NAME IN ({placeholders})""",
+            *SQL_AGENT_TABLES
+        )
+        row = cursor.fetchone()
+        return row[0] if row else None
     finally:
         if cursor:
             cursor.close()
-        conn.close()
 
 
 async def fetch_filters_data():
     """
     Fetches filter data from the database and organizes it into a nested JSON structure.
     """
-    conn = await get_db_connection()
+    async with get_connection_pool().connection() as conn:
+        return await get_sql_executor().run_to_completion(_fetch_filters_data, conn)
+
+
+def _fetch_filters_data(conn):
     cursor = None
     try:
         cursor = conn.cursor()
@@ -120,211 +359,293 @@ async def fetch_filters_data():
 
         cursor.execute(sql_stmt)
 
-        rows = [tuple(row) for row in cursor.fetchall()]
-
-        # Define column names
-        column_names = [i[0] for i in cursor.description]
-        df = pd.DataFrame(rows, columns=column_names)
-        df.rename(columns={'key1': 'key'}, inplace=True)
-
-        nested_json = (
-            df.groupby("filter_name")
-            .apply(lambda x: {
-                "filter_name": x.name,
-                "filter_values": x.to_dict(orient="records")
-            }, include_groups=False).to_list()
+        column_names = ['key' if i[0] == 'key1' else i[0] for i in cursor.description]
+        filters_data = group_rows(
+            cursor.fetchall(), column_names,
+            group_by=['filter_name'], value_columns=['displayValue', 'key'], value_key='filter_values'
         )
 
-        filters_data = nested_json
-
         return filters_data
     finally:
         if cursor:
             cursor.close()
-        conn.close()
 
 
 async def fetch_chart_data(chart_filters: ChartFilters = ''):
     """
     Fetches chart data from the database based on the provided filters and organizes it into a nested JSON structure.
     """
-    conn = await get_db_connection()
-    cursor = None
-    try:
-        cursor = conn.cursor()
-        where_clause = ''
-        req_body = ''
-        try:
-            req_body = chart_filters.model_dump()
-        except BaseException:
-            pass
-        if req_body != '':
-            where_clause = ''
-            for key, value in req_body.items():
-                if key == 'selected_filters':
-                    for k, v in value.items():
-                        if k == 'Topic':
-                            topics = ''
-                            for topic in v:
-                                topics += f''' '{topic}', '''
-                            if where_clause:
-                                where_clause += " and "
-                            if topics:
-                                where_clause += f" mined_topic  in ({topics})"
-                                where_clause = where_clause.replace(', )', ')')
-                        elif k == 'Sentiment':
-                            for sentiment in v:
-                                if sentiment != 'all':
-                                    if where_clause:
-                                        where_clause += " and "
-                                    where_clause += f"sentiment = '{sentiment}'"
-
-                        elif k == 'Satisfaction':
-                            for satisfaction in v:
-                                if where_clause:
-                                    where_clause += " and "
-                                where_clause += f"satisfied = '{satisfaction}'"
-                        elif k == 'DateRange':
-                            for date_range in v:
-                                if where_clause:
-                                    where_clause += " and "
-                                if date_range == 'Last 7 days':
-                                    where_clause += "StartTime >= DATEADD(day, -7, GETDATE())"
-                                elif date_range == 'Last 14 days':
-                                    where_clause += "StartTime >= DATEADD(day, -14, GETDATE())"
-                                elif date_range == 'Last 90 days':
-                                    where_clause += "StartTime >= DATEADD(day, -90, GETDATE())"
-                                elif date_range == 'Year to Date':
-                                    where_clause += "StartTime >= DATEADD(year, -1, GETDATE())"
-        if where_clause:
-            where_clause = f"where {where_clause} "
-
-        sql_stmt = (
-            f'''select 'TOTAL_CALLS' as id, 'Total Calls' as chart_name, 'card' as chart_type,
-                'Total Calls' as name, count(*) as value, '' as unit_of_measurement from [dbo].[processed_data] {where_clause}
-                union all
-                select 'AVG_HANDLING_TIME' as id, 'Average Handling Time' as chart_name, 'card' as chart_type,
-                'Average Handling Time' as name,
-                AVG(DATEDIFF(MINUTE, StartTime, EndTime))  as value, 'mins' as unit_of_measurement from [dbo].[processed_data] {where_clause}
-                union all
-                select 'SATISFIED' as id, 'Satisfied' as chart_name, 'card' as chart_type, 'Satisfied' as name,
-                round((CAST(SUM(CASE WHEN satisfied = 'yes' THEN 1 ELSE 0 END) AS FLOAT) / COUNT(*) * 100), 2) as value, '%' as unit_of_measurement from [dbo].[processed_data]
-                {where_clause}
-                union all
-                select 'SENTIMENT' as id, 'Topics Overview' as chart_name, 'donutchart' as chart_type,
-                sentiment as name,
-                (count(sentiment) * 100 / sum(count(sentiment)) over ()) as value,
-                '' as unit_of_measurement from [dbo].[processed_data]  {where_clause}
-                group by sentiment
-                union all
-                select 'AVG_HANDLING_TIME_BY_TOPIC' as id, 'Average Handling Time By Topic' as chart_name, 'bar' as chart_type,
-                mined_topic as name,
-                AVG(DATEDIFF(MINUTE, StartTime, EndTime)) as value, '' as unit_of_measurement from [dbo].[processed_data] {where_clause}
-                group by mined_topic
-                ''')
-
-        # charts pt1
-        cursor.execute(sql_stmt)
+    async with get_connection_pool().connection() as conn:
+        return await get_sql_executor().run_to_completion(_fetch_chart_data, conn, chart_filters)
 
-        # rows = cursor.fetchall()
-        rows = [tuple(row) for row in cursor.fetchall()]
 
-        column_names = [i[0] for i in cursor.description]
-        df = pd.DataFrame(rows, columns=column_names)
+# Aggregates of the raw tables at the grain the charts are computed from.
+RAW_CALL_AGGREGATE = '''SELECT mined_topic, sentiment,
+                COUNT(*) AS calls,
+                SUM(CASE WHEN satisfied = 'yes' THEN 1 ELSE 0 END) AS satisfied_calls,
+                SUM(CAST(DATEDIFF(MINUTE, StartTime, EndTime) AS bigint)) AS handling_minutes,
+                COUNT(DATEDIFF(MINUTE, StartTime, EndTime)) AS timed_calls
+            FROM [dbo].[processed_data] {where}
+            GROUP BY mined_topic, sentiment'''
 
-        # charts pt1
-        nested_json1 = (
-            df.groupby(['id', 'chart_name', 'chart_type']).apply(
-                lambda x: x[['name', 'value', 'unit_of_measurement']].to_dict(orient='records'), include_groups=False).reset_index(
-                name='chart_value')
-        )
-        result1 = nested_json1.to_dict(orient='records')
-
-        sql_stmt = f'''SELECT TOP 1 WITH TIES
-                        mined_topic as name, 'TOPICS' as id, 'Trending Topics' as chart_name, 'table' as chart_type,
-                        lower(sentiment) as average_sentiment,
-                        COUNT(*) AS call_frequency
-                    FROM [dbo].[processed_data]
-                    {where_clause}
-                    GROUP BY mined_topic, sentiment
-                    ORDER BY ROW_NUMBER() OVER (PARTITION BY mined_topic ORDER BY COUNT(*) DESC)
-                    '''
+RAW_KEY_PHRASE_AGGREGATE = '''SELECT key_phrase, sentiment, COUNT(*) AS calls
+            FROM [dbo].[processed_data_key_phrases] {where}
+            GROUP BY key_phrase, sentiment'''
 
-        cursor.execute(sql_stmt)
+# The same aggregates answered from the daily rollup tables maintained by the ingestion scripts.
+ROLLUP_CALL_AGGREGATE = '''SELECT mined_topic, sentiment,
+                SUM(calls) AS calls,
+                SUM(CASE WHEN satisfied = 'yes' THEN calls ELSE 0 END) AS satisfied_calls,
+                SUM(handling_minutes) AS handling_minutes,
+                SUM(timed_calls) AS timed_calls
+            FROM [dbo].[km_call_rollup_daily] {where}
+            GROUP BY mined_topic, sentiment'''
+
+ROLLUP_KEY_PHRASE_AGGREGATE = '''SELECT key_phrase, sentiment, SUM(calls) AS calls
+            FROM [dbo].[km_key_phrase_rollup_daily] {where}
+            GROUP BY key_phrase, sentiment'''
+
+
+# Column names of the filter dimensions in the call tables and the key phrase tables.
+# The key phrase tables have no satisfaction column.
+CALL_FILTER_COLUMNS = {'topic': 'mined_topic', 'sentiment': 'sentiment', 'satisfied': 'satisfied'}
+KEY_PHRASE_FILTER_COLUMNS = {'topic': 'topic', 'sentiment': 'sentiment'}
 
-        rows = [tuple(row) for row in cursor.fetchall()]
 
-        column_names = [i[0] for i in cursor.description]
-        df = pd.DataFrame(rows, columns=column_names)
+def _where(predicates):
+    return f"where {' and '.join(predicates)}" if predicates else ''
 
-        # charts pt2
-        nested_json2 = (
-            df.groupby(['id', 'chart_name', 'chart_type']).apply(
-                lambda x: x[['name', 'call_frequency', 'average_sentiment']].to_dict(orient='records'), include_groups=False).reset_index(
-                name='chart_value')
+
+def _chart_aggregate_sql(compiled_filters):
+    """
+    Build the statements that fill #chart_agg and #phrase_agg for the compiled filters.
+
+    When the daily rollup tables exist, whole days are read from them and raw rows are only
+    scanned for the partial first day of a date range, since the relative ranges start at the
+    current time of day rather than at midnight. Without the rollups everything comes from
+    the raw tables.
+    """
+    call_terms = compiled_filters.predicates(CALL_FILTER_COLUMNS)
+    phrase_terms = compiled_filters.predicates(KEY_PHRASE_FILTER_COLUMNS)
+
+    raw_date_terms = []
+    rollup_date_terms = []
+    boundary_date_terms = []
+    if compiled_filters.has_date_range:
+        # @cutoff has the same type as StartTime and the column is never wrapped in a
+        # function, so the range predicates are seeks on IX_processed_data_StartTime.
+        raw_date_terms = ["StartTime >= @cutoff"]
+        rollup_date_terms = ["call_date > CAST(@cutoff AS date)"]
+        boundary_date_terms = [
+            "StartTime >= @cutoff",
+            "StartTime < CAST(DATEADD(day, 1, CAST(@cutoff AS date)) AS datetime2(0))",
+        ]
+
+    rollup_call = ROLLUP_CALL_AGGREGATE.format(where=_where(call_terms + rollup_date_terms))
+    rollup_phrase = ROLLUP_KEY_PHRASE_AGGREGATE.format(where=_where(phrase_terms + rollup_date_terms))
+    if compiled_filters.has_date_range:
+        rollup_call = (
+            f"{rollup_call}\n            UNION ALL\n            "
+            f"{RAW_CALL_AGGREGATE.format(where=_where(call_terms + boundary_date_terms))}"
+        )
+        rollup_phrase = (
+            f"{rollup_phrase}\n            UNION ALL\n            "
+            f"{RAW_KEY_PHRASE_AGGREGATE.format(where=_where(phrase_terms + boundary_date_terms))}"
         )
-        result2 = nested_json2.to_dict(orient='records')
 
-        where_clause = where_clause.replace('mined_topic', 'topic')
-        sql_stmt = f'''select top 15 key_phrase as text,
+    return f'''IF OBJECT_ID(N'[dbo].[km_call_rollup_daily]', N'U') IS NOT NULL
+                AND OBJECT_ID(N'[dbo].[km_key_phrase_rollup_daily]', N'U') IS NOT NULL
+            BEGIN
+                INSERT INTO #chart_agg
+                SELECT mined_topic, sentiment, SUM(calls), SUM(satisfied_calls), SUM(handling_minutes), SUM(timed_calls)
+                FROM ({rollup_call}) t
+                GROUP BY mined_topic, sentiment;
+
+                INSERT INTO #phrase_agg
+                SELECT key_phrase, sentiment, SUM(calls)
+                FROM ({rollup_phrase}) t
+                GROUP BY key_phrase, sentiment;
+            END
+            ELSE
+            BEGIN
+                INSERT INTO #chart_agg
+                {RAW_CALL_AGGREGATE.format(where=_where(call_terms + raw_date_terms))};
+
+                INSERT INTO #phrase_agg
+                {RAW_KEY_PHRASE_AGGREGATE.format(where=_where(phrase_terms + raw_date_terms))};
+            END'''
+
+
+def _fetch_chart_data(conn, chart_filters):
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        compiled_filters = compile_chart_filters(chart_filters)
+
+        # One batch, one round trip. The filtered calls and key phrases are reduced to small
+        # (topic, sentiment) and (key phrase, sentiment) aggregates, preferably from the daily
+        # rollup tables, and every chart is derived from those. The three chart groups come
+        # back as consecutive result sets. The temp tables are dropped first because pooled
+        # connections keep their session.
+        sql_stmt = f'''SET NOCOUNT ON;
+            DROP TABLE IF EXISTS #chart_agg;
+            DROP TABLE IF EXISTS #phrase_agg;
+            CREATE TABLE #chart_agg (
+                mined_topic varchar(255), sentiment varchar(255), calls int,
+                satisfied_calls int, handling_minutes bigint, timed_calls int
+            );
+            CREATE TABLE #phrase_agg (key_phrase varchar(500), sentiment varchar(255), calls int);
+            {compiled_filters.declarations}
+            {_chart_aggregate_sql(compiled_filters)}
+
+            select 'TOTAL_CALLS' as id, 'Total Calls' as chart_name, 'card' as chart_type,
+            'Total Calls' as name, ISNULL(SUM(calls), 0) as value, '' as unit_of_measurement from #chart_agg
+            union all
+            select 'AVG_HANDLING_TIME' as id, 'Average Handling Time' as chart_name, 'card' as chart_type,
+            'Average Handling Time' as name,
+            SUM(handling_minutes) / NULLIF(SUM(timed_calls), 0) as value, 'mins' as unit_of_measurement from #chart_agg
+            union all
+            select 'SATISFIED' as id, 'Satisfied' as chart_name, 'card' as chart_type, 'Satisfied' as name,
+            round((CAST(SUM(satisfied_calls) AS FLOAT) / NULLIF(SUM(calls), 0) * 100), 2) as value,
+            '%' as unit_of_measurement from #chart_agg
+            union all
+            select 'SENTIMENT' as id, 'Topics Overview' as chart_name, 'donutchart' as chart_type,
+            sentiment as name,
+            (SUM(CASE WHEN sentiment IS NULL THEN 0 ELSE calls END) * 100
+                / NULLIF(SUM(SUM(CASE WHEN sentiment IS NULL THEN 0 ELSE calls END)) over (), 0)) as value,
+            '' as unit_of_measurement from #chart_agg
+            group by sentiment
+            union all
+            select 'AVG_HANDLING_TIME_BY_TOPIC' as id, 'Average Handling Time By Topic' as chart_name, 'bar' as chart_type,
+            mined_topic as name,
+            SUM(handling_minutes) / NULLIF(SUM(timed_calls), 0) as value, '' as unit_of_measurement from #chart_agg
+            group by mined_topic;
+
+            SELECT TOP 1 WITH TIES
+                mined_topic as name, 'TOPICS' as id, 'Trending Topics' as chart_name, 'table' as chart_type,
+                lower(sentiment) as average_sentiment,
+                calls AS call_frequency
+            FROM #chart_agg
+            ORDER BY ROW_NUMBER() OVER (PARTITION BY mined_topic ORDER BY calls DESC);
+
+            select top 15 key_phrase as text,
             'KEY_PHRASES' as id, 'Key Phrases' as chart_name, 'wordcloud' as chart_type,
             call_frequency as size, lower(average_sentiment) as average_sentiment from
             (
                 SELECT TOP 1 WITH TIES
                 key_phrase,
                 sentiment as average_sentiment,
-                COUNT(*) AS call_frequency from
-                (
-                    select key_phrase, sentiment from [dbo].[processed_data_key_phrases]
-                    {where_clause}
-                ) t
-                GROUP BY key_phrase, sentiment
-                ORDER BY ROW_NUMBER() OVER (PARTITION BY key_phrase ORDER BY COUNT(*) DESC)
+                calls AS call_frequency
+                FROM #phrase_agg
+                ORDER BY ROW_NUMBER() OVER (PARTITION BY key_phrase ORDER BY calls DESC)
             ) t2
-            order by call_frequency desc
-            '''
-
-        cursor.execute(sql_stmt)
-
-        rows = [tuple(row) for row in cursor.fetchall()]
-
-        column_names = [i[0] for i in cursor.description]
-        df = pd.DataFrame(rows, columns=column_names)
-
-        df = df.head(15)
-
-        nested_json3 = (
-            df.groupby(['id', 'chart_name', 'chart_type']).apply(
-                lambda x: x[['text', 'size', 'average_sentiment']].to_dict(orient='records'), include_groups=False).reset_index(
-                name='chart_value')
-        )
-        result3 = nested_json3.to_dict(orient='records')
-
-        final_result = result1 + result2 + result3
+            order by call_frequency desc;
+
+            DROP TABLE #chart_agg;
+            DROP TABLE #phrase_agg;'''
+
+        # The statement text only depends on the shape of the filters; the values are parameters.
+        cursor.execute(sql_stmt, *compiled_filters.params)
+
+        # cards, donut and bar charts / trending topics / key phrases
+        chart_value_columns = [
+            ['name', 'value', 'unit_of_measurement'],
+            ['name', 'call_frequency', 'average_sentiment'],
+            ['text', 'size', 'average_sentiment'],
+        ]
+        final_result = []
+        for index, value_columns in enumerate(chart_value_columns):
+            if index and not cursor.nextset():
+                raise RuntimeError("Chart query returned fewer result sets than expected")
+
+            column_names = [i[0] for i in cursor.description]
+            final_result += group_rows(
+                cursor.fetchall(), column_names,
+                group_by=['id', 'chart_name', 'chart_type'], value_columns=value_columns, value_key='chart_value'
+            )
 
         return final_result
 
     finally:
         if cursor:
             cursor.close()
-        conn.close()
 
 
-async def execute_sql_query(sql_query):
+async def execute_sql_query(sql_query, max_rows=None, max_chars=None):
     """
-    Executes a given SQL query and returns the result as a concatenated string.
+    Executes SQL generated by the SQL agent and returns the result as a compact text table.
+
+    The query runs under the SQL governor: it must be a single read-only SELECT, its outer
+    SELECT is capped at ``max_rows + 1`` rows, it is subject to the statement timeout and the
+    per-user concurrency quota, and it is cancelled on the server if the request goes away.
+
+    The first line holds the column names and every following line one row, with values
+    separated by ``|``. Rows are fetched in batches and reading stops once ``max_rows`` rows
+    or ``max_chars`` characters have been collected, in which case a final line reports the
+    truncation. Both budgets default to the SQL_QUERY_MAX_ROWS / SQL_QUERY_MAX_CHARS settings.
+
+    Returns:
+        str: The formatted result, or None if the query was rejected, timed out or failed.
     """
-    conn = await get_db_connection()
-    cursor = None
+    if max_rows is None or max_chars is None:
+        config = Config()
+        max_rows = config.sql_query_max_rows if max_rows is None else max_rows
+        max_chars = config.sql_query_max_chars if max_chars is None else max_chars
+
+    governor = get_sql_governor()
+    try:
+        # One row over the budget, so that truncation can still be reported
+        governed_sql = governor.prepare(sql_query, max_rows + 1)
+        async with governor.user_slot():
+            async with get_connection_pool().connection() as conn:
+                return await governor.run(conn, _execute_sql_query, governed_sql, max_rows, max_chars)
+    except (SqlQueryRejectedError, SqlQuotaExceededError) as e:
+        logging.warning("Generated SQL was not run: %s", e)
+        return None
+
+
+def _format_result_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    return str(value).replace('\r', ' ').replace('\n', ' ').replace('|', '\\|')
+
+
+def _execute_sql_query(cursor, sql_query, max_rows, max_chars):
     try:
-        cursor = conn.cursor()
         cursor.execute(sql_query)
-        result = ''.join(str(row) for row in cursor.fetchall())
-        return result
+        if not cursor.description:
+            return ''
+
+        lines = ['|'.join(_format_result_value(column[0]) for column in cursor.description)]
+        size = len(lines[0])
+        row_count = 0
+        truncated = False
+        fetch_size = min(max_rows + 1, 500)
+        while not truncated:
+            batch = cursor.fetchmany(fetch_size)
+            for row in batch:
+                line = '|'.join(_format_result_value(value) for value in row)
+                if row_count >= max_rows or size + 1 + len(line) > max_chars:
+                    truncated = True
+                    break
+                lines.append(line)
+                size += 1 + len(line)
+                row_count += 1
+            if len(batch) < fetch_size:
+                break
+
+        if truncated:
+            # Stop the server from streaming the rows that will not be read.
+            try:
+                cursor.cancel()
+            except Exception:
+                pass
+            lines.append(f"[truncated: showing the first {row_count} rows, the query returned more]")
+        return '\n'.join(lines)
     except Exception as e:
         logging.error("Error executing SQL query: %s", e)
         return None
-    finally:
-        if cursor:
-            cursor.close()
-        conn.close()
@@ -1,48 +1,292 @@
+"""
+Process-wide Azure credentials shared by every client in the API.
+
+Building a ManagedIdentityCredential per request and validating it with a token call costs an
+IMDS (or Azure CLI) round trip every time. Instead, one credential per client id and flavour
+(sync or async) is kept for the process. It resolves ManagedIdentityCredential, falling back to
+AzureCliCredential, on its first token request and caches tokens per scope:
+
+- cached tokens are returned until they are within TOKEN_REFRESH_MARGIN_SECONDS of expiry
+- inside TOKEN_BACKGROUND_REFRESH_MARGIN_SECONDS, one caller refreshes the token while the
+  others keep using the still-valid one
+- concurrent callers needing a new token for the same scope share a single fetch
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+from azure.core.exceptions import ClientAuthenticationError
 from azure.identity import ManagedIdentityCredential, AzureCliCredential
 from azure.identity.aio import ManagedIdentityCredential as AioManagedIdentityCredential, AzureCliCredential as AioAzureCliCredential
 
-async def get_azure_credential_async(client_id=None):
+logger = logging.getLogger(__name__)
+
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+TOKEN_BACKGROUND_REFRESH_MARGIN_SECONDS = 600
+
+CREDENTIAL_ERROR = "Failed to obtain credentials using ManagedIdentityCredential and AzureCliCredential."
+
+_credentials = {}
+_async_credentials = {}
+_credentials_lock = threading.Lock()
+_metrics = {
+    "token_requests": 0,
+    "cache_hits": 0,
+    "background_refreshes": 0,
+    "managed_identity_fetches": 0,
+    "cli_fetches": 0,
+    "fetch_failures": 0,
+}
+
+
+def _remaining_seconds(token):
+    return token.expires_on - time.time() if token is not None else 0
+
+
+def _token_options(claims, tenant_id, enable_cae):
+    options = {}
+    if claims:
+        options["claims"] = claims
+    if tenant_id:
+        options["tenant_id"] = tenant_id
+    if enable_cae:
+        options["enable_cae"] = enable_cae
+    return options
+
+
+class CachedTokenCredential:
     """
-    Returns an Azure credential asynchronously, falling back to AioAzureCliCredential if AioManagedIdentityCredential fails.
+    Token credential that resolves ManagedIdentityCredential or AzureCliCredential once and
+    caches tokens per scope.
 
     Args:
         client_id (str, optional): The client ID for the Managed Identity Credential.
+    """
 
-    Returns:
-        Credential object: Either AioManagedIdentityCredential or AioAzureCliCredential.
+    def __init__(self, client_id=None):
+        self.client_id = client_id
+        self.source = None
+        self._credential = None
+        self._tokens = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get_token(self, *scopes, claims=None, tenant_id=None, enable_cae=False, **kwargs):
+        """Return a token for ``scopes``, fetching a new one only when the cached one is about to expire."""
+        _metrics["token_requests"] += 1
+        options = _token_options(claims, tenant_id, enable_cae)
+        if claims:
+            # A claims challenge always needs a fresh token
+            return self._fetch(scopes, options)
+
+        key = (scopes, tenant_id, enable_cae)
+        token = self._tokens.get(key)
+        remaining = _remaining_seconds(token)
+        if remaining > TOKEN_BACKGROUND_REFRESH_MARGIN_SECONDS:
+            _metrics["cache_hits"] += 1
+            return token
+
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        if remaining > TOKEN_REFRESH_MARGIN_SECONDS:
+            # Still valid: the caller that gets the lock refreshes early, the others use the cached token
+            if not lock.acquire(blocking=False):
+                _metrics["cache_hits"] += 1
+                return token
+            _metrics["background_refreshes"] += 1
+        else:
+            lock.acquire()
+        try:
+            token = self._tokens.get(key)
+            if _remaining_seconds(token) > TOKEN_BACKGROUND_REFRESH_MARGIN_SECONDS:
+                _metrics["cache_hits"] += 1
+                return token
+            try:
+                token = self._fetch(scopes, options)
+            except Exception:
+                if _remaining_seconds(token) <= 0:
+                    raise
+                logger.warning("Token refresh failed, using cached token until it expires", exc_info=True)
+                return token
+            self._tokens[key] = token
+            return token
+        finally:
+            lock.release()
+
+    def _fetch(self, scopes, options):
+        if self._credential is not None:
+            try:
+                token = self._credential.get_token(*scopes, **options)
+            except Exception:
+                _metrics["fetch_failures"] += 1
+                # Resolve the credential again on the next fetch
+                self._credential = None
+                raise
+            _metrics[f"{self.source}_fetches"] += 1
+            return token
+
+        for source, factory in (
+            ("managed_identity", lambda: ManagedIdentityCredential(client_id=self.client_id)),
+            ("cli", AzureCliCredential),
+        ):
+            credential = factory()
+            try:
+                token = credential.get_token(*scopes, **options)
+            except Exception:
+                _metrics["fetch_failures"] += 1
+                continue
+            self._credential, self.source = credential, source
+            _metrics[f"{source}_fetches"] += 1
+            return token
+        raise ClientAuthenticationError(CREDENTIAL_ERROR)
+
+    def close(self):
+        if self._credential is not None:
+            self._credential.close()
+            self._credential = None
+
+
+class AsyncCachedTokenCredential:
     """
-    try:
-        mi_credential = AioManagedIdentityCredential(client_id=client_id)
-        await mi_credential.get_token("https://management.azure.com/.default")
-        return mi_credential
-    except Exception:
+    Async counterpart of CachedTokenCredential, for the aio Azure SDK clients.
+
+    Args:
+        client_id (str, optional): The client ID for the Managed Identity Credential.
+    """
+
+    def __init__(self, client_id=None):
+        self.client_id = client_id
+        self.source = None
+        self._credential = None
+        self._tokens = {}
+        self._refreshing = {}
+
+    async def get_token(self, *scopes, claims=None, tenant_id=None, enable_cae=False, **kwargs):
+        """Return a token for ``scopes``, fetching a new one only when the cached one is about to expire."""
+        _metrics["token_requests"] += 1
+        options = _token_options(claims, tenant_id, enable_cae)
+        if claims:
+            # A claims challenge always needs a fresh token
+            return await self._fetch(scopes, options)
+
+        key = (scopes, tenant_id, enable_cae)
+        token = self._tokens.get(key)
+        remaining = _remaining_seconds(token)
+        if remaining > TOKEN_REFRESH_MARGIN_SECONDS:
+            if remaining <= TOKEN_BACKGROUND_REFRESH_MARGIN_SECONDS and key not in self._refreshing:
+                _metrics["background_refreshes"] += 1
+                self._start_refresh(key, scopes, options)
+            _metrics["cache_hits"] += 1
+            return token
+
+        task = self._refreshing.get(key) or self._start_refresh(key, scopes, options)
+        # Shielded, so that a cancelled caller does not cancel the fetch shared with the others
+        return await asyncio.shield(task)
+
+    def _start_refresh(self, key, scopes, options):
+        task = asyncio.ensure_future(self._refresh(key, scopes, options))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+        return task
+
+    async def _refresh(self, key, scopes, options):
+        token = self._tokens.get(key)
         try:
-            cli_credential = AioAzureCliCredential()
-            await cli_credential.get_token("https://management.azure.com/.default")
-            return cli_credential
+            new_token = await self._fetch(scopes, options)
         except Exception:
-            raise Exception("Failed to obtain credentials using ManagedIdentityCredential and AzureCliCredential.")
+            if _remaining_seconds(token) <= 0:
+                raise
+            logger.warning("Token refresh failed, using cached token until it expires", exc_info=True)
+            return token
+        self._tokens[key] = new_token
+        return new_token
+
+    async def _fetch(self, scopes, options):
+        if self._credential is not None:
+            try:
+                token = await self._credential.get_token(*scopes, **options)
+            except Exception:
+                _metrics["fetch_failures"] += 1
+                # Resolve the credential again on the next fetch
+                credential, self._credential = self._credential, None
+                await credential.close()
+                raise
+            _metrics[f"{self.source}_fetches"] += 1
+            return token
+
+        for source, factory in (
+            ("managed_identity", lambda: AioManagedIdentityCredential(client_id=self.client_id)),
+            ("cli", AioAzureCliCredential),
+        ):
+            credential = factory()
+            try:
+                token = await credential.get_token(*scopes, **options)
+            except Exception:
+                _metrics["fetch_failures"] += 1
+                await credential.close()
+                continue
+            self._credential, self.source = credential, source
+            _metrics[f"{source}_fetches"] += 1
+            return token
+        raise ClientAuthenticationError(CREDENTIAL_ERROR)
+
+    async def close(self):
+        if self._credential is not None:
+            credential, self._credential = self._credential, None
+            await credential.close()
+
+
+async def get_azure_credential_async(client_id=None):
+    """
+    Returns the process-wide async Azure credential, which uses AioManagedIdentityCredential and
+    falls back to AioAzureCliCredential if it fails.
+
+    Args:
+        client_id (str, optional): The client ID for the Managed Identity Credential.
+
+    Returns:
+        AsyncCachedTokenCredential: Shared credential caching tokens per scope.
+    """
+    with _credentials_lock:
+        credential = _async_credentials.get(client_id)
+        if credential is None:
+            credential = _async_credentials[client_id] = AsyncCachedTokenCredential(client_id=client_id)
+    return credential
+
 
 def get_azure_credential(client_id=None):
     """
-    Returns an Azure credential, falling back to AzureCliCredential if ManagedIdentityCredential fails.
+    Returns the process-wide Azure credential, which uses ManagedIdentityCredential and falls
+    back to AzureCliCredential if it fails.
 
     Args:
         client_id (str, optional): The client ID for the Managed Identity Credential.
 
     Returns:
-        Credential object: Either ManagedIdentityCredential or AzureCliCredential.
+        CachedTokenCredential: Shared credential caching tokens per scope.
     """
-    try:
-        mi_credential = ManagedIdentityCredential(client_id=client_id)
-        mi_credential.get_token("https://management.azure.com/.default")
-        return mi_credential
-    except Exception:
-        try:
-            cli_credential = AzureCliCredential()
-            cli_credential.get_token("https://management.azure.com/.default")
-            return cli_credential
-        except Exception:
-            raise Exception("Failed to obtain credentials using ManagedIdentityCredential and AzureCliCredential.")
+    with _credentials_lock:
+        credential = _credentials.get(client_id)
+        if credential is None:
+            credential = _credentials[client_id] = CachedTokenCredential(client_id=client_id)
+    return credential
+
+
+async def close_azure_credentials():
+    """Close and drop the process-wide credentials and their cached tokens."""
+    with _credentials_lock:
+        credentials = list(_credentials.values())
+        async_credentials = list(_async_credentials.values())
+        _credentials.clear()
+        _async_credentials.clear()
+    for credential in credentials:
+        credential.close()
+    for credential in async_credentials:
+        await credential.close()
 
 
+def get_credential_metrics():
+    """Return token request, cache hit and IMDS/CLI token fetch counters for this process."""
+    return dict(_metrics)
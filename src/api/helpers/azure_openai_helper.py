@@ -4,8 +4,9 @@ Helper functions for initializing and managing Azure OpenAI client instances.
 
 import openai
 from azure.identity import get_bearer_token_provider
+from azure.identity.aio import get_bearer_token_provider as get_async_bearer_token_provider
 from common.config.config import Config
-from helpers.azure_credential_utils import get_azure_credential
+from helpers.azure_credential_utils import get_azure_credential, get_azure_credential_async
 
 
 def get_azure_openai_client():
@@ -23,3 +24,20 @@ def get_azure_openai_client():
         azure_ad_token_provider=token_provider,
     )
     return client
+
+
+async def get_azure_openai_async_client():
+    """
+    Initializes and returns an async Azure OpenAI client using a bearer token provider.
+    """
+
+    config = Config()
+    token_provider = get_async_bearer_token_provider(
+        await get_azure_credential_async(), "https://cognitiveservices.azure.com/.default"
+    )
+    client = openai.AsyncAzureOpenAI(
+        azure_endpoint=config.azure_openai_endpoint,
+        api_version=config.azure_openai_api_version,
+        azure_ad_token_provider=token_provider,
+    )
+    return client
@@ -0,0 +1,50 @@
+"""
+Builds the nested JSON returned by the chart endpoints directly from cursor rows.
+
+The chart queries return a few dozen flat rows that only need to be grouped by
+their chart (or filter) identity. Doing that in a single pass over the rows is
+much cheaper than a DataFrame round trip and keeps pandas out of the API process.
+"""
+
+
+def group_rows(rows, columns, group_by, value_columns, value_key, sort=True):
+    """
+    Group flat rows into one dict per distinct ``group_by`` key.
+
+    Each group holds its ``group_by`` columns plus ``value_key``, the list of
+    ``value_columns`` dicts for its rows in their original order. Groups are sorted
+    by key, matching what ``DataFrame.groupby`` produced, unless ``sort`` is False,
+    in which case they keep the order in which they were first seen.
+
+    Args:
+        rows: Iterable of row sequences, e.g. a pyodbc cursor or ``cursor.fetchall()``.
+        columns (list[str]): Column names of the rows, in order.
+        group_by (list[str]): Columns that identify a group.
+        value_columns (list[str]): Columns copied into each group's value list.
+        value_key (str): Name of the value list in each group.
+        sort (bool): Sort the groups by key.
+
+    Example:
+        >>> group_rows([("A", "x", 1), ("A", "y", 2)], ["id", "name", "value"], ["id"], ["name", "value"], "chart_value")
+        [{'id': 'A', 'chart_value': [{'name': 'x', 'value': 1}, {'name': 'y', 'value': 2}]}]
+    """
+    index = {name: position for position, name in enumerate(columns)}
+    key_positions = [index[name] for name in group_by]
+    value_positions = [(name, index[name]) for name in value_columns]
+
+    groups = {}
+    for row in rows:
+        key = tuple(row[position] for position in key_positions)
+        values = groups.get(key)
+        if values is None:
+            # Rows with a NULL group key are dropped, as DataFrame.groupby does.
+            if None in key:
+                continue
+            values = groups[key] = []
+        values.append({name: row[position] for name, position in value_positions})
+
+    keys = sorted(groups) if sort else groups
+    return [
+        {**dict(zip(group_by, key)), value_key: groups[key]}
+        for key in keys
+    ]
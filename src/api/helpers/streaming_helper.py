@@ -1,4 +1,20 @@
+import asyncio
+import json
 import logging
+import time
+import uuid
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library encoder is used without it
+    orjson = None
+
+
+def json_dumps(value):
+    """Serialize to compact JSON text, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, separators=(",", ":"))
 
 
 async def stream_processor(response):
@@ -9,3 +25,142 @@ async def stream_processor(response):
     except Exception as e:
         logging.error(f"Error processing streaming response: {e}", exc_info=True)
         raise
+
+
+async def coalesce_stream(source, max_bytes=256, max_latency=0.05):
+    """
+    Merge the text fragments of ``source`` into fewer, larger pieces.
+
+    A piece is yielded once the buffered text reaches ``max_bytes`` UTF-8 bytes, once
+    ``max_latency`` seconds have passed since its first fragment arrived, or when the source
+    ends. The source is read by a background task that stops reading while a full buffer
+    waits for the caller, so a slow client holds the producer back instead of letting the
+    buffer grow: it never exceeds ``max_bytes`` plus one fragment. An error raised by the
+    source is re-raised after the text buffered before it. ``max_bytes`` of 0 passes
+    fragments through unchanged.
+    """
+    if max_bytes <= 0:
+        async for fragment in source:
+            yield fragment
+        return
+
+    loop = asyncio.get_running_loop()
+    buffer = []
+    state = {"bytes": 0, "first_at": None, "done": False, "error": None, "wakeup": None, "room": None}
+
+    def wake(key):
+        waiter = state[key]
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def produce():
+        try:
+            async for fragment in source:
+                if not fragment:
+                    continue
+                if not buffer:
+                    state["first_at"] = loop.time()
+                    wake("wakeup")
+                buffer.append(fragment)
+                state["bytes"] += len(fragment.encode("utf-8"))
+                if state["bytes"] >= max_bytes:
+                    wake("wakeup")
+                    state["room"] = loop.create_future()
+                    await state["room"]
+        except Exception as e:
+            state["error"] = e
+        finally:
+            state["done"] = True
+            wake("wakeup")
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            if buffer and (state["done"] or state["bytes"] >= max_bytes
+                           or loop.time() >= state["first_at"] + max_latency):
+                piece = "".join(buffer)
+                buffer.clear()
+                state["bytes"] = 0
+                wake("room")
+                yield piece
+                continue
+            if state["done"]:
+                if state["error"] is not None:
+                    raise state["error"]
+                return
+            state["wakeup"] = loop.create_future()
+            timeout = state["first_at"] + max_latency - loop.time() if buffer else None
+            try:
+                await asyncio.wait_for(state["wakeup"], timeout)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if not producer.done():
+            producer.cancel()
+        try:
+            await producer
+        except asyncio.CancelledError:
+            pass
+
+
+class StreamChunkEncoder:
+    """
+    Writes the wire frames of a streamed chat answer directly from the text.
+
+    The parts that do not change during a response (model, object type, history metadata)
+    are serialized once, so each frame only encodes its own text. Frames are newline
+    separated JSON objects followed by a blank line, as /api/chat has always sent them.
+    """
+
+    def __init__(self, history_metadata, apim_request_id="", model="rag-model"):
+        self.response_id = str(uuid.uuid4())
+        self.created = int(time.time())
+        model_json = json_dumps(model)
+        self._history_metadata = history_metadata
+        self._apim_request_id = apim_request_id
+        self._model = model
+        self._full_head = ',"model":' + model_json + ',"created":'
+        self._full_mid = ',"object":"extensions.chat.completion.chunk","choices":[{"messages":[{"role":"assistant","content":'
+        self._full_tail = (
+            '}]}],"history_metadata":' + json_dumps(history_metadata)
+            + ',"apim-request-id":' + json_dumps(apim_request_id) + '}\n\n'
+        )
+        self._delta_head = (
+            '{"id":' + json_dumps(self.response_id) + self._full_head + str(self.created)
+            + ',"object":"extensions.chat.completion.chunk","choices":[{"delta":{"content":'
+        )
+        self._first_delta_tail = '}}],"history_metadata":' + json_dumps(history_metadata) + '}\n\n'
+
+    def full(self, content):
+        """Frame carrying the whole answer so far, with a new id per frame like the original protocol."""
+        return (
+            '{"id":"' + str(uuid.uuid4()) + '"' + self._full_head + str(int(time.time()))
+            + self._full_mid + json_dumps(content) + self._full_tail
+        )
+
+    def delta(self, content, first=False):
+        """Frame carrying only the new text; the first frame also carries the role and history metadata."""
+        if first:
+            return self._delta_head + json_dumps(content) + ',"role":"assistant"' + self._first_delta_tail
+        return self._delta_head + json_dumps(content) + '}}]}\n\n'
+
+    def final(self, content, citations):
+        """Consolidated last frame of the delta protocol."""
+        return json_dumps({
+            "id": self.response_id,
+            "model": self._model,
+            "created": self.created,
+            "object": "extensions.chat.completion",
+            "choices": [
+                {
+                    "messages": [{"role": "assistant", "content": content}],
+                    "finish_reason": "stop",
+                }
+            ],
+            "citations": citations,
+            "history_metadata": self._history_metadata,
+            "apim-request-id": self._apim_request_id,
+        }) + "\n\n"
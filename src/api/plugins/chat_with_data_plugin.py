@@ -20,6 +20,7 @@ from common.database.sqldb_service import execute_sql_query
 from common.config.config import Config
 from agents.search_agent_factory import SearchAgentFactory
 from agents.sql_agent_factory import SQLAgentFactory
+from services.sql_query_cache import get_sql_query_cache
 
 
 class ChatWithDataPlugin:
@@ -54,44 +55,62 @@ class ChatWithDataPlugin:
 
         query = input
         try:
-            agent_info = await SQLAgentFactory.get_agent()
-            agent = agent_info["agent"]
-            project_client = agent_info["client"]
+            sql_cache = get_sql_query_cache()
+            sql_query = await sql_cache.lookup(query)
+            if sql_query is not None:
+                answer = await execute_sql_query(sql_query)
+                if answer is None:
+                    # The cached SQL no longer executes; generate it again
+                    sql_cache.discard(query)
+            if sql_query is None or answer is None:
+                sql_query = await self._generate_sql(query)
+                if sql_query is None:
+                    return "Details could not be retrieved. Please try again later."
+                answer = await execute_sql_query(sql_query)
+                if answer is None:
+                    return "Details could not be retrieved. Please try again later."
+                await sql_cache.store(query, sql_query)
+
+        except Exception:
+            answer = 'Details could not be retrieved. Please try again later.'
+
+        return answer
+
+    async def _generate_sql(self, query):
+        """
+        Runs the SQL agent to write a T-SQL query for the question.
 
-            thread = project_client.agents.threads.create()
+        Returns:
+            str: The generated SQL, or None if the agent run failed.
+        """
+        agent_info = await SQLAgentFactory.get_agent()
+        agent = agent_info["agent"]
+        project_client = agent_info["client"]
 
-            project_client.agents.messages.create(
-                thread_id=thread.id,
+        async with agent_info["thread_pool"].thread() as thread_id:
+            await project_client.agents.messages.create(
+                thread_id=thread_id,
                 role=MessageRole.USER,
                 content=query,
             )
 
-            run = project_client.agents.runs.create_and_process(
-                thread_id=thread.id,
+            run = await project_client.agents.runs.create_and_process(
+                thread_id=thread_id,
                 agent_id=agent.id
             )
 
             if run.status == "failed":
                 print(f"Run failed: {run.last_error}")
-                return "Details could not be retrieved. Please try again later."
+                return None
 
             sql_query = ""
-            messages = project_client.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING)
-            for msg in messages:
+            messages = project_client.agents.messages.list(thread_id=thread_id, order=ListSortOrder.ASCENDING)
+            async for msg in messages:
                 if msg.role == MessageRole.AGENT and msg.text_messages:
                     sql_query = msg.text_messages[-1].text.value
                     break
-            sql_query = sql_query.replace("```sql", '').replace("```", '').strip()
-            answer = await execute_sql_query(sql_query)
-            answer = answer[:20000] if len(answer) > 20000 else answer
-
-            # Clean up
-            project_client.agents.threads.delete(thread_id=thread.id)
 
-        except Exception:
-            answer = 'Details could not be retrieved. Please try again later.'
-
-        return answer
+        return sql_query.replace("```sql", '').replace("```", '').strip()
 
     @kernel_function(name="ChatWithCallTranscripts", description="Provides summaries or detailed explanations from the search index.")
     async def get_answers_from_calltranscripts(
@@ -116,52 +135,50 @@ class ChatWithDataPlugin:
             agent = agent_info["agent"]
             project_client = agent_info["client"]
 
-            thread = project_client.agents.threads.create()
-
-            project_client.agents.messages.create(
-                thread_id=thread.id,
-                role=MessageRole.USER,
-                content=question,
-            )
-
-            run = project_client.agents.runs.create_and_process(
-                thread_id=thread.id,
-                agent_id=agent.id,
-                tool_choice={"type": "azure_ai_search"}
-            )
-
-            if run.status == "failed":
-                print(f"Run failed: {run.last_error}")
-            else:
-                def convert_citation_markers(text):
-                    def replace_marker(match):
-                        parts = match.group(1).split(":")
-                        if len(parts) == 2 and parts[1].isdigit():
-                            new_index = int(parts[1]) + 1
-                            return f"[{new_index}]"
-                        return match.group(0)
-
-                    return re.sub(r'【(\d+:\d+)†source】', replace_marker, text)
-
-                for run_step in project_client.agents.run_steps.list(thread_id=thread.id, run_id=run.id):
-                    if isinstance(run_step.step_details, RunStepToolCallDetails):
-                        for tool_call in run_step.step_details.tool_calls:
-                            output_data = tool_call['azure_ai_search']['output']
-                            tool_output = ast.literal_eval(output_data) if isinstance(output_data, str) else output_data
-                            urls = tool_output.get("metadata", {}).get("get_urls", [])
-                            titles = tool_output.get("metadata", {}).get("titles", [])
-
-                            for i, url in enumerate(urls):
-                                title = titles[i] if i < len(titles) else ""
-                                answer["citations"].append({"url": url, "title": title})
-
-                messages = project_client.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING)
-                for msg in messages:
-                    if msg.role == MessageRole.AGENT and msg.text_messages:
-                        answer["answer"] = msg.text_messages[-1].text.value
-                        answer["answer"] = convert_citation_markers(answer["answer"])
-                        break
-                project_client.agents.threads.delete(thread_id=thread.id)
+            async with agent_info["thread_pool"].thread() as thread_id:
+                await project_client.agents.messages.create(
+                    thread_id=thread_id,
+                    role=MessageRole.USER,
+                    content=question,
+                )
+
+                run = await project_client.agents.runs.create_and_process(
+                    thread_id=thread_id,
+                    agent_id=agent.id,
+                    tool_choice={"type": "azure_ai_search"}
+                )
+
+                if run.status == "failed":
+                    print(f"Run failed: {run.last_error}")
+                else:
+                    def convert_citation_markers(text):
+                        def replace_marker(match):
+                            parts = match.group(1).split(":")
+                            if len(parts) == 2 and parts[1].isdigit():
+                                new_index = int(parts[1]) + 1
+                                return f"[{new_index}]"
+                            return match.group(0)
+
+                        return re.sub(r'【(\d+:\d+)†source】', replace_marker, text)
+
+                    async for run_step in project_client.agents.run_steps.list(thread_id=thread_id, run_id=run.id):
+                        if isinstance(run_step.step_details, RunStepToolCallDetails):
+                            for tool_call in run_step.step_details.tool_calls:
+                                output_data = tool_call['azure_ai_search']['output']
+                                tool_output = ast.literal_eval(output_data) if isinstance(output_data, str) else output_data
+                                urls = tool_output.get("metadata", {}).get("get_urls", [])
+                                titles = tool_output.get("metadata", {}).get("titles", [])
+
+                                for i, url in enumerate(urls):
+                                    title = titles[i] if i < len(titles) else ""
+                                    answer["citations"].append({"url": url, "title": title})
+
+                    messages = project_client.agents.messages.list(thread_id=thread_id, order=ListSortOrder.ASCENDING)
+                    async for msg in messages:
+                        if msg.role == MessageRole.AGENT and msg.text_messages:
+                            answer["answer"] = msg.text_messages[-1].text.value
+                            answer["answer"] = convert_citation_markers(answer["answer"])
+                            break
         except Exception:
             return "Details could not be retrieved. Please try again later."
         return answer
@@ -0,0 +1,189 @@
+"""
+Result cache for the dashboard chart queries.
+
+Most dashboard requests use one of a handful of filter combinations, and every
+miss runs several full aggregate queries over processed_data. Results are cached
+per canonical filter key for a short TTL, concurrent misses for the same key share
+a single query, and the cache is dropped whenever the underlying data changes
+(date rebase or ingestion, both of which bump the km_data_watermark row).
+"""
+
+import asyncio
+import logging
+import time
+from datetime import date
+
+from cachetools import TTLCache
+
+from common.config.config import Config
+from common.database.sqldb_service import fetch_data_version
+
+logger = logging.getLogger(__name__)
+
+_chart_cache = None
+
+
+def chart_filters_key(chart_filters=None):
+    """
+    Build a hashable cache key for the given ChartFilters.
+
+    Filter values are de-duplicated and sorted, since the generated WHERE clause does not depend
+    on their order, and the no-op 'all' sentiment is dropped. Relative date ranges ("Last 7 days")
+    are evaluated against the current date, so the date is part of the key.
+    """
+    selected = {}
+    if chart_filters:
+        try:
+            selected = chart_filters.model_dump().get("selected_filters") or {}
+        except AttributeError:
+            selected = {}
+
+    parts = []
+    for name in sorted(selected):
+        values = {str(value) for value in selected[name] or []}
+        if name == "Sentiment":
+            values.discard("all")
+        if values:
+            parts.append((name, tuple(sorted(values))))
+    return date.today().isoformat(), tuple(parts)
+
+
+class ChartResultCache:
+    """
+    TTL and LRU bounded cache of chart results with single-flight loading.
+
+    Args:
+        ttl_seconds (float): How long a result is served before it is reloaded.
+        max_entries (int): Maximum number of filter combinations kept; least recently used go first.
+        version_check_seconds (float): How often the data version is re-read from the database to
+            detect rebases and ingestion runs from other workers. 0 disables the check.
+        version_loader: Coroutine function returning the current data version.
+    """
+
+    def __init__(self, ttl_seconds=300, max_entries=256, version_check_seconds=60, version_loader=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.version_check_seconds = version_check_seconds
+        self._version_loader = version_loader
+        self._cache = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        self._inflight = {}
+        self._generation = 0
+        self._data_version = None
+        self._version_checked_at = None
+        self._version_task = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "load_errors": 0,
+            "invalidations": 0,
+        }
+
+    def get_stats(self):
+        """Return a snapshot of the hit/miss counters and current occupancy."""
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "hit_ratio": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "size": len(self._cache),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "inflight": len(self._inflight),
+        }
+
+    def invalidate(self):
+        """Drop all cached results. Loads already in flight are not stored."""
+        self._cache.clear()
+        # Later misses must not join a load that may have read the old data.
+        self._inflight.clear()
+        self._generation += 1
+        self.stats["invalidations"] += 1
+
+    async def get_or_load(self, key, loader):
+        """
+        Return the cached result for ``key``, calling ``loader()`` on a miss.
+
+        Concurrent misses for the same key await the same load. Failed loads are not cached.
+        """
+        await self._check_data_version()
+
+        try:
+            result = self._cache[key]
+            self.stats["hits"] += 1
+            return result
+        except KeyError:
+            pass
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            task = asyncio.create_task(self._load(key, loader, self._generation))
+            self._inflight[key] = task
+        # Shield the shared load so one cancelled request does not fail the others waiting on it.
+        return await asyncio.shield(task)
+
+    async def _load(self, key, loader, generation):
+        try:
+            result = await loader()
+        except Exception:
+            self.stats["load_errors"] += 1
+            raise
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+        if generation == self._generation:
+            self._cache[key] = result
+        return result
+
+    async def _check_data_version(self):
+        if self._version_loader is None or not self.version_check_seconds:
+            return
+        now = time.monotonic()
+        if self._version_checked_at is not None and now - self._version_checked_at < self.version_check_seconds:
+            return
+        if self._version_task is None:
+            self._version_task = asyncio.create_task(self._refresh_data_version())
+        await asyncio.shield(self._version_task)
+
+    async def _refresh_data_version(self):
+        try:
+            version = await self._version_loader()
+            if self._data_version is not None and version != self._data_version:
+                logger.info("Chart data changed, clearing cached chart results")
+                self.invalidate()
+            self._data_version = version
+        except Exception as e:
+            # Keep serving cached results; the TTL still bounds how stale they can get.
+            logger.warning("Failed to read chart data version: %s", e)
+        finally:
+            self._version_checked_at = time.monotonic()
+            self._version_task = None
+
+
+def get_chart_cache():
+    """Get the process-wide chart result cache, creating it on first use."""
+    global _chart_cache
+    if _chart_cache is None:
+        config = Config()
+        _chart_cache = ChartResultCache(
+            ttl_seconds=config.chart_cache_ttl_seconds,
+            max_entries=config.chart_cache_max_entries,
+            version_check_seconds=config.chart_cache_version_check_seconds,
+            version_loader=fetch_data_version,
+        )
+    return _chart_cache
+
+
+def invalidate_chart_cache():
+    """Drop cached chart results, e.g. after the data has been rebased or re-ingested."""
+    if _chart_cache is not None:
+        _chart_cache.invalidate()
+
+
+def get_chart_cache_stats():
+    """Return chart cache counters, or an empty dict if the cache has not been used yet."""
+    if _chart_cache is None:
+        return {}
+    return _chart_cache.get_stats()
@@ -2,7 +2,8 @@ import logging
 from fastapi import HTTPException, status
 
 from api.models.input_models import ChartFilters
-from common.database.sqldb_service import adjust_processed_data_dates, fetch_chart_data, fetch_filters_data
+from common.database.sqldb_service import fetch_chart_data, fetch_filters_data
+from services.chart_cache import chart_filters_key, get_chart_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,7 +20,6 @@ class ChartService:
         Fetch filter data for charts.
         """
         try:
-            await adjust_processed_data_dates()
             return await fetch_filters_data()
         except Exception as e:
             logger.error("Error in fetch_filter_data: %s", e, exc_info=True)
@@ -33,7 +33,7 @@ class ChartService:
         Fetch chart data.
         """
         try:
-            return await fetch_chart_data()
+            return await get_chart_cache().get_or_load(chart_filters_key(), fetch_chart_data)
         except Exception as e:
             logger.error("Error in fetch_chart_data: %s", e, exc_info=True)
             raise HTTPException(
@@ -46,7 +46,10 @@ class ChartService:
         Fetch chart data based on applied filters.
         """
         try:
-            return await fetch_chart_data(chart_filters)
+            return await get_chart_cache().get_or_load(
+                chart_filters_key(chart_filters),
+                lambda: fetch_chart_data(chart_filters)
+            )
         except Exception as e:
             logger.error("Error in fetch_chart_data_with_filters: %s", e, exc_info=True)
             raise HTTPException(
@@ -10,9 +10,6 @@ import json
 import logging
 import time
 import uuid
-from types import SimpleNamespace
-import asyncio
-import random
 import re
 
 from fastapi import HTTPException, Request, status
@@ -23,51 +20,44 @@ from semantic_kernel.exceptions.agent_exceptions import AgentException
 
 from azure.ai.agents.models import TruncationObject, MessageRole, ListSortOrder
 
-from cachetools import TTLCache
-
-from helpers.utils import format_stream_response
+from helpers.streaming_helper import StreamChunkEncoder, coalesce_stream
 from common.config.config import Config
 from agents.chart_agent_factory import ChartAgentFactory
+from services.conversation_thread_store import get_conversation_thread_store
+from services.thread_reaper import get_thread_reaper
 
 # Constants
 HOST_NAME = "CKM"
 HOST_INSTRUCTIONS = "Answer questions about call center operations"
 
+# Streaming protocols for /api/chat. "full" resends the accumulated answer in every frame,
+# which the web app relies on; "delta" sends only new text and a final consolidated message.
+STREAM_PROTOCOL_FULL = "full"
+STREAM_PROTOCOL_DELTA = "delta"
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class ExpCache(TTLCache):
-    """
-    Extended TTLCache that associates an agent and deletes Azure AI agent threads when items expire or are evicted (LRU).
-    """
-    def __init__(self, *args, agent=None, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.agent = agent
+def negotiate_stream_protocol(requested):
+    """Return the streaming protocol to use for a requested value, defaulting to the full-text protocol."""
+    if isinstance(requested, str) and requested.strip().lower() == STREAM_PROTOCOL_DELTA:
+        return STREAM_PROTOCOL_DELTA
+    return STREAM_PROTOCOL_FULL
 
-    def expire(self, time=None):
-        items = super().expire(time)
-        for key, thread_id in items:
-            try:
-                if self.agent:
-                    thread = AzureAIAgentThread(client=self.agent.client, thread_id=thread_id)
-                    asyncio.create_task(thread.delete())
-                    print(f"Thread deleted : {thread_id}")
-            except Exception as e:
-                logger.error("Failed to delete thread for key %s: %s", key, e)
-        return items
 
-    def popitem(self):
-        key, thread_id = super().popitem()
-        try:
-            if self.agent:
-                thread = AzureAIAgentThread(client=self.agent.client, thread_id=thread_id)
-                asyncio.create_task(thread.delete())
-                print(f"Thread deleted (LRU evict): {thread_id}")
-        except Exception as e:
-            logger.error("Failed to delete thread for key %s (LRU evict): %s", key, e)
-        return key, thread_id
+def extract_citations(answer):
+    """Return the citations of an agent answer shaped as {"answer": ..., "citations": [...]}, or []."""
+    text = answer.strip()
+    if text.startswith("```"):
+        text = text.replace("```json", "").replace("```", "").strip()
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        return []
+    citations = parsed.get("citations") if isinstance(parsed, dict) else None
+    return citations if isinstance(citations, list) else []
 
 
 class ChatService:
@@ -76,15 +66,13 @@ class ChatService:
     processing RAG responses, and generating chart data for visualization.
     """
 
-    thread_cache = None
-
     def __init__(self, request : Request):
         config = Config()
         self.azure_openai_deployment_name = config.azure_openai_deployment_model
+        self.stream_coalesce_max_bytes = config.stream_coalesce_max_bytes
+        self.stream_coalesce_max_latency = config.stream_coalesce_max_latency_ms / 1000
         self.agent = request.app.state.agent
-
-        if ChatService.thread_cache is None:
-            ChatService.thread_cache = ExpCache(maxsize=1000, ttl=3600.0, agent=self.agent)
+        self.thread_store = get_conversation_thread_store(on_evict=get_thread_reaper().enqueue)
 
     async def process_rag_response(self, rag_response, query):
         """
@@ -100,31 +88,28 @@ class ChatService:
             agent = agent_info["agent"]
             client = agent_info["client"]
 
-            thread = client.agents.threads.create()
-
-            client.agents.messages.create(
-                thread_id=thread.id,
-                role=MessageRole.USER,
-                content=user_prompt
-            )
-
-            run = client.agents.runs.create_and_process(
-                thread_id=thread.id,
-                agent_id=agent.id
-            )
-
-            if run.status == "failed":
-                print(f"[Chart Agent] Run failed: {run.last_error}")
-                return {"error": "Chart could not be generated due to agent failure."}
-
-            chart_json = ""
-            messages = client.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING)
-            for msg in messages:
-                if msg.role == MessageRole.AGENT and msg.text_messages:
-                    chart_json = msg.text_messages[-1].text.value.strip()
-                    break
-
-            client.agents.threads.delete(thread_id=thread.id)
+            async with agent_info["thread_pool"].thread() as thread_id:
+                await client.agents.messages.create(
+                    thread_id=thread_id,
+                    role=MessageRole.USER,
+                    content=user_prompt
+                )
+
+                run = await client.agents.runs.create_and_process(
+                    thread_id=thread_id,
+                    agent_id=agent.id
+                )
+
+                if run.status == "failed":
+                    print(f"[Chart Agent] Run failed: {run.last_error}")
+                    return {"error": "Chart could not be generated due to agent failure."}
+
+                chart_json = ""
+                messages = client.agents.messages.list(thread_id=thread_id, order=ListSortOrder.ASCENDING)
+                async for msg in messages:
+                    if msg.role == MessageRole.AGENT and msg.text_messages:
+                        chart_json = msg.text_messages[-1].text.value.strip()
+                        break
 
             chart_json = chart_json.replace("```json", "").replace("```", "").strip()
             chart_data = json.loads(chart_json)
@@ -151,17 +136,18 @@ class ChatService:
             if not query:
                 query = "Please provide a query."
 
-            thread_id = None
-            if ChatService.thread_cache is not None:
-                thread_id = ChatService.thread_cache.get(conversation_id, None)
+            thread_id = await self._get_thread_id(conversation_id)
             if thread_id:
                 thread = AzureAIAgentThread(client=self.agent.client, thread_id=thread_id)
 
             truncation_strategy = TruncationObject(type="last_messages", last_messages=4)
 
+            stored_thread_id = None
             async for response in self.agent.invoke_stream(messages=query, thread=thread, truncation_strategy=truncation_strategy):
-                if ChatService.thread_cache is not None:
-                    ChatService.thread_cache[conversation_id] = response.thread.id
+                # Store the thread once per turn, which also restarts the conversation's TTL
+                if response.thread.id != stored_thread_id:
+                    stored_thread_id = response.thread.id
+                    await self._store_thread_id(conversation_id, stored_thread_id)
                 complete_response += str(response.content)
                 yield response.content
 
@@ -183,61 +169,83 @@ class ChatService:
             # Provide a fallback response when no data is received from OpenAI.
             if complete_response == "":
                 logger.info("No response received from OpenAI.")
-                thread_id = None
-                if ChatService.thread_cache is not None:
-                    thread_id = ChatService.thread_cache.pop(conversation_id, None)
-                    if thread_id is not None:
-                        corrupt_key = f"{conversation_id}_corrupt_{random.randint(1000, 9999)}"
-                        ChatService.thread_cache[corrupt_key] = thread_id
+                # The thread did not produce an answer; the next question starts a new one
+                try:
+                    await self.thread_store.discard(conversation_id)
+                except Exception as e:
+                    logger.error("Failed to discard thread of conversation %s: %s", conversation_id, e)
                 yield "I cannot answer this question with the current data. Please rephrase or add more details."
 
-    async def stream_chat_request(self, request_body, conversation_id, query):
+    async def _get_thread_id(self, conversation_id):
+        try:
+            return await self.thread_store.get(conversation_id)
+        except Exception as e:
+            # Answer without the earlier context rather than failing the question
+            logger.error("Failed to read thread of conversation %s: %s", conversation_id, e)
+            return None
+
+    async def _store_thread_id(self, conversation_id, thread_id):
+        try:
+            await self.thread_store.set(conversation_id, thread_id)
+        except Exception as e:
+            logger.error("Failed to store thread of conversation %s: %s", conversation_id, e)
+
+    async def stream_answer_text(self, conversation_id, query):
+        """
+        Stream the answer as text, coalescing small fragments from the agent into fewer frames.
+
+        See helpers.streaming_helper.coalesce_stream for the flush and backpressure rules.
+        """
+        async def fragments():
+            async for chunk in self.stream_openai_text(conversation_id, query):
+                if isinstance(chunk, dict):
+                    chunk = json.dumps(chunk)  # Convert dict to JSON string
+                yield str(chunk)
+
+        async for text in coalesce_stream(fragments(), self.stream_coalesce_max_bytes, self.stream_coalesce_max_latency):
+            yield text
+
+    async def stream_delta_frames(self, conversation_id, query, history_metadata):
+        """
+        Stream the answer as delta frames, each carrying only the text received since the previous one.
+
+        The first frame carries the role and history metadata. Once the answer is complete, a final
+        frame carries the consolidated message and its parsed citations.
+        """
+        encoder = StreamChunkEncoder(history_metadata)
+        parts = []
+        async for chunk in self.stream_answer_text(conversation_id, query):
+            if not chunk:
+                continue
+            yield encoder.delta(chunk, first=not parts)
+            parts.append(chunk)
+
+        assistant_content = "".join(parts)
+        yield encoder.final(assistant_content, extract_citations(assistant_content))
+
+    async def stream_chat_request(self, request_body, conversation_id, query, stream_protocol=STREAM_PROTOCOL_FULL):
         """
         Handles streaming chat requests.
+
+        With the "delta" protocol only new text is sent per frame, followed by a final consolidated
+        message; the default "full" protocol resends the whole answer so far in every frame.
         """
         history_metadata = request_body.get("history_metadata", {})
 
         async def generate():
             try:
+                if stream_protocol == STREAM_PROTOCOL_DELTA:
+                    async for frame in self.stream_delta_frames(conversation_id, query, history_metadata):
+                        yield frame
+                    return
+
+                encoder = StreamChunkEncoder(history_metadata)
                 assistant_content = ""
-                async for chunk in self.stream_openai_text(conversation_id, query):
-                    if isinstance(chunk, dict):
-                        chunk = json.dumps(chunk)  # Convert dict to JSON string
-                    assistant_content += str(chunk)
+                async for chunk in self.stream_answer_text(conversation_id, query):
+                    assistant_content += chunk
 
                     if assistant_content:
-                        chat_completion_chunk = {
-                            "id": "",
-                            "model": "",
-                            "created": 0,
-                            "object": "",
-                            "choices": [
-                                {
-                                    "messages": [],
-                                    "delta": {},
-                                }
-                            ],
-                            "history_metadata": history_metadata,
-                            "apim-request-id": "",
-                        }
-
-                        chat_completion_chunk["id"] = str(uuid.uuid4())
-                        chat_completion_chunk["model"] = "rag-model"
-                        chat_completion_chunk["created"] = int(time.time())
-                        chat_completion_chunk["object"] = "extensions.chat.completion.chunk"
-                        chat_completion_chunk["choices"][0]["messages"].append(
-                            {"role": "assistant", "content": assistant_content}
-                        )
-                        chat_completion_chunk["choices"][0]["delta"] = {
-                            "role": "assistant",
-                            "content": assistant_content,
-                        }
-
-                        completion_chunk_obj = json.loads(
-                            json.dumps(chat_completion_chunk),
-                            object_hook=lambda d: SimpleNamespace(**d),
-                        )
-                        yield json.dumps(format_stream_response(completion_chunk_obj, history_metadata, "")) + "\n\n"
+                        yield encoder.full(assistant_content)
 
             except AgentException as e:
                 error_message = str(e)
@@ -0,0 +1,460 @@
+"""
+Store mapping chat conversations to the agent threads that hold their history.
+
+The conversation agent keeps a conversation's context in an Azure AI agent thread, so a
+follow-up question has to find the thread created for the earlier ones. A process-local
+cache only works with a single worker: with several uvicorn/gunicorn workers a follow-up
+that lands on another worker starts a new thread and loses the context. The store has
+three backends behind one interface:
+
+- ``memory``: a TTL and LRU bounded cache in this process, for a single worker
+- ``sqlite``: a SQLite file shared by the workers of one host
+- ``redis``: a Redis server shared by every worker and replica
+
+Entries expire ``ttl_seconds`` after the conversation last used its thread, and the oldest
+entries are evicted beyond ``max_entries``. Whenever an entry leaves the store other than
+through ``pop`` (expiry, capacity eviction, replacement by a new thread or ``discard``) its thread id is
+handed to the ``on_evict`` callback, which is expected to queue the thread for deletion.
+With the shared backends every evicted entry is reported by exactly one worker.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from cachetools import TTLCache
+
+from common.config.config import Config
+
+try:
+    from redis import asyncio as redis_asyncio
+except ImportError:  # redis is only needed for the redis backend
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+_conversation_thread_store = None
+
+
+class ConversationThreadStore(ABC):
+    """
+    Interface of the conversation to agent thread stores.
+
+    Args:
+        max_entries (int): Maximum number of conversations; the oldest are evicted beyond it.
+        ttl_seconds (float): How long a conversation keeps its thread after it was last stored.
+        on_evict: Callable receiving the thread id of every evicted entry, or None.
+    """
+
+    backend = None
+    # Whether other workers see the same entries; their threads must then outlive this worker.
+    shared = False
+
+    def __init__(self, max_entries=10000, ttl_seconds=3600, on_evict=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.on_evict = on_evict
+        self.size = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "expired": 0,
+            "evicted": 0,
+            "replaced": 0,
+            "discarded": 0,
+            "errors": 0,
+        }
+
+    def get_metrics(self):
+        """Return the store counters and the last known number of entries."""
+        return {
+            **self.stats,
+            "backend": self.backend,
+            "size": self.size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    @abstractmethod
+    async def get(self, conversation_id):
+        """Return the thread id of the conversation, or None."""
+
+    @abstractmethod
+    async def set(self, conversation_id, thread_id):
+        """Store the conversation's thread id and restart its TTL."""
+
+    @abstractmethod
+    async def pop(self, conversation_id):
+        """Remove the conversation and return its thread id, without reporting it as evicted."""
+
+    @abstractmethod
+    async def items(self):
+        """Return (conversation_id, thread_id) pairs of the live entries."""
+
+    async def discard(self, conversation_id):
+        """Remove the conversation and hand its thread to on_evict, e.g. because the thread is unusable."""
+        thread_id = await self.pop(conversation_id)
+        if thread_id is not None:
+            self._evicted(thread_id, "discarded")
+
+    async def close(self):
+        """Release the backend's resources."""
+
+    def _evicted(self, thread_id, reason):
+        self.stats[reason] += 1
+        if self.on_evict is None:
+            return
+        try:
+            self.on_evict(thread_id)
+        except Exception as e:
+            logger.error("Failed to queue deletion of evicted thread %s: %s", thread_id, e)
+
+
+class _EvictingTTLCache(TTLCache):
+    """TTLCache that reports entries dropped by expiry or LRU eviction."""
+
+    def __init__(self, *args, on_drop, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._on_drop = on_drop
+
+    def expire(self, time=None):
+        items = super().expire(time)
+        for _, thread_id in items:
+            self._on_drop(thread_id, "expired")
+        return items
+
+    def popitem(self):
+        key, thread_id = super().popitem()
+        self._on_drop(thread_id, "evicted")
+        return key, thread_id
+
+
+class InMemoryThreadStore(ConversationThreadStore):
+    """Conversation threads in a TTL and LRU bounded cache of this process."""
+
+    backend = "memory"
+
+    def __init__(self, max_entries=10000, ttl_seconds=3600, on_evict=None):
+        super().__init__(max_entries, ttl_seconds, on_evict)
+        self._entries = _EvictingTTLCache(maxsize=max_entries, ttl=ttl_seconds, on_drop=self._evicted)
+
+    def get_metrics(self):
+        self.size = len(self._entries)
+        return super().get_metrics()
+
+    async def get(self, conversation_id):
+        thread_id = self._entries.get(conversation_id)
+        self.stats["hits" if thread_id is not None else "misses"] += 1
+        return thread_id
+
+    async def set(self, conversation_id, thread_id):
+        previous = self._entries.get(conversation_id)
+        self._entries[conversation_id] = thread_id
+        self.stats["sets"] += 1
+        if previous is not None and previous != thread_id:
+            self._evicted(previous, "replaced")
+
+    async def pop(self, conversation_id):
+        return self._entries.pop(conversation_id, None)
+
+    async def items(self):
+        self._entries.expire()
+        return list(self._entries.items())
+
+
+class SqliteThreadStore(ConversationThreadStore):
+    """
+    Conversation threads in a SQLite file shared by the workers of one host.
+
+    Expired and surplus rows are removed with ``DELETE ... RETURNING``, so the worker whose
+    statement removed a row is the only one reporting its thread as evicted. Statements run
+    off the event loop; SQLite's WAL mode lets the workers read while one of them writes.
+
+    Args:
+        path (str): Database file; created with its table on first use.
+        sweep_seconds (float): Minimum interval between removals of expired and surplus rows.
+    """
+
+    backend = "sqlite"
+    shared = True
+
+    def __init__(self, path, max_entries=10000, ttl_seconds=3600, on_evict=None, sweep_seconds=30):
+        super().__init__(max_entries, ttl_seconds, on_evict)
+        self.path = path
+        self.sweep_seconds = sweep_seconds
+        self._conn = None
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    async def get(self, conversation_id):
+        thread_id = await self._run(self._get, conversation_id, time.time())
+        self.stats["hits" if thread_id is not None else "misses"] += 1
+        return thread_id
+
+    async def set(self, conversation_id, thread_id):
+        now = time.time()
+        previous = await self._run(self._set, conversation_id, thread_id, now + self.ttl_seconds)
+        self.stats["sets"] += 1
+        if previous is not None and previous != thread_id:
+            self._evicted(previous, "replaced")
+        if now - self._last_sweep >= self.sweep_seconds:
+            self._last_sweep = now
+            await self.sweep()
+
+    async def pop(self, conversation_id):
+        return await self._run(self._pop, conversation_id)
+
+    async def items(self):
+        return await self._run(self._items, time.time())
+
+    async def sweep(self):
+        """Remove expired entries and the oldest entries beyond max_entries."""
+        expired, evicted, size = await self._run(self._sweep, time.time())
+        self.size = size
+        for thread_id in expired:
+            self._evicted(thread_id, "expired")
+        for thread_id in evicted:
+            self._evicted(thread_id, "evicted")
+
+    async def close(self):
+        await asyncio.to_thread(self._close)
+
+    async def _run(self, func, *args):
+        try:
+            return await asyncio.to_thread(self._locked, func, *args)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+    def _locked(self, func, *args):
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            return func(*args)
+
+    def _close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversation_threads ("
+            "conversation_id TEXT PRIMARY KEY, thread_id TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_conversation_threads_expires_at ON conversation_threads (expires_at)")
+        return conn
+
+    def _get(self, conversation_id, now):
+        row = self._conn.execute(
+            "SELECT thread_id FROM conversation_threads WHERE conversation_id = ? AND expires_at > ?",
+            (conversation_id, now),
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set(self, conversation_id, thread_id, expires_at):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT thread_id FROM conversation_threads WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO conversation_threads (conversation_id, thread_id, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (conversation_id) DO UPDATE SET thread_id = excluded.thread_id, expires_at = excluded.expires_at",
+                (conversation_id, thread_id, expires_at),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row[0] if row else None
+
+    def _pop(self, conversation_id):
+        row = self._conn.execute(
+            "DELETE FROM conversation_threads WHERE conversation_id = ? RETURNING thread_id", (conversation_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _items(self, now):
+        return self._conn.execute(
+            "SELECT conversation_id, thread_id FROM conversation_threads WHERE expires_at > ?", (now,)
+        ).fetchall()
+
+    def _sweep(self, now):
+        conn = self._conn
+        expired = [row[0] for row in conn.execute(
+            "DELETE FROM conversation_threads WHERE expires_at <= ? RETURNING thread_id", (now,)
+        ).fetchall()]
+        size = conn.execute("SELECT COUNT(*) FROM conversation_threads").fetchone()[0]
+        evicted = []
+        if size > self.max_entries:
+            evicted = [row[0] for row in conn.execute(
+                "DELETE FROM conversation_threads WHERE conversation_id IN ("
+                "SELECT conversation_id FROM conversation_threads ORDER BY expires_at LIMIT ?) RETURNING thread_id",
+                (size - self.max_entries,),
+            ).fetchall()]
+            size -= len(evicted)
+        return expired, evicted, size
+
+
+class RedisThreadStore(ConversationThreadStore):
+    """
+    Conversation threads in Redis, shared by every worker and replica.
+
+    A hash maps conversation ids to thread ids and a sorted set scores each
+    ``conversation_id/thread_id`` pair with its expiry time. Whichever worker removes an
+    expired or surplus pair from the sorted set reports its thread as evicted, so each
+    thread is handed to ``on_evict`` once.
+
+    Args:
+        client: ``redis.asyncio.Redis`` client created with ``decode_responses=True``.
+        key_prefix (str): Prefix of the two keys used by the store.
+        sweep_seconds (float): Minimum interval between removals of expired and surplus entries.
+    """
+
+    backend = "redis"
+    shared = True
+
+    def __init__(self, client, max_entries=10000, ttl_seconds=3600, on_evict=None,
+                 key_prefix="ckm:conversation-threads", sweep_seconds=30):
+        super().__init__(max_entries, ttl_seconds, on_evict)
+        self.client = client
+        self._threads_key = f"{key_prefix}:threads"
+        self._expiry_key = f"{key_prefix}:expiry"
+        self.sweep_seconds = sweep_seconds
+        self._last_sweep = 0.0
+
+    @staticmethod
+    def _member(conversation_id, thread_id):
+        return f"{conversation_id}/{thread_id}"
+
+    async def get(self, conversation_id):
+        thread_id = await self._call(self.client.hget, self._threads_key, conversation_id)
+        if thread_id is not None:
+            expires_at = await self._call(self.client.zscore, self._expiry_key, self._member(conversation_id, thread_id))
+            if expires_at is None or expires_at <= time.time():
+                thread_id = None
+        self.stats["hits" if thread_id is not None else "misses"] += 1
+        return thread_id
+
+    async def set(self, conversation_id, thread_id):
+        now = time.time()
+        previous = await self._call(self.client.hget, self._threads_key, conversation_id)
+        await self._call(self.client.hset, self._threads_key, conversation_id, thread_id)
+        await self._call(self.client.zadd, self._expiry_key, {self._member(conversation_id, thread_id): now + self.ttl_seconds})
+        self.stats["sets"] += 1
+        if previous is not None and previous != thread_id:
+            if await self._call(self.client.zrem, self._expiry_key, self._member(conversation_id, previous)):
+                self._evicted(previous, "replaced")
+        if now - self._last_sweep >= self.sweep_seconds:
+            self._last_sweep = now
+            await self.sweep()
+
+    async def pop(self, conversation_id):
+        thread_id = await self._call(self.client.hget, self._threads_key, conversation_id)
+        if thread_id is None:
+            return None
+        await self._call(self.client.hdel, self._threads_key, conversation_id)
+        if not await self._call(self.client.zrem, self._expiry_key, self._member(conversation_id, thread_id)):
+            # Another worker already claimed the entry
+            return None
+        return thread_id
+
+    async def items(self):
+        members = await self._call(self.client.zrangebyscore, self._expiry_key, time.time(), "+inf")
+        return [tuple(member.rsplit("/", 1)) for member in members]
+
+    async def sweep(self):
+        """Remove expired entries and the oldest entries beyond max_entries."""
+        expired = await self._call(self.client.zrangebyscore, self._expiry_key, "-inf", time.time())
+        await self._claim(expired, "expired")
+        self.size = await self._call(self.client.zcard, self._expiry_key)
+        if self.size > self.max_entries:
+            oldest = await self._call(self.client.zrange, self._expiry_key, 0, self.size - self.max_entries - 1)
+            self.size -= await self._claim(oldest, "evicted")
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def _claim(self, members, reason):
+        claimed = 0
+        for member in members:
+            if not await self._call(self.client.zrem, self._expiry_key, member):
+                continue
+            claimed += 1
+            conversation_id, thread_id = member.rsplit("/", 1)
+            if await self._call(self.client.hget, self._threads_key, conversation_id) == thread_id:
+                await self._call(self.client.hdel, self._threads_key, conversation_id)
+            self._evicted(thread_id, reason)
+        return claimed
+
+    async def _call(self, command, *args):
+        try:
+            return await command(*args)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+
+
+def create_conversation_thread_store(config, on_evict=None):
+    """Create the store selected by CONVERSATION_THREAD_STORE."""
+    backend = (config.conversation_thread_store or "memory").strip().lower()
+    options = {
+        "max_entries": config.conversation_thread_max_entries,
+        "ttl_seconds": config.conversation_thread_ttl_seconds,
+        "on_evict": on_evict,
+    }
+    if backend == "memory":
+        return InMemoryThreadStore(**options)
+    if backend == "sqlite":
+        path = config.conversation_thread_store_path or os.path.join(
+            tempfile.gettempdir(), "ckm_conversation_threads.db"
+        )
+        return SqliteThreadStore(path, **options)
+    if backend == "redis":
+        if redis_asyncio is None:
+            raise ValueError("CONVERSATION_THREAD_STORE=redis requires the redis package")
+        if not config.conversation_thread_store_url:
+            raise ValueError("CONVERSATION_THREAD_STORE=redis requires CONVERSATION_THREAD_STORE_URL")
+        client = redis_asyncio.from_url(config.conversation_thread_store_url, decode_responses=True)
+        return RedisThreadStore(client, **options)
+    raise ValueError(f"Unknown CONVERSATION_THREAD_STORE backend: {backend}")
+
+
+def get_conversation_thread_store(on_evict=None):
+    """
+    Get the process-wide conversation thread store, creating it on first use.
+
+    ``on_evict`` is only used when the store is created or has no callback yet.
+    """
+    global _conversation_thread_store
+    if _conversation_thread_store is None:
+        _conversation_thread_store = create_conversation_thread_store(Config(), on_evict)
+    elif _conversation_thread_store.on_evict is None:
+        _conversation_thread_store.on_evict = on_evict
+    return _conversation_thread_store
+
+
+async def close_conversation_thread_store():
+    """Close the process-wide store; a new one is created on next use."""
+    global _conversation_thread_store
+    if _conversation_thread_store is not None:
+        await _conversation_thread_store.close()
+    _conversation_thread_store = None
+
+
+def get_conversation_thread_store_metrics():
+    """Return conversation thread store counters, or an empty dict if the store has not been used yet."""
+    if _conversation_thread_store is None:
+        return {}
+    return _conversation_thread_store.get_metrics()
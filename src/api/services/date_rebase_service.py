@@ -0,0 +1,78 @@
+"""
+Background job that keeps the sample call data aligned with the current date.
+
+The dashboard filters ("Last 7 days", ...) are relative to today, so the stored call
+dates are shifted forward once per day. This used to happen on every /fetchFilterData
+request; it now runs on a schedule so that read endpoints never take write locks.
+"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+
+from common.database.sqldb_service import adjust_processed_data_dates
+from services.chart_cache import invalidate_chart_cache
+
+logger = logging.getLogger(__name__)
+
+
+class DateRebaseService:
+    """
+    Runs adjust_processed_data_dates() at startup and then shortly after every midnight.
+
+    The job is idempotent: the database watermark makes repeat runs on the same day a
+    cheap no-op, so every worker can run its own copy of the schedule.
+    """
+
+    def __init__(self, max_jitter_seconds=300, retry_seconds=600):
+        self.max_jitter_seconds = max_jitter_seconds
+        self.retry_seconds = retry_seconds
+        self._task = None
+        self.last_run_at = None
+        self.last_error = None
+
+    def start(self):
+        """Start the background schedule if it is not already running."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self):
+        """Cancel the background schedule and wait for it to finish."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self):
+        """Run the rebase once, returning True if any dates were shifted."""
+        try:
+            shifted = await adjust_processed_data_dates()
+            self.last_run_at = datetime.now()
+            self.last_error = None
+            if shifted:
+                invalidate_chart_cache()
+                logger.info("Processed data dates rebased to the current date")
+            return shifted
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error("Date rebase failed: %s", e, exc_info=True)
+            raise
+
+    def seconds_until_next_run(self, now=None):
+        """Seconds until just after the next local midnight, with jitter to spread workers out."""
+        now = now or datetime.now()
+        next_midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+        return (next_midnight - now).total_seconds() + random.uniform(0, self.max_jitter_seconds)
+
+    async def _run_forever(self):
+        while True:
+            try:
+                await self.run_once()
+                delay = self.seconds_until_next_run()
+            except Exception:
+                delay = self.retry_seconds
+            await asyncio.sleep(delay)
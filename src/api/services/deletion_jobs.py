@@ -0,0 +1,151 @@
+"""
+Background deletion of very large conversations.
+
+Deleting thousands of messages can outlast the request timeout, so HistoryService hands those
+deletions to this registry and answers with a job id straight away. The client polls
+/history/delete_status/{job_id} until the job has completed or failed.
+
+Job progress is stored as a ``deletion_job`` document in the conversations container, in the
+user's partition, so any worker or replica can answer the status request. The worker running a
+job saves its progress every PROGRESS_SAVE_SECONDS; a running job that has not been saved for
+STALE_JOB_SECONDS belonged to a worker that stopped, and is reported as interrupted. Deleting
+the conversation again resumes from the messages that are left. Finished jobs are removed
+FINISHED_JOB_TTL_SECONDS after they end, when the user starts another job.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_SAVE_SECONDS = 2
+STALE_JOB_SECONDS = 120
+FINISHED_JOB_TTL_SECONDS = 3600
+
+INTERNAL_ERROR = "An internal error has occurred!"
+INTERRUPTED_ERROR = "The deletion was interrupted; delete the conversation again to finish it."
+
+
+def _public(job):
+    """The fields of a job document returned to the client."""
+    return {
+        "job_id": job["id"],
+        "conversation_id": job["conversationId"],
+        "status": job["status"],
+        "total": job["total"],
+        "deleted": job["deleted"],
+        "error": job["error"],
+    }
+
+
+class DeletionJobs:
+    """
+    Runs deletions in the background and persists their progress per user.
+
+    Args:
+        get_store: Callable returning the CosmosConversationClient the jobs are stored with.
+    """
+
+    def __init__(self, get_store):
+        self._get_store = get_store
+        self._tasks = set()
+
+    async def submit(self, user_id, conversation_id, total, delete):
+        """
+        Start a background deletion.
+
+        Args:
+            user_id (str): The user the job belongs to; only they can read its status.
+            conversation_id (str): The conversation being deleted.
+            total (int): Number of items to delete, reported with the progress.
+            delete: Coroutine function ``delete(progress)`` doing the deletion and calling
+                ``progress(deleted)`` as items are deleted.
+
+        Returns:
+            dict: The initial status of the job.
+        """
+        store = self._get_store()
+        now = datetime.utcnow()
+        try:
+            await store.delete_deletion_jobs(user_id, (now - timedelta(seconds=FINISHED_JOB_TTL_SECONDS)).isoformat())
+        except Exception:
+            logger.warning("Could not remove finished deletion jobs of user %s", user_id, exc_info=True)
+
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": "deletion_job",
+            "userId": user_id,
+            "conversationId": conversation_id,
+            "status": "running",
+            "total": total,
+            "deleted": 0,
+            "error": None,
+            "createdAt": now.isoformat(),
+            "updatedAt": now.isoformat(),
+        }
+        await store.upsert_deletion_job(job)
+        task = asyncio.create_task(self._run(store, job, delete))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return _public(job)
+
+    async def get(self, user_id, job_id):
+        """Return the status of one of the user's jobs, or None if there is no such job."""
+        store = self._get_store()
+        job = await store.get_deletion_job(user_id, job_id) if store else None
+        if job is None:
+            return None
+        if job["status"] == "running":
+            saved_for = datetime.utcnow() - datetime.fromisoformat(job["updatedAt"])
+            if saved_for > timedelta(seconds=STALE_JOB_SECONDS):
+                job = {**job, "status": "failed", "error": INTERRUPTED_ERROR}
+        return _public(job)
+
+    async def drain(self, timeout):
+        """Wait up to ``timeout`` seconds for running jobs, then cancel the rest."""
+        if not self._tasks:
+            return
+        tasks = list(self._tasks)
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            logger.warning("Cancelled %d deletion jobs still running", len(pending))
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _run(self, store, job, delete):
+        def progress(deleted):
+            job["deleted"] = deleted
+
+        saver = asyncio.create_task(self._save_periodically(store, job))
+        try:
+            await delete(progress)
+            job["status"] = "completed"
+        except asyncio.CancelledError:
+            job["status"] = "failed"
+            job["error"] = INTERRUPTED_ERROR
+            raise
+        except Exception:
+            logger.exception("Deletion job %s for conversation %s failed", job["id"], job["conversationId"])
+            job["status"] = "failed"
+            job["error"] = INTERNAL_ERROR
+        finally:
+            saver.cancel()
+            await asyncio.gather(saver, return_exceptions=True)
+            await asyncio.shield(self._save(store, job))
+
+    async def _save_periodically(self, store, job):
+        # Also a heartbeat: status requests treat jobs that stop being saved as interrupted
+        while True:
+            await asyncio.sleep(PROGRESS_SAVE_SECONDS)
+            await self._save(store, job)
+
+    @staticmethod
+    async def _save(store, job):
+        job["updatedAt"] = datetime.utcnow().isoformat()
+        try:
+            await store.upsert_deletion_job(dict(job))
+        except Exception:
+            logger.warning("Could not save the progress of deletion job %s", job["id"], exc_info=True)
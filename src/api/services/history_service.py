@@ -1,18 +1,34 @@
+import json
 import logging
 import uuid
 from typing import Optional
 from fastapi import HTTPException, status
-from openai import AsyncAzureOpenAI
+from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+import httpx
 from helpers.azure_credential_utils import get_azure_credential
 from common.config.config import Config
 from common.database.cosmosdb_service import CosmosConversationClient
 from azure.identity.aio import get_bearer_token_provider
 from helpers.chat_helper import complete_chat_request
+from services.deletion_jobs import DeletionJobs
+from services.title_generation_queue import TitleGenerationQueue
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Seconds left to queued title generation when the app shuts down
+TITLE_GENERATION_DRAIN_SECONDS = 5
+
+# Seconds left to running deletion jobs when the app shuts down
+DELETION_JOBS_DRAIN_SECONDS = 10
+
+
+def provisional_title(conversation_messages):
+    """Title a conversation carries until its generated title is stored: the last user message."""
+    user_messages = [msg["content"] for msg in conversation_messages if msg["role"] == "user"]
+    return user_messages[-1] if user_messages else ""
+
 
 class HistoryService:
     def __init__(self):
@@ -35,26 +51,55 @@ class HistoryService:
         self.azure_openai_deployment_name = config.azure_openai_deployment_model
         self.azure_openai_resource = config.azure_openai_resource
 
+        # Clients are created once and shared by every request this worker serves
+        self.cosmosdb_connection_limit = config.azure_cosmosdb_connection_limit
+        self.azure_openai_max_connections = config.azure_openai_max_connections
+        self.cosmosdb_delete_max_concurrency = config.azure_cosmosdb_delete_max_concurrency
+        self._cosmos_conversation_client = None
+        self._openai_client = None
+
+        # Titles are generated off the request path and patched into the conversation afterwards
+        self.title_queue = TitleGenerationQueue(
+            self.generate_titles,
+            self._apply_title,
+            max_concurrency=config.title_generation_max_concurrency,
+            batch_size=config.title_generation_batch_size,
+            batch_wait=config.title_generation_batch_wait_ms / 1000,
+        )
+
+        # Conversations with more messages than this are deleted by a background job
+        self.delete_background_threshold = config.azure_cosmosdb_delete_background_threshold
+        self.deletion_jobs = DeletionJobs(lambda: self.init_cosmosdb_client())
+
     def init_cosmosdb_client(self):
         if not self.chat_history_enabled:
             logger.debug("CosmosDB is not enabled in configuration")
             return None
 
+        if self._cosmos_conversation_client is not None:
+            return self._cosmos_conversation_client
+
         try:
             cosmos_endpoint = f"https://{self.azure_cosmosdb_account}.documents.azure.com:443/"
             credentials = get_azure_credential()
-            return CosmosConversationClient(
+            self._cosmos_conversation_client = CosmosConversationClient(
                 cosmosdb_endpoint=cosmos_endpoint,
-                credential= credentials,
+                credential=credentials,
                 database_name=self.azure_cosmosdb_database,
                 container_name=self.azure_cosmosdb_conversations_container,
                 enable_message_feedback=self.azure_cosmosdb_enable_feedback,
+                connection_limit=self.cosmosdb_connection_limit,
+                delete_concurrency=self.cosmosdb_delete_max_concurrency,
             )
+            return self._cosmos_conversation_client
         except Exception:
             logger.exception("Failed to initialize CosmosDB client")
             raise
 
     def init_openai_client(self):
+        if self._openai_client is not None:
+            return self._openai_client
+
         user_agent = "GitHubSampleWebApp/AsyncAzureOpenAI/1.0.0"
 
         try:
@@ -73,16 +118,49 @@ class HistoryService:
             if not self.azure_openai_deployment_name:
                 raise ValueError("AZURE_OPENAI_MODEL is required")
 
-            return AsyncAzureOpenAI(
+            self._openai_client = AsyncAzureOpenAI(
                 api_version=self.azure_openai_api_version,
                 azure_ad_token_provider=ad_token_provider,
                 default_headers={"x-ms-useragent": user_agent},
                 azure_endpoint=endpoint,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=self.azure_openai_max_connections,
+                        max_keepalive_connections=self.azure_openai_max_connections,
+                    )
+                ),
             )
+            return self._openai_client
         except Exception:
             logger.exception("Failed to initialize Azure OpenAI client")
             raise
 
+    async def warm_up(self):
+        """
+        Create the shared clients and open the Cosmos DB connection at startup, so that the first
+        /history request does not pay for the TLS handshake and the database and container lookups.
+        """
+        if not self.chat_history_enabled:
+            return
+        try:
+            success, err = await self.init_cosmosdb_client().ensure()
+            if not success:
+                logger.warning("CosmosDB warm-up failed: %s", err)
+            self.init_openai_client()
+        except Exception:
+            logger.exception("Failed to warm up chat history clients")
+
+    async def close(self):
+        """Finish queued title generation and deletions, then close the shared Cosmos DB and Azure OpenAI clients."""
+        await self.title_queue.drain(TITLE_GENERATION_DRAIN_SECONDS)
+        await self.deletion_jobs.drain(DELETION_JOBS_DRAIN_SECONDS)
+        cosmos_conversation_client, self._cosmos_conversation_client = self._cosmos_conversation_client, None
+        openai_client, self._openai_client = self._openai_client, None
+        if cosmos_conversation_client is not None:
+            await cosmos_conversation_client.close()
+        if openai_client is not None:
+            await openai_client.close()
+
     async def generate_title(self, conversation_messages):
         title_prompt = (
             "Summarize the conversation so far into a 4-word or less title. "
@@ -107,6 +185,51 @@ class HistoryService:
             logger.error("Error generating title")
             return messages[-2]["content"]
 
+    async def generate_titles(self, conversations):
+        """
+        Generate titles for several conversations with a single chat completion.
+
+        Falls back to one generate_title call per conversation when there is only one
+        conversation or the batched answer cannot be matched to the conversations.
+        """
+        if len(conversations) > 1:
+            numbered = "\n\n".join(
+                f"Conversation {index}:\n" + "\n".join(
+                    msg["content"] for msg in conversation_messages if msg["role"] == "user"
+                )
+                for index, conversation_messages in enumerate(conversations, start=1)
+            )
+            title_prompt = (
+                "Summarize each of the conversations below into a 4-word or less title. "
+                "Do not use any quotation marks or punctuation in the titles. "
+                f"Return only a JSON array of {len(conversations)} strings, one title per conversation, in order."
+            )
+            try:
+                azure_openai_client = self.init_openai_client()
+                response = await azure_openai_client.chat.completions.create(
+                    model=self.azure_openai_deployment_name,
+                    messages=[{"role": "user", "content": f"{numbered}\n\n{title_prompt}"}],
+                    temperature=1,
+                    max_tokens=32 * len(conversations),
+                )
+                content = response.choices[0].message.content.replace("```json", "").replace("```", "").strip()
+                titles = json.loads(content)
+                if (isinstance(titles, list) and len(titles) == len(conversations)
+                        and all(isinstance(title, str) for title in titles)):
+                    return titles
+                logger.warning("Batched title generation returned %d titles for %d conversations",
+                               len(titles) if isinstance(titles, list) else 0, len(conversations))
+            except Exception:
+                logger.warning("Batched title generation failed, titling conversations one by one", exc_info=True)
+
+        return [await self.generate_title(conversation_messages) for conversation_messages in conversations]
+
+    async def _apply_title(self, pending, title):
+        cosmos_conversation_client = self.init_cosmosdb_client()
+        return await cosmos_conversation_client.update_conversation_title(
+            pending.user_id, pending.conversation_id, title, expected_title=pending.provisional_title
+        )
+
     async def add_conversation(self, user_id: str, request_json: dict):
         try:
             conversation_id = request_json.get("conversation_id")
@@ -120,9 +243,12 @@ class HistoryService:
                 raise ValueError("CosmosDB is not configured or unavailable")
 
             if not conversation_id:
-                title = await self.generate_title(messages)
-                conversation_dict = await cosmos_conversation_client.create_conversation(user_id, title)
+                title = provisional_title(messages)
+                conversation_dict = await cosmos_conversation_client.create_conversation(
+                    user_id, conversation_id=str(uuid.uuid4()), title=title
+                )
                 conversation_id = conversation_dict["id"]
+                self.title_queue.enqueue(user_id, conversation_id, messages, title)
                 history_metadata["title"] = title
                 history_metadata["date"] = conversation_dict["createdAt"]
 
@@ -151,11 +277,12 @@ class HistoryService:
         # Retrieve or create conversation
         conversation = await cosmos_conversation_client.get_conversation(user_id, conversation_id)
         if not conversation:
-            title = await self.generate_title(messages)
+            title = provisional_title(messages)
             conversation = await cosmos_conversation_client.create_conversation(
                 user_id=user_id, conversation_id=conversation_id, title=title
             )
             conversation_id = conversation["id"]
+            self.title_queue.enqueue(user_id, conversation_id, messages, title)
 
         # Format the incoming message object in the "chat/completions" messages format then write it to the
         # conversation history in cosmos
@@ -204,11 +331,9 @@ class HistoryService:
                 input_message=messages[-1],
             )
         else:
-            await cosmos_conversation_client.cosmosdb_client.close()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="No assistant message found")
-        await cosmos_conversation_client.cosmosdb_client.close()
         return {
             "id": conversation["id"],
             "title": conversation["title"],
@@ -264,8 +389,12 @@ class HistoryService:
             user_id (str): The ID of the authenticated user.
             conversation_id (str): The ID of the conversation to delete.
 
+        Conversations with more than ``delete_background_threshold`` messages are deleted by a
+        background job, whose status can be read with get_deletion_status.
+
         Returns:
-            bool: True if the conversation was deleted successfully, False otherwise.
+            bool or dict: True if the conversation was deleted successfully, False otherwise, or
+            the status of the background job deleting it.
         """
         try:
             cosmos_conversation_client = self.init_cosmosdb_client()
@@ -282,11 +411,21 @@ class HistoryService:
                     f"User {user_id} does not have permission to delete {conversation_id}.")
                 return False
 
-            # Delete associated messages first (if applicable)
-            await cosmos_conversation_client.delete_messages(conversation_id, user_id)
+            message_ids = await cosmos_conversation_client.get_message_ids(user_id, conversation_id)
+
+            async def delete(progress=None):
+                # Delete associated messages first (if applicable)
+                await cosmos_conversation_client.delete_messages(
+                    conversation_id, user_id, message_ids=message_ids, progress=progress)
+
+                # Delete the conversation itself
+                await cosmos_conversation_client.delete_conversation(user_id, conversation_id)
+
+            if len(message_ids) > self.delete_background_threshold:
+                logger.info(f"Deleting conversation {conversation_id} in the background.")
+                return await self.deletion_jobs.submit(user_id, conversation_id, len(message_ids) + 1, delete)
 
-            # Delete the conversation itself
-            await cosmos_conversation_client.delete_conversation(user_id, conversation_id)
+            await delete()
 
             logger.info(f"Successfully deleted conversation {conversation_id}.")
             return True
@@ -295,6 +434,15 @@ class HistoryService:
             logger.exception(f"Error deleting conversation {conversation_id}: {e}")
             return False
 
+    async def get_deletion_status(self, user_id: str, job_id: str):
+        """
+        Returns the status of one of the user's background deletion jobs.
+
+        Returns:
+            dict: The job status, or None if the job does not exist or belongs to another user.
+        """
+        return await self.deletion_jobs.get(user_id, job_id)
+
     async def get_conversations(self, user_id: str, offset: int, limit: int):
         """
         Retrieves a list of conversations for a given user.
@@ -317,6 +465,36 @@ class HistoryService:
             logger.exception(f"Error retrieving conversations for user {user_id}")
             return []
 
+    async def get_conversations_page(self, user_id: str, limit: int, continuation_token: str = None):
+        """
+        Retrieves one page of a user's conversations, resuming from a continuation token.
+
+        Args:
+            user_id (str): The ID of the authenticated user.
+            limit (int): Maximum number of conversations on the page.
+            continuation_token (str, optional): Token returned with the previous page.
+
+        Returns:
+            tuple: The conversations on the page, and the token of the next page or None.
+
+        Raises:
+            ValueError: If the continuation token is malformed.
+        """
+        try:
+            cosmos_conversation_client = self.init_cosmosdb_client()
+            if not cosmos_conversation_client:
+                raise RuntimeError("CosmosDB is not configured or unavailable")
+
+            conversations, next_token = await cosmos_conversation_client.get_conversations_page(
+                user_id, limit, continuation_token=continuation_token)
+
+            return conversations or [], next_token
+        except ValueError:
+            raise
+        except Exception:
+            logger.exception(f"Error retrieving conversations for user {user_id}")
+            return [], None
+
     async def get_messages(self, user_id: str, conversation_id: str):
         """
         Retrieves all messages for a given conversation ID if the user has access.
@@ -400,8 +578,12 @@ class HistoryService:
             user_id (str): The ID of the authenticated user.
             conversation_id (str): The ID of the conversation.
 
+        Like delete_conversation, hands conversations with more than ``delete_background_threshold``
+        messages to a background job.
+
         Returns:
-            bool: True if messages were cleared successfully, False otherwise.
+            bool or dict: True if messages were cleared successfully, False otherwise, or the
+            status of the background job clearing them.
         """
         try:
             cosmos_conversation_client = self.init_cosmosdb_client()
@@ -420,7 +602,14 @@ class HistoryService:
                 return False
 
             # Delete all messages associated with the conversation
-            await cosmos_conversation_client.delete_messages(conversation_id, user_id)
+            message_ids = await cosmos_conversation_client.get_message_ids(user_id, conversation_id)
+            if len(message_ids) > self.delete_background_threshold:
+                logger.info(f"Clearing messages of conversation {conversation_id} in the background.")
+                return await self.deletion_jobs.submit(
+                    user_id, conversation_id, len(message_ids),
+                    lambda progress: cosmos_conversation_client.delete_messages(
+                        conversation_id, user_id, message_ids=message_ids, progress=progress))
+            await cosmos_conversation_client.delete_messages(conversation_id, user_id, message_ids=message_ids)
 
             logger.info(
                 f"Successfully cleared messages in conversation {conversation_id}.")
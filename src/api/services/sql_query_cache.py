@@ -0,0 +1,292 @@
+"""
+Cache of SQL generated by the SQL agent for natural-language questions.
+
+Operators repeat the same quantitative questions, and every time the SQL agent spends a full
+LLM run to write the same T-SQL. Generated SQL that executed successfully is cached per
+normalized question and reused for the same question. Reuse for merely similar questions is
+opt-in (SQL_QUERY_CACHE_SIMILARITY_THRESHOLD > 0 and an embedding deployment): a lookup then
+falls back to the most similar cached question in a small in-process vector index, as long as
+both questions agree on every number, time window, negation and comparison term, since
+embeddings barely separate "calls last week" from "calls last month". Entries expire after a
+TTL, the least recently used go first when the cache is full, and everything is dropped when
+the columns of the queried tables change.
+
+Only the SQL is cached, never its result, so answers always reflect the current data.
+"""
+
+import asyncio
+import logging
+import math
+import re
+import time
+from operator import mul
+
+from cachetools import TTLCache
+
+from common.config.config import Config
+from common.database.sqldb_service import fetch_schema_version
+from helpers.azure_openai_helper import get_azure_openai_async_client
+
+logger = logging.getLogger(__name__)
+
+_sql_query_cache = None
+
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+_WORD_PATTERN = re.compile(r"[a-z]+(?:'t)?")
+
+# Words that change which rows or which aggregate a question asks for. Similar questions
+# must use exactly the same ones to share SQL.
+_TIME_TERMS = frozenset("""
+    today yesterday tomorrow tonight now day days daily week weeks weekly weekend month months
+    monthly quarter quarters quarterly year years yearly annual annually hour hours hourly
+    minute minutes morning afternoon evening night last past previous prior this next current
+    recent recently latest ago since before after until during ytd mtd qtd
+    january february march april may june july august september october november december
+    monday tuesday wednesday thursday friday saturday sunday
+""".split())
+_NEGATION_TERMS = frozenset("""
+    not no never none nothing nobody without except excluding exclude excluded non nor neither
+""".split())
+_COMPARISON_TERMS = frozenset("""
+    more most less least fewer fewest greater greatest higher highest lower lowest top bottom
+    maximum minimum above below over under between exceeding than best worst increase increased
+    decrease decreased average median total sum count first ascending descending largest
+    smallest biggest longest shortest
+""".split())
+_GUARD_TERMS = _TIME_TERMS | _NEGATION_TERMS | _COMPARISON_TERMS
+_TERM_ALIASES = {"avg": "average", "max": "maximum", "min": "minimum"}
+_NEGATING_PREFIXES = ("un", "dis", "non", "in", "im", "ir", "il")
+
+
+def normalize_question(question):
+    """Lower-case the question, collapse whitespace and drop surrounding punctuation."""
+    return " ".join((question or "").lower().split()).strip(" ?!.")
+
+
+def _words(question):
+    words = set()
+    for word in _WORD_PATTERN.findall(question):
+        if word.endswith("n't"):
+            word = "not"
+        words.add(_TERM_ALIASES.get(word, word))
+    return frozenset(words)
+
+
+def _guard_terms(question, words):
+    """Numbers and guard words of a question, which similar questions must share."""
+    return tuple(_NUMBER_PATTERN.findall(question)), words & _GUARD_TERMS
+
+
+def _negates(words, other_words):
+    """True if a word of ``words`` is the negated form of one in ``other_words`` ("unsatisfied"/"satisfied")."""
+    return any(
+        word[len(prefix):] in other_words
+        for word in words
+        for prefix in _NEGATING_PREFIXES
+        if word.startswith(prefix) and len(word) - len(prefix) >= 4
+    )
+
+
+def _unit_vector(vector):
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else None
+
+
+class _CachedQuery:
+    __slots__ = ("sql", "vector", "words", "guards")
+
+    def __init__(self, sql, vector, words, guards):
+        self.sql = sql
+        self.vector = vector
+        self.words = words
+        self.guards = guards
+
+
+class SqlQueryCache:
+    """
+    TTL and LRU bounded cache from normalized questions to generated SQL.
+
+    Args:
+        ttl_seconds (float): How long generated SQL is reused.
+        max_entries (int): Maximum number of cached questions; least recently used go first.
+        similarity_threshold (float): Minimum cosine similarity between question embeddings for
+            a similarity hit. 0, the default, only reuses SQL for the same normalized question.
+            Questions that differ in numbers, time windows, negations or comparisons never
+            match, so "top 5 topics" does not reuse the SQL for "top 10 topics", nor "satisfied
+            customers" the SQL for "unsatisfied customers".
+        schema_check_seconds (float): How often the schema checksum is re-read. 0 disables the check.
+        embedder: Coroutine function returning the embedding of a text, or None for exact
+            matching only.
+        schema_loader: Coroutine function returning the current schema checksum.
+    """
+
+    def __init__(self, ttl_seconds=86400, max_entries=256, similarity_threshold=0,
+                 schema_check_seconds=300, embedder=None, schema_loader=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.schema_check_seconds = schema_check_seconds
+        self._embedder = embedder
+        self._schema_loader = schema_loader
+        self._entries = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        # Embeddings computed by a missed lookup, reused when the generated SQL is stored.
+        self._pending_vectors = TTLCache(maxsize=64, ttl=600)
+        self._schema_version = None
+        self._schema_checked_at = None
+        self._schema_task = None
+        self.stats = {
+            "exact_hits": 0,
+            "similar_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "discards": 0,
+            "embedding_errors": 0,
+            "invalidations": 0,
+        }
+
+    def get_stats(self):
+        """Return a snapshot of the hit/miss counters and current occupancy."""
+        hits = self.stats["exact_hits"] + self.stats["similar_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_enabled": self._similarity_enabled(),
+        }
+
+    def invalidate(self):
+        """Drop all cached SQL."""
+        self._entries.clear()
+        self._pending_vectors.clear()
+        self.stats["invalidations"] += 1
+
+    async def lookup(self, question):
+        """Return cached SQL for the question, or None if it has to be generated."""
+        await self._check_schema_version()
+
+        key = normalize_question(question)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.stats["exact_hits"] += 1
+            return entry.sql
+
+        if self._similarity_enabled() and len(self._entries):
+            vector = await self._embed(key)
+            if vector is not None:
+                self._pending_vectors[key] = vector
+                match = self._most_similar(vector, _words(key), key)
+                if match is not None:
+                    self.stats["similar_hits"] += 1
+                    return self._entries[match].sql
+
+        self.stats["misses"] += 1
+        return None
+
+    async def store(self, question, sql):
+        """Cache SQL that was generated for the question and executed successfully."""
+        key = normalize_question(question)
+        if not key or not sql:
+            return
+        vector = self._pending_vectors.pop(key, None)
+        if vector is None and self._similarity_enabled():
+            vector = await self._embed(key)
+        words = _words(key)
+        self._entries[key] = _CachedQuery(sql, vector, words, _guard_terms(key, words))
+        self.stats["stores"] += 1
+
+    def discard(self, question):
+        """Drop the SQL cached for the question, e.g. because it no longer executes."""
+        if self._entries.pop(normalize_question(question), None) is not None:
+            self.stats["discards"] += 1
+
+    def _similarity_enabled(self):
+        return self._embedder is not None and self.similarity_threshold > 0
+
+    async def _embed(self, text):
+        try:
+            return _unit_vector(await self._embedder(text))
+        except Exception as e:
+            self.stats["embedding_errors"] += 1
+            logger.warning("Could not embed question for the SQL cache: %s", e)
+            return None
+
+    def _most_similar(self, vector, words, question):
+        self._entries.expire()
+        guards = _guard_terms(question, words)
+        best_key, best_score = None, self.similarity_threshold
+        for key, entry in self._entries.items():
+            if entry.vector is None or entry.guards != guards:
+                continue
+            if _negates(words, entry.words) or _negates(entry.words, words):
+                continue
+            # Both vectors are unit length, so the dot product is the cosine similarity.
+            score = sum(map(mul, vector, entry.vector))
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    async def _check_schema_version(self):
+        if self._schema_loader is None or not self.schema_check_seconds:
+            return
+        now = time.monotonic()
+        if self._schema_checked_at is not None and now - self._schema_checked_at < self.schema_check_seconds:
+            return
+        if self._schema_task is None:
+            self._schema_task = asyncio.create_task(self._refresh_schema_version())
+        await asyncio.shield(self._schema_task)
+
+    async def _refresh_schema_version(self):
+        try:
+            version = await self._schema_loader()
+            if self._schema_version is not None and version != self._schema_version:
+                logger.info("SQL agent tables changed, clearing cached SQL")
+                self.invalidate()
+            self._schema_version = version
+        except Exception as e:
+            # Keep serving cached SQL; a query that no longer executes is discarded on use.
+            logger.warning("Failed to read the SQL agent schema version: %s", e)
+        finally:
+            self._schema_checked_at = time.monotonic()
+            self._schema_task = None
+
+
+def _question_embedder(deployment):
+    client = None
+
+    async def embed(text):
+        nonlocal client
+        if client is None:
+            client = await get_azure_openai_async_client()
+        response = await client.embeddings.create(model=deployment, input=text)
+        return response.data[0].embedding
+
+    return embed
+
+
+def get_sql_query_cache():
+    """Get the process-wide generated SQL cache, creating it on first use."""
+    global _sql_query_cache
+    if _sql_query_cache is None:
+        config = Config()
+        embedder = None
+        if config.azure_openai_embedding_model and config.sql_query_cache_similarity_threshold > 0:
+            embedder = _question_embedder(config.azure_openai_embedding_model)
+        _sql_query_cache = SqlQueryCache(
+            ttl_seconds=config.sql_query_cache_ttl_seconds,
+            max_entries=config.sql_query_cache_max_entries,
+            similarity_threshold=config.sql_query_cache_similarity_threshold,
+            schema_check_seconds=config.sql_query_cache_schema_check_seconds,
+            embedder=embedder,
+            schema_loader=fetch_schema_version,
+        )
+    return _sql_query_cache
+
+
+def get_sql_query_cache_stats():
+    """Return generated SQL cache counters, or an empty dict if the cache has not been used yet."""
+    if _sql_query_cache is None:
+        return {}
+    return _sql_query_cache.get_stats()
@@ -0,0 +1,384 @@
+"""
+Background deletion of agent threads that conversations no longer use.
+
+Threads evicted from the conversation thread store used to be deleted by a task created
+inline from the cache mutation, which failed without a running event loop, flooded the
+agents API when many conversations expired at once and left no trace of failed deletions.
+The reaper queues thread ids instead and deletes them in the background:
+
+- the queue is kept in a SQLite file shared by the workers of a host; each row is leased to
+  the worker that queued or claimed it, so a thread is deleted by one worker at a time
+- threads left by a worker that stopped (its rows are released on drain, or their lease
+  expires if it died) are claimed by the next running worker that renews its lease
+- deletions run with bounded concurrency and a rate limit, and failures are retried with
+  exponential backoff; threads that already disappeared count as deleted
+- threads that still fail after the last attempt are marked failed and claimed again once
+  their backoff, which doubles each time, has passed, until MAX_FAILED_ROUNDS is reached
+- queue file I/O runs in a background thread, never on the event loop
+- on shutdown the queue is drained until it is empty or a deadline passes
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+
+from azure.core.exceptions import ResourceNotFoundError
+
+from common.config.config import Config
+
+logger = logging.getLogger(__name__)
+
+_thread_reaper = None
+
+# Seconds a worker holds the rows it queued or claimed without renewing its lease
+LEASE_SECONDS = 300
+
+# Seconds between lease renewals, which also pick up failed and abandoned threads that are due
+RECLAIM_SECONDS = 60
+
+# Failed threads are given up for good after this many rounds of attempts
+MAX_FAILED_ROUNDS = 5
+
+
+class ThreadReaper:
+    """
+    Rate-limited, retrying deletion queue for agent threads.
+
+    Args:
+        queue_path (str): SQLite file holding the queue, or None to keep it in memory only.
+        max_concurrency (int): Deletions running at once.
+        rate_per_second (float): Maximum deletion attempts started per second. 0 disables the limit.
+        max_attempts (int): Attempts per thread before it is recorded as failed.
+        retry_base_seconds (float): Delay before the first retry; doubled for each further one.
+        failed_retry_seconds (float): Delay before a thread marked failed is claimed again;
+            doubled for each further failed round.
+    """
+
+    def __init__(self, queue_path=None, max_concurrency=4, rate_per_second=10.0, max_attempts=5,
+                 retry_base_seconds=1.0, failed_retry_seconds=300.0):
+        self.queue_path = queue_path
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_per_second = rate_per_second
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_seconds = retry_base_seconds
+        self.failed_retry_seconds = failed_retry_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._unsaved = deque()
+        self._pending = deque()
+        self._queued = set()
+        self._in_flight = 0
+        self._delete_thread = None
+        self._workers = []
+        self._wakeup = None
+        self._save_wakeup = None
+        self._idle = None
+        self._next_attempt_at = 0.0
+        self._db = None
+        self._lock = threading.Lock()
+        self.metrics = {
+            "enqueued": 0,
+            "deleted": 0,
+            "not_found": 0,
+            "retries": 0,
+            "failed": 0,
+        }
+
+    def get_metrics(self):
+        """Return the reaper counters and the current queue depth."""
+        return {
+            **self.metrics,
+            "pending": len(self._unsaved) + len(self._pending),
+            "in_flight": self._in_flight,
+            "running": bool(self._workers),
+        }
+
+    def enqueue(self, thread_id):
+        """
+        Queue a thread for deletion. Safe to call from synchronous code such as cache callbacks,
+        with or without a running event loop; queued threads are saved to the queue file and
+        deleted once the reaper runs.
+        """
+        if not thread_id or thread_id in self._queued:
+            return
+        self._queued.add(thread_id)
+        self._unsaved.append(thread_id)
+        self.metrics["enqueued"] += 1
+        self._notify()
+
+    async def start(self, delete_thread):
+        """
+        Start deleting queued threads with ``delete_thread``, a coroutine function taking a
+        thread id. Threads left in the queue file by an earlier run are queued first.
+        """
+        self._delete_thread = delete_thread
+        if self._workers:
+            return
+        await self._reclaim()
+        self._wakeup = asyncio.Event()
+        self._save_wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._notify()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.max_concurrency)]
+        self._workers.append(asyncio.create_task(self._maintain()))
+
+    async def drain(self, timeout):
+        """
+        Wait up to ``timeout`` seconds for the queue to empty, then stop the workers.
+
+        Threads still queued stay in the queue file and are released for the next worker that starts.
+
+        Returns:
+            int: Number of threads that were not deleted in time.
+        """
+        remaining = len(self._unsaved) + len(self._pending)
+        if self._workers:
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Thread reaper stopped with %d deletions pending",
+                               len(self._unsaved) + len(self._pending) + self._in_flight)
+            remaining = len(self._unsaved) + len(self._pending) + self._in_flight
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            self._workers = []
+        if self.queue_path:
+            unsaved = list(self._unsaved)
+            self._unsaved.clear()
+            try:
+                await self._run(self._release, unsaved)
+            except sqlite3.Error as e:
+                logger.warning("Could not release queued thread deletions: %s", e)
+            await self._run(self._close)
+        return remaining
+
+    async def _run(self, func, *args):
+        # SQLite calls block, so they run in a thread; the lock keeps them off the connection at once
+        return await asyncio.to_thread(self._locked, func, *args)
+
+    def _locked(self, func, *args):
+        with self._lock:
+            return func(*args)
+
+    def _save(self, thread_ids):
+        """Persist newly queued threads and return the ones this worker holds the lease on."""
+        now = time.time()
+        claimed = set()
+        for thread_id in thread_ids:
+            if self._execute(
+                "INSERT INTO pending_thread_deletions (thread_id, enqueued_at, owner, lease_expires_at) "
+                "VALUES (?, ?, ?, ?) ON CONFLICT (thread_id) DO UPDATE SET "
+                "owner = excluded.owner, lease_expires_at = excluded.lease_expires_at "
+                "WHERE owner IS NULL OR owner = excluded.owner OR lease_expires_at < ? "
+                "RETURNING thread_id",
+                (thread_id, now, self.owner, now + LEASE_SECONDS, now),
+            ):
+                claimed.add(thread_id)
+        return claimed
+
+    def _claim(self):
+        """Renew this worker's lease, lease the due unowned or abandoned rows and return the thread ids held."""
+        now = time.time()
+        self._execute("UPDATE pending_thread_deletions SET lease_expires_at = ? WHERE owner = ?",
+                      (now + LEASE_SECONDS, self.owner))
+        self._execute(
+            "UPDATE pending_thread_deletions SET owner = ?, lease_expires_at = ? "
+            "WHERE (owner IS NULL OR lease_expires_at < ?) AND retry_at <= ? AND failed < ?",
+            (self.owner, now + LEASE_SECONDS, now, now, MAX_FAILED_ROUNDS),
+        )
+        return self._execute(
+            "SELECT thread_id FROM pending_thread_deletions WHERE owner = ? AND retry_at <= ? ORDER BY enqueued_at",
+            (self.owner, now),
+        )
+
+    def _release(self, unsaved):
+        now = time.time()
+        self._execute("UPDATE pending_thread_deletions SET owner = NULL WHERE owner = ?", (self.owner,))
+        for thread_id in unsaved:
+            self._execute(
+                "INSERT INTO pending_thread_deletions (thread_id, enqueued_at) VALUES (?, ?) "
+                "ON CONFLICT (thread_id) DO NOTHING",
+                (thread_id, now),
+            )
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def _reclaim(self):
+        if not self.queue_path:
+            return
+        try:
+            rows = await self._run(self._claim)
+        except sqlite3.Error as e:
+            logger.warning("Could not load queued thread deletions: %s", e)
+            return
+        for (thread_id,) in rows:
+            if thread_id not in self._queued:
+                self._queued.add(thread_id)
+                self._pending.append(thread_id)
+        self._notify()
+
+    async def _maintain(self):
+        # Saves newly queued threads and, every RECLAIM_SECONDS, renews the lease and picks up
+        # threads whose failed backoff has passed or whose worker stopped
+        last_reclaim = time.monotonic()
+        while True:
+            timeout = max(0.0, RECLAIM_SECONDS - (time.monotonic() - last_reclaim))
+            try:
+                await asyncio.wait_for(self._save_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._save_wakeup.clear()
+            if self._unsaved:
+                await self._save_unsaved()
+            if time.monotonic() - last_reclaim >= RECLAIM_SECONDS:
+                last_reclaim = time.monotonic()
+                await self._reclaim()
+
+    async def _save_unsaved(self):
+        thread_ids = list(self._unsaved)
+        self._unsaved.clear()
+        claimed = set(thread_ids)
+        if self.queue_path:
+            try:
+                claimed = await self._run(self._save, thread_ids)
+            except sqlite3.Error as e:
+                logger.warning("Could not persist queued deletion of threads %s: %s", thread_ids, e)
+                claimed = set(thread_ids)
+        for thread_id in thread_ids:
+            if thread_id in claimed:
+                self._pending.append(thread_id)
+            else:
+                # Another worker holds the thread and deletes it
+                self._queued.discard(thread_id)
+        self._notify()
+
+    def _notify(self):
+        if self._wakeup is None:
+            return
+        if self._unsaved:
+            self._idle.clear()
+            self._save_wakeup.set()
+        if self._pending:
+            self._idle.clear()
+            self._wakeup.set()
+        elif not self._unsaved and not self._in_flight:
+            self._idle.set()
+
+    async def _work(self):
+        while True:
+            while not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            thread_id = self._pending.popleft()
+            self._in_flight += 1
+            try:
+                await self._delete_with_retries(thread_id)
+            finally:
+                self._in_flight -= 1
+                self._notify()
+
+    async def _delete_with_retries(self, thread_id):
+        for attempt in range(1, self.max_attempts + 1):
+            await self._throttle()
+            try:
+                await self._delete_thread(thread_id)
+                self.metrics["deleted"] += 1
+            except ResourceNotFoundError:
+                self.metrics["not_found"] += 1
+            except Exception as e:
+                if attempt < self.max_attempts:
+                    self.metrics["retries"] += 1
+                    await asyncio.sleep(self.retry_base_seconds * 2 ** (attempt - 1))
+                    continue
+                self.metrics["failed"] += 1
+                logger.error("Giving up deleting thread %s after %d attempts: %s", thread_id, attempt, e)
+                await self._finish(thread_id, error=str(e))
+                return
+            await self._finish(thread_id)
+            return
+
+    async def _throttle(self):
+        if not self.rate_per_second:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start_at = max(now, self._next_attempt_at)
+        self._next_attempt_at = start_at + 1 / self.rate_per_second
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+    async def _finish(self, thread_id, error=None):
+        try:
+            if not self.queue_path:
+                return
+            if error is None:
+                await self._run(self._execute, "DELETE FROM pending_thread_deletions WHERE thread_id = ?", (thread_id,))
+            else:
+                # Released with a backoff, so that a later reclaim tries again
+                await self._run(
+                    self._execute,
+                    "UPDATE pending_thread_deletions SET failed = failed + 1, last_error = ?, owner = NULL, "
+                    "retry_at = ? + ? * (1 << failed) WHERE thread_id = ?",
+                    (error[:1000], time.time(), self.failed_retry_seconds, thread_id),
+                )
+        except sqlite3.Error as e:
+            logger.warning("Could not update queued deletion of thread %s: %s", thread_id, e)
+        finally:
+            self._queued.discard(thread_id)
+
+    def _execute(self, sql, params=()):
+        if not self.queue_path:
+            return []
+        if self._db is None:
+            self._db = sqlite3.connect(self.queue_path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pending_thread_deletions ("
+                "thread_id TEXT PRIMARY KEY, enqueued_at REAL NOT NULL, "
+                "failed INTEGER NOT NULL DEFAULT 0, last_error TEXT, owner TEXT, "
+                "lease_expires_at REAL NOT NULL DEFAULT 0, retry_at REAL NOT NULL DEFAULT 0)"
+            )
+        return self._db.execute(sql, params).fetchall()
+
+
+def get_thread_reaper():
+    """Get the process-wide thread reaper, creating it on first use."""
+    global _thread_reaper
+    if _thread_reaper is None:
+        config = Config()
+        queue_path = config.thread_reaper_queue_path
+        if queue_path is None:
+            queue_path = os.path.join(tempfile.gettempdir(), "ckm_thread_reaper.db")
+        _thread_reaper = ThreadReaper(
+            queue_path=queue_path,
+            max_concurrency=config.thread_reaper_max_concurrency,
+            rate_per_second=config.thread_reaper_rate_per_second,
+            max_attempts=config.thread_reaper_max_attempts,
+        )
+    return _thread_reaper
+
+
+async def drain_thread_reaper(timeout):
+    """Drain and drop the process-wide reaper; see ThreadReaper.drain."""
+    global _thread_reaper
+    if _thread_reaper is None:
+        return 0
+    remaining = await _thread_reaper.drain(timeout)
+    _thread_reaper = None
+    return remaining
+
+
+def get_thread_reaper_metrics():
+    """Return thread reaper counters, or an empty dict if the reaper has not been used yet."""
+    if _thread_reaper is None:
+        return {}
+    return _thread_reaper.get_metrics()
@@ -0,0 +1,121 @@
+"""
+Background generation of conversation titles.
+
+Conversations are created with a provisional title (the user's first question) so that the
+first message does not wait for a chat completion. The queue then generates the real titles
+with bounded concurrency, batching the conversations that are waiting into one prompt where
+possible, and patches each conversation document; the client picks the title up on its next
+/history/list call.
+"""
+
+import asyncio
+import logging
+from typing import NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class PendingTitle(NamedTuple):
+    user_id: str
+    conversation_id: str
+    messages: list
+    provisional_title: str
+
+
+class TitleGenerationQueue:
+    """
+    Generates conversation titles in the background.
+
+    Args:
+        generate_titles: Coroutine function taking a list of conversations' messages and
+            returning one title per conversation, in order.
+        apply_title: Coroutine function ``apply_title(pending, title)`` storing a generated title.
+            Returns False when the conversation was renamed or removed in the meantime.
+        max_concurrency (int): Batches generated at once.
+        batch_size (int): Maximum conversations titled by one prompt.
+        batch_wait (float): Seconds to wait for more conversations before generating a batch.
+    """
+
+    def __init__(self, generate_titles, apply_title, max_concurrency=2, batch_size=8, batch_wait=0.1):
+        self._generate_titles = generate_titles
+        self._apply_title = apply_title
+        self.max_concurrency = max(1, max_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self._queue = None
+        self._workers = []
+        self.metrics = {
+            "enqueued": 0,
+            "batches": 0,
+            "updated": 0,
+            "skipped": 0,
+            "failed": 0,
+        }
+
+    def get_metrics(self):
+        """Return the queue counters and the number of titles waiting."""
+        return {**self.metrics, "pending": self._queue.qsize() if self._queue is not None else 0}
+
+    def enqueue(self, user_id, conversation_id, messages, provisional_title):
+        """Queue a conversation for titling. Must be called from the event loop."""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.max_concurrency)]
+        self._queue.put_nowait(PendingTitle(user_id, conversation_id, messages, provisional_title))
+        self.metrics["enqueued"] += 1
+
+    async def drain(self, timeout):
+        """Wait up to ``timeout`` seconds for queued titles, then stop the workers."""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Stopped title generation with %d titles pending", self._queue.qsize())
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_wait
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._process(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _process(self, batch):
+        self.metrics["batches"] += 1
+        try:
+            titles = await self._generate_titles([pending.messages for pending in batch])
+        except Exception:
+            self.metrics["failed"] += len(batch)
+            logger.exception("Failed to generate %d conversation titles", len(batch))
+            return
+
+        for pending, title in zip(batch, titles):
+            if not title or title == pending.provisional_title:
+                self.metrics["skipped"] += 1
+                continue
+            try:
+                if await self._apply_title(pending, title):
+                    self.metrics["updated"] += 1
+                else:
+                    self.metrics["skipped"] += 1
+            except Exception:
+                self.metrics["failed"] += 1
+                logger.exception("Failed to store the title of conversation %s", pending.conversation_id)
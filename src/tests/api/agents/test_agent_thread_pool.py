@@ -0,0 +1,116 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from agents import agent_thread_pool
+from agents.agent_thread_pool import AgentThreadPool, get_agent_thread_pool_metrics
+
+
+def make_client():
+    client = MagicMock()
+    counter = iter(range(1000))
+    client.agents.threads.create = AsyncMock(side_effect=lambda: SimpleNamespace(id=f"thread-{next(counter)}"))
+    client.agents.threads.delete = AsyncMock()
+    return client
+
+
+async def settle(pool):
+    while pool._background:
+        await asyncio.gather(*pool._background)
+
+
+@pytest.fixture(autouse=True)
+def reset_pools():
+    agent_thread_pool._thread_pools.clear()
+    yield
+    agent_thread_pool._thread_pools.clear()
+
+
+@pytest.mark.asyncio
+async def test_start_prefills_and_registers_pool():
+    client = make_client()
+    pool = AgentThreadPool(client, name="sql", size=3)
+    pool.start()
+    await settle(pool)
+
+    assert client.agents.threads.create.await_count == 3
+    assert get_agent_thread_pool_metrics()["sql"]["idle"] == 3
+
+
+@pytest.mark.asyncio
+async def test_warm_thread_is_used_and_replaced_after_use():
+    client = make_client()
+    pool = AgentThreadPool(client, name="sql", size=1)
+    pool.start()
+    await settle(pool)
+
+    async with pool.thread() as thread_id:
+        assert thread_id == "thread-0"
+        assert client.agents.threads.create.await_count == 1
+        assert pool.get_metrics()["in_use"] == 1
+    await settle(pool)
+
+    client.agents.threads.delete.assert_awaited_once_with(thread_id="thread-0")
+    metrics = pool.get_metrics()
+    assert metrics["hits"] == 1
+    assert metrics["recycled"] == 1
+    assert metrics["idle"] == 1
+    assert metrics["in_use"] == 0
+    assert list(pool._idle) == ["thread-1"]
+
+
+@pytest.mark.asyncio
+async def test_empty_pool_creates_on_demand_and_recycles_up_to_size():
+    client = make_client()
+    pool = AgentThreadPool(client, name="search", size=1)
+
+    async with pool.thread() as first, pool.thread() as second:
+        assert first != second
+    await settle(pool)
+
+    metrics = pool.get_metrics()
+    assert metrics["misses"] == 2
+    assert metrics["recycled"] == 2
+    assert metrics["idle"] == 1
+
+
+@pytest.mark.asyncio
+async def test_thread_is_recycled_when_the_run_fails():
+    client = make_client()
+    pool = AgentThreadPool(client, name="chart", size=0)
+
+    with pytest.raises(RuntimeError):
+        async with pool.thread():
+            raise RuntimeError("run failed")
+    await settle(pool)
+
+    client.agents.threads.delete.assert_awaited_once_with(thread_id="thread-0")
+
+
+@pytest.mark.asyncio
+async def test_create_and_delete_errors_are_counted():
+    client = make_client()
+    client.agents.threads.create = AsyncMock(side_effect=Exception("boom"))
+    client.agents.threads.delete = AsyncMock(side_effect=Exception("boom"))
+    pool = AgentThreadPool(client, name="sql", size=2)
+    pool.start()
+    await settle(pool)
+
+    assert pool.get_metrics()["create_errors"] == 2
+    await pool._delete("thread-x")
+    assert pool.get_metrics()["delete_errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_close_deletes_idle_threads_and_unregisters():
+    client = make_client()
+    pool = AgentThreadPool(client, name="sql", size=2)
+    pool.start()
+
+    await pool.close()
+
+    assert client.agents.threads.delete.await_count == 2
+    assert pool.get_metrics()["idle"] == 0
+    assert get_agent_thread_pool_metrics() == {}
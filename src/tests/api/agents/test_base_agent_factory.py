@@ -3,7 +3,12 @@ import asyncio
 from unittest.mock import AsyncMock, patch, MagicMock
 
 from common.config.config import Config
-from agents.agent_factory_base import BaseAgentFactory
+from agents.agent_factory_base import (
+    DEFINITION_HASH_KEY,
+    BaseAgentFactory,
+    agent_definition_hash,
+    get_agent_startup_metrics,
+)
 
 
 class MockAgentFactory(BaseAgentFactory):
@@ -26,6 +31,7 @@ def reset_factory_state():
     MockAgentFactory._agent = None
     MockAgentFactory._created = False
     MockAgentFactory._deleted = False
+    MockAgentFactory._owns_agent = True
     yield
     MockAgentFactory._agent = None
 
@@ -88,3 +94,151 @@ async def test_thread_safety_of_get_agent(monkeypatch):
     # All should return the same instance
     assert all(result == {"agent": "thread-safe"} for result in results)
     assert call_count == 1  # Only one creation
+
+
+class OtherAgentFactory(BaseAgentFactory):
+    """Second factory, to check that factories do not share a lock."""
+
+    @classmethod
+    async def create_agent(cls, config: Config):
+        await asyncio.sleep(0.1)
+        return {"agent": "other-agent"}
+
+    @classmethod
+    async def _delete_agent_instance(cls, agent: object):
+        pass
+
+
+class AsyncIterator:
+    def __init__(self, items):
+        self.items = iter(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.items)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def make_remote_agent(name, definition_hash):
+    agent = MagicMock()
+    agent.name = name
+    agent.metadata = {DEFINITION_HASH_KEY: definition_hash}
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_factories_provision_concurrently(monkeypatch):
+    async def slow_create_agent(config):
+        await asyncio.sleep(0.1)
+        return {"agent": "mock-agent"}
+
+    monkeypatch.setattr(MockAgentFactory, "create_agent", slow_create_agent)
+    OtherAgentFactory._agent = None
+    assert MockAgentFactory._lock is not OtherAgentFactory._lock
+
+    started = asyncio.get_running_loop().time()
+    await asyncio.gather(MockAgentFactory.get_agent(), OtherAgentFactory.get_agent())
+
+    assert asyncio.get_running_loop().time() - started < 0.19
+    metrics = get_agent_startup_metrics()
+    assert metrics["OtherAgentFactory"]["seconds"] >= 0.1
+    assert metrics["OtherAgentFactory"]["reused"] is False
+
+
+@pytest.mark.asyncio
+async def test_provision_agent_reuses_agent_with_same_definition():
+    definition = {"model": "gpt-4o", "name": "KM-Agent", "instructions": "Be helpful."}
+    stale = make_remote_agent("KM-Agent", agent_definition_hash({**definition, "instructions": "Old."}))
+    current = make_remote_agent("KM-Agent", agent_definition_hash(definition))
+    agents_client = MagicMock()
+    agents_client.list_agents.return_value = AsyncIterator([stale, current])
+    agents_client.create_agent = AsyncMock()
+    config = MagicMock(agent_reuse_enabled=True)
+
+    agent = await MockAgentFactory._provision_agent(agents_client, config, **definition)
+
+    assert agent is current
+    agents_client.create_agent.assert_not_awaited()
+    assert MockAgentFactory._owns_agent is False
+
+
+@pytest.mark.asyncio
+async def test_provision_agent_creates_tagged_agent_when_none_matches():
+    definition = {"model": "gpt-4o", "name": "KM-Agent", "instructions": "Be helpful."}
+    agents_client = MagicMock()
+    agents_client.list_agents.return_value = AsyncIterator([make_remote_agent("KM-Other", "x")])
+    agents_client.create_agent = AsyncMock()
+    config = MagicMock(agent_reuse_enabled=True)
+
+    agent = await MockAgentFactory._provision_agent(agents_client, config, **definition)
+
+    assert agent is agents_client.create_agent.return_value
+    agents_client.create_agent.assert_awaited_once_with(
+        **definition, metadata={DEFINITION_HASH_KEY: agent_definition_hash(definition)}
+    )
+    # Other workers reuse the new agent, so it is not deleted on shutdown
+    assert MockAgentFactory._owns_agent is False
+
+
+@pytest.mark.asyncio
+async def test_provision_agent_deletes_agents_of_older_definitions():
+    definition = {"model": "gpt-4o", "name": "KM-Agent", "instructions": "Be helpful."}
+    stale = make_remote_agent("KM-Agent", agent_definition_hash({**definition, "instructions": "Old."}))
+    other = make_remote_agent("KM-Other", "x")
+    created = make_remote_agent("KM-Agent", agent_definition_hash(definition))
+    listings = iter([[stale, other], [stale, other, created]])
+    agents_client = MagicMock()
+    agents_client.list_agents.side_effect = lambda **kwargs: AsyncIterator(next(listings))
+    agents_client.create_agent = AsyncMock(return_value=created)
+    agents_client.delete_agent = AsyncMock()
+    config = MagicMock(agent_reuse_enabled=True)
+
+    agent = await MockAgentFactory._provision_agent(agents_client, config, **definition)
+
+    assert agent is created
+    agents_client.delete_agent.assert_awaited_once_with(stale.id)
+
+
+@pytest.mark.asyncio
+async def test_provision_agent_keeps_the_oldest_of_concurrently_created_agents():
+    definition = {"model": "gpt-4o", "name": "KM-Agent", "instructions": "Be helpful."}
+    oldest = make_remote_agent("KM-Agent", agent_definition_hash(definition))
+    created = make_remote_agent("KM-Agent", agent_definition_hash(definition))
+    listings = iter([[], [oldest, created]])
+    agents_client = MagicMock()
+    agents_client.list_agents.side_effect = lambda **kwargs: AsyncIterator(next(listings))
+    agents_client.create_agent = AsyncMock(return_value=created)
+    agents_client.delete_agent = AsyncMock(side_effect=Exception("not found"))
+    config = MagicMock(agent_reuse_enabled=True)
+
+    agent = await MockAgentFactory._provision_agent(agents_client, config, **definition)
+
+    assert agent is oldest
+    agents_client.delete_agent.assert_awaited_once_with(created.id)
+    assert MockAgentFactory._owns_agent is False
+
+
+@pytest.mark.asyncio
+async def test_provision_agent_without_reuse_creates_an_owned_agent():
+    agents_client = MagicMock()
+    agents_client.create_agent = AsyncMock()
+    config = MagicMock(agent_reuse_enabled=False)
+
+    await MockAgentFactory._provision_agent(agents_client, config, model="gpt-4o", name="KM-Agent")
+
+    agents_client.list_agents.assert_not_called()
+    agents_client.create_agent.assert_awaited_once()
+    assert MockAgentFactory._owns_agent is True
+
+
+def test_definition_hash_is_stable_and_sensitive_to_changes():
+    tool = MagicMock()
+    tool.as_dict.return_value = {"type": "azure_ai_search"}
+    definition = {"model": "gpt-4o", "name": "KM-Agent", "tools": [tool]}
+
+    assert agent_definition_hash(definition) == agent_definition_hash(dict(reversed(definition.items())))
+    assert agent_definition_hash(definition) != agent_definition_hash({**definition, "model": "gpt-4.1"})
@@ -4,22 +4,23 @@ from agents.chart_agent_factory import ChartAgentFactory
 
 
 @pytest.mark.asyncio
-@patch("agents.chart_agent_factory.ManagedIdentityCredential")
+@patch("agents.chart_agent_factory.AgentThreadPool")
+@patch("agents.chart_agent_factory.get_azure_credential_async", new_callable=AsyncMock)
 @patch("agents.chart_agent_factory.AIProjectClient")
-async def test_create_agent_success(mock_ai_project_client_class, mock_credential_class):
+async def test_create_agent_success(mock_ai_project_client_class, mock_credential, mock_thread_pool_class):
     # Mock config
     mock_config = MagicMock()
     mock_config.ai_project_endpoint = "https://example-endpoint/"
     mock_config.ai_project_api_version = "2024-04-01-preview"
     mock_config.azure_openai_deployment_model = "gpt-4"
     mock_config.solution_name = "TestSolution"
+    mock_config.agent_reuse_enabled = False
 
     # Mock client and agent
     mock_agent = MagicMock()
     mock_client = MagicMock()
-    mock_client.agents.create_agent.return_value = mock_agent
+    mock_client.agents.create_agent = AsyncMock(return_value=mock_agent)
     mock_ai_project_client_class.return_value = mock_client
-    mock_credential_class.return_value = MagicMock()
 
     # Call create_agent
     result = await ChartAgentFactory.create_agent(mock_config)
@@ -29,23 +30,34 @@ async def test_create_agent_success(mock_ai_project_client_class, mock_credentia
     assert result["client"] == mock_client
     mock_ai_project_client_class.assert_called_once_with(
         endpoint=mock_config.ai_project_endpoint,
-        credential=mock_credential_class.return_value,
+        credential=mock_credential.return_value,
         api_version=mock_config.ai_project_api_version
     )
     mock_client.agents.create_agent.assert_called_once()
+    mock_thread_pool_class.assert_called_once_with(mock_client, name="chart", size=mock_config.agent_thread_pool_size)
+    mock_thread_pool_class.return_value.start.assert_called_once()
+    assert result["thread_pool"] == mock_thread_pool_class.return_value
 
 
 @pytest.mark.asyncio
 async def test_delete_agent_instance():
     mock_client = MagicMock()
+    mock_client.agents.delete_agent = AsyncMock()
+    mock_client.close = AsyncMock()
     mock_agent = MagicMock()
     mock_agent.id = "mock-agent-id"
     
+    mock_thread_pool = MagicMock()
+    mock_thread_pool.close = AsyncMock()
+
     agent_wrapper = {
         "agent": mock_agent,
-        "client": mock_client
+        "client": mock_client,
+        "thread_pool": mock_thread_pool
     }
 
     await ChartAgentFactory._delete_agent_instance(agent_wrapper)
 
-    mock_client.agents.delete_agent.assert_called_once_with("mock-agent-id")
+    mock_client.agents.delete_agent.assert_awaited_once_with("mock-agent-id")
+    mock_client.close.assert_awaited_once()
+    mock_thread_pool.close.assert_awaited_once()
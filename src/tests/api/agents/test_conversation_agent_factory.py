@@ -1,6 +1,6 @@
 import pytest
 import asyncio
-from unittest.mock import AsyncMock, patch, MagicMock
+from unittest.mock import AsyncMock, patch, MagicMock, call
 
 from agents.conversation_agent_factory import ConversationAgentFactory
 
@@ -8,6 +8,7 @@ from agents.conversation_agent_factory import ConversationAgentFactory
 @pytest.fixture(autouse=True)
 def reset_conversation_agent_factory():
     ConversationAgentFactory._agent = None
+    ConversationAgentFactory._owns_agent = True
     yield
     ConversationAgentFactory._agent = None
 
@@ -53,11 +54,15 @@ async def test_get_agent_returns_existing_instance():
 
 
 @pytest.mark.asyncio
-@patch("agents.conversation_agent_factory.AzureAIAgentThread", autospec=True)
-@patch("agents.conversation_agent_factory.ChatService", autospec=True)
-async def test_delete_agent_deletes_threads_and_agent(
-    mock_chat_service,
-    mock_agent_thread
+@patch("agents.conversation_agent_factory.drain_thread_reaper", new_callable=AsyncMock, return_value=0)
+@patch("agents.conversation_agent_factory.get_thread_reaper")
+@patch("agents.conversation_agent_factory.close_conversation_thread_store", new_callable=AsyncMock)
+@patch("agents.conversation_agent_factory.get_conversation_thread_store")
+async def test_delete_agent_queues_threads_and_deletes_agent(
+    mock_get_store,
+    mock_close_store,
+    mock_get_reaper,
+    mock_drain_reaper
 ):
     mock_client = AsyncMock()
     mock_agent = MagicMock()
@@ -65,36 +70,43 @@ async def test_delete_agent_deletes_threads_and_agent(
     mock_agent.client = mock_client
     ConversationAgentFactory._agent = mock_agent
 
-    mock_chat_service.thread_cache = {
-        "c1": "t1",
-        "c2": "t2"
-    }
-
-    thread_mock = AsyncMock()
-    mock_agent_thread.side_effect = lambda client, thread_id: thread_mock
+    mock_get_store.return_value.shared = False
+    mock_get_store.return_value.items = AsyncMock(return_value=[("c1", "t1"), ("c2", "t2")])
 
     await ConversationAgentFactory.delete_agent()
 
-    mock_agent_thread.assert_any_call(client=mock_client, thread_id="t1")
-    mock_agent_thread.assert_any_call(client=mock_client, thread_id="t2")
-    assert thread_mock.delete.await_count == 2
+    mock_get_reaper.return_value.enqueue.assert_has_calls([call("t1"), call("t2")])
+    mock_close_store.assert_awaited_once()
+    mock_drain_reaper.assert_awaited_once()
     mock_client.agents.delete_agent.assert_awaited_once_with("agent-id")
     assert ConversationAgentFactory._agent is None
 
 
 @pytest.mark.asyncio
-@patch("agents.conversation_agent_factory.ChatService", autospec=True)
-async def test_delete_agent_handles_missing_thread_cache(mock_chat_service):
+@patch("agents.conversation_agent_factory.drain_thread_reaper", new_callable=AsyncMock, return_value=0)
+@patch("agents.conversation_agent_factory.get_thread_reaper")
+@patch("agents.conversation_agent_factory.close_conversation_thread_store", new_callable=AsyncMock)
+@patch("agents.conversation_agent_factory.get_conversation_thread_store")
+async def test_delete_agent_keeps_threads_of_a_shared_store(
+    mock_get_store,
+    mock_close_store,
+    mock_get_reaper,
+    mock_drain_reaper
+):
     mock_client = AsyncMock()
     mock_agent = MagicMock()
     mock_agent.id = "agent-id"
     mock_agent.client = mock_client
     ConversationAgentFactory._agent = mock_agent
 
-    del mock_chat_service.thread_cache  # Simulate absence
+    mock_get_store.return_value.shared = True
+    mock_get_store.return_value.items = AsyncMock(return_value=[("c1", "t1")])
 
     await ConversationAgentFactory.delete_agent()
 
+    mock_get_reaper.return_value.enqueue.assert_not_called()
+    mock_close_store.assert_awaited_once()
+    mock_drain_reaper.assert_awaited_once()
     mock_client.agents.delete_agent.assert_awaited_once_with("agent-id")
     assert ConversationAgentFactory._agent is None
 
@@ -1,23 +1,26 @@
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from agents.search_agent_factory import SearchAgentFactory
 
 
 @pytest.fixture(autouse=True)
 def reset_search_agent_factory():
     SearchAgentFactory._agent = None
+    SearchAgentFactory._owns_agent = True
     yield
     SearchAgentFactory._agent = None
 
 
 @pytest.mark.asyncio
-@patch("agents.search_agent_factory.ManagedIdentityCredential", autospec=True)
+@patch("agents.search_agent_factory.AgentThreadPool")
+@patch("agents.search_agent_factory.get_azure_credential_async", new_callable=AsyncMock)
 @patch("agents.search_agent_factory.AIProjectClient", autospec=True)
 @patch("agents.search_agent_factory.AzureAISearchTool", autospec=True)
 async def test_create_agent_creates_new_instance(
     mock_search_tool_cls,
     mock_project_client_cls,
-    mock_credential_cls
+    mock_credential,
+    mock_thread_pool_cls
 ):
     # Mock config
     mock_config = MagicMock()
@@ -27,6 +30,7 @@ async def test_create_agent_creates_new_instance(
     mock_config.azure_openai_deployment_model = "fake-model"
     mock_config.solution_name = "test-solution"
     mock_config.ai_project_api_version = "2025-05-01"
+    mock_config.agent_reuse_enabled = False
 
     # Mock project client
     mock_project_client = MagicMock()
@@ -36,7 +40,7 @@ async def test_create_agent_creates_new_instance(
     mock_index = MagicMock()
     mock_index.name = "index-name"
     mock_index.version = "1"
-    mock_project_client.indexes.create_or_update.return_value = mock_index
+    mock_project_client.indexes.create_or_update = AsyncMock(return_value=mock_index)
 
     # Mock search tool
     mock_search_tool_instance = MagicMock()
@@ -46,7 +50,7 @@ async def test_create_agent_creates_new_instance(
 
     # Mock agent
     mock_agent = MagicMock()
-    mock_project_client.agents.create_agent.return_value = mock_agent
+    mock_project_client.agents.create_agent = AsyncMock(return_value=mock_agent)
 
     # Run the factory directly
     result = await SearchAgentFactory.create_agent(mock_config)
@@ -69,6 +73,11 @@ async def test_create_agent_creates_new_instance(
         }
     )
     mock_project_client.agents.create_agent.assert_called_once()
+    mock_thread_pool_cls.assert_called_once_with(
+        mock_project_client, name="search", size=mock_config.agent_thread_pool_size
+    )
+    mock_thread_pool_cls.return_value.start.assert_called_once()
+    assert result["thread_pool"] == mock_thread_pool_cls.return_value
 
 
 @pytest.mark.asyncio
@@ -85,12 +94,19 @@ async def test_delete_agent_removes_agent():
     mock_agent = MagicMock()
     mock_agent.id = "mock-agent-id"
     mock_client = MagicMock()
+    mock_client.agents.delete_agent = AsyncMock()
+    mock_client.close = AsyncMock()
+
+    mock_thread_pool = MagicMock()
+    mock_thread_pool.close = AsyncMock()
 
-    SearchAgentFactory._agent = {"agent": mock_agent, "client": mock_client}
+    SearchAgentFactory._agent = {"agent": mock_agent, "client": mock_client, "thread_pool": mock_thread_pool}
 
     await SearchAgentFactory.delete_agent()
 
-    mock_client.agents.delete_agent.assert_called_once_with("mock-agent-id")
+    mock_client.agents.delete_agent.assert_awaited_once_with("mock-agent-id")
+    mock_client.close.assert_awaited_once()
+    mock_thread_pool.close.assert_awaited_once()
     assert SearchAgentFactory._agent is None
 
 
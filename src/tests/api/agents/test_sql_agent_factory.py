@@ -7,16 +7,19 @@ from agents.sql_agent_factory import SQLAgentFactory
 @pytest.fixture(autouse=True)
 def reset_sql_agent_factory():
     SQLAgentFactory._agent = None
+    SQLAgentFactory._owns_agent = True
     yield
     SQLAgentFactory._agent = None
 
 
 @pytest.mark.asyncio
-@patch("agents.sql_agent_factory.ManagedIdentityCredential", autospec=True)
+@patch("agents.sql_agent_factory.AgentThreadPool")
+@patch("agents.sql_agent_factory.get_azure_credential_async", new_callable=AsyncMock)
 @patch("agents.sql_agent_factory.AIProjectClient", autospec=True)
 async def test_create_agent_creates_new_instance(
     mock_ai_client_cls,
-    mock_credential_cls
+    mock_credential,
+    mock_thread_pool_cls
 ):
     # Mock config
     mock_config = MagicMock()
@@ -24,6 +27,7 @@ async def test_create_agent_creates_new_instance(
     mock_config.ai_project_api_version = "2025-05-01"
     mock_config.azure_openai_deployment_model = "test-model"
     mock_config.solution_name = "test-solution"
+    mock_config.agent_reuse_enabled = False
 
     # Mock project client
     mock_project_client = MagicMock()
@@ -31,7 +35,7 @@ async def test_create_agent_creates_new_instance(
 
     # Mock agent
     mock_agent = MagicMock()
-    mock_project_client.agents.create_agent.return_value = mock_agent
+    mock_project_client.agents.create_agent = AsyncMock(return_value=mock_agent)
 
     result = await SQLAgentFactory.create_agent(mock_config)
 
@@ -40,7 +44,7 @@ async def test_create_agent_creates_new_instance(
 
     mock_ai_client_cls.assert_called_once_with(
         endpoint="https://test-endpoint",
-        credential=mock_credential_cls.return_value,
+        credential=mock_credential.return_value,
         api_version="2025-05-01"
     )
     mock_project_client.agents.create_agent.assert_called_once()
@@ -48,6 +52,11 @@ async def test_create_agent_creates_new_instance(
     assert kwargs["model"] == "test-model"
     assert kwargs["name"] == "KM-ChatWithSQLDatabaseAgent-test-solution"
     assert "Generate a valid T-SQL query" in kwargs["instructions"]
+    mock_thread_pool_cls.assert_called_once_with(
+        mock_project_client, name="sql", size=mock_config.agent_thread_pool_size
+    )
+    mock_thread_pool_cls.return_value.start.assert_called_once()
+    assert result["thread_pool"] == mock_thread_pool_cls.return_value
 
 
 @pytest.mark.asyncio
@@ -63,19 +72,43 @@ async def test_delete_agent_removes_agent():
     mock_agent.id = "agent-id"
 
     mock_client = MagicMock()
-    mock_client.agents.delete_agent = MagicMock()
+    mock_client.agents.delete_agent = AsyncMock()
+    mock_client.close = AsyncMock()
+
+    mock_thread_pool = MagicMock()
+    mock_thread_pool.close = AsyncMock()
 
     SQLAgentFactory._agent = {
         "agent": mock_agent,
-        "client": mock_client
+        "client": mock_client,
+        "thread_pool": mock_thread_pool
     }
 
     await SQLAgentFactory.delete_agent()
 
-    mock_client.agents.delete_agent.assert_called_once_with("agent-id")
+    mock_client.agents.delete_agent.assert_awaited_once_with("agent-id")
+    mock_client.close.assert_awaited_once()
+    mock_thread_pool.close.assert_awaited_once()
     assert SQLAgentFactory._agent is None
 
 
+@pytest.mark.asyncio
+async def test_delete_agent_keeps_a_shared_agent():
+    mock_client = MagicMock()
+    mock_client.agents.delete_agent = AsyncMock()
+    mock_client.close = AsyncMock()
+    mock_thread_pool = MagicMock()
+    mock_thread_pool.close = AsyncMock()
+    SQLAgentFactory._owns_agent = False
+    SQLAgentFactory._agent = {"agent": MagicMock(), "client": mock_client, "thread_pool": mock_thread_pool}
+
+    await SQLAgentFactory.delete_agent()
+
+    mock_client.agents.delete_agent.assert_not_awaited()
+    mock_client.close.assert_awaited_once()
+    mock_thread_pool.close.assert_awaited_once()
+
+
 @pytest.mark.asyncio
 async def test_delete_agent_does_nothing_if_none():
     SQLAgentFactory._agent = None
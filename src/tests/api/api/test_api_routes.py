@@ -108,6 +108,24 @@ def test_chat_endpoint_basic(create_test_client):
         assert response.json() == {"chart": "mocked"}
 
 
+def test_chat_endpoint_negotiates_delta_streaming(create_test_client):
+    with patch("api.api_routes.ChatService") as MockChatService:
+        mock_instance = MockChatService.return_value
+        mock_instance.stream_chat_request = AsyncMock(return_value=iter([b'{"choices": []}\n\n']))
+
+        client = create_test_client()
+        payload = {"conversation_id": "test", "messages": [{"content": "Top topics?"}]}
+
+        response = client.post("/chat", json=payload, headers={"X-Stream-Protocol": "delta"})
+        assert response.status_code == 200
+        assert response.headers["X-Stream-Protocol"] == "delta"
+        assert mock_instance.stream_chat_request.await_args.args[3] == "delta"
+
+        response = client.post("/chat", json=payload)
+        assert response.headers["X-Stream-Protocol"] == "full"
+        assert mock_instance.stream_chat_request.await_args.args[3] == "full"
+
+
 def test_get_layout_config_valid(create_test_client, monkeypatch):
     test_config = {"layout": "mocked"}
     monkeypatch.setenv("REACT_APP_LAYOUT_CONFIG", json.dumps(test_config))
@@ -188,4 +206,32 @@ def test_get_chart_config_env_missing(create_test_client, monkeypatch):
     response = client.get("/display-chart-default")
 
     assert response.status_code == 400
-    assert "error" in response.json()
\ No newline at end of file
+    assert "error" in response.json()
+
+def test_get_metrics(create_test_client):
+    with patch("api.api_routes.get_pool_metrics", return_value={"checkouts": 3}), \
+         patch("api.api_routes.get_executor_metrics", return_value={"pending": 1}), \
+         patch("api.api_routes.get_governor_metrics", return_value={"timeouts": 0}), \
+         patch("api.api_routes.get_chart_cache_stats", return_value={"hits": 2}), \
+         patch("api.api_routes.get_agent_startup_metrics", return_value={"SQLAgentFactory": {"seconds": 1.5}}), \
+         patch("api.api_routes.get_agent_thread_pool_metrics", return_value={"sql": {"idle": 4}}), \
+         patch("api.api_routes.get_sql_query_cache_stats", return_value={"exact_hits": 5}), \
+         patch("api.api_routes.get_conversation_thread_store_metrics", return_value={"size": 7}), \
+         patch("api.api_routes.get_credential_metrics", return_value={"cache_hits": 9}), \
+         patch("api.api_routes.get_thread_reaper_metrics", return_value={"pending": 2}):
+        client = create_test_client()
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "sql_pool": {"checkouts": 3},
+            "sql_executor": {"pending": 1},
+            "sql_governor": {"timeouts": 0},
+            "chart_cache": {"hits": 2},
+            "agent_startup": {"SQLAgentFactory": {"seconds": 1.5}},
+            "agent_thread_pools": {"sql": {"idle": 4}},
+            "sql_query_cache": {"exact_hits": 5},
+            "conversation_threads": {"size": 7},
+            "credentials": {"cache_hits": 9},
+            "thread_reaper": {"pending": 2},
+        }
@@ -131,6 +131,39 @@ async def test_delete_conversation(mock_track, mock_delete, mock_auth, client, h
     assert res.status_code == 200
 
 
+@pytest.mark.asyncio
+@patch("auth.auth_utils.get_authenticated_user_details")
+@patch("services.history_service.HistoryService.delete_conversation", new_callable=AsyncMock)
+@patch("common.logging.event_utils.track_event_if_configured")
+async def test_delete_conversation_in_background(mock_track, mock_delete, mock_auth, client, headers, mock_user):
+    mock_auth.return_value = mock_user
+    mock_delete.return_value = {"job_id": "job-1", "conversation_id": "c1", "status": "running"}
+
+    res = await client.request(
+        "DELETE", "/delete",
+        content=json.dumps({"conversation_id": "c1"}),
+        headers={**headers, "Content-Type": "application/json"}
+    )
+    assert res.status_code == 202
+    assert res.json()["status_url"] == "/history/delete_status/job-1"
+
+
+@pytest.mark.asyncio
+@patch("auth.auth_utils.get_authenticated_user_details")
+@patch("services.history_service.HistoryService.get_deletion_status", new_callable=AsyncMock)
+async def test_get_deletion_status(mock_status, mock_auth, client, headers, mock_user):
+    mock_auth.return_value = mock_user
+    mock_status.return_value = {"job_id": "job-1", "status": "completed"}
+
+    res = await client.get("/delete_status/job-1", headers=headers)
+    assert res.status_code == 200
+    assert res.json()["status"] == "completed"
+
+    mock_status.return_value = None
+    res = await client.get("/delete_status/unknown", headers=headers)
+    assert res.status_code == 404
+
+
 @pytest.mark.asyncio
 @patch("auth.auth_utils.get_authenticated_user_details")
 @patch("services.history_service.HistoryService.delete_conversation", new_callable=AsyncMock)
@@ -161,17 +194,45 @@ async def test_list_conversations(mock_track, mock_get, mock_auth, client, heade
 
 @pytest.mark.asyncio
 @patch("auth.auth_utils.get_authenticated_user_details")
-@patch("services.history_service.HistoryService.get_conversations", new_callable=AsyncMock)
+@patch("services.history_service.HistoryService.get_conversations_page", new_callable=AsyncMock)
 @patch("common.logging.event_utils.track_event_if_configured")
 async def test_list_conversations_not_found(mock_track, mock_get, mock_auth, client, headers, mock_user):
     mock_auth.return_value = mock_user
-    mock_get.return_value = None
+    mock_get.return_value = (None, None)
 
     res = await client.get("/list", headers=headers)
     assert res.status_code == 404
     assert "error" in res.json()
 
 
+@pytest.mark.asyncio
+@patch("auth.auth_utils.get_authenticated_user_details")
+@patch("services.history_service.HistoryService.get_conversations_page", new_callable=AsyncMock)
+@patch("common.logging.event_utils.track_event_if_configured")
+async def test_list_conversations_with_next_token(mock_track, mock_get, mock_auth, client, headers, mock_user):
+    mock_auth.return_value = mock_user
+    mock_get.return_value = ([{"id": "c2"}], "token-3")
+
+    res = await client.get("/list?limit=10&next=token-2", headers=headers)
+    assert res.status_code == 200
+    assert res.json() == [{"id": "c2"}]
+    assert res.headers["X-Next-Token"] == "token-3"
+    assert mock_get.await_args.args[1:] == (10,)
+    assert mock_get.await_args.kwargs == {"continuation_token": "token-2"}
+
+
+@pytest.mark.asyncio
+@patch("auth.auth_utils.get_authenticated_user_details")
+@patch("services.history_service.HistoryService.get_conversations_page", new_callable=AsyncMock)
+@patch("common.logging.event_utils.track_event_if_configured")
+async def test_list_conversations_invalid_next_token(mock_track, mock_get, mock_auth, client, headers, mock_user):
+    mock_auth.return_value = mock_user
+    mock_get.side_effect = ValueError("Invalid continuation token")
+
+    res = await client.get("/list?next=bad", headers=headers)
+    assert res.status_code == 400
+
+
 
 @pytest.mark.asyncio
 @patch("auth.auth_utils.get_authenticated_user_details")
@@ -246,6 +307,24 @@ async def test_delete_all_conversations(mock_track, mock_delete, mock_get, mock_
     assert res.status_code == 200
 
 
+@pytest.mark.asyncio
+@patch("auth.auth_utils.get_authenticated_user_details")
+@patch("services.history_service.HistoryService.get_conversations", new_callable=AsyncMock)
+@patch("services.history_service.HistoryService.delete_conversation", new_callable=AsyncMock)
+@patch("common.logging.event_utils.track_event_if_configured")
+async def test_delete_all_conversations_with_background_jobs(mock_track, mock_delete, mock_get, mock_auth, client,
+                                                            headers, mock_user):
+    mock_auth.return_value = mock_user
+    mock_get.return_value = [{"id": "c1"}, {"id": "c2"}]
+    mock_delete.side_effect = [True, {"job_id": "job-2", "conversation_id": "c2", "status": "running"}]
+
+    res = await client.request("DELETE", "/delete_all", headers=headers)
+    assert res.status_code == 202
+    assert res.json()["jobs"] == [{
+        "job_id": "job-2", "conversation_id": "c2", "status": "running",
+        "status_url": "/history/delete_status/job-2"}]
+
+
 @pytest.mark.asyncio
 @patch("auth.auth_utils.get_authenticated_user_details")
 @patch("services.history_service.HistoryService.clear_messages", new_callable=AsyncMock)
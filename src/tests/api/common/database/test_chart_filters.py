@@ -0,0 +1,78 @@
+from unittest.mock import MagicMock
+
+from api.models.input_models import ChartFilters
+from common.database.chart_filters import compile_chart_filters
+
+CALL_COLUMNS = {"topic": "mined_topic", "sentiment": "sentiment", "satisfied": "satisfied"}
+
+
+def make_filters(topics=(), sentiments=(), date_ranges=()):
+    return ChartFilters(selected_filters={
+        "Topic": list(topics),
+        "Sentiment": list(sentiments),
+        "DateRange": list(date_ranges),
+    })
+
+
+def test_values_are_bound_as_parameters():
+    compiled = compile_chart_filters(make_filters(topics=["Billing", "O'Brien"], sentiments=["negative"]))
+
+    assert compiled.params == ["Billing", "O'Brien", "negative"]
+    assert "O'Brien" not in compiled.declarations
+    assert compiled.declarations.count("?") == 3
+    assert compiled.predicates(CALL_COLUMNS) == [
+        "mined_topic IN (@topic_0, @topic_1)",
+        "sentiment IN (@sentiment_0)",
+    ]
+
+
+def test_statement_text_is_stable_per_filter_shape():
+    first = compile_chart_filters(make_filters(topics=["Billing", "Outage"], date_ranges=["Last 7 days"]))
+    second = compile_chart_filters(make_filters(topics=["Roaming", "Devices"], date_ranges=["Last 7 days"]))
+
+    assert first.declarations == second.declarations
+    assert first.predicates(CALL_COLUMNS) == second.predicates(CALL_COLUMNS)
+    assert first.params != second.params
+
+
+def test_in_lists_are_padded_to_a_power_of_two():
+    compiled = compile_chart_filters(make_filters(topics=["a", "b", "c"]))
+
+    assert compiled.params == ["a", "b", "c", "c"]
+    assert compiled.predicates(CALL_COLUMNS) == ["mined_topic IN (@topic_0, @topic_1, @topic_2, @topic_3)"]
+
+
+def test_all_sentiment_and_empty_filters_are_ignored():
+    compiled = compile_chart_filters(make_filters(sentiments=["all"]))
+
+    assert compiled.params == []
+    assert compiled.declarations == ""
+    assert compiled.predicates(CALL_COLUMNS) == []
+    assert not compiled.has_date_range
+
+
+def test_date_ranges_declare_a_single_cutoff_in_fixed_order():
+    first = compile_chart_filters(make_filters(date_ranges=["Last 90 days", "Last 7 days"]))
+    second = compile_chart_filters(make_filters(date_ranges=["Last 7 days", "Last 90 days", "Unknown"]))
+
+    assert first.has_date_range
+    assert first.declarations == second.declarations
+    assert first.declarations.startswith("DECLARE @cutoff datetime2(0)")
+
+
+def test_predicates_skip_dimensions_missing_from_table():
+    filters = MagicMock()
+    filters.model_dump.return_value = {"selected_filters": {"Topic": ["Billing"], "Satisfaction": ["yes"]}}
+    compiled = compile_chart_filters(filters)
+
+    assert compiled.predicates({"topic": "topic", "sentiment": "sentiment"}) == ["topic IN (@topic_0)"]
+    assert len(compiled.predicates(CALL_COLUMNS)) == 2
+
+
+def test_unreadable_filters_compile_to_no_predicates():
+    filters = MagicMock()
+    filters.model_dump.side_effect = Exception("Invalid model")
+
+    compiled = compile_chart_filters(filters)
+    assert compiled.params == []
+    assert compiled.predicates(CALL_COLUMNS) == []
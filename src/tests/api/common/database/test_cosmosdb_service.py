@@ -1,7 +1,8 @@
+import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 from azure.cosmos import exceptions
-from common.database.cosmosdb_service import CosmosConversationClient
+from common.database.cosmosdb_service import CosmosConversationClient, decode_continuation_token, encode_continuation_token
 
 
 class AsyncIteratorWrapper:
@@ -77,6 +78,20 @@ class TestCosmosDbService:
         result, msg = await cosmos_client.ensure()
         assert result is False and "container" in msg
 
+    @pytest.mark.asyncio
+    async def test_connection_limit_sizes_the_transport_pool(self, mock_cosmos_clients):
+        """Test a connection limit gives the Cosmos client its own sized aiohttp transport."""
+        cosmos_mock, _, _ = mock_cosmos_clients
+        cosmos_mock.close = AsyncMock()
+        with patch("common.database.cosmosdb_service.CosmosClient", return_value=cosmos_mock) as mock_client_cls:
+            client = CosmosConversationClient("url", "key", "db", "container", connection_limit=25)
+
+        transport = mock_client_cls.call_args.kwargs["transport"]
+        assert transport.session.connector.limit == 25
+        await transport.session.close()
+        await client.close()
+        cosmos_mock.close.assert_awaited_once()
+
     def test_constructor_invalid_credential(self):
         """Test constructor raises ValueError on bad credentials."""
         with patch("common.database.cosmosdb_service.CosmosClient", side_effect=exceptions.CosmosHttpResponseError(status_code=401)):
@@ -157,6 +172,48 @@ class TestCosmosDbService:
         result = await cosmos_client.get_conversations("user1", limit=2, offset=0)
         assert len(result) == 2
 
+    @pytest.mark.asyncio
+    async def test_get_conversations_rejects_invalid_sort_order(self, cosmos_client):
+        """Test the sort order is never interpolated into the query unchecked."""
+        with pytest.raises(ValueError):
+            await cosmos_client.get_conversations("user1", limit=2, sort_order="DESC; DROP")
+
+    @pytest.mark.asyncio
+    async def test_get_conversations_page_resumes_from_token(self, cosmos_client, mock_cosmos_clients):
+        """Test get_conversations_page returns one page and the next page's opaque token."""
+        _, _, container = mock_cosmos_clients
+        pages = AsyncIteratorWrapper([AsyncIteratorWrapper([{"id": "3"}, {"id": "4"}]), AsyncIteratorWrapper([{"id": "5"}])])
+        pages.continuation_token = "cosmos-token-2"
+        container.query_items.return_value.by_page.return_value = pages
+        token = encode_continuation_token("cosmos-token-1")
+
+        conversations, next_token = await cosmos_client.get_conversations_page("user1", 2, continuation_token=token)
+
+        assert conversations == [{"id": "3"}, {"id": "4"}]
+        assert decode_continuation_token(next_token) == "cosmos-token-2"
+        container.query_items.return_value.by_page.assert_called_once_with("cosmos-token-1")
+        query = container.query_items.call_args.kwargs["query"]
+        assert query.startswith("SELECT c.id, c.title, c.createdAt, c.updatedAt FROM c")
+        assert container.query_items.call_args.kwargs["max_item_count"] == 2
+
+    @pytest.mark.asyncio
+    async def test_get_conversations_page_last_page(self, cosmos_client, mock_cosmos_clients):
+        """Test the last page has no next token."""
+        _, _, container = mock_cosmos_clients
+        pages = AsyncIteratorWrapper([AsyncIteratorWrapper([{"id": "1"}])])
+        pages.continuation_token = None
+        container.query_items.return_value.by_page.return_value = pages
+
+        conversations, next_token = await cosmos_client.get_conversations_page("user1", 2)
+
+        assert conversations == [{"id": "1"}]
+        assert next_token is None
+        container.query_items.return_value.by_page.assert_called_once_with(None)
+
+    def test_decode_continuation_token_rejects_malformed_tokens(self):
+        with pytest.raises(ValueError):
+            decode_continuation_token("not-base64!")
+
     @pytest.mark.asyncio
     async def test_create_message_with_feedback(self, cosmos_client, mock_cosmos_clients):
         """Test message creation with feedback enabled."""
@@ -220,20 +277,93 @@ class TestCosmosDbService:
     async def test_delete_messages_with_messages(self, cosmos_client, mock_cosmos_clients):
         """Test deleting messages when messages exist."""
         _, _, container = mock_cosmos_clients
-        cosmos_client.get_messages = AsyncMock(return_value=[
-            {"id": "m1"}, {"id": "m2"}
-        ])
-        container.delete_item = AsyncMock(return_value=True)
+        container.query_items.return_value = AsyncIteratorWrapper(["m1", "m2"])
+        container.execute_item_batch = AsyncMock()
         result = await cosmos_client.delete_messages("c1", "user1")
         assert len(result) == 2
+        container.execute_item_batch.assert_awaited_once_with(
+            batch_operations=[("delete", ("m1",)), ("delete", ("m2",))], partition_key="user1")
 
     @pytest.mark.asyncio
-    async def test_delete_messages_no_messages(self, cosmos_client):
+    async def test_delete_messages_no_messages(self, cosmos_client, mock_cosmos_clients):
         """Test delete_messages returns None when there are no messages."""
-        cosmos_client.get_messages = AsyncMock(return_value=[])
+        _, _, container = mock_cosmos_clients
+        container.query_items.return_value = AsyncIteratorWrapper([])
         result = await cosmos_client.delete_messages("c1", "user1")
         assert result is None
 
+    @pytest.mark.asyncio
+    async def test_delete_items_in_batches_with_progress(self, cosmos_client, mock_cosmos_clients):
+        """Test items are split into transactional batches of at most 100 deletes."""
+        _, _, container = mock_cosmos_clients
+        container.execute_item_batch = AsyncMock()
+        progress = []
+
+        deleted = await cosmos_client.delete_items("user1", [f"m{i}" for i in range(250)], progress=progress.append)
+
+        assert deleted == 250
+        sizes = sorted(len(c.kwargs["batch_operations"]) for c in container.execute_item_batch.await_args_list)
+        assert sizes == [50, 100, 100]
+        assert progress[-1] == 250
+
+    @pytest.mark.asyncio
+    async def test_delete_items_falls_back_to_single_deletes(self, cosmos_client, mock_cosmos_clients):
+        """Test a failed batch is retried item by item, skipping items already deleted."""
+        _, _, container = mock_cosmos_clients
+        container.execute_item_batch = AsyncMock(side_effect=exceptions.CosmosBatchOperationError(
+            error_index=0, headers={}, status_code=404, message="gone", operation_responses=[]))
+        container.delete_item = AsyncMock(side_effect=[exceptions.CosmosResourceNotFoundError(), None, None])
+
+        deleted = await cosmos_client.delete_items("user1", ["m1", "m2", "m3"])
+
+        assert deleted == 3
+        assert container.delete_item.await_count == 3
+
+    @pytest.mark.asyncio
+    async def test_delete_items_bounds_concurrency(self, cosmos_client, mock_cosmos_clients):
+        """Test no more than delete_concurrency batches run at once."""
+        _, _, container = mock_cosmos_clients
+        running = 0
+        peak = 0
+
+        async def execute_item_batch(**kwargs):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        container.execute_item_batch = execute_item_batch
+        cosmos_client.delete_concurrency = 2
+
+        await cosmos_client.delete_items("user1", [f"m{i}" for i in range(500)])
+
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_get_deletion_job(self, cosmos_client, mock_cosmos_clients):
+        """Test deletion jobs are read from the user's partition and other documents are ignored."""
+        _, _, container = mock_cosmos_clients
+        container.read_item = AsyncMock(return_value={"id": "job-1", "type": "deletion_job"})
+        assert (await cosmos_client.get_deletion_job("user1", "job-1"))["id"] == "job-1"
+        container.read_item.assert_awaited_once_with(item="job-1", partition_key="user1")
+
+        container.read_item = AsyncMock(return_value={"id": "c1", "type": "conversation"})
+        assert await cosmos_client.get_deletion_job("user1", "c1") is None
+
+        container.read_item = AsyncMock(side_effect=exceptions.CosmosResourceNotFoundError())
+        assert await cosmos_client.get_deletion_job("user1", "none") is None
+
+    @pytest.mark.asyncio
+    async def test_delete_deletion_jobs(self, cosmos_client, mock_cosmos_clients):
+        """Test finished deletion jobs are removed in a batch."""
+        _, _, container = mock_cosmos_clients
+        container.query_items.return_value = AsyncIteratorWrapper(["job-1", "job-2"])
+        container.execute_item_batch = AsyncMock()
+
+        assert await cosmos_client.delete_deletion_jobs("user1", "2024-01-01T00:00:00") == 2
+        container.execute_item_batch.assert_awaited_once()
+
     @pytest.mark.asyncio
     async def test_delete_conversation_found(self, cosmos_client, mock_cosmos_clients):
         """Test deleting an existing conversation."""
@@ -247,6 +377,37 @@ class TestCosmosDbService:
     async def test_delete_conversation_not_found(self, cosmos_client, mock_cosmos_clients):
         """Test deleting a non-existent conversation returns True (no-op)."""
         _, _, container = mock_cosmos_clients
-        container.read_item = AsyncMock(return_value=None)
+        container.delete_item = AsyncMock(side_effect=exceptions.CosmosResourceNotFoundError())
         result = await cosmos_client.delete_conversation("user1", "none")
         assert result is True
+
+    @pytest.mark.asyncio
+    async def test_update_conversation_title(self, cosmos_client, mock_cosmos_clients):
+        """Test the title is replaced only if the document is unchanged since it was read."""
+        _, _, container = mock_cosmos_clients
+        container.read_item = AsyncMock(return_value={"id": "c1", "title": "question", "_etag": "e1"})
+        container.replace_item = AsyncMock(return_value={"id": "c1", "title": "Short title"})
+
+        result = await cosmos_client.update_conversation_title("user1", "c1", "Short title", expected_title="question")
+
+        assert result == {"id": "c1", "title": "Short title"}
+        kwargs = container.replace_item.call_args.kwargs
+        assert kwargs["body"]["title"] == "Short title"
+        assert kwargs["etag"] == "e1"
+
+    @pytest.mark.asyncio
+    async def test_update_conversation_title_keeps_a_rename(self, cosmos_client, mock_cosmos_clients):
+        """Test a conversation renamed by the user, before or during the update, keeps its title."""
+        _, _, container = mock_cosmos_clients
+        container.read_item = AsyncMock(return_value={"id": "c1", "title": "Renamed", "_etag": "e1"})
+        container.replace_item = AsyncMock()
+
+        assert await cosmos_client.update_conversation_title("user1", "c1", "Title", expected_title="question") is False
+        container.replace_item.assert_not_awaited()
+
+        container.read_item = AsyncMock(return_value={"id": "c1", "title": "question", "_etag": "e1"})
+        container.replace_item = AsyncMock(side_effect=exceptions.CosmosAccessConditionFailedError())
+        assert await cosmos_client.update_conversation_title("user1", "c1", "Title", expected_title="question") is False
+
+        container.read_item = AsyncMock(side_effect=exceptions.CosmosResourceNotFoundError())
+        assert await cosmos_client.update_conversation_title("user1", "c1", "Title", expected_title="question") is False
@@ -0,0 +1,217 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from common.database.sql_connection_pool import PoolTimeoutError, SqlConnectionPool
+
+
+def make_pool(**kwargs):
+    connect = AsyncMock(side_effect=lambda: MagicMock())
+    return SqlConnectionPool(connect, **kwargs), connect
+
+
+class TestSqlConnectionPool:
+
+    @pytest.mark.asyncio
+    async def test_connection_is_reused(self):
+        pool, connect = make_pool(max_size=2)
+
+        async with pool.connection() as conn1:
+            pass
+        async with pool.connection() as conn2:
+            pass
+
+        assert conn1 is conn2
+        assert connect.await_count == 1
+        assert pool.get_metrics()["checkouts"] == 2
+        assert pool.get_metrics()["idle"] == 1
+
+    @pytest.mark.asyncio
+    async def test_pool_is_bounded_and_waiters_are_counted(self):
+        pool, connect = make_pool(max_size=1, acquire_timeout=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with pool.connection():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        assert pool.get_metrics()["in_use"] == 1
+
+        release.set()
+        await asyncio.gather(holder, waiter)
+
+        assert connect.await_count == 1
+        assert pool.get_metrics()["waits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_release_discards_the_connection(self):
+        resetting = asyncio.Event()
+
+        async def run_sync(func, *args):
+            if func is SqlConnectionPool._reset and not resetting.is_set():
+                resetting.set()
+                await asyncio.sleep(10)
+            return func(*args)
+
+        connect = AsyncMock(side_effect=lambda: MagicMock())
+        pool = SqlConnectionPool(connect, max_size=1, acquire_timeout=0.1, run_sync=run_sync)
+
+        async def borrow():
+            async with pool.connection() as conn:
+                return conn
+
+        task = asyncio.create_task(borrow())
+        await resetting.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert pool.size == 0
+        assert pool.get_metrics()["discarded"] == 1
+        # The slot was freed, so a new connection can be opened
+        async with pool.connection():
+            pass
+        assert connect.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_health_check_discards_the_connection(self):
+        checking = asyncio.Event()
+
+        async def run_sync(func, *args):
+            if func is SqlConnectionPool._ping and not checking.is_set():
+                checking.set()
+                await asyncio.sleep(10)
+            return func(*args)
+
+        connect = AsyncMock(side_effect=lambda: MagicMock())
+        pool = SqlConnectionPool(connect, max_size=1, acquire_timeout=0.1, health_check_seconds=0,
+                                 run_sync=run_sync)
+        async with pool.connection():
+            pass
+
+        async def borrow():
+            async with pool.connection():
+                pass
+
+        task = asyncio.create_task(borrow())
+        await checking.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+        assert pool.size == 0
+        assert pool.idle == 0
+        assert pool.get_metrics()["discarded"] == 1
+        # The slot was freed, so the pool does not time out
+        async with pool.connection():
+            pass
+        assert connect.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_acquire_times_out(self):
+        pool, _ = make_pool(max_size=1, acquire_timeout=0.01)
+
+        async with pool.connection():
+            with pytest.raises(PoolTimeoutError):
+                async with pool.connection():
+                    pass
+
+        assert pool.get_metrics()["wait_timeouts"] == 1
+
+    @pytest.mark.asyncio
+    async def test_expired_connection_is_recycled(self):
+        pool, connect = make_pool(recycle_seconds=0)
+
+        async with pool.connection() as conn1:
+            pass
+        async with pool.connection() as conn2:
+            pass
+
+        assert conn1 is not conn2
+        conn1.close.assert_called_once()
+        assert pool.get_metrics()["recycled"] == 2
+
+    @pytest.mark.asyncio
+    async def test_failed_health_check_discards_connection(self):
+        pool, connect = make_pool(health_check_seconds=0)
+
+        async with pool.connection() as conn1:
+            pass
+        conn1.cursor.return_value.execute.side_effect = Exception("connection lost")
+
+        async with pool.connection() as conn2:
+            pass
+
+        assert conn1 is not conn2
+        assert pool.get_metrics()["health_check_failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_error_in_block_forces_health_check(self):
+        pool, _ = make_pool()
+
+        with pytest.raises(ValueError):
+            async with pool.connection() as conn1:
+                raise ValueError("query failed")
+
+        async with pool.connection() as conn2:
+            pass
+
+        assert conn1 is conn2
+        conn1.cursor.return_value.execute.assert_called_with("SELECT 1")
+
+    @pytest.mark.asyncio
+    async def test_discarded_connection_is_closed_on_release(self):
+        pool, connect = make_pool()
+
+        async with pool.connection() as conn1:
+            pool.discard(conn1)
+        async with pool.connection() as conn2:
+            pass
+
+        assert conn1 is not conn2
+        conn1.close.assert_called_once()
+        assert connect.await_count == 2
+        assert pool.size == 1
+        assert pool.get_metrics()["recycled"] == 0
+
+    @pytest.mark.asyncio
+    async def test_release_rolls_back_open_transaction(self):
+        pool, _ = make_pool()
+
+        async with pool.connection() as conn:
+            pass
+
+        conn.rollback.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_connect_failure_frees_slot(self):
+        connect = AsyncMock(side_effect=[Exception("login failed"), MagicMock()])
+        pool = SqlConnectionPool(connect, max_size=1)
+
+        with pytest.raises(Exception, match="login failed"):
+            async with pool.connection():
+                pass
+
+        async with pool.connection() as conn:
+            assert conn is not None
+        assert pool.size == 1
+
+    @pytest.mark.asyncio
+    async def test_close_discards_idle_connections(self):
+        pool, _ = make_pool()
+
+        async with pool.connection() as conn:
+            pass
+        await pool.close()
+
+        conn.close.assert_called_once()
+        assert pool.size == 0
+        with pytest.raises(RuntimeError):
+            async with pool.connection():
+                pass
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from common.database.sql_executor import SqlExecutor, SqlExecutorSaturatedError
+
+
+@pytest.fixture
+def executor():
+    sql_executor = SqlExecutor(max_workers=2, max_queue_depth=1)
+    yield sql_executor
+    sql_executor.shutdown()
+
+
+class TestSqlExecutor:
+
+    @pytest.mark.asyncio
+    async def test_run_returns_result_from_worker_thread(self, executor):
+        result = await executor.run(lambda a, b=0: (a + b, threading.current_thread().name), 1, b=2)
+
+        assert result[0] == 3
+        assert result[1].startswith("sqldb")
+        assert executor.get_metrics()["submitted"] == 1
+
+    @pytest.mark.asyncio
+    async def test_run_propagates_exceptions(self, executor):
+        def fail():
+            raise ValueError("bad query")
+
+        with pytest.raises(ValueError, match="bad query"):
+            await executor.run(fail)
+
+    @pytest.mark.asyncio
+    async def test_rejects_calls_beyond_queue_depth(self, executor):
+        release = threading.Event()
+        running = [asyncio.create_task(executor.run(release.wait)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+
+        metrics = executor.get_metrics()
+        assert metrics["active"] == 2
+        assert metrics["queued"] == 1
+        with pytest.raises(SqlExecutorSaturatedError):
+            await executor.run(release.wait)
+        assert executor.get_metrics()["rejected"] == 1
+
+        release.set()
+        await asyncio.gather(*running)
+        await asyncio.sleep(0.01)
+        assert executor.get_metrics()["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_call_stays_pending_until_thread_finishes(self, executor):
+        release = threading.Event()
+        task = asyncio.create_task(executor.run(release.wait))
+        await asyncio.sleep(0.01)
+
+        task.cancel()
+        await asyncio.sleep(0.01)
+        assert executor.get_metrics()["pending"] == 1
+
+        release.set()
+        await asyncio.sleep(0.05)
+        assert executor.get_metrics()["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_run_to_completion_waits_for_thread_when_cancelled(self, executor):
+        release = threading.Event()
+        task = asyncio.create_task(executor.run_to_completion(release.wait))
+        await asyncio.sleep(0.01)
+
+        task.cancel()
+        await asyncio.sleep(0.01)
+        assert not task.done()
+
+        task.cancel()
+        await asyncio.sleep(0.01)
+        assert not task.done()
+
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert executor.get_metrics()["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_run_to_completion_returns_result(self, executor):
+        assert await executor.run_to_completion(lambda x: x + 1, 1) == 2
+
+    @pytest.mark.asyncio
+    async def test_blocking_calls_do_not_block_event_loop(self, executor):
+        started = time.monotonic()
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while time.monotonic() - started < 0.2:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(ticker(), executor.run(time.sleep, 0.2))
+
+        assert ticks >= 10
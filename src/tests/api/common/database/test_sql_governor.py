@@ -0,0 +1,226 @@
+import asyncio
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from common.database.sql_governor import (
+    SqlQueryGovernor,
+    SqlQueryRejectedError,
+    SqlQuotaExceededError,
+    govern_sql,
+    sql_query_user,
+)
+
+
+async def run_inline(func, *args):
+    return func(*args)
+
+
+async def run_in_thread(func, *args):
+    return await asyncio.to_thread(func, *args)
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT topic FROM t", "SELECT TOP (10) topic FROM t"),
+    ("select distinct topic from t", "select distinct TOP (10) topic from t"),
+    ("SELECT TOP 500 topic FROM t", "SELECT TOP 10 topic FROM t"),
+    ("SELECT TOP (500) topic FROM t;", "SELECT TOP (10) topic FROM t;"),
+    ("WITH c AS (SELECT TOP 1000 x FROM t) SELECT x FROM c", "WITH c AS (SELECT TOP 1000 x FROM t) SELECT TOP (10) x FROM c"),
+    ("SELECT x FROM (SELECT x FROM t) s", "SELECT TOP (10) x FROM (SELECT x FROM t) s"),
+])
+def test_govern_sql_limits_outer_select(sql, expected):
+    assert govern_sql(sql, 10) == (expected, True)
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT TOP 5 topic FROM t",
+    "SELECT TOP 50 PERCENT topic FROM t",
+    "SELECT a FROM t UNION ALL SELECT a FROM u",
+    "SELECT a FROM t ORDER BY a OFFSET 0 ROWS FETCH NEXT 5 ROWS ONLY",
+])
+def test_govern_sql_leaves_bounded_or_combined_queries(sql):
+    assert govern_sql(sql, 10) == (sql, False)
+
+
+@pytest.mark.parametrize("sql", [
+    "",
+    "UPDATE t SET x = 1",
+    "SELECT * INTO copy FROM t",
+    "SELECT 1; DROP TABLE t",
+    "SELECT 1; SELECT 2",
+    "WITH c AS (SELECT 1 AS x) DELETE FROM t",
+    "EXEC sp_who",
+    "SELECT * FROM OPENROWSET('x', 'y', 'z')",
+    "SELECT (1",
+    "SELECT 'unterminated",
+])
+def test_govern_sql_rejects(sql):
+    with pytest.raises(SqlQueryRejectedError):
+        govern_sql(sql, 10)
+
+
+def test_govern_sql_ignores_keywords_in_literals_and_comments():
+    sql = "SELECT 'DROP TABLE t' AS [delete] FROM t -- update me\n/* INSERT */"
+    governed, limited = govern_sql(sql, 10)
+    assert limited
+    assert governed.startswith("SELECT TOP (10) 'DROP TABLE t'")
+
+
+@pytest.mark.asyncio
+async def test_quota_limits_concurrent_queries_per_user():
+    governor = SqlQueryGovernor(run_inline, max_concurrent_per_user=1)
+    sql_query_user.set("alice")
+
+    async with governor.user_slot():
+        with pytest.raises(SqlQuotaExceededError):
+            async with governor.user_slot():
+                pass
+        sql_query_user.set("bob")
+        async with governor.user_slot():
+            assert governor.get_metrics()["running"] == 2
+        sql_query_user.set("alice")
+
+    async with governor.user_slot():
+        pass
+    assert governor.get_metrics()["quota_exceeded"] == 1
+    assert governor.get_metrics()["running"] == 0
+
+
+@pytest.mark.asyncio
+async def test_run_sets_query_timeout_and_closes_cursor():
+    conn = MagicMock()
+    cursor = MagicMock()
+    timeouts = []
+    conn.cursor.side_effect = lambda: timeouts.append(conn.timeout) or cursor
+    governor = SqlQueryGovernor(run_inline, timeout_seconds=7, check_plan_cost=False)
+
+    result = await governor.run(conn, lambda cur, sql: (cur, sql), "SELECT 1")
+
+    assert result == (cursor, "SELECT 1")
+    assert timeouts == [7]
+    assert conn.timeout == 0
+    cursor.close.assert_called_once()
+    assert governor.get_metrics()["executed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_client_timeout_cancels_statement():
+    cursor = MagicMock()
+    conn = MagicMock()
+    conn.cursor.return_value = cursor
+    cancelled = threading.Event()
+    cursor.cancel.side_effect = cancelled.set
+    governor = SqlQueryGovernor(run_in_thread, timeout_seconds=0.05, check_plan_cost=False)
+    # The mock cursor never times out on the server, so only the client-side timeout applies
+    governor.client_grace_seconds = 0
+
+    result = await governor.run(conn, lambda cur, sql: cancelled.wait(5), "SELECT 1")
+
+    assert result is None
+    cursor.cancel.assert_called_once()
+    cursor.close.assert_called_once()
+    assert governor.get_metrics()["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_request_cancellation_cancels_statement():
+    cursor = MagicMock()
+    conn = MagicMock()
+    conn.cursor.return_value = cursor
+    started = threading.Event()
+    cancelled = threading.Event()
+    cursor.cancel.side_effect = cancelled.set
+    governor = SqlQueryGovernor(run_in_thread, check_plan_cost=False)
+
+    def slow_query(cur, sql):
+        started.set()
+        cancelled.wait(5)
+
+    task = asyncio.create_task(governor.run(conn, slow_query, "SELECT 1"))
+    await asyncio.to_thread(started.wait, 5)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    cursor.cancel.assert_called_once()
+    cursor.close.assert_called_once()
+    assert governor.get_metrics()["cancelled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_plan_cost_above_limit_is_rejected():
+    cursor = MagicMock()
+    cursor.fetchone.return_value = ('<ShowPlanXML><StmtSimple StatementSubTreeCost="125.5"/></ShowPlanXML>',)
+    conn = MagicMock()
+    conn.cursor.return_value = cursor
+    governor = SqlQueryGovernor(run_inline, check_plan_cost=True, max_plan_cost=100)
+    func = MagicMock()
+
+    with pytest.raises(SqlQueryRejectedError):
+        await governor.run(conn, func, "SELECT 1")
+
+    func.assert_not_called()
+    assert [call.args[0] for call in cursor.execute.call_args_list] == [
+        "SET SHOWPLAN_XML ON", "SELECT 1", "SET SHOWPLAN_XML OFF"
+    ]
+    assert governor.get_metrics()["max_plan_cost"] == 125.5
+    cursor.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_plan_cost_errors_do_not_block_the_query():
+    cursor = MagicMock()
+    cursor.execute.side_effect = [Exception("no SHOWPLAN permission"), None, None]
+    conn = MagicMock()
+    conn.cursor.return_value = cursor
+    discard = MagicMock()
+    governor = SqlQueryGovernor(run_inline, check_plan_cost=True, discard=discard)
+
+    assert await governor.run(conn, lambda cur, sql: "ok", "SELECT 1") == "ok"
+    discard.assert_called_once_with(conn)
+
+
+@pytest.mark.asyncio
+async def test_query_is_not_run_when_showplan_cannot_be_turned_off():
+    cursor = MagicMock()
+    cursor.execute.side_effect = Exception("connection broken")
+    conn = MagicMock()
+    conn.cursor.return_value = cursor
+    discard = MagicMock()
+    governor = SqlQueryGovernor(run_inline, check_plan_cost=True, discard=discard)
+    func = MagicMock()
+
+    with pytest.raises(Exception, match="connection broken"):
+        await governor.run(conn, func, "SELECT 1")
+
+    func.assert_not_called()
+    discard.assert_called_once_with(conn)
+    cursor.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_plan_cost_check_discards_the_connection():
+    started = threading.Event()
+    release = threading.Event()
+
+    def execute(sql):
+        if sql != "SET SHOWPLAN_XML ON":
+            started.set()
+            release.wait()
+
+    cursor = MagicMock()
+    cursor.execute.side_effect = execute
+    conn = MagicMock()
+    conn.cursor.return_value = cursor
+    discard = MagicMock()
+    governor = SqlQueryGovernor(run_in_thread, check_plan_cost=True, discard=discard)
+
+    task = asyncio.create_task(governor.run(conn, MagicMock(), "SELECT 1"))
+    await asyncio.to_thread(started.wait)
+    task.cancel()
+    release.set()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    discard.assert_called_once_with(conn)
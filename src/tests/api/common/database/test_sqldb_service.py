@@ -1,8 +1,12 @@
+import asyncio
+import time
+
 import pytest
 import pyodbc
 from unittest.mock import patch, MagicMock, AsyncMock
 from datetime import datetime
 from common.database import sqldb_service
+from common.database.chart_filters import compile_chart_filters
 
 
 @pytest.fixture
@@ -18,28 +22,80 @@ def mock_db_conn():
 
 @pytest.fixture
 def token_fixture():
-    """Fixture to mock ManagedIdentityCredential with async context support."""
-    with patch("common.database.sqldb_service.ManagedIdentityCredential") as mock_cred:
+    """Fixture to mock the async Azure credential used for the SQL access token."""
+    with patch("common.database.sqldb_service.get_azure_credential_async", new_callable=AsyncMock) as mock_get_cred:
         mock_cred_instance = MagicMock()
+        token_mock = MagicMock()
+        token_mock.token = "dummy_token"
+        token_mock.expires_on = datetime.now().timestamp() + 3600
+        mock_cred_instance.get_token = AsyncMock(return_value=token_mock)
+        mock_get_cred.return_value = mock_cred_instance
 
-        async def mock_get_token(*args, **kwargs):
-            token_mock = MagicMock()
-            token_mock.token = "dummy_token"
-            return token_mock
-
-        mock_cred_instance.get_token.side_effect = mock_get_token
-
-        async def aenter(*args, **kwargs):
-            return mock_cred_instance
-
-        async def aexit(*args, **kwargs):
-            pass
+        yield mock_cred_instance
 
-        mock_cred_instance.__aenter__.side_effect = aenter
-        mock_cred_instance.__aexit__.side_effect = aexit
-        mock_cred.return_value = mock_cred_instance
 
-        yield mock_cred_instance
+@pytest.fixture(autouse=True)
+def reset_connection_pool():
+    """Each test starts with an empty connection pool."""
+    sqldb_service._connection_pool = None
+    sqldb_service._sql_executor = None
+    sqldb_service._sql_governor = None
+    sqldb_service._watermark_table_ready = False
+    yield
+    if sqldb_service._sql_executor is not None:
+        sqldb_service._sql_executor.shutdown(wait=False)
+    sqldb_service._connection_pool = None
+    sqldb_service._sql_executor = None
+    sqldb_service._sql_governor = None
+
+
+def mock_query_rows(mock_cursor, description, rows):
+    """Make each execute() start a result set that fetchmany() returns in batches."""
+    def execute(*args):
+        remaining = list(rows)
+        mock_cursor.description = description
+
+        def fetchmany(size=1):
+            batch = remaining[:size]
+            del remaining[:size]
+            return batch
+        mock_cursor.fetchmany.side_effect = fetchmany
+    mock_cursor.execute.side_effect = execute
+
+
+CHART_RESULT_SETS = [
+    (
+        [("id",), ("chart_name",), ("chart_type",), ("name",), ("value",), ("unit_of_measurement",)],
+        [("TOTAL_CALLS", "Total Calls", "card", "Total Calls", 100, "")],
+    ),
+    (
+        [("name",), ("id",), ("chart_name",), ("chart_type",), ("average_sentiment",), ("call_frequency",)],
+        [("Topic A", "TOPICS", "Trending Topics", "table", "positive", 42)],
+    ),
+    (
+        [("text",), ("id",), ("chart_name",), ("chart_type",), ("size",), ("average_sentiment",)],
+        [("keyphrase", "KEY_PHRASES", "Key Phrases", "wordcloud", 20, "positive")],
+    ),
+]
+
+
+def mock_chart_result_sets(mock_cursor, result_sets=CHART_RESULT_SETS):
+    """Make the cursor return the given (description, rows) result sets, advanced by nextset()."""
+    position = {"index": 0}
+
+    def select(index):
+        position["index"] = index
+        mock_cursor.description = result_sets[index][0]
+
+    def nextset():
+        if position["index"] + 1 >= len(result_sets):
+            return False
+        select(position["index"] + 1)
+        return True
+
+    mock_cursor.execute.side_effect = lambda *args, **kwargs: select(0)
+    mock_cursor.nextset.side_effect = nextset
+    mock_cursor.fetchall.side_effect = lambda: list(result_sets[position["index"]][1])
 
 
 class TestSqlDbService:
@@ -50,43 +106,117 @@ class TestSqlDbService:
         assert conn is not None
 
     @pytest.mark.asyncio
-    async def test_get_db_connection_fallback_to_sql_auth(self):
+    async def test_get_db_connection_fallback_to_sql_auth(self, token_fixture):
         """Test fallback to SQL auth when token auth fails."""
-        with patch("pyodbc.connect") as mock_connect, \
-             patch("common.database.sqldb_service.ManagedIdentityCredential") as mock_cred:
+        with patch("pyodbc.connect") as mock_connect:
+            fallback_conn = MagicMock()
+            mock_connect.side_effect = [pyodbc.Error("Simulated failure"), fallback_conn]
 
-            mock_token_instance = MagicMock()
+            conn = await sqldb_service.get_db_connection()
+            assert conn is fallback_conn
 
-            async def get_token_mock(*args, **kwargs):
-                token_mock = MagicMock()
-                token_mock.token = "dummy_token"
-                return token_mock
+    @pytest.mark.asyncio
+    async def test_access_token_comes_from_the_shared_credential(self, mock_db_conn, token_fixture):
+        await sqldb_service.get_db_connection()
 
-            mock_token_instance.get_token.side_effect = get_token_mock
+        token_fixture.get_token.assert_awaited_once_with(sqldb_service.SQL_TOKEN_SCOPE)
 
-            async def aenter(*args, **kwargs):
-                raise pyodbc.Error("Simulated failure")
+    @pytest.mark.asyncio
+    async def test_queries_borrow_pooled_connection(self, mock_db_conn, token_fixture):
+        _, mock_cursor = mock_db_conn
+        mock_query_rows(mock_cursor, [("value",)], [(1,)])
 
-            mock_token_instance.__aenter__.side_effect = aenter
-            mock_token_instance.__aexit__.side_effect = AsyncMock()
-            mock_cred.return_value = mock_token_instance
+        with patch("pyodbc.connect", wraps=sqldb_service.pyodbc.connect) as mock_connect:
+            await sqldb_service.execute_sql_query("SELECT 1")
+            await sqldb_service.execute_sql_query("SELECT 1")
 
-            fallback_conn = MagicMock()
-            mock_connect.return_value = fallback_conn
+            assert mock_connect.call_count == 1
+        metrics = sqldb_service.get_pool_metrics()
+        assert metrics["checkouts"] == 2
+        assert metrics["created"] == 1
 
-            conn = await sqldb_service.get_db_connection()
-            assert conn is fallback_conn
+    @pytest.mark.asyncio
+    async def test_close_connection_pool(self, mock_db_conn, token_fixture):
+        mock_conn, mock_cursor = mock_db_conn
+        mock_query_rows(mock_cursor, [("value",)], [(1,)])
+        await sqldb_service.execute_sql_query("SELECT 1")
+
+        await sqldb_service.close_connection_pool()
+
+        mock_conn.close.assert_called_once()
+        assert sqldb_service.get_pool_metrics() == {}
 
     @pytest.mark.asyncio
     async def test_adjust_processed_data_dates(self, mock_db_conn, token_fixture):
         mock_conn, mock_cursor = mock_db_conn
         old_date = datetime.today().replace(year=datetime.today().year - 1)
-        mock_cursor.fetchone.return_value = [old_date]
+        # watermark check, applock result, watermark re-check under lock, max start time
+        mock_cursor.fetchone.side_effect = [None, [0], None, [old_date]]
+
+        shifted = await sqldb_service.adjust_processed_data_dates()
 
-        await sqldb_service.adjust_processed_data_dates()
-        assert mock_cursor.execute.call_count >= 4
+        assert shifted is True
+        statements = [c.args[0] for c in mock_cursor.execute.call_args_list]
+        assert sum(stmt.startswith("UPDATE") for stmt in statements) == 3
+        assert any("sp_getapplock" in stmt for stmt in statements)
+        assert any("UPDATE [dbo].[km_call_rollup_daily]" in stmt for stmt in statements)
+        assert any("MERGE [dbo].[km_data_watermark]" in stmt for stmt in statements)
         assert mock_conn.commit.called
 
+    @pytest.mark.asyncio
+    async def test_adjust_processed_data_dates_skips_when_already_rebased_today(self, mock_db_conn, token_fixture):
+        mock_conn, mock_cursor = mock_db_conn
+        mock_cursor.fetchone.return_value = [datetime.today().date()]
+
+        shifted = await sqldb_service.adjust_processed_data_dates()
+
+        assert shifted is False
+        statements = [c.args[0] for c in mock_cursor.execute.call_args_list]
+        assert not any(stmt.startswith("UPDATE") or "sp_getapplock" in stmt for stmt in statements)
+        assert not mock_conn.commit.called
+
+    @pytest.mark.asyncio
+    async def test_adjust_processed_data_dates_skips_when_lock_is_held(self, mock_db_conn, token_fixture):
+        mock_conn, mock_cursor = mock_db_conn
+        mock_cursor.fetchone.side_effect = [None, [-1]]
+
+        shifted = await sqldb_service.adjust_processed_data_dates()
+
+        assert shifted is False
+        statements = [c.args[0] for c in mock_cursor.execute.call_args_list]
+        assert not any(stmt.startswith("UPDATE") for stmt in statements)
+        assert not mock_conn.commit.called
+
+    @pytest.mark.asyncio
+    async def test_fetch_data_version(self, mock_db_conn, token_fixture):
+        _, mock_cursor = mock_db_conn
+        updated_at = datetime(2024, 5, 1, 0, 5)
+        mock_cursor.fetchone.return_value = [updated_at]
+
+        assert await sqldb_service.fetch_data_version() == updated_at
+        mock_cursor.execute.assert_called_once()
+        sql = mock_cursor.execute.call_args.args[0]
+        assert "SELECT updated_at FROM [dbo].[km_data_watermark] WHERE id = 1" in sql
+        assert "CREATE TABLE" not in sql
+        assert not mock_cursor.commit.called
+
+    @pytest.mark.asyncio
+    async def test_fetch_data_version_without_watermark(self, mock_db_conn, token_fixture):
+        _, mock_cursor = mock_db_conn
+        mock_cursor.fetchone.return_value = [None]
+
+        assert await sqldb_service.fetch_data_version() is None
+
+    @pytest.mark.asyncio
+    async def test_fetch_schema_version(self, mock_db_conn, token_fixture):
+        _, mock_cursor = mock_db_conn
+        mock_cursor.fetchone.return_value = [123456]
+
+        assert await sqldb_service.fetch_schema_version() == 123456
+        sql, *params = mock_cursor.execute.call_args.args
+        assert "INFORMATION_SCHEMA.COLUMNS" in sql
+        assert params == ["km_processed_data", "processed_data_key_phrases"]
+
     @pytest.mark.asyncio
     async def test_fetch_filters_data(self, mock_db_conn, token_fixture):
         _, mock_cursor = mock_db_conn
@@ -105,22 +235,7 @@ class TestSqlDbService:
     @pytest.mark.asyncio
     async def test_fetch_chart_data_with_filters(self, mock_db_conn, token_fixture):
         _, mock_cursor = mock_db_conn
-        mock_cursor.fetchall.side_effect = [
-            [("TOTAL_CALLS", "Total Calls", "card", "Total Calls", 100, "")],
-            [("Topic A", "TOPICS", "Trending Topics", "table", "positive", 42)],
-            [("keyphrase", "KEY_PHRASES", "Key Phrases", "wordcloud", 20, "positive")]
-        ]
-        descriptions = [
-            [("id",), ("chart_name",), ("chart_type",), ("name",), ("value",), ("unit_of_measurement",)],
-            [("name",), ("id",), ("chart_name",), ("chart_type",), ("average_sentiment",), ("call_frequency",)],
-            [("text",), ("id",), ("chart_name",), ("chart_type",), ("size",), ("average_sentiment",)],
-        ]
-
-        def exec_side_effect(*args, **kwargs):
-            call = mock_cursor.execute.call_count - 1
-            mock_cursor.description = descriptions[call]
-
-        mock_cursor.execute.side_effect = exec_side_effect
+        mock_chart_result_sets(mock_cursor)
 
         filters = MagicMock()
         filters.model_dump.return_value = {
@@ -135,26 +250,25 @@ class TestSqlDbService:
         result = await sqldb_service.fetch_chart_data(chart_filters=filters)
         assert isinstance(result, list)
         assert len(result) == 3
+        assert mock_cursor.execute.call_count == 1
+        sql_stmt, *params = mock_cursor.execute.call_args.args
+        assert params == ["Topic A", "positive", "yes"]
+        assert "Topic A" not in sql_stmt
+        assert [chart["id"] for chart in result] == ["TOTAL_CALLS", "TOPICS", "KEY_PHRASES"]
+        assert result[2]["chart_value"] == [{"text": "keyphrase", "size": 20, "average_sentiment": "positive"}]
 
     @pytest.mark.asyncio
-    async def test_fetch_chart_data_with_invalid_model(self, mock_db_conn, token_fixture):
+    async def test_fetch_chart_data_missing_result_set(self, mock_db_conn, token_fixture):
         _, mock_cursor = mock_db_conn
-        mock_cursor.fetchall.side_effect = [
-            [("TOTAL_CALLS", "Total Calls", "card", "Total Calls", 100, "")],
-            [("Topic A", "TOPICS", "Trending Topics", "table", "positive", 42)],
-            [("keyphrase", "KEY_PHRASES", "Key Phrases", "wordcloud", 20, "positive")]
-        ]
-        descriptions = [
-            [("id",), ("chart_name",), ("chart_type",), ("name",), ("value",), ("unit_of_measurement",)],
-            [("name",), ("id",), ("chart_name",), ("chart_type",), ("average_sentiment",), ("call_frequency",)],
-            [("text",), ("id",), ("chart_name",), ("chart_type",), ("size",), ("average_sentiment",)],
-        ]
+        mock_chart_result_sets(mock_cursor, CHART_RESULT_SETS[:2])
 
-        def exec_side_effect(*args, **kwargs):
-            call = mock_cursor.execute.call_count - 1
-            mock_cursor.description = descriptions[call]
+        with pytest.raises(RuntimeError):
+            await sqldb_service.fetch_chart_data()
 
-        mock_cursor.execute.side_effect = exec_side_effect
+    @pytest.mark.asyncio
+    async def test_fetch_chart_data_with_invalid_model(self, mock_db_conn, token_fixture):
+        _, mock_cursor = mock_db_conn
+        mock_chart_result_sets(mock_cursor)
 
         filters = MagicMock()
         filters.model_dump.side_effect = Exception("Invalid model")
@@ -169,22 +283,7 @@ class TestSqlDbService:
     ])
     async def test_fetch_chart_data_with_various_date_ranges(self, mock_db_conn, token_fixture, date_range_value):
         _, mock_cursor = mock_db_conn
-        mock_cursor.fetchall.side_effect = [
-            [("TOTAL_CALLS", "Total Calls", "card", "Total Calls", 100, "")],
-            [("Topic A", "TOPICS", "Trending Topics", "table", "positive", 42)],
-            [(f"keyphrase", "KEY_PHRASES", "Key Phrases", "wordcloud", 10, "positive")]
-        ]
-        descriptions = [
-            [("id",), ("chart_name",), ("chart_type",), ("name",), ("value",), ("unit_of_measurement",)],
-            [("name",), ("id",), ("chart_name",), ("chart_type",), ("average_sentiment",), ("call_frequency",)],
-            [("text",), ("id",), ("chart_name",), ("chart_type",), ("size",), ("average_sentiment",)],
-        ]
-
-        def exec_side_effect(*args, **kwargs):
-            call = mock_cursor.execute.call_count - 1
-            mock_cursor.description = descriptions[call]
-
-        mock_cursor.execute.side_effect = exec_side_effect
+        mock_chart_result_sets(mock_cursor)
 
         filters = MagicMock()
         filters.model_dump.return_value = {"selected_filters": {"DateRange": [date_range_value]}}
@@ -193,18 +292,176 @@ class TestSqlDbService:
         assert isinstance(result, list)
         assert len(result) == 3
 
+    def test_chart_aggregate_sql_uses_rollups_with_raw_boundary_day(self):
+        filters = MagicMock()
+        filters.model_dump.return_value = {
+            "selected_filters": {"Topic": ["Billing"], "Sentiment": ["all"], "DateRange": ["Last 7 days"]}
+        }
+
+        sql = sqldb_service._chart_aggregate_sql(compile_chart_filters(filters))
+
+        assert "FROM [dbo].[km_call_rollup_daily] where mined_topic IN (@topic_0) and call_date > CAST(@cutoff AS date)" in sql
+        assert "FROM [dbo].[km_key_phrase_rollup_daily] where topic IN (@topic_0)" in sql
+        # Raw rows are only read for the first, partial day when the rollups exist
+        assert "StartTime < CAST(DATEADD(day, 1, CAST(@cutoff AS date)) AS datetime2(0))" in sql
+        # StartTime is compared directly so the date range can seek on its index
+        assert "CAST(StartTime" not in sql
+        assert "sentiment IN" not in sql
+
+    def test_chart_aggregate_sql_without_filters(self):
+        sql = sqldb_service._chart_aggregate_sql(compile_chart_filters(''))
+
+        assert "@cutoff" not in sql
+        assert "UNION ALL" not in sql
+        assert "km_call_rollup_daily" in sql
+        assert "FROM [dbo].[processed_data]" in sql
+
     @pytest.mark.asyncio
     async def test_execute_sql_query(self, mock_db_conn, token_fixture):
         _, mock_cursor = mock_db_conn
-        mock_cursor.fetchall.return_value = [(1,), (2,), (3,)]
+        mock_query_rows(mock_cursor, [("date",), ("topic",), ("total_calls",)], [
+            (datetime(2025, 6, 27).date(), "Billing", 11),
+            (datetime(2025, 6, 28).date(), "Roaming | Data", None),
+        ])
+
+        result = await sqldb_service.execute_sql_query("SELECT 1", max_rows=10, max_chars=1000)
+        assert result == (
+            "date|topic|total_calls\n"
+            "2025-06-27|Billing|11\n"
+            "2025-06-28|Roaming \\| Data|"
+        )
+        mock_cursor.fetchall.assert_not_called()
 
-        result = await sqldb_service.execute_sql_query("SELECT 1")
-        assert result == "(1,)(2,)(3,)"
+    @pytest.mark.asyncio
+    async def test_execute_sql_query_stops_at_row_budget(self, mock_db_conn, token_fixture):
+        _, mock_cursor = mock_db_conn
+        mock_query_rows(mock_cursor, [("n",)], [(n,) for n in range(10000)])
+
+        result = await sqldb_service.execute_sql_query("SELECT n", max_rows=3, max_chars=1000)
+        assert result.splitlines() == [
+            "n", "0", "1", "2", "[truncated: showing the first 3 rows, the query returned more]"
+        ]
+        # Only the first batch was read
+        mock_cursor.fetchmany.assert_called_once_with(4)
+        mock_cursor.cancel.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_execute_sql_query_stops_at_char_budget(self, mock_db_conn, token_fixture):
+        _, mock_cursor = mock_db_conn
+        mock_query_rows(mock_cursor, [("text",)], [("x" * 40,) for _ in range(10)])
+
+        result = await sqldb_service.execute_sql_query("SELECT text", max_rows=100, max_chars=100)
+        lines = result.splitlines()
+        assert lines[1:3] == ["x" * 40, "x" * 40]
+        assert lines[3].startswith("[truncated: showing the first 2 rows")
+
+    @pytest.mark.asyncio
+    async def test_execute_sql_query_reads_all_batches_within_budget(self, mock_db_conn, token_fixture):
+        _, mock_cursor = mock_db_conn
+        mock_query_rows(mock_cursor, [("n",)], [(n,) for n in range(1200)])
+
+        result = await sqldb_service.execute_sql_query("SELECT n", max_rows=5000, max_chars=100000)
+        assert len(result.splitlines()) == 1201
+        assert "truncated" not in result
+
+    @pytest.mark.asyncio
+    async def test_execute_sql_query_budgets_default_to_config(self, mock_db_conn, token_fixture):
+        _, mock_cursor = mock_db_conn
+        mock_query_rows(mock_cursor, [("n",)], [(n,) for n in range(10)])
+
+        with patch("common.database.sqldb_service.Config") as mock_config:
+            mock_config.return_value.sql_query_max_rows = 2
+            mock_config.return_value.sql_query_max_chars = 20000
+            mock_config.return_value.sqldb_pool_size = 2
+            mock_config.return_value.sqldb_pool_timeout = 5
+            mock_config.return_value.sqldb_pool_recycle_seconds = 1800
+            mock_config.return_value.sqldb_pool_health_check_seconds = 60
+            mock_config.return_value.sqldb_max_concurrency = 2
+            mock_config.return_value.sqldb_max_queue_depth = 10
+            mock_config.return_value.sql_query_timeout_seconds = 30
+            mock_config.return_value.sql_query_max_concurrent_per_user = 2
+            mock_config.return_value.sql_query_check_plan_cost = False
+            mock_config.return_value.sql_query_max_plan_cost = 0
+            result = await sqldb_service.execute_sql_query("SELECT n")
+
+        assert result.splitlines()[1:3] == ["0", "1"]
+        assert "truncated" in result
+
+    @pytest.mark.asyncio
+    async def test_execute_sql_query_without_result_set(self, mock_db_conn, token_fixture):
+        _, mock_cursor = mock_db_conn
+        mock_cursor.description = None
+
+        assert await sqldb_service.execute_sql_query("SELECT 1 WHERE 1 = 0") == ""
 
     @pytest.mark.asyncio
     async def test_execute_sql_query_exception(self, mock_db_conn, token_fixture):
         _, mock_cursor = mock_db_conn
         mock_cursor.execute.side_effect = Exception("Invalid SQL")
 
-        result = await sqldb_service.execute_sql_query("INVALID SQL")
+        result = await sqldb_service.execute_sql_query("SELECT * FROM missing_table")
+        assert result is None
+
+    @pytest.mark.asyncio
+    async def test_execute_sql_query_rejects_writes(self, mock_db_conn, token_fixture):
+        mock_conn, mock_cursor = mock_db_conn
+
+        result = await sqldb_service.execute_sql_query("DELETE FROM processed_data")
         assert result is None
+        mock_cursor.execute.assert_not_called()
+        assert sqldb_service.get_governor_metrics()["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_execute_sql_query_caps_rows_and_sets_timeout(self, mock_db_conn, token_fixture):
+        mock_conn, mock_cursor = mock_db_conn
+        mock_query_rows(mock_cursor, [("n",)], [(1,)])
+
+        await sqldb_service.execute_sql_query("SELECT n FROM t", max_rows=10, max_chars=1000)
+
+        executed = [call.args[0] for call in mock_cursor.execute.call_args_list]
+        assert executed[-1] == "SELECT TOP (11) n FROM t"
+        # The query timeout is only applied to the generated SQL's cursor
+        assert mock_conn.timeout == 0
+        mock_cursor.close.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_sql_work_runs_off_the_event_loop(self, mock_db_conn, token_fixture):
+        _, mock_cursor = mock_db_conn
+        mock_query_rows(mock_cursor, [("value",)], [(1,)])
+
+        await sqldb_service.execute_sql_query("SELECT 1")
+
+        metrics = sqldb_service.get_executor_metrics()
+        # connect, execute and the rollback on release all go through the executor
+        assert metrics["submitted"] >= 3
+        assert metrics["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_streaming_latency_stays_flat_under_chart_load(self, mock_db_conn, token_fixture):
+        """Load test: slow chart queries must not delay frames of a concurrent chat stream."""
+        _, mock_cursor = mock_db_conn
+        query_seconds = 0.2
+
+        def slow_execute(*args, **kwargs):
+            time.sleep(query_seconds)
+            mock_cursor.description = [("filter_name",), ("displayValue",), ("key1",)]
+
+        mock_cursor.execute.side_effect = slow_execute
+        mock_cursor.fetchall.return_value = [("Topic", "Billing", "Billing")]
+
+        frame_interval = 0.01
+        gaps = []
+
+        async def stream_frames():
+            last = time.monotonic()
+            for _ in range(40):
+                await asyncio.sleep(frame_interval)
+                now = time.monotonic()
+                gaps.append(now - last)
+                last = now
+
+        chart_queries = [sqldb_service.fetch_filters_data() for _ in range(8)]
+        await asyncio.gather(stream_frames(), *chart_queries)
+
+        # Run on the loop, each 200ms query would have stalled the stream for its full duration.
+        assert max(gaps) < query_seconds / 2
@@ -0,0 +1,168 @@
+import asyncio
+import threading
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from azure.core.credentials import AccessToken
+from azure.core.exceptions import ClientAuthenticationError
+
+import helpers.azure_credential_utils as credential_utils
+from helpers.azure_credential_utils import (
+    AsyncCachedTokenCredential,
+    CachedTokenCredential,
+    close_azure_credentials,
+    get_azure_credential,
+    get_azure_credential_async,
+    get_credential_metrics,
+)
+
+SCOPE = "https://database.windows.net/.default"
+
+
+def make_token(name, expires_in=3600):
+    return AccessToken(name, int(time.time() + expires_in))
+
+
+@pytest.fixture(autouse=True)
+def reset_credentials():
+    credential_utils._credentials.clear()
+    credential_utils._async_credentials.clear()
+    for key in credential_utils._metrics:
+        credential_utils._metrics[key] = 0
+    yield
+    credential_utils._credentials.clear()
+    credential_utils._async_credentials.clear()
+
+
+@patch("helpers.azure_credential_utils.AzureCliCredential")
+@patch("helpers.azure_credential_utils.ManagedIdentityCredential")
+def test_tokens_are_cached_per_scope(mock_mi, mock_cli):
+    mock_mi.return_value.get_token.side_effect = lambda scope: make_token(scope)
+    credential = CachedTokenCredential(client_id="mid")
+
+    assert credential.get_token(SCOPE).token == SCOPE
+    assert credential.get_token(SCOPE).token == SCOPE
+    assert credential.get_token("other").token == "other"
+
+    mock_mi.assert_called_once_with(client_id="mid")
+    assert mock_mi.return_value.get_token.call_count == 2
+    mock_cli.assert_not_called()
+    metrics = get_credential_metrics()
+    assert metrics["managed_identity_fetches"] == 2
+    assert metrics["cache_hits"] == 1
+    assert credential.source == "managed_identity"
+
+
+@patch("helpers.azure_credential_utils.AzureCliCredential")
+@patch("helpers.azure_credential_utils.ManagedIdentityCredential")
+def test_falls_back_to_cli_and_raises_when_both_fail(mock_mi, mock_cli):
+    mock_mi.return_value.get_token.side_effect = Exception("no IMDS")
+    mock_cli.return_value.get_token.return_value = make_token("cli")
+
+    assert CachedTokenCredential().get_token(SCOPE).token == "cli"
+    assert get_credential_metrics()["cli_fetches"] == 1
+
+    mock_cli.return_value.get_token.side_effect = Exception("not logged in")
+    with pytest.raises(ClientAuthenticationError):
+        CachedTokenCredential().get_token(SCOPE)
+
+
+@patch("helpers.azure_credential_utils.ManagedIdentityCredential")
+def test_tokens_close_to_expiry_are_refreshed(mock_mi):
+    mock_mi.return_value.get_token.side_effect = [make_token("old", expires_in=60), make_token("new")]
+    credential = CachedTokenCredential()
+
+    assert credential.get_token(SCOPE).token == "old"
+    assert credential.get_token(SCOPE).token == "new"
+
+
+@patch("helpers.azure_credential_utils.ManagedIdentityCredential")
+def test_refresh_failure_keeps_a_valid_token(mock_mi):
+    mock_mi.return_value.get_token.side_effect = [make_token("old", expires_in=450), Exception("IMDS down")]
+    credential = CachedTokenCredential()
+
+    assert credential.get_token(SCOPE).token == "old"
+    assert credential.get_token(SCOPE).token == "old"
+    assert get_credential_metrics()["fetch_failures"] == 1
+
+
+@patch("helpers.azure_credential_utils.ManagedIdentityCredential")
+def test_concurrent_threads_share_one_fetch(mock_mi):
+    def slow_token(scope):
+        time.sleep(0.05)
+        return make_token("token")
+
+    mock_mi.return_value.get_token.side_effect = slow_token
+    credential = CachedTokenCredential()
+    threads = [threading.Thread(target=credential.get_token, args=(SCOPE,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert mock_mi.return_value.get_token.call_count == 1
+
+
+@pytest.mark.asyncio
+@patch("helpers.azure_credential_utils.AioManagedIdentityCredential")
+async def test_async_concurrent_callers_share_one_fetch(mock_mi):
+    async def slow_token(scope):
+        await asyncio.sleep(0.05)
+        return make_token("token")
+
+    mock_mi.return_value.get_token = AsyncMock(side_effect=slow_token)
+    credential = AsyncCachedTokenCredential()
+
+    tokens = await asyncio.gather(*(credential.get_token(SCOPE) for _ in range(8)))
+
+    assert {token.token for token in tokens} == {"token"}
+    assert mock_mi.return_value.get_token.await_count == 1
+    assert get_credential_metrics()["managed_identity_fetches"] == 1
+
+
+@pytest.mark.asyncio
+@patch("helpers.azure_credential_utils.AioManagedIdentityCredential")
+async def test_async_refreshes_in_the_background_before_expiry(mock_mi):
+    mock_mi.return_value.get_token = AsyncMock(side_effect=[make_token("old", expires_in=450), make_token("new")])
+    credential = AsyncCachedTokenCredential()
+
+    assert (await credential.get_token(SCOPE)).token == "old"
+    # Still valid, so it is returned while the new token is fetched
+    assert (await credential.get_token(SCOPE)).token == "old"
+    await asyncio.sleep(0)
+    assert (await credential.get_token(SCOPE)).token == "new"
+    assert get_credential_metrics()["background_refreshes"] == 1
+
+
+@pytest.mark.asyncio
+@patch("helpers.azure_credential_utils.AioAzureCliCredential")
+@patch("helpers.azure_credential_utils.AioManagedIdentityCredential")
+async def test_async_falls_back_to_cli(mock_mi, mock_cli):
+    mock_mi.return_value.get_token = AsyncMock(side_effect=Exception("no IMDS"))
+    mock_mi.return_value.close = AsyncMock()
+    mock_cli.return_value.get_token = AsyncMock(return_value=make_token("cli"))
+
+    credential = AsyncCachedTokenCredential()
+
+    assert (await credential.get_token(SCOPE)).token == "cli"
+    assert credential.source == "cli"
+    mock_mi.return_value.close.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_credentials_are_shared_per_client_id():
+    assert get_azure_credential() is get_azure_credential()
+    assert get_azure_credential("mid") is not get_azure_credential()
+    assert await get_azure_credential_async("mid") is await get_azure_credential_async("mid")
+
+    sync_credential = get_azure_credential()
+    sync_credential._credential = MagicMock()
+    async_credential = await get_azure_credential_async()
+    async_credential._credential = MagicMock(close=AsyncMock())
+    inner = async_credential._credential
+
+    await close_azure_credentials()
+
+    inner.close.assert_awaited_once()
+    assert get_azure_credential() is not sync_credential
@@ -0,0 +1,66 @@
+import pytest
+
+from helpers.row_grouping import group_rows
+
+CHART_COLUMNS = ["id", "chart_name", "chart_type", "name", "value", "unit_of_measurement"]
+CHART_ROWS = [
+    ("TOTAL_CALLS", "Total Calls", "card", "Total Calls", 100, ""),
+    ("SENTIMENT", "Topics Overview", "donutchart", "positive", 60, ""),
+    ("AVG_HANDLING_TIME", "Average Handling Time", "card", "Average Handling Time", 7, "mins"),
+    ("SENTIMENT", "Topics Overview", "donutchart", "negative", 40, ""),
+]
+
+
+def group_charts(rows, **kwargs):
+    return group_rows(
+        rows, CHART_COLUMNS,
+        group_by=["id", "chart_name", "chart_type"],
+        value_columns=["name", "value", "unit_of_measurement"],
+        value_key="chart_value",
+        **kwargs
+    )
+
+
+def test_group_rows_nests_values_per_group():
+    result = group_charts(CHART_ROWS)
+
+    assert [chart["id"] for chart in result] == ["AVG_HANDLING_TIME", "SENTIMENT", "TOTAL_CALLS"]
+    sentiment = result[1]
+    assert sentiment == {
+        "id": "SENTIMENT",
+        "chart_name": "Topics Overview",
+        "chart_type": "donutchart",
+        "chart_value": [
+            {"name": "positive", "value": 60, "unit_of_measurement": ""},
+            {"name": "negative", "value": 40, "unit_of_measurement": ""},
+        ],
+    }
+
+
+def test_group_rows_keeps_first_seen_order_when_unsorted():
+    result = group_charts(CHART_ROWS, sort=False)
+    assert [chart["id"] for chart in result] == ["TOTAL_CALLS", "SENTIMENT", "AVG_HANDLING_TIME"]
+
+
+def test_group_rows_drops_null_keys_and_keeps_null_values():
+    rows = [(None, "x", "card", "a", 1, ""), ("A", "x", "card", "b", None, "")]
+    result = group_charts(rows)
+
+    assert len(result) == 1
+    assert result[0]["chart_value"] == [{"name": "b", "value": None, "unit_of_measurement": ""}]
+
+
+def test_group_rows_empty():
+    assert group_charts([]) == []
+
+
+def test_group_rows_matches_pandas_groupby():
+    pd = pytest.importorskip("pandas")
+    df = pd.DataFrame(CHART_ROWS, columns=CHART_COLUMNS)
+    expected = (
+        df.groupby(["id", "chart_name", "chart_type"]).apply(
+            lambda x: x[["name", "value", "unit_of_measurement"]].to_dict(orient="records"), include_groups=False
+        ).reset_index(name="chart_value").to_dict(orient="records")
+    )
+
+    assert group_charts(CHART_ROWS) == expected
@@ -1,6 +1,12 @@
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
-from helpers.streaming_helper import stream_processor
+import asyncio
+import json
+from types import SimpleNamespace
+
+from helpers import streaming_helper
+from helpers.streaming_helper import StreamChunkEncoder, coalesce_stream, json_dumps, stream_processor
+from helpers.utils import format_stream_response
 
 
 @pytest.mark.asyncio
@@ -57,3 +63,133 @@ async def test_stream_processor_logs_and_raises_on_exception():
         args, kwargs = mock_log.call_args
         assert "Error processing streaming response" in args[0]
         assert kwargs["exc_info"] is True
+
+
+def legacy_full_frame(content, history_metadata):
+    """The frame the chat stream used to build through format_stream_response."""
+    chunk = {
+        "id": "id", "model": "rag-model", "created": 0, "object": "extensions.chat.completion.chunk",
+        "choices": [{"messages": [], "delta": {"role": "assistant", "content": content}}],
+    }
+    chunk_obj = json.loads(json.dumps(chunk), object_hook=lambda d: SimpleNamespace(**d))
+    return json.dumps(format_stream_response(chunk_obj, history_metadata, "")) + "\n\n"
+
+
+@pytest.mark.parametrize("use_orjson", [False, True])
+def test_full_frame_matches_legacy_format(use_orjson):
+    history_metadata = {"conversation_id": "c1", "title": "Caf\u00e9 \"calls\""}
+    content = '{"answer": "Line 1\nLine 2 \u2014 \\ done", "citations": []}'
+    with patch.object(streaming_helper, "orjson", streaming_helper.orjson if use_orjson else None):
+        frame = StreamChunkEncoder(history_metadata).full(content)
+
+    assert frame.endswith("\n\n")
+    expected = json.loads(legacy_full_frame(content, history_metadata))
+    actual = json.loads(frame)
+    for key in ("id", "created"):
+        expected.pop(key)
+        actual.pop(key)
+    assert actual == expected
+
+
+def test_delta_and_final_frames():
+    encoder = StreamChunkEncoder({"conversation_id": "c1"})
+
+    first = json.loads(encoder.delta("Hel", first=True))
+    second = json.loads(encoder.delta("lo"))
+    final = json.loads(encoder.final("Hello", [{"url": "u"}]))
+
+    assert first["choices"][0]["delta"] == {"content": "Hel", "role": "assistant"}
+    assert first["history_metadata"] == {"conversation_id": "c1"}
+    assert second["choices"][0]["delta"] == {"content": "lo"}
+    assert "history_metadata" not in second
+    assert first["id"] == second["id"] == final["id"] == encoder.response_id
+    assert final["choices"][0]["messages"] == [{"role": "assistant", "content": "Hello"}]
+    assert final["citations"] == [{"url": "u"}]
+
+
+def test_json_dumps_without_orjson_is_compact():
+    with patch.object(streaming_helper, "orjson", None):
+        assert json_dumps({"a": [1, "b"]}) == '{"a":[1,"b"]}'
+
+
+async def fragments(items, delay=0):
+    for item in items:
+        if delay:
+            await asyncio.sleep(delay)
+        yield item
+
+
+@pytest.mark.asyncio
+async def test_coalesce_stream_flushes_on_size():
+    result = [piece async for piece in coalesce_stream(fragments(["ab", "cd", "", "efg", "h"]), max_bytes=4, max_latency=10)]
+
+    assert result == ["abcd", "efgh"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_stream_counts_utf8_bytes():
+    result = [piece async for piece in coalesce_stream(fragments(["\u00e9\u00e9", "x"]), max_bytes=4, max_latency=10)]
+
+    assert result == ["\u00e9\u00e9", "x"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_stream_flushes_on_latency():
+    source = fragments(["a", "b", "c"], delay=0.05)
+
+    result = [piece async for piece in coalesce_stream(source, max_bytes=1000, max_latency=0.01)]
+
+    assert result == ["a", "b", "c"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_stream_passthrough_when_disabled():
+    result = [piece async for piece in coalesce_stream(fragments(["a", "b"]), max_bytes=0)]
+
+    assert result == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_stream_does_not_read_ahead_of_a_slow_consumer():
+    produced = []
+
+    async def source():
+        for index in range(100):
+            produced.append(index)
+            yield "x" * 10
+
+    stream = coalesce_stream(source(), max_bytes=20, max_latency=10)
+    assert await stream.__anext__() == "x" * 20
+    # The consumer is busy: the producer refills one piece and is then held back
+    await asyncio.sleep(0.05)
+    assert len(produced) == 4
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_coalesce_stream_close_stops_the_source():
+    closed = asyncio.Event()
+
+    async def source():
+        try:
+            yield "a"
+            await asyncio.sleep(10)
+            yield "b"
+        finally:
+            closed.set()
+
+    stream = coalesce_stream(source(), max_bytes=1000, max_latency=0.01)
+    assert await stream.__anext__() == "a"
+    await stream.aclose()
+
+    assert closed.is_set()
+
+
+@pytest.mark.asyncio
+async def test_coalesce_stream_propagates_source_errors():
+    async def source():
+        yield "a"
+        raise RuntimeError("agent failed")
+
+    with pytest.raises(RuntimeError):
+        [piece async for piece in coalesce_stream(source(), max_bytes=1000, max_latency=10)]
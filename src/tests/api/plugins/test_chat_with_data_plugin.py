@@ -1,6 +1,8 @@
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock, Mock
 from plugins.chat_with_data_plugin import ChatWithDataPlugin
+from agents.agent_thread_pool import AgentThreadPool
+from services.sql_query_cache import SqlQueryCache
 from azure.ai.agents.models import (RunStepToolCallDetails, MessageRole, ListSortOrder)
 
 
@@ -18,6 +20,35 @@ def mock_config():
     return config_mock
 
 
+def async_pages(items):
+    """Stand-in for the AsyncItemPaged returned by the async agents list operations."""
+    async def pages():
+        for item in items:
+            yield item
+    return pages()
+
+
+def make_project_client():
+    client = MagicMock()
+    client.agents.threads.create = AsyncMock()
+    client.agents.threads.delete = AsyncMock()
+    client.agents.messages.create = AsyncMock()
+    client.agents.runs.create_and_process = AsyncMock()
+    return client
+
+
+def make_agent_info(agent, client):
+    # An empty pool creates a thread per call and deletes it in the background once the call is done
+    return {"agent": agent, "client": client, "thread_pool": AgentThreadPool(client, name="test", size=0)}
+
+
+@pytest.fixture(autouse=True)
+def sql_cache():
+    cache = SqlQueryCache()
+    with patch("plugins.chat_with_data_plugin.get_sql_query_cache", return_value=cache):
+        yield cache
+
+
 @pytest.fixture
 def chat_plugin(mock_config):
     with patch("plugins.chat_with_data_plugin.Config", return_value=mock_config):
@@ -33,10 +64,10 @@ class TestChatWithDataPlugin:
         # Mocks
         mock_agent = MagicMock()
         mock_agent.id = "agent-id"
-        mock_client = MagicMock()
+        mock_client = make_project_client()
 
         # Set return value for get_agent
-        mock_get_agent.return_value = {"agent": mock_agent, "client": mock_client}
+        mock_get_agent.return_value = make_agent_info(mock_agent, mock_client)
 
         # Mock thread creation
         mock_thread = MagicMock()
@@ -54,7 +85,7 @@ class TestChatWithDataPlugin:
         mock_agent_msg = MagicMock()
         mock_agent_msg.role = MessageRole.AGENT
         mock_agent_msg.text_messages = [MagicMock(text=MagicMock(value="```sql\nSELECT CAST(StartTime AS DATE) AS date, COUNT(*) AS total_calls FROM km_processed_data WHERE StartTime >= DATEADD(DAY, -7, GETDATE()) GROUP BY CAST(StartTime AS DATE) ORDER BY date ASC;\n```"))]
-        mock_client.agents.messages.list.return_value = [mock_agent_msg]
+        mock_client.agents.messages.list.return_value = async_pages([mock_agent_msg])
 
         # Mock final SQL execution
         mock_execute_sql.return_value = "(datetime.date(2025, 6, 27), 11)(datetime.date(2025, 6, 28), 20)(datetime.date(2025, 6, 29), 29)(datetime.date(2025, 6, 30), 17)(datetime.date(2025, 7, 1), 19)(datetime.date(2025, 7, 2), 16)"
@@ -72,7 +103,78 @@ class TestChatWithDataPlugin:
         mock_client.agents.messages.create.assert_called_once()
         mock_client.agents.runs.create_and_process.assert_called_once()
         mock_client.agents.messages.list.assert_called_once_with(thread_id="thread-id", order=ListSortOrder.ASCENDING)
-        mock_client.agents.threads.delete.assert_called_once_with(thread_id="thread-id")
+        await mock_get_agent.return_value["thread_pool"].close()
+        mock_client.agents.threads.delete.assert_awaited_once_with(thread_id="thread-id")
+
+    @pytest.mark.asyncio
+    @patch("plugins.chat_with_data_plugin.execute_sql_query", new_callable=AsyncMock)
+    @patch("plugins.chat_with_data_plugin.SQLAgentFactory.get_agent", new_callable=AsyncMock)
+    async def test_get_sql_response_failed_run_deletes_thread(self, mock_get_agent, mock_execute_sql, chat_plugin):
+        mock_client = make_project_client()
+        mock_get_agent.return_value = make_agent_info(MagicMock(id="agent-id"), mock_client)
+        mock_client.agents.threads.create.return_value = MagicMock(id="thread-id")
+        mock_client.agents.runs.create_and_process.return_value = MagicMock(status="failed")
+
+        result = await chat_plugin.get_sql_response("Show me data")
+
+        assert result == "Details could not be retrieved. Please try again later."
+        mock_execute_sql.assert_not_called()
+        await mock_get_agent.return_value["thread_pool"].close()
+        mock_client.agents.threads.delete.assert_awaited_once_with(thread_id="thread-id")
+
+    @pytest.mark.asyncio
+    @patch("plugins.chat_with_data_plugin.execute_sql_query", new_callable=AsyncMock)
+    @patch("plugins.chat_with_data_plugin.SQLAgentFactory.get_agent", new_callable=AsyncMock)
+    async def test_get_sql_response_reuses_cached_sql(self, mock_get_agent, mock_execute_sql, chat_plugin, sql_cache):
+        await sql_cache.store("Total calls by topic?", "SELECT topic, COUNT(*) FROM km_processed_data GROUP BY topic")
+        mock_execute_sql.return_value = "('Billing', 3)"
+
+        result = await chat_plugin.get_sql_response("total calls  by topic")
+
+        assert result == "('Billing', 3)"
+        mock_get_agent.assert_not_called()
+        mock_execute_sql.assert_awaited_once_with("SELECT topic, COUNT(*) FROM km_processed_data GROUP BY topic")
+        assert sql_cache.get_stats()["exact_hits"] == 1
+
+    @pytest.mark.asyncio
+    @patch("plugins.chat_with_data_plugin.execute_sql_query", new_callable=AsyncMock)
+    @patch("plugins.chat_with_data_plugin.SQLAgentFactory.get_agent", new_callable=AsyncMock)
+    async def test_get_sql_response_regenerates_failing_cached_sql(self, mock_get_agent, mock_execute_sql, chat_plugin, sql_cache):
+        await sql_cache.store("Total calls", "SELECT COUNT(*) FROM old_table")
+        mock_client = make_project_client()
+        mock_get_agent.return_value = make_agent_info(MagicMock(id="agent-id"), mock_client)
+        mock_client.agents.threads.create.return_value = MagicMock(id="thread-id")
+        mock_client.agents.runs.create_and_process.return_value = MagicMock(status="succeeded")
+        mock_agent_msg = MagicMock(role=MessageRole.AGENT)
+        mock_agent_msg.text_messages = [MagicMock(text=MagicMock(value="SELECT COUNT(*) FROM km_processed_data"))]
+        mock_client.agents.messages.list.return_value = async_pages([mock_agent_msg])
+        mock_execute_sql.side_effect = [None, "(42,)"]
+
+        result = await chat_plugin.get_sql_response("Total calls")
+
+        assert result == "(42,)"
+        assert await sql_cache.lookup("Total calls") == "SELECT COUNT(*) FROM km_processed_data"
+        assert sql_cache.get_stats()["discards"] == 1
+        await mock_get_agent.return_value["thread_pool"].close()
+
+    @pytest.mark.asyncio
+    @patch("plugins.chat_with_data_plugin.execute_sql_query", new_callable=AsyncMock)
+    @patch("plugins.chat_with_data_plugin.SQLAgentFactory.get_agent", new_callable=AsyncMock)
+    async def test_get_sql_response_does_not_cache_failing_sql(self, mock_get_agent, mock_execute_sql, chat_plugin, sql_cache):
+        mock_client = make_project_client()
+        mock_get_agent.return_value = make_agent_info(MagicMock(id="agent-id"), mock_client)
+        mock_client.agents.threads.create.return_value = MagicMock(id="thread-id")
+        mock_client.agents.runs.create_and_process.return_value = MagicMock(status="succeeded")
+        mock_agent_msg = MagicMock(role=MessageRole.AGENT)
+        mock_agent_msg.text_messages = [MagicMock(text=MagicMock(value="SELECT nope"))]
+        mock_client.agents.messages.list.return_value = async_pages([mock_agent_msg])
+        mock_execute_sql.return_value = None
+
+        result = await chat_plugin.get_sql_response("Total calls")
+
+        assert result == "Details could not be retrieved. Please try again later."
+        assert sql_cache.get_stats()["stores"] == 0
+        await mock_get_agent.return_value["thread_pool"].close()
 
     @pytest.mark.asyncio
     @patch("plugins.chat_with_data_plugin.execute_sql_query")
@@ -98,8 +200,8 @@ class TestChatWithDataPlugin:
         # Mock agent and client setup
         mock_agent = MagicMock()
         mock_agent.id = "mock-agent-id"
-        mock_client = MagicMock()
-        mock_get_agent.return_value = {"agent": mock_agent, "client": mock_client}
+        mock_client = make_project_client()
+        mock_get_agent.return_value = make_agent_info(mock_agent, mock_client)
 
         # Mock thread creation
         mock_thread = MagicMock()
@@ -126,13 +228,13 @@ class TestChatWithDataPlugin:
                 }
             }
         ])
-        mock_client.agents.run_steps.list.return_value = [mock_run_step]
+        mock_client.agents.run_steps.list.return_value = async_pages([mock_run_step])
 
         # Mock agent message with answer
         mock_agent_msg = MagicMock()
         mock_agent_msg.role = MessageRole.AGENT
         mock_agent_msg.text_messages = [MagicMock(text=MagicMock(value="This is a test answer with citation 【3:0†source】"))]
-        mock_client.agents.messages.list.return_value = [mock_agent_msg]
+        mock_client.agents.messages.list.return_value = async_pages([mock_agent_msg])
 
         # Mock thread deletion
         mock_client.agents.threads.delete.return_value = None
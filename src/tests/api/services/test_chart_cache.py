@@ -0,0 +1,167 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from api.models.input_models import ChartFilters
+import services.chart_cache as chart_cache_module
+from services.chart_cache import ChartResultCache, chart_filters_key
+
+
+def make_filters(topics=(), sentiments=(), date_ranges=()):
+    return ChartFilters(selected_filters={
+        "Topic": list(topics),
+        "Sentiment": list(sentiments),
+        "DateRange": list(date_ranges),
+    })
+
+
+@pytest.fixture(autouse=True)
+def reset_chart_cache():
+    chart_cache_module._chart_cache = None
+    yield
+    chart_cache_module._chart_cache = None
+
+
+def test_chart_filters_key_is_order_and_duplicate_insensitive():
+    key1 = chart_filters_key(make_filters(topics=["Billing", "Outage"], date_ranges=["Last 7 days"]))
+    key2 = chart_filters_key(make_filters(topics=["Outage", "Billing", "Billing"], date_ranges=["Last 7 days"]))
+    assert key1 == key2
+
+
+def test_chart_filters_key_ignores_all_sentiment():
+    assert chart_filters_key(make_filters(sentiments=["all"])) == chart_filters_key()
+    assert chart_filters_key(make_filters(sentiments=["positive"])) != chart_filters_key()
+
+
+def test_chart_filters_key_distinguishes_filters():
+    assert chart_filters_key(make_filters(topics=["Billing"])) != chart_filters_key(make_filters(topics=["Outage"]))
+
+
+@pytest.mark.asyncio
+async def test_hit_after_miss():
+    cache = ChartResultCache()
+    loader = AsyncMock(return_value=["chart"])
+
+    assert await cache.get_or_load("key", loader) == ["chart"]
+    assert await cache.get_or_load("key", loader) == ["chart"]
+
+    loader.assert_awaited_once()
+    stats = cache.get_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    cache = ChartResultCache()
+    release = asyncio.Event()
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return ["chart"]
+
+    waiters = [asyncio.create_task(cache.get_or_load("key", loader)) for _ in range(5)]
+    await asyncio.sleep(0.01)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == [["chart"]] * 5
+    assert calls == 1
+    assert cache.get_stats()["coalesced"] == 4
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_shared_load():
+    cache = ChartResultCache()
+    release = asyncio.Event()
+
+    async def loader():
+        await release.wait()
+        return ["chart"]
+
+    first = asyncio.create_task(cache.get_or_load("key", loader))
+    second = asyncio.create_task(cache.get_or_load("key", loader))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    release.set()
+
+    assert await second == ["chart"]
+    assert cache.get_stats()["size"] == 1
+
+
+@pytest.mark.asyncio
+async def test_lru_bound():
+    cache = ChartResultCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        await cache.get_or_load(key, AsyncMock(return_value=key))
+
+    assert cache.get_stats()["size"] == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate_discards_results_and_inflight_loads():
+    cache = ChartResultCache()
+    release = asyncio.Event()
+
+    async def slow_loader():
+        await release.wait()
+        return "old"
+
+    await cache.get_or_load("cached", AsyncMock(return_value="value"))
+    inflight = asyncio.create_task(cache.get_or_load("key", slow_loader))
+    await asyncio.sleep(0.01)
+
+    cache.invalidate()
+    release.set()
+    assert await inflight == "old"
+
+    loader = AsyncMock(return_value="new")
+    assert await cache.get_or_load("key", loader) == "new"
+    loader.assert_awaited_once()
+    assert cache.get_stats()["invalidations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_data_version_change_invalidates():
+    version_loader = AsyncMock(side_effect=["v1", "v2"])
+    cache = ChartResultCache(version_check_seconds=0.01, version_loader=version_loader)
+    loader = AsyncMock(return_value="chart")
+
+    await cache.get_or_load("key", loader)
+    await asyncio.sleep(0.02)
+    await cache.get_or_load("key", loader)
+
+    assert loader.await_count == 2
+    assert cache.get_stats()["invalidations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_data_version_failure_keeps_serving_cache():
+    version_loader = AsyncMock(side_effect=["v1", Exception("DB unavailable")])
+    cache = ChartResultCache(version_check_seconds=0.01, version_loader=version_loader)
+    loader = AsyncMock(return_value="chart")
+
+    await cache.get_or_load("key", loader)
+    await asyncio.sleep(0.02)
+
+    assert await cache.get_or_load("key", loader) == "chart"
+    loader.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_invalidate_chart_cache_and_stats():
+    assert chart_cache_module.get_chart_cache_stats() == {}
+
+    with patch("services.chart_cache.fetch_data_version", new_callable=AsyncMock, return_value="v1"):
+        cache = chart_cache_module.get_chart_cache()
+        await cache.get_or_load("key", AsyncMock(return_value="chart"))
+
+    chart_cache_module.invalidate_chart_cache()
+
+    stats = chart_cache_module.get_chart_cache_stats()
+    assert stats["size"] == 0
+    assert stats["invalidations"] == 1
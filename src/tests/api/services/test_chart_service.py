@@ -3,29 +3,38 @@ from unittest.mock import AsyncMock, MagicMock, patch
 from fastapi import HTTPException
 
 
-@patch("common.database.sqldb_service.adjust_processed_data_dates", new_callable=MagicMock)
 @patch("common.database.sqldb_service.fetch_filters_data", new_callable=MagicMock)
 @patch("common.database.sqldb_service.fetch_chart_data", new_callable=AsyncMock)
 @patch("api.models.input_models.ChartFilters", new_callable=MagicMock)
 @pytest.fixture
-def patched_imports(_, __, ___, ____):
+def patched_imports(_, __, ___):
     """
     Apply patches to dependencies before importing ChartService.
     Returns patched ChartService
     """
     # Import the service under test only after patching dependencies
-    with patch("services.chart_service.adjust_processed_data_dates"), \
-         patch("services.chart_service.fetch_filters_data"), \
+    with patch("services.chart_service.fetch_filters_data"), \
          patch("services.chart_service.fetch_chart_data"):
         from services.chart_service import ChartService
         return ChartService
 
 # ---- Import service under test ----
-with patch("common.database.sqldb_service.adjust_processed_data_dates", MagicMock()), \
-     patch("common.database.sqldb_service.fetch_filters_data", MagicMock()), \
+with patch("common.database.sqldb_service.fetch_filters_data", MagicMock()), \
      patch("common.database.sqldb_service.fetch_chart_data", AsyncMock()), \
      patch("api.models.input_models.ChartFilters", MagicMock()):
     from services.chart_service import ChartService
+from services.chart_cache import ChartResultCache
+
+
+@pytest.fixture(autouse=True)
+def chart_cache():
+    """
+    Gives each test an empty chart cache that does not query the data version.
+    """
+    cache = ChartResultCache(version_loader=None)
+    with patch("services.chart_service.get_chart_cache", return_value=cache):
+        yield cache
+
 
 @pytest.fixture
 def chart_service():
@@ -35,22 +44,28 @@ def chart_service():
     return ChartService()
 
 
-@patch("services.chart_service.adjust_processed_data_dates", new_callable=AsyncMock)
 @patch("services.chart_service.fetch_filters_data", new_callable=AsyncMock)
 @pytest.mark.asyncio
-async def test_fetch_filter_data_success(mock_fetch_filters_data, mock_adjust_dates, chart_service):
-    mock_adjust_dates.return_value = None
+async def test_fetch_filter_data_success(mock_fetch_filters_data, chart_service):
     mock_fetch_filters_data.return_value = {"data": "filter_data"}
 
     result = await chart_service.fetch_filter_data()
     assert result == {"data": "filter_data"}
 
 
-
-@patch("services.chart_service.adjust_processed_data_dates", new_callable=AsyncMock, side_effect=Exception("Failed"))
+@patch("common.database.sqldb_service.adjust_processed_data_dates", new_callable=AsyncMock)
 @patch("services.chart_service.fetch_filters_data", new_callable=AsyncMock)
 @pytest.mark.asyncio
-async def test_fetch_filter_data_failure(mock_fetch_filters_data, mock_adjust_dates, chart_service):
+async def test_fetch_filter_data_does_not_rebase_dates(mock_fetch_filters_data, mock_adjust_dates, chart_service):
+    mock_fetch_filters_data.return_value = {"data": "filter_data"}
+
+    await chart_service.fetch_filter_data()
+    mock_adjust_dates.assert_not_awaited()
+
+
+@patch("services.chart_service.fetch_filters_data", new_callable=AsyncMock, side_effect=Exception("Failed"))
+@pytest.mark.asyncio
+async def test_fetch_filter_data_failure(mock_fetch_filters_data, chart_service):
     with pytest.raises(HTTPException) as exc_info:
         await chart_service.fetch_filter_data()
     assert exc_info.value.status_code == 500
@@ -90,3 +105,30 @@ async def test_fetch_chart_data_with_filters_failure(mock_fetch_chart_data, char
     with pytest.raises(HTTPException) as exc_info:
         await chart_service.fetch_chart_data_with_filters(fake_filters)
     assert exc_info.value.status_code == 500
+
+
+@patch("services.chart_service.fetch_chart_data", new_callable=AsyncMock)
+@pytest.mark.asyncio
+async def test_fetch_chart_data_with_filters_uses_cache(mock_fetch_chart_data, chart_service, chart_cache):
+    from api.models.input_models import ChartFilters
+    mock_fetch_chart_data.return_value = [{"id": "TOTAL_CALLS"}]
+    filters = ChartFilters(selected_filters={"Topic": ["b", "a"], "Sentiment": ["all"], "DateRange": []})
+    same_filters = ChartFilters(selected_filters={"Topic": ["a", "b", "a"], "Sentiment": [], "DateRange": []})
+
+    first = await chart_service.fetch_chart_data_with_filters(filters)
+    second = await chart_service.fetch_chart_data_with_filters(same_filters)
+
+    assert first == second == [{"id": "TOTAL_CALLS"}]
+    mock_fetch_chart_data.assert_awaited_once_with(filters)
+    assert chart_cache.get_stats()["hits"] == 1
+
+
+@patch("services.chart_service.fetch_chart_data", new_callable=AsyncMock, side_effect=Exception("DB error"))
+@pytest.mark.asyncio
+async def test_fetch_chart_data_failure_is_not_cached(mock_fetch_chart_data, chart_service, chart_cache):
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            await chart_service.fetch_chart_data()
+
+    assert mock_fetch_chart_data.await_count == 2
+    assert chart_cache.get_stats()["size"] == 0
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import time
 from unittest.mock import AsyncMock, MagicMock, patch
@@ -6,6 +7,8 @@ import pytest
 from fastapi import HTTPException, status
 from semantic_kernel.exceptions.agent_exceptions import AgentException as RealAgentException
 from azure.ai.agents.models import MessageRole
+from agents.agent_thread_pool import AgentThreadPool
+from services.conversation_thread_store import InMemoryThreadStore
 
 
 
@@ -32,10 +35,9 @@ def patched_imports(mock_format_stream, mock_openai, mock_agent_exception, mock_
          patch("services.chat_service.AzureAIAgentThread", mock_thread), \
          patch("services.chat_service.TruncationObject", mock_truncation), \
          patch("services.chat_service.AgentException", mock_agent_exception), \
-         patch("helpers.azure_openai_helper.openai.AzureOpenAI", mock_openai), \
-         patch("services.chat_service.format_stream_response", mock_format_stream):
-        from services.chat_service import ChatService, ExpCache
-        return ChatService, ExpCache, {
+         patch("helpers.azure_openai_helper.openai.AzureOpenAI", mock_openai):
+        from services.chat_service import ChatService
+        return ChatService, {
             'config': mock_config,
             'thread': mock_thread,
             'truncation': mock_truncation,
@@ -61,7 +63,10 @@ with patch("common.config.config.Config") as mock_config, \
     mock_config_instance.azure_ai_project_conn_string = "test_conn_string"
     mock_config.return_value = mock_config_instance
     
-    from services.chat_service import ChatService, ExpCache
+    from services.chat_service import ChatService, extract_citations, negotiate_stream_protocol
+
+from services import conversation_thread_store, thread_reaper
+from services.thread_reaper import ThreadReaper
 
 
 @pytest.fixture
@@ -77,9 +82,14 @@ def mock_request():
 @pytest.fixture
 def chat_service(mock_request):
     """Create a ChatService instance for testing."""
-    # Reset class-level cache before each test
-    ChatService.thread_cache = None
-    return ChatService(mock_request)
+    # Each test starts with an empty in-process conversation thread store
+    conversation_thread_store._conversation_thread_store = InMemoryThreadStore()
+    thread_reaper._thread_reaper = ThreadReaper()
+    service = ChatService(mock_request)
+    # Frames map one to one to agent fragments unless a test turns coalescing on
+    service.stream_coalesce_max_bytes = 0
+    service.stream_coalesce_max_latency = 0.05
+    return service
 
 
 @pytest.fixture
@@ -91,62 +101,22 @@ def mock_agent():
     return agent
 
 
-class TestExpCache:
-    """Test cases for ExpCache class."""
-    
-    def test_init_with_agent(self, mock_agent):
-        """Test ExpCache initialization with agent."""
-        cache = ExpCache(maxsize=10, ttl=60, agent=mock_agent)
-        assert cache.agent == mock_agent
-        assert cache.maxsize == 10
-        assert cache.ttl == 60
-    
-    def test_init_without_agent(self):
-        """Test ExpCache initialization without agent."""
-        cache = ExpCache(maxsize=10, ttl=60)
-        assert cache.agent is None
-    
-    @patch('asyncio.create_task')
-    @patch('services.chat_service.AzureAIAgentThread')
-    def test_expire_with_agent(self, mock_thread_class, mock_create_task, mock_agent):
-        """Test expire method when agent is present."""
-        cache = ExpCache(maxsize=2, ttl=0.01, agent=mock_agent)
-        cache['key1'] = 'thread_id_1'
-        cache['key2'] = 'thread_id_2'
-        
-        # Wait for expiration
-        time.sleep(0.02)
-        
-        # Trigger expiration
-        expired_items = cache.expire()
-        
-        # Verify threads were scheduled for deletion
-        assert len(expired_items) == 2
-        assert mock_create_task.call_count == 2
-    
-    def test_expire_without_agent(self):
-        """Test expire method when agent is None."""
-        cache = ExpCache(maxsize=2, ttl=0.01, agent=None)
-        cache['key1'] = 'thread_id_1'
-        
-        # Wait for expiration
-        time.sleep(0.02)
-        
-        # Should not raise error
-        expired_items = cache.expire()
-        assert len(expired_items) == 1
-    
-    @patch('asyncio.create_task')
-    @patch('services.chat_service.AzureAIAgentThread')
-    def test_popitem_with_agent(self, mock_thread_class, mock_create_task, mock_agent):
-        """Test popitem method when agent is present."""
-        cache = ExpCache(maxsize=2, ttl=60, agent=mock_agent)
-        cache['key1'] = 'thread_id_1'
-        cache['key2'] = 'thread_id_2'
-        cache['key3'] = 'thread_id_3'  
-        
-        # Verify thread deletion was scheduled
-        mock_create_task.assert_called()
+class TestThreadEviction:
+    """Test cases for handing evicted conversation threads to the thread reaper."""
+
+    def test_evicted_thread_is_queued_for_deletion(self, chat_service):
+        assert chat_service.thread_store.on_evict == thread_reaper._thread_reaper.enqueue
+
+    @pytest.mark.asyncio
+    async def test_evicted_thread_is_queued_without_a_running_reaper(self):
+        reaper = ThreadReaper()
+        store = InMemoryThreadStore(max_entries=1, on_evict=reaper.enqueue)
+
+        await store.set("c1", "thread_id_1")
+        await store.set("c2", "thread_id_2")
+
+        assert reaper.get_metrics()["pending"] == 1
+        assert reaper.get_metrics()["enqueued"] == 1
 
 
 class TestChatService:
@@ -163,14 +133,14 @@ class TestChatService:
         mock_config_instance.azure_ai_project_conn_string = "test_conn_string"
         mock_config_class.return_value = mock_config_instance
         
-        # Reset class-level cache for test isolation
-        ChatService.thread_cache = None
-        
-        service = ChatService(mock_request)
-        
+        store = InMemoryThreadStore()
+        with patch("services.chat_service.get_conversation_thread_store", return_value=store) as mock_get_store:
+            service = ChatService(mock_request)
+
         assert service.azure_openai_deployment_name == "gpt-4o-mini"
         assert service.agent == mock_request.app.state.agent
-        assert ChatService.thread_cache is not None
+        assert service.thread_store is store
+        assert callable(mock_get_store.call_args.kwargs["on_evict"])
     
 
     @pytest.mark.asyncio
@@ -190,7 +160,8 @@ class TestChatService:
         # Return from ChartAgentFactory
         mock_get_agent.return_value = {
             "agent": mock_agent,
-            "client": mock_client
+            "client": mock_client,
+            "thread_pool": AgentThreadPool(mock_client, name="chart", size=0)
         }
 
         # Set up valid chart JSON
@@ -212,11 +183,14 @@ class TestChatService:
         mock_msg.text_messages = [mock_text_msg]
 
         # Setup all methods
-        mock_client.agents.threads.create.return_value = mock_thread
-        mock_client.agents.messages.create.return_value = None
-        mock_client.agents.runs.create_and_process.return_value.status = "completed"
-        mock_client.agents.messages.list.return_value = [mock_msg]
-        mock_client.agents.threads.delete.return_value = None
+        async def messages(*args, **kwargs):
+            yield mock_msg
+
+        mock_client.agents.threads.create = AsyncMock(return_value=mock_thread)
+        mock_client.agents.messages.create = AsyncMock(return_value=None)
+        mock_client.agents.runs.create_and_process = AsyncMock(return_value=MagicMock(status="completed"))
+        mock_client.agents.messages.list.side_effect = messages
+        mock_client.agents.threads.delete = AsyncMock(return_value=None)
 
         # ACT
         result = await service.process_rag_response("RAG content", "Query")
@@ -227,6 +201,8 @@ class TestChatService:
         assert isinstance(result, dict)
         assert result["type"] == "bar"
         assert result["data"]["labels"] == ["A", "B"]
+        await mock_get_agent.return_value["thread_pool"].close()
+        mock_client.agents.threads.delete.assert_awaited_once_with(thread_id="mock-thread-id")
     
     @pytest.mark.asyncio
     @patch('helpers.azure_openai_helper.openai.AzureOpenAI')
@@ -281,7 +257,8 @@ class TestChatService:
         
         assert len(chunks) == 1
         assert chunks[0] == "Hello, world!"
-        assert ChatService.thread_cache["conversation_1"] == "new_thread_id"
+        assert await chat_service.thread_store.get("conversation_1") == "new_thread_id"
+        assert chat_service.thread_store.get_metrics()["sets"] == 1
     
     @pytest.mark.asyncio
     @patch('services.chat_service.AzureAIAgentThread')
@@ -355,36 +332,93 @@ class TestChatService:
         assert "I cannot answer this question with the current data" in chunks[0]
     
     @pytest.mark.asyncio
-    @patch('services.chat_service.uuid.uuid4')
-    @patch('services.chat_service.time.time')
-    @patch('services.chat_service.format_stream_response')
-    async def test_stream_chat_request_success(self, mock_format_stream, mock_time, mock_uuid, chat_service):
+    @patch('services.chat_service.AzureAIAgentThread')
+    @patch('services.chat_service.TruncationObject')
+    async def test_stream_openai_text_continues_stored_thread(self, mock_truncation_class, mock_thread_class, chat_service):
+        """A follow-up question runs on the conversation's stored thread, which is stored once per turn."""
+        await chat_service.thread_store.set("conversation_1", "existing_thread")
+        responses = []
+        for content in ["Hello", ", world"]:
+            response = MagicMock()
+            response.content = content
+            response.thread.id = "existing_thread"
+            responses.append(response)
+
+        async def mock_invoke_stream(*args, **kwargs):
+            for response in responses:
+                yield response
+
+        chat_service.agent.invoke_stream = mock_invoke_stream
+
+        chunks = [chunk async for chunk in chat_service.stream_openai_text("conversation_1", "And now?")]
+
+        assert chunks == ["Hello", ", world"]
+        mock_thread_class.assert_called_once_with(client=chat_service.agent.client, thread_id="existing_thread")
+        assert chat_service.thread_store.get_metrics()["sets"] == 2
+
+    @pytest.mark.asyncio
+    async def test_stream_openai_text_no_response_discards_thread(self, chat_service):
+        await chat_service.thread_store.set("conversation_1", "broken_thread")
+        chat_service.thread_store.on_evict = MagicMock()
+
+        async def mock_invoke_stream(*args, **kwargs):
+            return
+            yield
+
+        chat_service.agent.invoke_stream = mock_invoke_stream
+
+        [chunk async for chunk in chat_service.stream_openai_text("conversation_1", "Hello")]
+
+        chat_service.thread_store.on_evict.assert_called_once_with("broken_thread")
+        assert await chat_service.thread_store.get("conversation_1") is None
+
+    @pytest.mark.asyncio
+    async def test_stream_openai_text_survives_store_errors(self, chat_service):
+        chat_service.thread_store = MagicMock()
+        chat_service.thread_store.get = AsyncMock(side_effect=Exception("store down"))
+        chat_service.thread_store.set = AsyncMock(side_effect=Exception("store down"))
+        mock_response = MagicMock()
+        mock_response.content = "Hello"
+        mock_response.thread.id = "new_thread_id"
+
+        async def mock_invoke_stream(*args, **kwargs):
+            assert kwargs["thread"] is None
+            yield mock_response
+
+        chat_service.agent.invoke_stream = mock_invoke_stream
+
+        chunks = [chunk async for chunk in chat_service.stream_openai_text("conversation_1", "Hello")]
+
+        assert chunks == ["Hello"]
+
+    @pytest.mark.asyncio
+    async def test_stream_chat_request_success(self, chat_service):
         """Test successful stream chat request."""
-        # Setup mocks
-        mock_uuid.return_value = "test-uuid"
-        mock_time.return_value = 1234567890
-        mock_format_stream.return_value = {"formatted": "response"}
-        
         # Mock stream_openai_text
         async def mock_stream_openai_text(conversation_id, query):
             yield "Hello"
             yield " world"
-        
+
         chat_service.stream_openai_text = mock_stream_openai_text
-        
+
         request_body = {"history_metadata": {"test": "metadata"}}
         generator = await chat_service.stream_chat_request(request_body, "conv_1", "Hello")
-        
+
         chunks = []
         async for chunk in generator:
             chunks.append(chunk)
-        
-        assert len(chunks) > 0
-        # Verify the chunks contain expected structure
-        for chunk in chunks:
-            chunk_data = json.loads(chunk.strip())
-            assert "formatted" in chunk_data
-    
+
+        assert len(chunks) == 2
+        assert all(chunk.endswith("\n\n") for chunk in chunks)
+        # Every frame carries the whole answer so far
+        chunk_data = [json.loads(chunk) for chunk in chunks]
+        assert [data["choices"][0]["messages"] for data in chunk_data] == [
+            [{"role": "assistant", "content": "Hello"}],
+            [{"role": "assistant", "content": "Hello world"}],
+        ]
+        assert chunk_data[0]["history_metadata"] == {"test": "metadata"}
+        assert chunk_data[0]["object"] == "extensions.chat.completion.chunk"
+
     @pytest.mark.asyncio
     async def test_stream_chat_request_agent_exception_rate_limit(self, chat_service):
         """Test stream_chat_request with AgentException for rate limiting."""
@@ -457,6 +491,75 @@ class TestChatService:
         assert "error" in error_data
         assert "An error occurred while processing the request." == error_data["error"]
     
+    @pytest.mark.asyncio
+    async def test_stream_chat_request_coalesces_fragments(self, chat_service):
+        """Small agent fragments are merged into frames of at least the configured size."""
+        chat_service.stream_coalesce_max_bytes = 10
+
+        async def mock_stream_openai_text(conversation_id, query):
+            for fragment in ["Hel", "lo", " wor", "ld", {"k": 1}]:
+                yield fragment
+
+        chat_service.stream_openai_text = mock_stream_openai_text
+
+        generator = await chat_service.stream_chat_request({}, "conv_1", "Hello", stream_protocol="delta")
+        frames = [json.loads(frame) async for frame in generator]
+
+        assert [frame["choices"][0]["delta"]["content"] for frame in frames[:-1]] == ["Hello world", '{"k": 1}']
+        assert frames[-1]["choices"][0]["messages"][0]["content"] == 'Hello world{"k": 1}'
+
+    @pytest.mark.asyncio
+    async def test_stream_chat_request_delta_protocol(self, chat_service):
+        """Delta frames carry only new text and the last frame consolidates the answer."""
+        answer = ['{"answer": "Billing is the top', ' topic [1]", "citations": ', '[{"url": "u", "title": "t"}]}']
+
+        async def mock_stream_openai_text(conversation_id, query):
+            for part in answer:
+                yield part
+
+        chat_service.stream_openai_text = mock_stream_openai_text
+
+        generator = await chat_service.stream_chat_request(
+            {"history_metadata": {"test": "metadata"}}, "conv_1", "Hello", stream_protocol="delta"
+        )
+        frames = [json.loads(frame) async for frame in generator]
+
+        assert [frame["choices"][0]["delta"]["content"] for frame in frames[:-1]] == answer
+        assert frames[0]["choices"][0]["delta"]["role"] == "assistant"
+        assert frames[0]["history_metadata"] == {"test": "metadata"}
+        assert "history_metadata" not in frames[1]
+        assert len({frame["id"] for frame in frames}) == 1
+
+        final = frames[-1]
+        assert final["object"] == "extensions.chat.completion"
+        assert final["choices"][0]["messages"][0]["content"] == "".join(answer)
+        assert final["choices"][0]["finish_reason"] == "stop"
+        assert final["citations"] == [{"url": "u", "title": "t"}]
+
+    @pytest.mark.asyncio
+    async def test_stream_chat_request_delta_protocol_error(self, chat_service):
+        async def mock_stream_openai_text_generic_error(conversation_id, query):
+            raise Exception("Some other error")
+            yield  # Needs to be an async generator
+
+        chat_service.stream_openai_text = mock_stream_openai_text_generic_error
+
+        generator = await chat_service.stream_chat_request({}, "conv_1", "Hello", stream_protocol="delta")
+        chunks = [chunk async for chunk in generator]
+
+        assert chunks == [json.dumps({"error": "An error occurred while processing the request."}) + "\n\n"]
+
+    def test_negotiate_stream_protocol(self):
+        assert negotiate_stream_protocol("delta") == "delta"
+        assert negotiate_stream_protocol(" Delta ") == "delta"
+        assert negotiate_stream_protocol("v9") == "full"
+        assert negotiate_stream_protocol(None) == "full"
+
+    def test_extract_citations(self):
+        assert extract_citations('```json\n{"answer": "a", "citations": [{"url": "u"}]}\n```') == [{"url": "u"}]
+        assert extract_citations("I cannot answer this question.") == []
+        assert extract_citations('{"answer": "a"}') == []
+
     @pytest.mark.asyncio
     async def test_complete_chat_request_success(self, chat_service):
         mock_chart_data = {
@@ -0,0 +1,219 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from services import conversation_thread_store
+from services.conversation_thread_store import (
+    InMemoryThreadStore,
+    RedisThreadStore,
+    SqliteThreadStore,
+    create_conversation_thread_store,
+    get_conversation_thread_store,
+    get_conversation_thread_store_metrics,
+)
+
+
+class FakeRedis:
+    """The subset of redis.asyncio.Redis used by RedisThreadStore, with decoded responses."""
+
+    def __init__(self):
+        self.hashes = {}
+        self.zsets = {}
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    async def hdel(self, key, field):
+        return int(self.hashes.get(key, {}).pop(field, None) is not None)
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zscore(self, key, member):
+        return self.zsets.get(key, {}).get(member)
+
+    async def zrem(self, key, member):
+        return int(self.zsets.get(key, {}).pop(member, None) is not None)
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    def _sorted(self, key):
+        return sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1])
+
+    async def zrangebyscore(self, key, low, high):
+        low = float(low)
+        high = float(high)
+        return [member for member, score in self._sorted(key) if low <= score <= high]
+
+    async def zrange(self, key, start, stop):
+        return [member for member, _ in self._sorted(key)][start:stop + 1]
+
+    async def aclose(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def reset_store():
+    conversation_thread_store._conversation_thread_store = None
+    yield
+    conversation_thread_store._conversation_thread_store = None
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def make_store(request, tmp_path):
+    """Factory creating stores of each backend; sqlite and redis stores made by one test share their data."""
+    redis = FakeRedis()
+
+    def make(**kwargs):
+        kwargs.setdefault("on_evict", MagicMock())
+        if request.param == "memory":
+            store = InMemoryThreadStore(**kwargs)
+        elif request.param == "sqlite":
+            store = SqliteThreadStore(str(tmp_path / "threads.db"), sweep_seconds=0, **kwargs)
+        else:
+            store = RedisThreadStore(redis, sweep_seconds=0, **kwargs)
+        return store
+
+    return make
+
+
+@pytest.mark.asyncio
+async def test_get_set_and_pop(make_store):
+    store = make_store()
+
+    assert await store.get("c1") is None
+    await store.set("c1", "t1")
+    assert await store.get("c1") == "t1"
+    assert await store.items() == [("c1", "t1")]
+    assert await store.pop("c1") == "t1"
+    assert await store.get("c1") is None
+
+    metrics = store.get_metrics()
+    assert metrics["hits"] == 1
+    assert metrics["misses"] == 2
+    assert metrics["sets"] == 1
+    store.on_evict.assert_not_called()
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_replacing_a_thread_evicts_the_old_one(make_store):
+    store = make_store()
+    await store.set("c1", "t1")
+    await store.set("c1", "t1")
+    await store.set("c1", "t2")
+
+    assert await store.get("c1") == "t2"
+    store.on_evict.assert_called_once_with("t1")
+    assert store.get_metrics()["replaced"] == 1
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_discard_hands_the_thread_to_on_evict(make_store):
+    store = make_store()
+    await store.set("c1", "t1")
+
+    await store.discard("c1")
+    await store.discard("c1")
+
+    store.on_evict.assert_called_once_with("t1")
+    assert await store.get("c1") is None
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_evicted(make_store):
+    store = make_store(ttl_seconds=0.05)
+    await store.set("c1", "t1")
+    await asyncio.sleep(0.1)
+
+    assert await store.get("c1") is None
+    await store.set("c2", "t2")
+    await store.items()
+
+    store.on_evict.assert_called_once_with("t1")
+    assert store.get_metrics()["expired"] == 1
+    await store.close()
+
+
+@pytest.mark.asyncio
+async def test_capacity_evicts_oldest(make_store):
+    store = make_store(max_entries=2)
+    for index in range(3):
+        await store.set(f"c{index}", f"t{index}")
+        await asyncio.sleep(0.01)
+
+    assert await store.get("c0") is None
+    assert await store.get("c2") == "t2"
+    store.on_evict.assert_called_once_with("t0")
+    assert store.get_metrics()["evicted"] == 1
+    await store.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["sqlite", "redis"])
+async def test_shared_backends_are_seen_by_every_worker(backend, tmp_path):
+    redis = FakeRedis()
+
+    def make_worker():
+        if backend == "sqlite":
+            return SqliteThreadStore(str(tmp_path / "threads.db"), ttl_seconds=0.05, sweep_seconds=0, on_evict=MagicMock())
+        return RedisThreadStore(redis, ttl_seconds=0.05, sweep_seconds=0, on_evict=MagicMock())
+
+    first, second = make_worker(), make_worker()
+    assert first.shared
+
+    await first.set("c1", "t1")
+    assert await second.get("c1") == "t1"
+
+    # The expired entry is reported by one worker only
+    await asyncio.sleep(0.1)
+    await first.sweep()
+    await second.sweep()
+    assert first.on_evict.call_count + second.on_evict.call_count == 1
+    await first.close()
+    await second.close()
+
+
+def test_create_store_from_config(tmp_path):
+    config = MagicMock()
+    config.conversation_thread_max_entries = 5
+    config.conversation_thread_ttl_seconds = 60
+
+    config.conversation_thread_store = "memory"
+    assert isinstance(create_conversation_thread_store(config), InMemoryThreadStore)
+
+    config.conversation_thread_store = "SQLite"
+    config.conversation_thread_store_path = str(tmp_path / "threads.db")
+    store = create_conversation_thread_store(config)
+    assert isinstance(store, SqliteThreadStore)
+    assert store.path == config.conversation_thread_store_path
+
+    config.conversation_thread_store = "redis"
+    config.conversation_thread_store_url = None
+    with pytest.raises(ValueError):
+        create_conversation_thread_store(config)
+
+    config.conversation_thread_store = "etcd"
+    with pytest.raises(ValueError):
+        create_conversation_thread_store(config)
+
+
+def test_get_store_is_a_singleton_and_keeps_the_first_callback():
+    first_callback, second_callback = MagicMock(), MagicMock()
+    with patch("services.conversation_thread_store.Config") as mock_config:
+        mock_config.return_value.conversation_thread_store = "memory"
+        mock_config.return_value.conversation_thread_max_entries = 5
+        mock_config.return_value.conversation_thread_ttl_seconds = 60
+        assert get_conversation_thread_store_metrics() == {}
+        store = get_conversation_thread_store(on_evict=first_callback)
+
+    assert get_conversation_thread_store(on_evict=second_callback) is store
+    assert store.on_evict is first_callback
+    assert get_conversation_thread_store_metrics()["backend"] == "memory"
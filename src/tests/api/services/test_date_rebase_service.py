@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from services.date_rebase_service import DateRebaseService
+
+
+@pytest.fixture
+def rebase_service():
+    return DateRebaseService(max_jitter_seconds=0, retry_seconds=0)
+
+
+@pytest.mark.asyncio
+@patch("services.date_rebase_service.invalidate_chart_cache")
+@patch("services.date_rebase_service.adjust_processed_data_dates", new_callable=AsyncMock)
+async def test_run_once_success(mock_adjust, mock_invalidate, rebase_service):
+    mock_adjust.return_value = True
+
+    assert await rebase_service.run_once() is True
+    assert rebase_service.last_run_at is not None
+    assert rebase_service.last_error is None
+    mock_invalidate.assert_called_once()
+
+
+@pytest.mark.asyncio
+@patch("services.date_rebase_service.invalidate_chart_cache")
+@patch("services.date_rebase_service.adjust_processed_data_dates", new_callable=AsyncMock)
+async def test_run_once_without_changes_keeps_chart_cache(mock_adjust, mock_invalidate, rebase_service):
+    mock_adjust.return_value = False
+
+    assert await rebase_service.run_once() is False
+    mock_invalidate.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch("services.date_rebase_service.adjust_processed_data_dates", new_callable=AsyncMock,
+       side_effect=Exception("DB unavailable"))
+async def test_run_once_failure(mock_adjust, rebase_service):
+    with pytest.raises(Exception, match="DB unavailable"):
+        await rebase_service.run_once()
+    assert rebase_service.last_error == "DB unavailable"
+
+
+def test_seconds_until_next_run(rebase_service):
+    now = datetime(2024, 5, 1, 23, 0, 0)
+    assert rebase_service.seconds_until_next_run(now) == 3600
+
+
+def test_seconds_until_next_run_adds_jitter():
+    service = DateRebaseService(max_jitter_seconds=300)
+    now = datetime(2024, 5, 1, 23, 0, 0)
+    assert 3600 <= service.seconds_until_next_run(now) <= 3900
+
+
+@pytest.mark.asyncio
+@patch("services.date_rebase_service.adjust_processed_data_dates", new_callable=AsyncMock)
+async def test_start_runs_immediately_and_stop_cancels(mock_adjust, rebase_service):
+    mock_adjust.return_value = False
+
+    rebase_service.start()
+    await asyncio.sleep(0.01)
+    mock_adjust.assert_awaited_once()
+
+    await rebase_service.stop()
+    assert rebase_service._task is None
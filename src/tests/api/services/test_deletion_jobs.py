@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import services.deletion_jobs as deletion_jobs
+from services.deletion_jobs import DeletionJobs
+
+
+class FakeStore:
+    """In-memory stand-in for the job methods of CosmosConversationClient."""
+
+    def __init__(self):
+        self.jobs = {}
+        self.saves = 0
+
+    async def upsert_deletion_job(self, job):
+        self.saves += 1
+        self.jobs[(job["userId"], job["id"])] = dict(job)
+
+    async def get_deletion_job(self, user_id, job_id):
+        job = self.jobs.get((user_id, job_id))
+        return dict(job) if job else None
+
+    async def delete_deletion_jobs(self, user_id, finished_before):
+        for key, job in list(self.jobs.items()):
+            if key[0] == user_id and job["status"] != "running" and job["updatedAt"] < finished_before:
+                del self.jobs[key]
+
+
+@pytest.mark.asyncio
+async def test_job_progress_is_readable_by_another_worker(monkeypatch):
+    monkeypatch.setattr(deletion_jobs, "PROGRESS_SAVE_SECONDS", 0.01)
+    store = FakeStore()
+    release = asyncio.Event()
+
+    async def delete(progress):
+        progress(40)
+        await release.wait()
+        progress(100)
+
+    worker = DeletionJobs(lambda: store)
+    other_worker = DeletionJobs(lambda: store)
+    job = await worker.submit("user", "c1", 100, delete)
+    assert job["status"] == "running"
+
+    await asyncio.sleep(0.05)
+    assert (await other_worker.get("user", job["job_id"]))["deleted"] == 40
+
+    release.set()
+    await worker.drain(1)
+    status = await other_worker.get("user", job["job_id"])
+    assert status["status"] == "completed"
+    assert status["deleted"] == 100
+
+
+@pytest.mark.asyncio
+async def test_failed_job_and_other_users():
+    store = FakeStore()
+
+    async def delete(progress):
+        raise Exception("Cosmos unavailable")
+
+    jobs = DeletionJobs(lambda: store)
+    job = await jobs.submit("user", "c1", 10, delete)
+    await jobs.drain(1)
+
+    assert (await jobs.get("user", job["job_id"]))["status"] == "failed"
+    assert await jobs.get("other-user", job["job_id"]) is None
+    assert await jobs.get("user", "unknown") is None
+
+
+@pytest.mark.asyncio
+async def test_jobs_of_a_stopped_worker_are_reported_interrupted():
+    store = FakeStore()
+    last_saved = datetime.utcnow() - timedelta(seconds=deletion_jobs.STALE_JOB_SECONDS + 1)
+    await store.upsert_deletion_job({
+        "id": "job-1", "type": "deletion_job", "userId": "user", "conversationId": "c1",
+        "status": "running", "total": 10, "deleted": 4, "error": None, "updatedAt": last_saved.isoformat(),
+    })
+
+    status = await DeletionJobs(lambda: store).get("user", "job-1")
+
+    assert status["status"] == "failed"
+    assert status["error"] == deletion_jobs.INTERRUPTED_ERROR
+    assert status["deleted"] == 4
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_expire(monkeypatch):
+    store = FakeStore()
+
+    async def delete(progress):
+        pass
+
+    jobs = DeletionJobs(lambda: store)
+    job = await jobs.submit("user", "c1", 1, delete)
+    await jobs.drain(1)
+
+    monkeypatch.setattr(deletion_jobs, "FINISHED_JOB_TTL_SECONDS", -1)
+    await jobs.submit("user", "c2", 1, delete)
+    assert await jobs.get("user", job["job_id"]) is None
+    await jobs.drain(1)
+
+
+@pytest.mark.asyncio
+async def test_drain_cancels_jobs_and_records_the_interruption():
+    store = FakeStore()
+
+    async def delete(progress):
+        await asyncio.sleep(10)
+
+    jobs = DeletionJobs(lambda: store)
+    job = await jobs.submit("user", "c1", 1, delete)
+
+    await jobs.drain(0.05)
+
+    assert not jobs._tasks
+    status = await jobs.get("user", job["job_id"])
+    assert status["status"] == "failed"
+    assert status["error"] == deletion_jobs.INTERRUPTED_ERROR
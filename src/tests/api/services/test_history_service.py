@@ -18,6 +18,13 @@ def mock_config_instance():
     config.azure_openai_api_version = "2024-02-15-preview"
     config.azure_openai_deployment_model = "gpt-4o-mini"
     config.azure_openai_resource = "test-resource"
+    config.azure_cosmosdb_connection_limit = 50
+    config.azure_cosmosdb_delete_max_concurrency = 10
+    config.azure_cosmosdb_delete_background_threshold = 1000
+    config.azure_openai_max_connections = 20
+    config.title_generation_max_concurrency = 2
+    config.title_generation_batch_size = 8
+    config.title_generation_batch_wait_ms = 10
     return config
 
 
@@ -77,6 +84,42 @@ class TestHistoryService:
             with pytest.raises(Exception):
                 history_service.init_cosmosdb_client()
 
+    def test_clients_are_shared_across_requests(self, history_service):
+        """Test the Cosmos DB and OpenAI clients are created once per service"""
+        with patch("services.history_service.CosmosConversationClient") as mock_cosmos_cls, \
+             patch("services.history_service.AsyncAzureOpenAI") as mock_openai_cls:
+            assert history_service.init_cosmosdb_client() is history_service.init_cosmosdb_client()
+            assert history_service.init_openai_client() is history_service.init_openai_client()
+
+        mock_cosmos_cls.assert_called_once()
+        assert mock_cosmos_cls.call_args.kwargs["connection_limit"] == 50
+        mock_openai_cls.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_warm_up_and_close(self, history_service):
+        """Test warm-up opens the shared clients and close shuts them down"""
+        mock_cosmos_client = AsyncMock()
+        mock_cosmos_client.ensure.return_value = (True, "CosmosDB client initialized successfully")
+        mock_openai_client = AsyncMock()
+        with patch("services.history_service.CosmosConversationClient", return_value=mock_cosmos_client), \
+             patch("services.history_service.AsyncAzureOpenAI", return_value=mock_openai_client):
+            await history_service.warm_up()
+            assert history_service.init_cosmosdb_client() is mock_cosmos_client
+
+        mock_cosmos_client.ensure.assert_awaited_once()
+        await history_service.close()
+        mock_cosmos_client.close.assert_awaited_once()
+        mock_openai_client.close.assert_awaited_once()
+        assert history_service._cosmos_conversation_client is None
+        assert history_service._openai_client is None
+
+    @pytest.mark.asyncio
+    async def test_warm_up_failure_does_not_raise(self, history_service):
+        """Test a failed warm-up is logged without failing startup"""
+        with patch("services.history_service.CosmosConversationClient", side_effect=Exception("Test error")):
+            await history_service.warm_up()
+        await history_service.close()
+
     def test_init_openai_client_with_endpoint(self, history_service):
         """Test OpenAI client initialization with endpoint"""
         with patch("services.history_service.AsyncAzureOpenAI", return_value="openai_client"):
@@ -135,6 +178,42 @@ class TestHistoryService:
             result = await history_service.generate_title([{"role": "user", "content": "Fallback content"}])
             assert result == "Fallback content"
 
+    @pytest.mark.asyncio
+    async def test_generate_titles_batches_conversations(self, history_service):
+        """Test several conversations are titled by one completion"""
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock()]
+        mock_response.choices[0].message.content = '```json\n["Call volumes", "Billing complaints"]\n```'
+        mock_client = AsyncMock()
+        mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
+
+        with patch.object(history_service, "init_openai_client", return_value=mock_client):
+            titles = await history_service.generate_titles([
+                [{"role": "user", "content": "How many calls last week?"}],
+                [{"role": "user", "content": "Top billing complaints"}],
+            ])
+
+        assert titles == ["Call volumes", "Billing complaints"]
+        mock_client.chat.completions.create.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_generate_titles_falls_back_to_one_by_one(self, history_service):
+        """Test an unusable batched answer falls back to titling each conversation"""
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock()]
+        mock_response.choices[0].message.content = '["Only one title"]'
+        mock_client = AsyncMock()
+        mock_client.chat.completions.create = AsyncMock(return_value=mock_response)
+
+        with patch.object(history_service, "init_openai_client", return_value=mock_client), \
+             patch.object(history_service, "generate_title", AsyncMock(side_effect=["First", "Second"])):
+            titles = await history_service.generate_titles([
+                [{"role": "user", "content": "a"}],
+                [{"role": "user", "content": "b"}],
+            ])
+
+        assert titles == ["First", "Second"]
+
     @pytest.mark.asyncio
     async def test_add_conversation_new(self, history_service):
         """Test adding a new conversation"""
@@ -151,14 +230,19 @@ class TestHistoryService:
         mock_cosmos_client.create_message = AsyncMock(return_value="success")
         
         with patch.object(history_service, "init_cosmosdb_client", return_value=mock_cosmos_client):
-            with patch.object(history_service, "generate_title", AsyncMock(return_value="Test Title")):
+            with patch.object(history_service, "title_queue") as mock_title_queue:
                 with patch("services.history_service.complete_chat_request", AsyncMock(return_value={"response": "test"})):
                     result = await history_service.add_conversation(user_id, request_json)
                     assert result == {"response": "test"}
                     
                     # Verify calls
                     mock_cosmos_client.create_conversation.assert_awaited_once()
+                    assert mock_cosmos_client.create_conversation.call_args.kwargs["title"] == "Hello"
                     mock_cosmos_client.create_message.assert_awaited_once()
+                    # The title is generated after the response, starting from the question
+                    mock_title_queue.enqueue.assert_called_once_with(
+                        user_id, "new-conv-id", request_json["messages"], "Hello"
+                    )
 
     @pytest.mark.asyncio
     async def test_add_conversation_existing(self, history_service):
@@ -253,7 +337,7 @@ class TestHistoryService:
             # Verify calls
             mock_cosmos_client.get_conversation.assert_awaited_once()
             mock_cosmos_client.create_message.assert_awaited()
-            mock_cosmos_client.cosmosdb_client.close.assert_awaited_once()
+            mock_cosmos_client.cosmosdb_client.close.assert_not_awaited()
 
     @pytest.mark.asyncio
     async def test_update_conversation_with_tool(self, history_service):
@@ -286,7 +370,7 @@ class TestHistoryService:
             mock_cosmos_client.get_conversation.assert_awaited_once()
             mock_cosmos_client.create_message.assert_awaited()
             assert mock_cosmos_client.create_message.await_count > 1
-            mock_cosmos_client.cosmosdb_client.close.assert_awaited_once()
+            mock_cosmos_client.cosmosdb_client.close.assert_not_awaited()
 
     @pytest.mark.asyncio
     async def test_update_conversation_not_found(self, history_service):
@@ -309,17 +393,20 @@ class TestHistoryService:
         mock_cosmos_client.create_message = AsyncMock(return_value="success")
         
         with patch.object(history_service, "init_cosmosdb_client", return_value=mock_cosmos_client):
-            with patch.object(history_service, "generate_title", mock_generate_title):
+            with patch.object(history_service, "generate_title", mock_generate_title), \
+                 patch.object(history_service, "title_queue") as mock_title_queue:
                 result = await history_service.update_conversation(user_id, request_json)
 
                 assert result == {"id": "new-id", "title": "Generated Title", "updatedAt": None}
 
                 # Verify calls
                 mock_cosmos_client.get_conversation.assert_awaited_once()
-                mock_generate_title.assert_awaited_once()
+                mock_generate_title.assert_not_awaited()
+                assert mock_cosmos_client.create_conversation.call_args.kwargs["title"] == "Hello"
+                mock_title_queue.enqueue.assert_called_once_with(user_id, "new-id", request_json["messages"], "Hello")
                 mock_cosmos_client.create_conversation.assert_awaited_once()
                 mock_cosmos_client.create_message.assert_awaited()
-                mock_cosmos_client.cosmosdb_client.close.assert_awaited_once()
+                mock_cosmos_client.cosmosdb_client.close.assert_not_awaited()
 
     @pytest.mark.asyncio
     async def test_update_conversation_no_conversation_id(self, history_service):
@@ -414,7 +501,7 @@ class TestHistoryService:
             mock_cosmos_client.get_conversation.assert_awaited_once()
             # Verify that create_message was called for the user message but not beyond that
             mock_cosmos_client.create_message.assert_awaited_once()
-            mock_cosmos_client.cosmosdb_client.close.assert_awaited_once()
+            mock_cosmos_client.cosmosdb_client.close.assert_not_awaited()
 
     @pytest.mark.asyncio
     async def test_rename_conversation(self, history_service):
@@ -524,6 +611,34 @@ class TestHistoryService:
             mock_cosmos_client.delete_messages.assert_awaited_once()
             mock_cosmos_client.delete_conversation.assert_awaited_once()
 
+    @pytest.mark.asyncio
+    async def test_delete_large_conversation_in_background(self, history_service):
+        """Test conversations above the threshold are deleted by a background job"""
+        user_id = "test-user-id"
+        conversation_id = "conv-id"
+        history_service.delete_background_threshold = 2
+
+        mock_cosmos_client = AsyncMock()
+        mock_cosmos_client.get_conversation = AsyncMock(
+            return_value={"id": conversation_id, "userId": user_id}
+        )
+        mock_cosmos_client.get_message_ids = AsyncMock(return_value=["m1", "m2", "m3"])
+
+        with patch.object(history_service, "init_cosmosdb_client", return_value=mock_cosmos_client):
+            job = await history_service.delete_conversation(user_id, conversation_id)
+            assert job["status"] == "running"
+            assert job["total"] == 4
+
+            await history_service.deletion_jobs.drain(1)
+
+        # The job's progress is stored with the conversations
+        saved = mock_cosmos_client.upsert_deletion_job.await_args.args[0]
+        assert saved["id"] == job["job_id"]
+        assert saved["userId"] == user_id
+        assert saved["status"] == "completed"
+        assert mock_cosmos_client.delete_messages.await_args.kwargs["message_ids"] == ["m1", "m2", "m3"]
+        mock_cosmos_client.delete_conversation.assert_awaited_once_with(user_id, conversation_id)
+
     @pytest.mark.asyncio
     async def test_delete_conversation_not_found(self, history_service):
         """Test deleting a conversation that doesn't exist"""
@@ -591,6 +706,29 @@ class TestHistoryService:
             # Verify calls
             mock_cosmos_client.get_conversations.assert_awaited_once_with(user_id, offset=offset, limit=limit)
 
+    @pytest.mark.asyncio
+    async def test_get_conversations_page(self, history_service):
+        """Test getting a page of conversations and the next page's token"""
+        mock_cosmos_client = AsyncMock()
+        mock_cosmos_client.get_conversations_page = AsyncMock(return_value=([{"id": "conv3"}], "next-token"))
+
+        with patch.object(history_service, "init_cosmosdb_client", return_value=mock_cosmos_client):
+            result = await history_service.get_conversations_page("test-user-id", 10, continuation_token="token")
+
+        assert result == ([{"id": "conv3"}], "next-token")
+        mock_cosmos_client.get_conversations_page.assert_awaited_once_with(
+            "test-user-id", 10, continuation_token="token")
+
+    @pytest.mark.asyncio
+    async def test_get_conversations_page_invalid_token(self, history_service):
+        """Test a malformed continuation token is reported to the caller"""
+        mock_cosmos_client = AsyncMock()
+        mock_cosmos_client.get_conversations_page = AsyncMock(side_effect=ValueError("Invalid continuation token"))
+
+        with patch.object(history_service, "init_cosmosdb_client", return_value=mock_cosmos_client):
+            with pytest.raises(ValueError):
+                await history_service.get_conversations_page("test-user-id", 10, continuation_token="bad")
+
     @pytest.mark.asyncio
     async def test_get_messages(self, history_service):
         """Test getting messages for a conversation"""
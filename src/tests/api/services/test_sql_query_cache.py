@@ -0,0 +1,170 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from services import sql_query_cache
+from services.sql_query_cache import SqlQueryCache, normalize_question
+
+EMBEDDINGS = {
+    "average handling time by topic last week": [1.0, 0.0, 0.0],
+    "avg handling time per topic for last week": [0.99, 0.1, 0.0],
+    "total calls by sentiment": [0.0, 1.0, 0.0],
+    "top 5 topics": [0.0, 0.0, 1.0],
+    "top 10 topics": [0.0, 0.01, 1.0],
+}
+
+
+def make_embedder():
+    async def embed(text):
+        return EMBEDDINGS[text]
+    return AsyncMock(side_effect=embed)
+
+
+@pytest.fixture(autouse=True)
+def reset_sql_query_cache():
+    sql_query_cache._sql_query_cache = None
+    yield
+    sql_query_cache._sql_query_cache = None
+
+
+def test_normalize_question():
+    assert normalize_question("  Total   Calls by Topic? ") == "total calls by topic"
+    assert normalize_question(None) == ""
+
+
+@pytest.mark.asyncio
+async def test_exact_match_ignores_case_whitespace_and_punctuation():
+    cache = SqlQueryCache()
+    await cache.store("Total calls by topic?", "SELECT 1")
+
+    assert await cache.lookup("total  calls by TOPIC") == "SELECT 1"
+    assert await cache.lookup("total calls by sentiment") is None
+    stats = cache.get_stats()
+    assert stats["exact_hits"] == 1
+    assert stats["misses"] == 1
+    assert not stats["similarity_enabled"]
+
+
+@pytest.mark.asyncio
+async def test_similar_question_reuses_sql_and_embeds_once():
+    embedder = make_embedder()
+    cache = SqlQueryCache(similarity_threshold=0.95, embedder=embedder)
+    await cache.store("Average handling time by topic last week", "SELECT aht")
+
+    assert await cache.lookup("Avg handling time per topic for last week?") == "SELECT aht"
+    assert await cache.lookup("Total calls by sentiment") is None
+    await cache.store("Total calls by sentiment", "SELECT calls")
+
+    # The embedding computed by the missed lookup is reused by store
+    assert embedder.await_count == 3
+    assert cache.get_stats()["similar_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_questions_with_different_numbers_never_match():
+    cache = SqlQueryCache(similarity_threshold=0.9, embedder=make_embedder())
+    await cache.store("Top 5 topics", "SELECT TOP 5")
+
+    assert await cache.lookup("Top 10 topics") is None
+
+
+@pytest.mark.asyncio
+async def test_similarity_is_off_by_default():
+    embedder = make_embedder()
+    cache = SqlQueryCache(embedder=embedder)
+    await cache.store("Average handling time by topic last week", "SELECT aht")
+
+    assert await cache.lookup("Avg handling time per topic for last week") is None
+    embedder.assert_not_awaited()
+    assert not cache.get_stats()["similarity_enabled"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cached, asked", [
+    ("Number of calls last week", "Number of calls last month"),
+    ("Calls handled today", "Calls handled yesterday"),
+    ("Satisfied customers by topic", "Unsatisfied customers by topic"),
+    ("Topics with complaints", "Topics without complaints"),
+    ("Agents who resolved the issue", "Agents who didn't resolve the issue"),
+    ("Topic with the most calls", "Topic with the fewest calls"),
+    ("Topics with calls above average", "Topics with calls below average"),
+])
+async def test_near_miss_questions_never_match(cached, asked):
+    # Identical embeddings, so only the guards keep the questions apart
+    cache = SqlQueryCache(similarity_threshold=0.5, embedder=AsyncMock(return_value=[1.0, 0.0]))
+    await cache.store(cached, "SELECT cached")
+
+    assert await cache.lookup(asked) is None
+
+
+@pytest.mark.asyncio
+async def test_embedding_errors_fall_back_to_exact_match():
+    cache = SqlQueryCache(similarity_threshold=0.95, embedder=AsyncMock(side_effect=Exception("throttled")))
+    await cache.store("Total calls", "SELECT 1")
+
+    assert await cache.lookup("Total calls") == "SELECT 1"
+    assert await cache.lookup("Number of calls") is None
+    assert cache.get_stats()["embedding_errors"] == 2
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_and_discard():
+    cache = SqlQueryCache(max_entries=2)
+    await cache.store("a", "SELECT a")
+    await cache.store("b", "SELECT b")
+    assert await cache.lookup("a") == "SELECT a"
+    await cache.store("c", "SELECT c")
+
+    assert await cache.lookup("b") is None
+    cache.discard("a")
+    assert await cache.lookup("a") is None
+    assert cache.get_stats()["discards"] == 1
+
+
+@pytest.mark.asyncio
+async def test_ttl_expiry():
+    cache = SqlQueryCache(ttl_seconds=0.01)
+    await cache.store("a", "SELECT a")
+    await asyncio.sleep(0.02)
+    assert await cache.lookup("a") is None
+
+
+@pytest.mark.asyncio
+async def test_schema_change_invalidates():
+    loader = AsyncMock(side_effect=[1, 2])
+    cache = SqlQueryCache(schema_check_seconds=60, schema_loader=loader)
+    assert await cache.lookup("a") is None
+    await cache.store("a", "SELECT a")
+
+    cache._schema_checked_at -= 120
+    assert await cache.lookup("a") is None
+    assert cache.get_stats()["invalidations"] == 1
+    assert loader.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_schema_check_errors_keep_entries():
+    cache = SqlQueryCache(schema_loader=AsyncMock(side_effect=Exception("db down")))
+    await cache.store("a", "SELECT a")
+
+    assert await cache.lookup("a") == "SELECT a"
+
+
+def test_get_sql_query_cache_uses_config():
+    with patch("services.sql_query_cache.Config") as mock_config:
+        mock_config.return_value.sql_query_cache_ttl_seconds = 60
+        mock_config.return_value.sql_query_cache_max_entries = 8
+        mock_config.return_value.sql_query_cache_similarity_threshold = 0.9
+        mock_config.return_value.sql_query_cache_schema_check_seconds = 0
+        mock_config.return_value.azure_openai_embedding_model = None
+        cache = sql_query_cache.get_sql_query_cache()
+
+    assert sql_query_cache.get_sql_query_cache() is cache
+    assert cache.max_entries == 8
+    assert not cache.get_stats()["similarity_enabled"]
+    assert sql_query_cache.get_sql_query_cache_stats()["size"] == 0
+
+
+def test_stats_empty_before_first_use():
+    assert sql_query_cache.get_sql_query_cache_stats() == {}
@@ -0,0 +1,232 @@
+import asyncio
+import threading
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from azure.core.exceptions import ResourceNotFoundError
+
+from services import thread_reaper
+from services.thread_reaper import (
+    ThreadReaper,
+    drain_thread_reaper,
+    get_thread_reaper,
+    get_thread_reaper_metrics,
+)
+
+
+@pytest.fixture(autouse=True)
+def reset_reaper():
+    thread_reaper._thread_reaper = None
+    yield
+    thread_reaper._thread_reaper = None
+
+
+@pytest.mark.asyncio
+async def test_queued_threads_are_deleted_once():
+    reaper = ThreadReaper(rate_per_second=0)
+    delete_thread = AsyncMock()
+    reaper.enqueue("t1")
+    reaper.enqueue("t1")
+
+    await reaper.start(delete_thread)
+    reaper.enqueue("t2")
+    remaining = await reaper.drain(1)
+
+    assert remaining == 0
+    assert sorted(c.args[0] for c in delete_thread.await_args_list) == ["t1", "t2"]
+    metrics = reaper.get_metrics()
+    assert metrics["enqueued"] == 2
+    assert metrics["deleted"] == 2
+    assert metrics["pending"] == 0
+    assert not metrics["running"]
+
+
+@pytest.mark.asyncio
+async def test_failures_are_retried_then_recorded(tmp_path):
+    reaper = ThreadReaper(queue_path=str(tmp_path / "reaper.db"), rate_per_second=0, max_attempts=3,
+                          retry_base_seconds=0.01)
+    delete_thread = AsyncMock(side_effect=[RuntimeError("throttled"), None, RuntimeError("boom"),
+                                           RuntimeError("boom"), RuntimeError("boom")])
+    reaper.max_concurrency = 1
+    reaper.enqueue("t1")
+    reaper.enqueue("t2")
+
+    await reaper.start(delete_thread)
+    await reaper.drain(1)
+
+    metrics = reaper.get_metrics()
+    assert metrics["deleted"] == 1
+    assert metrics["failed"] == 1
+    assert metrics["retries"] == 3
+
+    # The failed thread is kept with its error and not retried before its backoff has passed
+    restarted = ThreadReaper(queue_path=str(tmp_path / "reaper.db"))
+    rows = restarted._execute("SELECT thread_id, failed, last_error FROM pending_thread_deletions")
+    assert rows == [("t2", 1, "boom")]
+    await restarted.start(AsyncMock())
+    assert restarted.get_metrics()["pending"] == 0
+    await restarted.drain(1)
+
+
+@pytest.mark.asyncio
+async def test_threads_already_gone_count_as_deleted():
+    reaper = ThreadReaper(rate_per_second=0)
+    reaper.enqueue("t1")
+
+    await reaper.start(AsyncMock(side_effect=ResourceNotFoundError("gone")))
+    await reaper.drain(1)
+
+    assert reaper.get_metrics()["not_found"] == 1
+    assert reaper.get_metrics()["failed"] == 0
+
+
+@pytest.mark.asyncio
+async def test_deletions_are_rate_limited():
+    reaper = ThreadReaper(rate_per_second=50)
+    for index in range(6):
+        reaper.enqueue(f"t{index}")
+
+    started = asyncio.get_running_loop().time()
+    await reaper.start(AsyncMock())
+    await reaper.drain(1)
+
+    assert reaper.get_metrics()["deleted"] == 6
+    assert asyncio.get_running_loop().time() - started >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_threads_left_at_the_deadline_are_deleted_after_restart(tmp_path):
+    queue_path = str(tmp_path / "reaper.db")
+    reaper = ThreadReaper(queue_path=queue_path, rate_per_second=0)
+    reaper.enqueue("t1")
+
+    async def hang(thread_id):
+        await asyncio.sleep(10)
+
+    await reaper.start(hang)
+    assert await reaper.drain(0.05) == 1
+
+    restarted = ThreadReaper(queue_path=queue_path, rate_per_second=0)
+    delete_thread = AsyncMock()
+    await restarted.start(delete_thread)
+    assert await restarted.drain(1) == 0
+    delete_thread.assert_awaited_once_with("t1")
+
+
+@pytest.mark.asyncio
+async def test_failed_threads_are_retried_after_their_backoff(tmp_path):
+    queue_path = str(tmp_path / "reaper.db")
+    reaper = ThreadReaper(queue_path=queue_path, rate_per_second=0, max_attempts=1, failed_retry_seconds=0.05)
+    reaper.enqueue("t1")
+    await reaper.start(AsyncMock(side_effect=RuntimeError("boom")))
+    await reaper.drain(1)
+
+    delete_thread = AsyncMock()
+    too_early = ThreadReaper(queue_path=queue_path, rate_per_second=0)
+    await too_early.start(delete_thread)
+    assert await too_early.drain(1) == 0
+    delete_thread.assert_not_awaited()
+
+    await asyncio.sleep(0.06)
+    restarted = ThreadReaper(queue_path=queue_path, rate_per_second=0)
+    await restarted.start(delete_thread)
+    await restarted.drain(1)
+    delete_thread.assert_awaited_once_with("t1")
+    assert restarted._execute("SELECT thread_id FROM pending_thread_deletions") == []
+
+
+@pytest.mark.asyncio
+async def test_queued_threads_are_claimed_by_one_worker(tmp_path):
+    queue_path = str(tmp_path / "reaper.db")
+    release = asyncio.Event()
+
+    async def wait_for_release(thread_id):
+        await release.wait()
+
+    owner = ThreadReaper(queue_path=queue_path, rate_per_second=0)
+    owner_delete = AsyncMock(side_effect=wait_for_release)
+    owner.enqueue("t1")
+    await owner.start(owner_delete)
+    await asyncio.sleep(0.05)
+
+    # The thread is leased to the worker that queued it
+    other = ThreadReaper(queue_path=queue_path, rate_per_second=0)
+    other_delete = AsyncMock()
+    other.enqueue("t1")
+    await other.start(other_delete)
+    assert await other.drain(1) == 0
+
+    release.set()
+    await owner.drain(1)
+
+    owner_delete.assert_awaited_once_with("t1")
+    other_delete.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_expired_leases_are_taken_over(tmp_path, monkeypatch):
+    queue_path = str(tmp_path / "reaper.db")
+    monkeypatch.setattr(thread_reaper, "LEASE_SECONDS", -1)
+    # A worker that queued a thread and died without draining
+    ThreadReaper(queue_path=queue_path)._save(["t1"])
+
+    delete_thread = AsyncMock()
+    survivor = ThreadReaper(queue_path=queue_path, rate_per_second=0)
+    await survivor.start(delete_thread)
+    await survivor.drain(1)
+
+    delete_thread.assert_awaited_once_with("t1")
+
+
+@pytest.mark.asyncio
+async def test_failed_threads_are_reclaimed_while_running(tmp_path, monkeypatch):
+    monkeypatch.setattr(thread_reaper, "RECLAIM_SECONDS", 0.05)
+    reaper = ThreadReaper(queue_path=str(tmp_path / "reaper.db"), rate_per_second=0, max_attempts=1,
+                          failed_retry_seconds=0.01)
+    delete_thread = AsyncMock(side_effect=[RuntimeError("boom"), None])
+    reaper.enqueue("t1")
+    await reaper.start(delete_thread)
+
+    await asyncio.sleep(0.2)
+    assert delete_thread.await_count == 2
+    assert reaper.get_metrics()["deleted"] == 1
+    await reaper.drain(1)
+    assert reaper._execute("SELECT thread_id FROM pending_thread_deletions") == []
+
+
+@pytest.mark.asyncio
+async def test_queue_file_is_not_accessed_on_the_event_loop(tmp_path):
+    reaper = ThreadReaper(queue_path=str(tmp_path / "reaper.db"), rate_per_second=0)
+    execute = reaper._execute
+    threads = set()
+
+    def record_thread(*args):
+        threads.add(threading.get_ident())
+        return execute(*args)
+
+    reaper._execute = record_thread
+    reaper.enqueue("t1")
+    await reaper.start(AsyncMock())
+    await reaper.drain(1)
+
+    assert threads
+    assert threading.get_ident() not in threads
+
+
+@pytest.mark.asyncio
+async def test_get_reaper_is_a_singleton(tmp_path):
+    with patch("services.thread_reaper.Config") as mock_config:
+        mock_config.return_value.thread_reaper_queue_path = str(tmp_path / "reaper.db")
+        mock_config.return_value.thread_reaper_max_concurrency = 2
+        mock_config.return_value.thread_reaper_rate_per_second = 5
+        mock_config.return_value.thread_reaper_max_attempts = 3
+        assert get_thread_reaper_metrics() == {}
+        reaper = get_thread_reaper()
+
+    assert get_thread_reaper() is reaper
+    assert reaper.max_concurrency == 2
+    reaper.enqueue("t1")
+    assert get_thread_reaper_metrics()["pending"] == 1
+
+    assert await drain_thread_reaper(1) == 1
+    assert thread_reaper._thread_reaper is None
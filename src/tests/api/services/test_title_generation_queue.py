@@ -0,0 +1,98 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from services.title_generation_queue import TitleGenerationQueue
+
+
+def make_messages(question):
+    return [{"role": "user", "content": question}]
+
+
+@pytest.mark.asyncio
+async def test_waiting_conversations_are_titled_in_one_batch():
+    generate_titles = AsyncMock(side_effect=lambda conversations: [f"Title {len(c)}" for c in conversations])
+    apply_title = AsyncMock(return_value=True)
+    queue = TitleGenerationQueue(generate_titles, apply_title, max_concurrency=1, batch_size=8, batch_wait=0.05)
+
+    for index in range(3):
+        queue.enqueue("user", f"c{index}", make_messages(f"q{index}"), f"q{index}")
+    await queue.drain(1)
+
+    generate_titles.assert_awaited_once()
+    assert len(generate_titles.await_args.args[0]) == 3
+    assert [c.args[0].conversation_id for c in apply_title.await_args_list] == ["c0", "c1", "c2"]
+    metrics = queue.get_metrics()
+    assert metrics["batches"] == 1
+    assert metrics["updated"] == 3
+    assert metrics["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_batches_are_bounded_in_size_and_concurrency():
+    running = 0
+    peak = 0
+
+    async def generate_titles(conversations):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        return ["Title"] * len(conversations)
+
+    queue = TitleGenerationQueue(generate_titles, AsyncMock(return_value=True), max_concurrency=2, batch_size=2,
+                                 batch_wait=0.01)
+    for index in range(7):
+        queue.enqueue("user", f"c{index}", make_messages("q"), "q")
+    await queue.drain(1)
+
+    assert peak == 2
+    assert queue.get_metrics()["batches"] == 4
+    assert queue.get_metrics()["updated"] == 7
+
+
+@pytest.mark.asyncio
+async def test_unchanged_renamed_and_failed_titles():
+    apply_title = AsyncMock(side_effect=[False, Exception("Cosmos unavailable")])
+    queue = TitleGenerationQueue(AsyncMock(return_value=["q0", "Renamed", "Title"]), apply_title, batch_wait=0.05)
+
+    for index in range(3):
+        queue.enqueue("user", f"c{index}", make_messages(f"q{index}"), f"q{index}")
+    await queue.drain(1)
+
+    # The first title equals the provisional one and is not written
+    assert apply_title.await_count == 2
+    metrics = queue.get_metrics()
+    assert metrics["skipped"] == 2
+    assert metrics["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_generation_failure_is_counted_and_the_queue_keeps_running():
+    generate_titles = AsyncMock(side_effect=[Exception("rate limited"), ["Title"]])
+    apply_title = AsyncMock(return_value=True)
+    queue = TitleGenerationQueue(generate_titles, apply_title, batch_wait=0)
+
+    queue.enqueue("user", "c0", make_messages("q0"), "q0")
+    await asyncio.sleep(0.01)
+    queue.enqueue("user", "c1", make_messages("q1"), "q1")
+    await queue.drain(1)
+
+    assert queue.get_metrics()["failed"] == 1
+    assert queue.get_metrics()["updated"] == 1
+
+
+@pytest.mark.asyncio
+async def test_drain_stops_at_the_deadline():
+    async def hang(conversations):
+        await asyncio.sleep(10)
+
+    queue = TitleGenerationQueue(hang, AsyncMock(), batch_wait=0)
+    queue.enqueue("user", "c0", make_messages("q0"), "q0")
+
+    await queue.drain(0.05)
+
+    assert queue.get_metrics()["pending"] == 0
+    assert queue._workers == []
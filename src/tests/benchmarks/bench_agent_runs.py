@@ -0,0 +1,169 @@
+"""
+Concurrency benchmark: ChatWithDataPlugin agent runs on the async project client vs. the
+former blocking calls.
+
+Both sides talk to a local stub of the agents API in which every call takes ``--latency``
+seconds and ``runs.create_and_process`` takes ``--run-latency`` seconds, standing in for the
+LLM run. ``--chats`` transcript questions are issued concurrently on one event loop, the way
+a single worker serves simultaneous chats. The blocking side replays the call sequence the
+plugin used with the synchronous client, so every run holds the event loop; the async sides
+call the real ``ChatWithDataPlugin.get_answers_from_calltranscripts``, first with an empty
+thread pool (a thread is created per call) and then with a warm one.
+Run from the repository root:
+
+    python src/tests/benchmarks/bench_agent_runs.py [--chats 20] [--run-latency 0.5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "api"))
+
+from azure.ai.agents.models import ListSortOrder, MessageRole  # noqa: E402
+
+from agents.agent_thread_pool import AgentThreadPool  # noqa: E402
+from agents.search_agent_factory import SearchAgentFactory  # noqa: E402
+from plugins.chat_with_data_plugin import ChatWithDataPlugin  # noqa: E402
+
+ANSWER = SimpleNamespace(
+    role=MessageRole.AGENT,
+    text_messages=[SimpleNamespace(text=SimpleNamespace(value="Calls about billing rose 12% 【3:0†source】"))],
+)
+
+
+class BlockingAgentsStub:
+    """Synchronous stub shaped like ``AIProjectClient.agents``."""
+
+    def __init__(self, latency, run_latency):
+        self.threads = SimpleNamespace(create=self._create_thread, delete=self._call)
+        self.messages = SimpleNamespace(create=self._call, list=self._list)
+        self.runs = SimpleNamespace(create_and_process=self._run)
+        self.run_steps = SimpleNamespace(list=self._list_steps)
+        self._latency = latency
+        self._run_latency = run_latency
+
+    def _call(self, **kwargs):
+        time.sleep(self._latency)
+
+    def _create_thread(self):
+        self._call()
+        return SimpleNamespace(id="thread")
+
+    def _run(self, **kwargs):
+        time.sleep(self._run_latency)
+        return SimpleNamespace(id="run", status="completed")
+
+    def _list(self, **kwargs):
+        self._call()
+        return [ANSWER]
+
+    def _list_steps(self, **kwargs):
+        self._call()
+        return []
+
+
+class AsyncAgentsStub:
+    """Asynchronous stub shaped like ``azure.ai.projects.aio.AIProjectClient.agents``."""
+
+    def __init__(self, latency, run_latency):
+        self.threads = SimpleNamespace(create=self._create_thread, delete=self._call)
+        self.messages = SimpleNamespace(create=self._call, list=self._list)
+        self.runs = SimpleNamespace(create_and_process=self._run)
+        self.run_steps = SimpleNamespace(list=self._list_steps)
+        self._latency = latency
+        self._run_latency = run_latency
+
+    async def _call(self, **kwargs):
+        await asyncio.sleep(self._latency)
+
+    async def _create_thread(self):
+        await self._call()
+        return SimpleNamespace(id="thread")
+
+    async def _run(self, **kwargs):
+        await asyncio.sleep(self._run_latency)
+        return SimpleNamespace(id="run", status="completed")
+
+    async def _list(self, **kwargs):
+        await self._call()
+        yield ANSWER
+
+    async def _list_steps(self, **kwargs):
+        await self._call()
+        return
+        yield
+
+
+async def blocking_transcript_run(client, agent, question):
+    """The call sequence the plugin issued against the synchronous project client."""
+    thread = client.agents.threads.create()
+    client.agents.messages.create(thread_id=thread.id, role=MessageRole.USER, content=question)
+    run = client.agents.runs.create_and_process(
+        thread_id=thread.id, agent_id=agent.id, tool_choice={"type": "azure_ai_search"}
+    )
+    for _ in client.agents.run_steps.list(thread_id=thread.id, run_id=run.id):
+        pass
+    answer = ""
+    for msg in client.agents.messages.list(thread_id=thread.id, order=ListSortOrder.ASCENDING):
+        if msg.role == MessageRole.AGENT and msg.text_messages:
+            answer = msg.text_messages[-1].text.value
+            break
+    client.agents.threads.delete(thread_id=thread.id)
+    return answer
+
+
+async def measure(run_one, chats):
+    """Issue all chats at once; a chat's latency runs from the common start to its answer."""
+    latencies = []
+    start = time.perf_counter()
+
+    async def timed(index):
+        await run_one(f"question {index}")
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(timed(index) for index in range(chats)))
+    return time.perf_counter() - start, sorted(latencies)
+
+
+def report(name, elapsed, latencies, chats):
+    p50 = latencies[len(latencies) // 2]
+    print(f"{name:<10} wall {elapsed:7.2f} s   {chats / elapsed:6.2f} chats/s   "
+          f"p50 {p50:6.2f} s   max {latencies[-1]:6.2f} s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=20, help="concurrent chats")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per agents API call")
+    parser.add_argument("--run-latency", type=float, default=0.5, help="seconds per agent run")
+    args = parser.parse_args()
+
+    agent = SimpleNamespace(id="agent")
+    print(f"{args.chats} concurrent chats, {args.latency}s per call, {args.run_latency}s per run")
+
+    blocking_client = SimpleNamespace(agents=BlockingAgentsStub(args.latency, args.run_latency))
+    elapsed, latencies = await measure(
+        lambda question: blocking_transcript_run(blocking_client, agent, question), args.chats
+    )
+    report("blocking", elapsed, latencies, args.chats)
+
+    plugin = ChatWithDataPlugin()
+    for name, pool_size in (("async", 0), ("warm pool", args.chats)):
+        client = SimpleNamespace(agents=AsyncAgentsStub(args.latency, args.run_latency))
+        thread_pool = AgentThreadPool(client, name="search", size=pool_size)
+        thread_pool.start()
+        while thread_pool.get_metrics()["idle"] < pool_size:
+            await asyncio.sleep(args.latency)
+        SearchAgentFactory._agent = {"agent": agent, "client": client, "thread_pool": thread_pool}
+
+        elapsed, latencies = await measure(plugin.get_answers_from_calltranscripts, args.chats)
+        report(name, elapsed, latencies, args.chats)
+        await thread_pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
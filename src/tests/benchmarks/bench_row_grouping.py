@@ -0,0 +1,85 @@
+"""
+Micro-benchmark: chart row shaping with helpers.row_grouping vs. the former pandas path.
+
+pandas is no longer an API dependency, so the pandas side is only measured when it is
+installed (``pip install pandas``). Run from the repository root:
+
+    python src/tests/benchmarks/bench_row_grouping.py [--rows 60] [--repeat 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "api"))
+
+from helpers.row_grouping import group_rows  # noqa: E402
+
+COLUMNS = ["id", "chart_name", "chart_type", "name", "value", "unit_of_measurement"]
+GROUP_BY = ["id", "chart_name", "chart_type"]
+VALUE_COLUMNS = ["name", "value", "unit_of_measurement"]
+
+
+def make_rows(count):
+    """Rows shaped like the cards/donut/bar result set of fetch_chart_data."""
+    rows = [
+        ("TOTAL_CALLS", "Total Calls", "card", "Total Calls", 1000, ""),
+        ("AVG_HANDLING_TIME", "Average Handling Time", "card", "Average Handling Time", 7, "mins"),
+        ("SATISFIED", "Satisfied", "card", "Satisfied", 71.5, "%"),
+    ]
+    for sentiment in ("positive", "neutral", "negative"):
+        rows.append(("SENTIMENT", "Topics Overview", "donutchart", sentiment, 33, ""))
+    topic = 0
+    while len(rows) < count:
+        rows.append(("AVG_HANDLING_TIME_BY_TOPIC", "Average Handling Time By Topic", "bar", f"Topic {topic}", topic % 15, ""))
+        topic += 1
+    return rows
+
+
+def shape_with_row_grouping(rows):
+    return group_rows(rows, COLUMNS, GROUP_BY, VALUE_COLUMNS, "chart_value")
+
+
+def shape_with_pandas(pd, rows):
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    return (
+        df.groupby(GROUP_BY).apply(
+            lambda x: x[VALUE_COLUMNS].to_dict(orient="records"), include_groups=False
+        ).reset_index(name="chart_value").to_dict(orient="records")
+    )
+
+
+def report(name, seconds, repeat):
+    print(f"{name:<14} {seconds / repeat * 1e6:10.1f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=60, help="rows per result set")
+    parser.add_argument("--repeat", type=int, default=2000, help="calls per measurement")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    print(f"{len(rows)} rows, {args.repeat} calls")
+
+    seconds = min(timeit.repeat(lambda: shape_with_row_grouping(rows), number=args.repeat, repeat=5))
+    report("row_grouping", seconds, args.repeat)
+
+    try:
+        start = time.perf_counter()
+        import pandas as pd
+        print(f"pandas import  {(time.perf_counter() - start) * 1e3:10.1f} ms (cold start cost)")
+    except ImportError:
+        print("pandas is not installed; skipping the pandas comparison")
+        return
+
+    if shape_with_pandas(pd, rows) != shape_with_row_grouping(rows):
+        raise SystemExit("row_grouping output differs from the pandas output")
+    seconds = min(timeit.repeat(lambda: shape_with_pandas(pd, rows), number=args.repeat, repeat=5))
+    report("pandas", seconds, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark: chat stream frames per second per core with StreamChunkEncoder vs. the
+former dict -> JSON -> SimpleNamespace -> format_stream_response -> JSON path.
+
+Each frame carries an answer of ``--chars`` characters, the size of a frame late in a
+typical answer with the full-text protocol. The encoder is measured with the standard
+library JSON encoder and, when it is installed, with orjson. Run from the repository root:
+
+    python src/tests/benchmarks/bench_stream_encoder.py [--chars 1500] [--repeat 20000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import timeit
+import uuid
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "api"))
+
+from helpers import streaming_helper  # noqa: E402
+from helpers.streaming_helper import StreamChunkEncoder  # noqa: E402
+from helpers.utils import format_stream_response  # noqa: E402
+
+HISTORY_METADATA = {"conversation_id": str(uuid.uuid4()), "title": "Billing disputes last week"}
+
+
+def legacy_frame(content):
+    chunk = {
+        "id": str(uuid.uuid4()),
+        "model": "rag-model",
+        "created": int(time.time()),
+        "object": "extensions.chat.completion.chunk",
+        "choices": [{"messages": [{"role": "assistant", "content": content}],
+                     "delta": {"role": "assistant", "content": content}}],
+        "history_metadata": HISTORY_METADATA,
+        "apim-request-id": "",
+    }
+    chunk_obj = json.loads(json.dumps(chunk), object_hook=lambda d: SimpleNamespace(**d))
+    return json.dumps(format_stream_response(chunk_obj, HISTORY_METADATA, "")) + "\n\n"
+
+
+def report(name, seconds, repeat):
+    print(f"{name:<18} {repeat / seconds:12,.0f} frames/s {seconds / repeat * 1e6:8.1f} us/frame")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chars", type=int, default=1500, help="answer characters carried per frame")
+    parser.add_argument("--repeat", type=int, default=20000, help="frames encoded per measurement")
+    args = parser.parse_args()
+
+    sentence = '{"answer": "Billing disputes were the most frequent topic [1].\\n", "citations": []} '
+    content = (sentence * (args.chars // len(sentence) + 1))[:args.chars]
+
+    report("legacy", timeit.timeit(lambda: legacy_frame(content), number=args.repeat), args.repeat)
+    with patch.object(streaming_helper, "orjson", None):
+        encoder = StreamChunkEncoder(HISTORY_METADATA)
+        report("encoder (json)", timeit.timeit(lambda: encoder.full(content), number=args.repeat), args.repeat)
+    if streaming_helper.orjson is not None:
+        encoder = StreamChunkEncoder(HISTORY_METADATA)
+        report("encoder (orjson)", timeit.timeit(lambda: encoder.full(content), number=args.repeat), args.repeat)
+    else:
+        print("encoder (orjson)   skipped, orjson is not installed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Wire benchmark: bytes and server CPU per streamed answer with the full-text and delta
+protocols of /api/chat.
+
+A synthetic agent answer of ``--chars`` characters is streamed in fragments of
+``--fragment`` characters through ``ChatService.stream_chat_request``, once per protocol.
+The full-text protocol resends the accumulated answer in every frame, so its cost grows
+with the square of the answer length; the delta protocol sends every character once plus
+a final consolidated message. Each protocol is measured once with every fragment in its
+own frame and once with fragments coalesced up to ``--coalesce-bytes``.
+Run from the repository root:
+
+    python src/tests/benchmarks/bench_stream_protocol.py [--chars 4000] [--fragment 4] [--coalesce-bytes 256]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "api"))
+
+from services.chat_service import (  # noqa: E402
+    STREAM_PROTOCOL_DELTA,
+    STREAM_PROTOCOL_FULL,
+    ChatService,
+)
+
+
+def make_answer(chars):
+    """An answer shaped like the conversation agent's JSON output."""
+    sentence = "Billing disputes were the most frequent topic last week [1]. "
+    text = (sentence * (chars // len(sentence) + 1))[:chars]
+    return json.dumps({"answer": text, "citations": [{"url": "https://example/1", "title": "call 1"}]})
+
+
+def make_service(answer, fragment, coalesce_bytes):
+    service = ChatService.__new__(ChatService)
+    service.stream_coalesce_max_bytes = coalesce_bytes
+    service.stream_coalesce_max_latency = 0.05
+
+    async def stream_openai_text(conversation_id, query):
+        for start in range(0, len(answer), fragment):
+            yield answer[start:start + fragment]
+
+    service.stream_openai_text = stream_openai_text
+    return service
+
+
+async def stream_once(service, protocol):
+    generator = await service.stream_chat_request(
+        {"history_metadata": {"conversation_id": "c"}}, "c", "question", protocol
+    )
+    total_bytes = 0
+    frames = 0
+    async for frame in generator:
+        total_bytes += len(frame.encode("utf-8"))
+        frames += 1
+    return total_bytes, frames
+
+
+async def measure(service, protocol, repeat):
+    started = time.process_time()
+    for _ in range(repeat):
+        total_bytes, frames = await stream_once(service, protocol)
+    cpu_ms = (time.process_time() - started) / repeat * 1000
+    return total_bytes, frames, cpu_ms
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chars", type=int, default=4000, help="answer length in characters")
+    parser.add_argument("--fragment", type=int, default=4, help="characters per streamed fragment")
+    parser.add_argument("--coalesce-bytes", type=int, default=256, help="coalescing threshold")
+    parser.add_argument("--repeat", type=int, default=20, help="answers streamed per protocol")
+    args = parser.parse_args()
+
+    answer = make_answer(args.chars)
+    print(f"answer {len(answer)} chars in fragments of {args.fragment}")
+    for coalesce_bytes in (0, args.coalesce_bytes):
+        service = make_service(answer, args.fragment, coalesce_bytes)
+        for protocol in (STREAM_PROTOCOL_FULL, STREAM_PROTOCOL_DELTA):
+            total_bytes, frames, cpu_ms = await measure(service, protocol, args.repeat)
+            print(f"{protocol:<6} coalesce {coalesce_bytes:4d} {frames:6d} frames "
+                  f"{total_bytes / 1024:12.1f} KiB {cpu_ms:10.2f} ms CPU per answer")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
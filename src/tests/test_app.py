@@ -45,11 +45,15 @@ async def test_lifespan_startup_and_shutdown():
          patch("agents.sql_agent_factory.SQLAgentFactory.get_agent", return_value=mock_sql_agent) as mock_get_sql, \
          patch("agents.conversation_agent_factory.ConversationAgentFactory.delete_agent", new_callable=AsyncMock) as mock_delete_convo, \
          patch("agents.search_agent_factory.SearchAgentFactory.delete_agent", new_callable=AsyncMock) as mock_delete_search, \
-         patch("agents.sql_agent_factory.SQLAgentFactory.delete_agent", new_callable=AsyncMock) as mock_delete_sql:
+         patch("agents.sql_agent_factory.SQLAgentFactory.delete_agent", new_callable=AsyncMock) as mock_delete_sql, \
+         patch("app.DateRebaseService") as mock_rebase_service_cls:
+        mock_rebase_service = mock_rebase_service_cls.return_value
+        mock_rebase_service.stop = AsyncMock()
 
         app = app_module.build_app()
 
         async with app_module.lifespan(app):
+            mock_rebase_service.start.assert_called_once()
             mock_get_convo.assert_awaited_once()
             mock_get_search.assert_awaited_once()
             mock_get_sql.assert_awaited_once()
@@ -61,6 +65,7 @@ async def test_lifespan_startup_and_shutdown():
         mock_delete_convo.assert_awaited_once()
         mock_delete_search.assert_awaited_once()
         mock_delete_sql.assert_awaited_once()
+        mock_rebase_service.stop.assert_awaited_once()
 
         assert app.state.agent is None
         assert app.state.search_agent is None